@@ -1,19 +1,69 @@
+from os import stat
+from pickle import HIGHEST_PROTOCOL, dump, load
 from sys import maxsize
 
 from enigma import eActionMap
 
 from keyids import KEYIDS
 from Components.config import config
-from Tools.Directories import fileReadXML
+from Tools.Directories import SCOPE_CONFIG, fileReadXML, resolveFilename
+from Tools.KeyLatency import runAction
 
 MODULE_NAME = __name__.split(".")[-1]
+KEYMAP_CACHE_FILE = resolveFilename(SCOPE_CONFIG, "keymap.cache")
+KEYMAP_CACHE_VERSION = 1
 
-keyBindings = {}
+keyBindings = {}  # Indexed by (context, mapto), the value is a list of (keyId, filename, flags).
+contextIndex = {}  # Indexed by context, the value is the set of mapto actions bound in that context.
+filenameIndex = {}  # Indexed by filename, the value is the set of (context, mapto) bound from that file.
+keyIdIndex = {}  # Indexed by keyId, the value is the set of (context, mapto) bound to that key.
 unmapDict = {}
+keymapCache = None
+
+
+def _indexKeyBinding(contextAction, keyId, filename):
+	contextIndex.setdefault(contextAction[0], set()).add(contextAction[1])
+	filenameIndex.setdefault(filename, set()).add(contextAction)
+	keyIdIndex.setdefault(keyId, set()).add(contextAction)
+
+
+def _unindexKeyBinding(contextAction, bindings):
+	# Drop the index entries for the bindings that were removed from "contextAction".
+	remaining = keyBindings.get(contextAction, [])
+	for keyId, filename, flags in bindings:
+		if not any(x[0] == keyId for x in remaining):
+			contextActions = keyIdIndex.get(keyId)
+			if contextActions is not None:
+				contextActions.discard(contextAction)
+				if not contextActions:
+					del keyIdIndex[keyId]
+		if not any(x[1] == filename for x in remaining):
+			contextActions = filenameIndex.get(filename)
+			if contextActions is not None:
+				contextActions.discard(contextAction)
+				if not contextActions:
+					del filenameIndex[filename]
+	if not remaining:
+		actions = contextIndex.get(contextAction[0])
+		if actions is not None:
+			actions.discard(contextAction[1])
+			if not actions:
+				del contextIndex[contextAction[0]]
+
+
+def _setKeyBindings(contextAction, bindings):
+	removed = keyBindings.get(contextAction, [])
+	if bindings:
+		keyBindings[contextAction] = bindings
+	else:
+		keyBindings.pop(contextAction, None)
+	_unindexKeyBinding(contextAction, [x for x in removed if x not in bindings])
 
 
 def addKeyBinding(filename, keyId, context, mapto, flags):
-	keyBindings.setdefault((context, mapto), []).append((keyId, filename, flags))
+	contextAction = (context, mapto)
+	keyBindings.setdefault(contextAction, []).append((keyId, filename, flags))
+	_indexKeyBinding(contextAction, keyId, filename)
 
 
 def queryKeyBinding(context, mapto):  # Returns a list of (keyId, flags) for a specified "mapto" action in a context.
@@ -22,45 +72,43 @@ def queryKeyBinding(context, mapto):  # Returns a list of (keyId, flags) for a s
 	return []
 
 
+def queryKeyIdBindings(keyId):  # Returns a list of (context, mapto, flags) for all actions bound to a key.
+	result = []
+	for contextAction in keyIdIndex.get(keyId, ()):
+		result.extend([(contextAction[0], contextAction[1], x[2]) for x in keyBindings[contextAction] if x[0] == keyId])
+	return result
+
+
 def getKeyBindingKeys(filterFunction=lambda key: True):
 	return filter(filterFunction, keyBindings)
 
 
 def removeContext(context, actionMapInstance):  # Remove all entries for a context.
-	removeActions = []
-	for contxt, mapto in keyBindings:
-		if contxt == context:
-			contextAction = (context, mapto)
-			removeActions.append(contextAction)
-	for contextAction in removeActions:
+	for mapto in list(contextIndex.get(context, ())):
+		contextAction = (context, mapto)
 		if contextAction in keyBindings:
 			binding = keyBindings[contextAction]
-			actionMapInstance.unbindPythonKey(context, binding[0][0], contextAction[1])
-			del keyBindings[contextAction]
+			actionMapInstance.unbindPythonKey(context, binding[0][0], mapto)
+			_setKeyBindings(contextAction, [])
 
 
 def removeKeyBinding(keyId, context, mapto, wild=True):
 	if wild and mapto == "*":
-		for contxt, mapto in keyBindings.keys():
-			if contxt == context:
-				removeKeyBinding(keyId, context, mapto, False)
+		for mapto in list(contextIndex.get(context, ())):
+			removeKeyBinding(keyId, context, mapto, False)
 		return
 	contextAction = (context, mapto)
 	if contextAction in keyBindings:
-		bind = [x for x in keyBindings[contextAction] if x[0] != keyId]
-		if bind:
-			keyBindings[contextAction] = bind
-		else:
-			del keyBindings[contextAction]
+		_setKeyBindings(contextAction, [x for x in keyBindings[contextAction] if x[0] != keyId])
 
 
 def removeKeyBindings(filename):  # Remove all entries of filename "domain".
-	for keyBinding in keyBindings:
-		keyBindings[keyBinding] = filter(lambda x: x[1] != filename, keyBindings[keyBinding])
+	for contextAction in list(filenameIndex.get(filename, ())):
+		_setKeyBindings(contextAction, [x for x in keyBindings.get(contextAction, []) if x[1] != filename])
 
 
-def parseKeymap(filename, context, actionMapInstance, device, domKeys):
-	unmapDict = {}
+def compileKeymap(filename, context, device, domKeys):  # Returns a list of (keyName, keyId, mapto, unmap, flags) for the valid keys.
+	keys = []
 	error = False
 	keyId = -1
 	for key in domKeys.findall("key"):
@@ -115,15 +163,26 @@ def parseKeymap(filename, context, actionMapInstance, device, domKeys):
 				error = True
 			flags = newFlags
 		if not error:
-			if unmap is None:  # If a key was unmapped, it can only be assigned a new function in the same key map file (avoid file parsing sequence dependency).
-				if unmapDict.get((context, keyName, mapto)) in [filename, None]:
-					if config.crash.debugActionMaps.value:
-						print("[ActionMap] Context '%s' keyName '%s' (%d) mapped to '%s' (Device: %s)." % (context, keyName, keyId, mapto, device.capitalize()))
-					actionMapInstance.bindKey(filename, device, keyId, flags, context, mapto)
-					addKeyBinding(filename, keyId, context, mapto, flags)
-			else:
-				actionMapInstance.unbindPythonKey(context, keyId, unmap)
-				unmapDict.update({(context, keyName, unmap): filename})
+			keys.append((keyName, keyId, mapto, unmap, flags))
+	return keys
+
+
+def applyKeymap(filename, context, actionMapInstance, device, keys):
+	unmapDict = {}
+	for keyName, keyId, mapto, unmap, flags in keys:
+		if unmap is None:  # If a key was unmapped, it can only be assigned a new function in the same key map file (avoid file parsing sequence dependency).
+			if unmapDict.get((context, keyName, mapto)) in [filename, None]:
+				if config.crash.debugActionMaps.value:
+					print("[ActionMap] Context '%s' keyName '%s' (%d) mapped to '%s' (Device: %s)." % (context, keyName, keyId, mapto, device.capitalize()))
+				actionMapInstance.bindKey(filename, device, keyId, flags, context, mapto)
+				addKeyBinding(filename, keyId, context, mapto, flags)
+		else:
+			actionMapInstance.unbindPythonKey(context, keyId, unmap)
+			unmapDict.update({(context, keyName, unmap): filename})
+
+
+def parseKeymap(filename, context, actionMapInstance, device, domKeys):
+	applyKeymap(filename, context, actionMapInstance, device, compileKeymap(filename, context, device, domKeys))
 
 
 def getKeyId(id):  # FIME Remove keytranslation.xml.
@@ -144,12 +203,13 @@ def getKeyId(id):  # FIME Remove keytranslation.xml.
 	return keyid
 
 
-def parseTrans(filename, actionmap, device, keys):  # FIME Remove keytranslation.xml.
+def compileTrans(filename, keys):  # FIME Remove keytranslation.xml.
+	toggles = []
+	translations = []
 	for toggle in keys.findall("toggle"):
 		get_attr = toggle.attrib.get
 		toggle_key = get_attr("from")
-		toggle_key = getKeyId(toggle_key)
-		actionmap.bindToggle(filename, device, toggle_key)
+		toggles.append(getKeyId(toggle_key))
 	for key in keys.findall("key"):
 		get_attr = key.attrib.get
 		keyin = get_attr("from")
@@ -157,35 +217,115 @@ def parseTrans(filename, actionmap, device, keys):  # FIME Remove keytranslation
 		toggle = get_attr("toggle") or "0"
 		assert keyin, "[ActionMap] %s: must specify key to translate from '%s'" % (filename, keyin)
 		assert keyout, "[ActionMap] %s: must specify key to translate to '%s'" % (filename, keyout)
-		keyin = getKeyId(keyin)
-		keyout = getKeyId(keyout)
-		toggle = int(toggle)
+		translations.append((getKeyId(keyin), getKeyId(keyout), int(toggle)))
+	return toggles, translations
+
+
+def applyTrans(filename, actionmap, device, toggles, translations):  # FIME Remove keytranslation.xml.
+	for toggle_key in toggles:
+		actionmap.bindToggle(filename, device, toggle_key)
+	for keyin, keyout, toggle in translations:
 		actionmap.bindTranslation(filename, device, keyin, keyout, toggle)
 
 
-def loadKeymap(filename, replace=False):
-	actionMapInstance = eActionMap.getInstance()
+def parseTrans(filename, actionmap, device, keys):  # FIME Remove keytranslation.xml.
+	toggles, translations = compileTrans(filename, keys)
+	applyTrans(filename, actionmap, device, toggles, translations)
+
+
+def compileKeymapFile(filename):  # Returns the parsed form of a key map file or None if it can't be read.
 	domKeymap = fileReadXML(filename, source=MODULE_NAME)
-	if domKeymap:
-		replace = replace or (domKeymap.get("load", "") == "replace")
-		for domMap in domKeymap.findall("map"):
-			context = domMap.attrib.get("context")
-			if context is None:
-				print("ActionMap] Error: All key map action maps in '%s' must have a context!" % filename)
-			else:
-				if replace and keyBindings:  # Remove all entries for an existing context.
-					removeContext(context, actionMapInstance)
-				parseKeymap(filename, context, actionMapInstance, "generic", domMap)
-				for domDevice in domMap.findall("device"):
-					parseKeymap(filename, context, actionMapInstance, domDevice.attrib.get("name"), domDevice)
-		for domMap in domKeymap.findall("translate"):  # FIME Remove keytranslation.xml.
+	if not domKeymap:
+		return None
+	maps = []
+	for domMap in domKeymap.findall("map"):
+		context = domMap.attrib.get("context")
+		if context is None:
+			print("ActionMap] Error: All key map action maps in '%s' must have a context!" % filename)
+		else:
+			devices = [("generic", compileKeymap(filename, context, "generic", domMap))]
 			for domDevice in domMap.findall("device"):
-				parseTrans(filename, actionMapInstance, domDevice.attrib.get("name"), domDevice)
+				device = domDevice.attrib.get("name")
+				devices.append((device, compileKeymap(filename, context, device, domDevice)))
+			maps.append((context, devices))
+	translations = []
+	for domMap in domKeymap.findall("translate"):  # FIME Remove keytranslation.xml.
+		for domDevice in domMap.findall("device"):
+			translations.append((domDevice.attrib.get("name"),) + compileTrans(filename, domDevice))
+	return {
+		"replace": domKeymap.get("load", "") == "replace",
+		"maps": maps,
+		"translations": translations
+	}
+
+
+def getKeymapCacheSignature():
+	# The compiled key maps hold resolved key ids, so a changed key id table invalidates them.
+	return (KEYMAP_CACHE_VERSION, len(KEYIDS), sum(KEYIDS.values()))
+
+
+def loadKeymapCache():
+	global keymapCache
+	if keymapCache is None:
+		keymapCache = {}
+		try:
+			with open(KEYMAP_CACHE_FILE, "rb") as fd:
+				cache = load(fd)
+			if cache.get("signature") == getKeymapCacheSignature():
+				keymapCache = cache.get("keymaps", {})
+		except OSError:
+			pass
+		except Exception as err:
+			print("[ActionMap] Error: Unable to load key map cache '%s'!  (%s)" % (KEYMAP_CACHE_FILE, err))
+	return keymapCache
+
+
+def saveKeymapCache():
+	try:
+		with open(KEYMAP_CACHE_FILE, "wb") as fd:
+			dump({"signature": getKeymapCacheSignature(), "keymaps": keymapCache}, fd, HIGHEST_PROTOCOL)
+	except OSError as err:
+		print("[ActionMap] Error %d: Unable to save key map cache '%s'!  (%s)" % (err.errno, KEYMAP_CACHE_FILE, err.strerror))
+
+
+def getCompiledKeymap(filename):  # Returns the parsed key map file from the cache if the file is unchanged since it was cached.
+	cache = loadKeymapCache()
+	try:
+		status = stat(filename)
+		fileKey = (status.st_mtime_ns, status.st_size)
+	except OSError:
+		fileKey = None
+	entry = cache.get(filename)
+	if fileKey and entry and entry[0] == fileKey:
+		return entry[1]
+	compiled = compileKeymapFile(filename)
+	if fileKey and compiled is not None:
+		cache[filename] = (fileKey, compiled)
+		saveKeymapCache()
+	elif filename in cache:
+		del cache[filename]
+		saveKeymapCache()
+	return compiled
+
+
+def loadKeymap(filename, replace=False):
+	actionMapInstance = eActionMap.getInstance()
+	compiled = getCompiledKeymap(filename)
+	if compiled:
+		replace = replace or compiled["replace"]
+		for context, devices in compiled["maps"]:
+			if replace and keyBindings:  # Remove all entries for an existing context.
+				removeContext(context, actionMapInstance)
+			for device, keys in devices:
+				applyKeymap(filename, context, actionMapInstance, device, keys)
+		for device, toggles, translations in compiled["translations"]:  # FIME Remove keytranslation.xml.
+			applyTrans(filename, actionMapInstance, device, toggles, translations)
 
 
 def removeKeymap(filename):
 	actionMapInstance = eActionMap.getInstance()
 	actionMapInstance.unbindKeyDomain(filename)
+	removeKeyBindings(filename)
 
 
 class ActionMap:
@@ -273,7 +413,7 @@ class ActionMap:
 	def action(self, context, action):
 		if action in self.actions:
 			print("[ActionMap] Map context '%s' -> Action '%s'." % (context, action))
-			response = self.actions[action]()
+			response = runAction(context, action, self.actions[action])
 			if response is not None:
 				return response
 			return 1
@@ -284,7 +424,7 @@ class ActionMap:
 		if action in self.legacyActions:
 			print("[ActionMap] Map context '%s' -> Legacy action '%s'." % (context, action))
 			print(self.legacyActions[action])
-			response = self.legacyActions[action]()
+			response = runAction(context, action, self.legacyActions[action])
 			if response is not None:
 				return response
 			return 1
@@ -298,7 +438,7 @@ class ActionMap:
 class NumberActionMap(ActionMap):
 	def action(self, contexts, action):
 		if action in ("0", "1", "2", "3", "4", "5", "6", "7", "8", "9") and action in self.actions:
-			response = self.actions[action](int(action))
+			response = runAction(contexts, action, self.actions[action], int(action))
 			if response is not None:
 				return response
 			return 1
@@ -0,0 +1,134 @@
+from time import monotonic
+
+from enigma import eTimer
+
+MODULE_NAME = __name__.split(".")[-1]
+
+FRAME_TOLERANCE = 10  # Timers due within this many milliseconds of a frame are run in that frame.
+FRAME_COST_WEIGHT = 0.05  # Weight of the latest frame in the average frame cost.
+
+
+class AnimationTimer:
+	"""An eTimer look-alike driven by the shared animation scheduler.  It
+	offers the "callback" list, start(), stop() and isActive() of eTimer so
+	existing step loops only need to create it instead of an eTimer."""
+
+	__slots__ = ("scheduler", "callback", "due", "base", "interval")
+
+	def __init__(self, scheduler):
+		self.scheduler = scheduler
+		self.callback = []
+		self.due = None  # Time in milliseconds when the callbacks are due or None if the timer is stopped.
+		self.base = None  # Due time of the last run, steps started from a callback are timed from this.
+		self.interval = None  # Repeat interval or None for a single shot timer.
+
+	def start(self, msec, singleShot=False):
+		self.interval = None if singleShot else msec
+		self.scheduler.add(self, msec)
+
+	def stop(self):
+		self.scheduler.remove(self)
+
+	def isActive(self):
+		return self.due is not None
+
+
+class AnimationScheduler:
+	"""Runs the steps of all active animations (the running text renderers)
+	from a single eTimer.  The eTimer is started for the earliest due step
+	and every step due within FRAME_TOLERANCE of it runs in the same frame,
+	so several scrolling labels cost one main loop wakeup per frame instead
+	of one per label and step.  The time spent in the step callbacks of each
+	frame is measured and available from getFrameCost() to help tune step
+	sizes and step timeouts."""
+
+	def __init__(self):
+		self.timers = set()
+		self.timer = eTimer()
+		self.timer.callback.append(self.runFrame)
+		self.nextFrame = None
+		self.inFrame = False
+		self.frameTime = 0
+		self.frames = 0
+		self.steps = 0
+		self.averageCost = 0.0
+		self.peakCost = 0.0
+
+	def createTimer(self):
+		return AnimationTimer(self)
+
+	def add(self, timer, msec):
+		now = monotonic() * 1000
+		base = now
+		if self.inFrame and timer.base is not None:  # Keep the step rate when a step was run early or late.
+			base = max(timer.base, self.frameTime - FRAME_TOLERANCE)
+		timer.due = base + max(msec, 0)
+		self.timers.add(timer)
+		if not self.inFrame:
+			self.schedule(now)
+
+	def remove(self, timer):
+		timer.due = None
+		timer.base = None
+		if timer in self.timers:
+			self.timers.discard(timer)
+			if not self.inFrame:
+				self.schedule()
+
+	def schedule(self, now=None):
+		if not self.timers:
+			self.timer.stop()
+			self.nextFrame = None
+			return
+		due = min(timer.due for timer in self.timers)
+		if due != self.nextFrame:
+			self.nextFrame = due
+			if now is None:
+				now = monotonic() * 1000
+			self.timer.start(max(int(due - now), 0), True)
+
+	def runFrame(self):
+		self.nextFrame = None
+		self.frameTime = monotonic() * 1000
+		limit = self.frameTime + FRAME_TOLERANCE
+		due = [timer for timer in self.timers if timer.due <= limit]
+		self.inFrame = True
+		try:
+			for timer in due:
+				if timer.due is None or timer.due > limit:  # Stopped or restarted by an earlier callback of this frame.
+					continue
+				self.timers.discard(timer)
+				timer.base = timer.due
+				timer.due = None
+				if timer.interval is not None:
+					self.add(timer, timer.interval)
+				for callback in timer.callback[:]:
+					try:
+						callback()
+					except Exception as err:
+						print("[%s] Error: Animation step failed!  (%s)" % (MODULE_NAME, err))
+		finally:
+			self.inFrame = False
+		cost = monotonic() * 1000 - self.frameTime
+		self.frames += 1
+		self.steps += len(due)
+		self.averageCost += (cost - self.averageCost) * FRAME_COST_WEIGHT
+		if cost > self.peakCost:
+			self.peakCost = cost
+			if cost > FRAME_TOLERANCE:  # Steps that take longer than a frame make the animations stutter.
+				print("[%s] Frame with %d animation steps took %.1f ms, the average is %.1f ms." % (MODULE_NAME, len(due), cost, self.averageCost))
+		self.schedule()
+
+	def getFrameCost(self):
+		"""Returns (averageCost, peakCost, stepsPerFrame), the costs are the
+		milliseconds spent in the steps of a frame."""
+		return self.averageCost, self.peakCost, (self.steps / self.frames) if self.frames else 0.0
+
+	def resetFrameCost(self):
+		self.frames = 0
+		self.steps = 0
+		self.averageCost = 0.0
+		self.peakCost = 0.0
+
+
+animationScheduler = AnimationScheduler()
@@ -4,6 +4,7 @@ from enigma import iServiceInformation, eServiceReference
 from Components.Converter.Converter import Converter
 from Components.Element import cached, ElementError
 from ServiceReference import ServiceReference
+from Tools.MovieInfoParser import getExtendedMovieDescription
 
 
 class MovieInfo(Converter):
@@ -48,6 +49,7 @@ class MovieInfo(Converter):
 			elif self.type == self.MOVIE_META_DESCRIPTION:
 				return ((event and (event.getExtendedDescription() or event.getShortDescription()))
 						or info.getInfoString(service, iServiceInformation.sDescription)
+						or (not isDirectory and getExtendedMovieDescription(service)[1])
 						or service.getPath())
 			elif self.type == self.MOVIE_REC_SERVICE_NAME:
 				rec_ref_str = info.getInfoString(service, iServiceInformation.sServiceref)
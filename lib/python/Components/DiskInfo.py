@@ -1,6 +1,6 @@
 from Components.GUIComponent import GUIComponent
+from Components.MountTable import mountTable
 from Components.VariableText import VariableText
-from os import statvfs
 
 from enigma import eLabel
 
@@ -23,7 +23,7 @@ class DiskInfo(VariableText, GUIComponent):
 
 	def update(self):
 		try:
-			stat = statvfs(self.path)
+			stat = mountTable.statvfs(self.path)
 		except OSError:
 			return -1
 
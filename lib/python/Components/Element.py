@@ -1,4 +1,5 @@
 from Tools.CList import CList
+from Tools.LoopTracer import loopTracer
 from functools import reduce
 
 
@@ -88,7 +89,10 @@ class Element:
 	# default action: push downstream
 	def changed(self, *args, **kwargs):
 		self.cache = {}
-		self.downstream_elements.changed(*args, **kwargs)
+		if loopTracer.enabled:
+			loopTracer.call("changed", self, self.downstream_elements.changed, *args, **kwargs)
+		else:
+			self.downstream_elements.changed(*args, **kwargs)
 		self.cache = None
 
 	def setSuspend(self, suspended):
@@ -1,4 +1,4 @@
-from os import R_OK, access, listdir, lstat, sep
+from os import lstat, scandir, sep
 from os.path import basename, dirname, exists, isdir, islink, join as pathjoin, normpath, realpath, splitext
 from re import compile
 
@@ -157,7 +157,8 @@ class FileListBase(MenuList):
 	def __init__(self, selectedItems, directory, showDirectories=True, showFiles=True, showMountPoints=True, matchingPattern=None, useServiceRef=False, inhibitDirs=False, inhibitMounts=False, isTop=False, additionalExtensions=None, sortDirectories="0.0", sortFiles="0.0", directoriesFirst=True, showCurrentDirectory=False):
 		self.fileList = []
 		MenuList.__init__(self, self.fileList, content=eListboxPythonMultiContent)
-		self.selectedItems = selectedItems
+		self.l.setBuildFunc(self.buildEntry)  # The entries are only built when they are shown.
+		self.selectedItems = dict.fromkeys(selectedItems)  # Indexed by the path, the dictionary is a set that keeps the order of the selection.
 		self.showDirectories = showDirectories
 		self.showFiles = showFiles
 		self.showMountPoints = showMountPoints
@@ -183,12 +184,12 @@ class FileListBase(MenuList):
 		self.changeDir(directory, directory)
 
 	def execBegin(self):
-		harddiskmanager.on_partition_list_change.append(self.partitionListChanged)
+		harddiskmanager.on_partition_list_batch.append(self.partitionListChanged)
 
 	def execEnd(self):
-		harddiskmanager.on_partition_list_change.remove(self.partitionListChanged)
+		harddiskmanager.on_partition_list_batch.remove(self.partitionListChanged)
 
-	def partitionListChanged(self, action, device):
+	def partitionListChanged(self, changes):
 		self.refreshMountPoints()
 		if self.currentDirectory is None:
 			self.refresh()
@@ -231,10 +232,12 @@ class FileListBase(MenuList):
 				if directory != parent and parent.startswith(mountPoint) and not (self.inhibitMounts and self.getMountPoint(directory) in self.inhibitMounts):
 					self.fileList.append(self.fileListComponent(name="<%s>" % _("Parent Directory"), path=pathjoin(parent, ""), isDir=True, isLink=islink(parent), selected=None, dirIcon=ICON_PARENT))
 				# print("[FileList] changeDir DEBUG: mountPoint='%s', mountPointLink='%s', directory='%s', parent='%s'." % (normpath(self.getMountPointLink(directory)), mountPoint, directory, parent))
+			realDirectory = realpath(directory) if directory and (self.inhibitMounts or self.inhibitDirs) else None
 			for name, path, isDir, isLink in directories:
-				if not (self.inhibitMounts and self.getMountPoint(path) in self.inhibitMounts) and not self.inParentDirs(path, self.inhibitDirs):
-					selected = (path in self.selectedItems or normpath(path) in self.selectedItems) if self.multiSelect else None
-					self.fileList.append(self.fileListComponent(name=name, path=path, isDir=isDir, isLink=isLink, selected=selected, dirIcon=None))
+				if realDirectory and self.isInhibited(realpath(path) if isLink else pathjoin(realDirectory, name)):  # Only the links need to be resolved.
+					continue
+				selected = (path in self.selectedItems or normpath(path) in self.selectedItems) if self.multiSelect else None
+				self.fileList.append(self.fileListComponent(name=name, path=path, isDir=isDir, isLink=isLink, selected=selected, dirIcon=None))
 
 		self.fileList = []
 		directories = []
@@ -243,16 +246,17 @@ class FileListBase(MenuList):
 		if directory:
 			directory = normpath(directory)
 		if directory is None and self.showMountPoints:  # Present available mount points.
-			seenMountPoints = []  # TO DO: Fix Hardisk.py to remove duplicated mount points!
+			seenMountPoints = set()  # TO DO: Fix Hardisk.py to remove duplicated mount points!
 			for partition in harddiskmanager.getMountedPartitions():
 				path = normpath(partition.mountpoint)
 				if path in seenMountPoints:  # TO DO: Fix Hardisk.py to remove duplicated mount points!
 					continue
-				seenMountPoints.append(path)
+				seenMountPoints.add(path)
 				if path not in self.inhibitMounts and not self.inParentDirs(path, self.inhibitDirs):
 					selected = False if self.multiSelect else None
 					self.fileList.append(self.fileListComponent(name=partition.description, path=pathjoin(path, ""), isDir=True, isLink=False, selected=selected, dirIcon=None))
 		elif self.useServiceRef and directory:
+			entries = {entry.name: entry for entry in self.scanDirectory(directory)}
 			# Don't use "eServiceReference(string)" constructor as it doesn't allow ":" in the directory name.
 			root = eServiceReference(eServiceReference.idFile, eServiceReference.noFlags, eServiceReferenceFS.directory)
 			root.setPath(pathjoin(directory, ""))
@@ -265,26 +269,28 @@ class FileListBase(MenuList):
 					del serviceList
 					break
 				path = normpath(service.getPath())
+				entry = entries.get(basename(path))
+				isLink = self.isLink(entry) if entry else islink(path)
 				if service.flags & service.mustDescent:
-					directories.append((basename(path), service.getPath(), True, islink(path)))
+					directories.append((basename(path), service.getPath(), True, isLink, entry))
 				else:
-					files.append((service, service.getPath(), False, islink(path)))
+					files.append((service, service.getPath(), False, isLink, entry))
 			directories = self.sortList(directories, self.sortDirectories)
 			files = self.sortList(files, self.sortFiles)
 		else:
 			if directory and isdir(directory):
-				try:
-					items = listdir(directory)
-					for item in items:
-						path = pathjoin(directory, item)
-						if isdir(path):
-							directories.append((item, pathjoin(path, ""), True, islink(path)))
-						else:
-							files.append((item, path, False, islink(path)))
-					directories = self.sortList(directories, self.sortDirectories)
-					files = self.sortList(files, self.sortFiles)
-				except OSError as err:
-					print("FileList] Error %d: Unable to list directory contents of '%s'!  (%s)" % (err.errno, directory, err.strerror))
+				for entry in self.scanDirectory(directory):
+					isLink = self.isLink(entry)
+					try:
+						isDir = entry.is_dir()  # This only needs a stat for links and on file systems that don't report the type.
+					except OSError:
+						isDir = False
+					if isDir:
+						directories.append((entry.name, pathjoin(entry.path, ""), True, isLink, entry))
+					else:
+						files.append((entry.name, entry.path, False, isLink, entry))
+				directories = self.sortList(directories, self.sortDirectories)
+				files = self.sortList(files, self.sortFiles)
 		if self.showDirectories and self.directoriesFirst:
 			buildDirectoryList()
 		if self.showFiles:
@@ -319,16 +325,27 @@ class FileListBase(MenuList):
 			path = self.getPath()
 		self.changeDir(self.currentDirectory, path)
 
+	def scanDirectory(self, directory):
+		"""Returns the list of the os.DirEntry items of the directory, their
+		types come with the directory entries and their status is only read
+		once when it is needed."""
+		try:
+			with scandir(directory) as entries:
+				return list(entries)
+		except OSError as err:
+			print("[FileList] Error %d: Unable to list directory contents of '%s'!  (%s)" % (err.errno, directory, err.strerror))
+			return []
+
+	def isLink(self, entry):
+		try:
+			return entry.is_symlink()
+		except OSError:
+			return False
+
 	def fileListComponent(self, name, path, isDir, isLink, selected, dirIcon):
 		# print("[FileList] fileListComponent DEBUG: Name='%s', Path='%s', isDir=%s, isLink=%s, selected=%s, dirIcon=%s." % (name, path, isDir, isLink, selected, dirIcon))
-		res = [(path, isDir, isLink, selected, name, dirIcon)]
-		if selected is not None and not name.startswith("<"):
-			icon = EXTENSION_ICONS["lock_%s" % ("on" if selected else "off")]
-			if icon:
-				res.append((eListboxPythonMultiContent.TYPE_PIXMAP_ALPHABLEND, self.lockX, self.lockY, self.lockW, self.lockH, icon, None, None, BT_SCALE | BT_VALIGN_CENTER))
-		linkIcon = EXTENSION_ICONS["link-arrow"] if isLink else None
 		if isDir:
-			if isLink and linkIcon is None:
+			if isLink and EXTENSION_ICONS["link-arrow"] is None:
 				icon = EXTENSION_ICONS["link"]
 			else:
 				icon = EXTENSION_ICONS[{
@@ -341,8 +358,18 @@ class FileListBase(MenuList):
 				path = ""
 			extension = splitext(path.getPath())[1].lower() if isinstance(path, eServiceReference) else splitext(path)[1].lower()
 			icon = EXTENSION_ICONS[EXTENSIONS.get(extension, "file")]
+		return ((path, isDir, isLink, selected, name, dirIcon), icon)
+
+	def buildEntry(self, data, icon):  # Called by the list for the shown entries only.
+		path, isDir, isLink, selected, name, dirIcon = data
+		res = [data]
+		if selected is not None and not name.startswith("<"):
+			lockIcon = EXTENSION_ICONS["lock_%s" % ("on" if selected else "off")]
+			if lockIcon:
+				res.append((eListboxPythonMultiContent.TYPE_PIXMAP_ALPHABLEND, self.lockX, self.lockY, self.lockW, self.lockH, lockIcon, None, None, BT_SCALE | BT_VALIGN_CENTER))
 		if icon:
 			res.append((eListboxPythonMultiContent.TYPE_PIXMAP_ALPHABLEND, self.iconX, self.iconY, self.iconW, self.iconH, icon, None, None, BT_SCALE | BT_VALIGN_CENTER))
+			linkIcon = EXTENSION_ICONS["link-arrow"] if isLink else None
 			if linkIcon:
 				res.append((eListboxPythonMultiContent.TYPE_PIXMAP_ALPHABLEND, self.iconX, self.iconY, self.iconW, self.iconH, linkIcon, None, None, BT_SCALE | BT_VALIGN_CENTER))
 		res.append((eListboxPythonMultiContent.TYPE_TEXT, self.nameX, self.nameY, self.nameW, self.nameH, 0, RT_HALIGN_LEFT | RT_VALIGN_CENTER, name))
@@ -356,10 +383,10 @@ class FileListBase(MenuList):
 			selected = entry[0][FILE_SELECTED]
 		if path and not entry[0][FILE_NAME].startswith("<"):
 			path = path if isDir else pathjoin(self.currentDirectory, path)
-			if selected and path not in self.selectedItems:
-				self.selectedItems.append(path)
-			elif not selected and path in self.selectedItems:
-				self.selectedItems.remove(path)
+			if selected:
+				self.selectedItems.setdefault(path)
+			else:
+				self.selectedItems.pop(path, None)
 			entry = self.fileListComponent(name=entry[0][FILE_NAME], path=path, isDir=isDir, isLink=entry[0][FILE_IS_LINK], selected=selected, dirIcon=dirIcon)
 		else:
 			entry = self.fileListComponent(name=entry[0][FILE_NAME], path=path, isDir=isDir, isLink=entry[0][FILE_IS_LINK], selected=None, dirIcon=dirIcon)
@@ -466,6 +493,15 @@ class FileListBase(MenuList):
 	def getMountpoint(self, path):  # Legacy method name for external code.
 		self.getMountPoint(path)
 
+	def isInhibited(self, realPath):
+		"""Returns True if the resolved path is on an inhibited mount point or
+		in an inhibited directory."""
+		if self.inhibitMounts:
+			path = pathjoin(realPath, "")
+			if next((mountPoint for mountPoint in self.mountPoints if path.startswith(mountPoint)), "/") in self.inhibitMounts:
+				return True
+		return any(realPath.startswith(parent) for parent in self.inhibitDirs)
+
 	def inParentDirs(self, path, parents):
 		path = realpath(path)
 		for parent in parents:
@@ -487,22 +523,22 @@ class FileListBase(MenuList):
 		return "%s,%s" % (self.sortDirectories, self.sortFiles)
 
 	def sortList(self, items, sortBy):
+		"""Returns the (name, path, isDir, isLink) items sorted by sortBy, an
+		item may have its os.DirEntry as fifth element.  The status of the
+		items is only read to sort them by date or size."""
 		sort, reverse = (int(x) for x in sortBy.split("."))
-		itemList = []
-		for name, path, isDir, isLink in items:
-			if access(path, R_OK):
-				status = lstat(path)
-				date = status.st_ctime
-				size = status.st_size
-			else:
-				date = 0
-				size = 0
-			itemList.append((name, date, size, path, isDir, isLink))
-		itemList = sorted(itemList, key=lambda x: x[sort], reverse=reverse)
-		items = []
-		for name, date, size, path, isDir, isLink in itemList:
-			items.append((name, path, isDir, isLink))
-		return items
+		if sort:
+			def getStatus(item):
+				try:
+					status = item[4].stat(follow_symlinks=False) if len(item) > 4 and item[4] else lstat(item[1])
+					return status.st_ctime if sort == 1 else status.st_size
+				except OSError:
+					return 0
+
+			items = sorted(items, key=getStatus, reverse=reverse)
+		else:
+			items = sorted(items, key=lambda item: item[0], reverse=reverse)
+		return [item[:4] for item in items]
 
 	def getCurrentDirectory(self):
 		return self.currentDirectory
@@ -538,11 +574,7 @@ class FileListBase(MenuList):
 		self.toggleSelection()
 
 	def getSelectedItems(self):
-		selectedItems = []
-		for item in self.selectedItems:
-			if exists(item):
-				selectedItems.append(item)
-		return selectedItems
+		return [item for item in self.selectedItems if exists(item)]
 
 	def getSelectedList(self):  # This method name is deprecated, please use getSelectedItems() instead.
 		return self.getSelectedItems()
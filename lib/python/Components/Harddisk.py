@@ -1,18 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from json import dump, load
 from os import listdir
-from os.path import exists, ismount, join
+from os.path import exists, join
 import os
 import time
 from Tools.CList import CList
 from Components.SystemInfo import BoxInfo
 from Components.Console import Console
+from Components.MountTable import mountTable
 from Tools.HardwareInfo import HardwareInfo
-from Tools.Directories import fileHas
+from Tools.Directories import SCOPE_CONFIG, fileHas, resolveFilename
 import Components.Task
 import re
 import six
 
 MODEL = BoxInfo.getItem("model")
 
+PROBE_WORKERS = 4  # Block devices probed at the same time.
+PROBE_TIMEOUT = 3  # Seconds the start up waits for the probes, slower devices are added when their probe finished.
+TOPOLOGY_FILE = resolveFilename(SCOPE_CONFIG, "blockdevices.json")
+
 
 def readFile(filename):
 	file = open(filename)
@@ -32,19 +39,7 @@ def getextdevices(ext):
 
 
 def getProcMounts():
-	try:
-		mounts = open("/proc/mounts")
-		result = []
-		tmp = [line.strip().split(' ') for line in mounts]
-		mounts.close()
-		for item in tmp:
-			# Spaces are encoded as \040 in mounts
-			item[1] = item[1].replace('\\040', ' ')
-			result.append(item)
-		return result
-	except OSError as ex:
-		print("[Harddisk] Failed to open /proc/mounts", ex)
-		return []
+	return mountTable.getMounts()
 
 
 def isFileSystemSupported(filesystem):
@@ -62,10 +57,7 @@ def isFileSystemSupported(filesystem):
 
 def findMountPoint(path):
 	"""Example: findMountPoint("/media/hdd/some/file") returns "/media/hdd\""""
-	path = os.path.abspath(path)
-	while not os.path.ismount(path):
-		path = os.path.dirname(path)
-	return path
+	return mountTable.findMountPoint(path)
 
 
 def getFolderSize(path):
@@ -94,7 +86,7 @@ def getFolderSize(path):
 
 def Freespace(dev):
 	try:
-		statdev = os.statvfs(dev)
+		statdev = mountTable.statvfs(dev)
 		space = (statdev.f_bavail * statdev.f_frsize) / 1024
 	except:
 		space = 0
@@ -207,7 +199,7 @@ class Harddisk:
 		except:
 			dev = self.findMount()
 			if dev:
-				stat = os.statvfs(dev)
+				stat = mountTable.statvfs(dev)
 				cap = int(stat.f_blocks * stat.f_bsize)
 				return cap // 1000 // 1000
 			else:
@@ -242,7 +234,7 @@ class Harddisk:
 		dev = self.findMount()
 		if dev:
 			try:
-				stat = os.statvfs(dev)
+				stat = mountTable.statvfs(dev)
 				return int((stat.f_bfree / 1000) * (stat.f_bsize / 1024))
 			except:
 				pass
@@ -583,7 +575,7 @@ class Partition:
 
 	def stat(self):
 		if self.mountpoint:
-			return os.statvfs(self.mountpoint)
+			return mountTable.statvfs(self.mountpoint)
 		else:
 			raise OSError("Device %s is not mounted" % self.device)
 
@@ -609,7 +601,6 @@ class Partition:
 
 	def mounted(self, mounts=None):
 		# THANK YOU PYTHON FOR STRIPPING AWAY f_fsid.
-		# TODO: can os.path.ismount be used?
 		if self.force_mounted:
 			return True
 		if self.mountpoint:
@@ -623,7 +614,7 @@ class Partition:
 	def filesystem(self, mounts=None):
 		if self.mountpoint:
 			if mounts is None:
-				mounts = getProcMounts()
+				return mountTable.getFileSystem(self.mountpoint)
 			for fields in mounts:
 				if self.mountpoint.endswith('/') and not self.mountpoint == '/':
 					if fields[1] + '/' == self.mountpoint:
@@ -784,6 +775,11 @@ class HarddiskManager:
 		self.partitions = []
 		self.devices_scanned_on_init = []
 		self.on_partition_list_change = CList()
+		self.on_partition_list_batch = CList()  # Called once with the list of (action, partition) of a hotplug batch or of a single change.
+		self.partitionChanges = None
+		self.topology = {}  # Indexed by the block device, the value is {"removable", "cdrom", "devices"} of the last probe.
+		self.cachedDevices = {}  # Indexed by the block device, the value is the list of the devices added from the topology of the previous start.
+		self.pendingProbes = 0
 		self.enumerateBlockDevices()
 		self.enumerateNetworkMounts()
 		# Find stuff not detected by the enumeration
@@ -851,13 +847,105 @@ class HarddiskManager:
 		return error, blacklisted, removable, is_cdrom, partitions, medium_found
 
 	def enumerateBlockDevices(self):
+		"""Probes the block devices in a pool of PROBE_WORKERS threads, opening
+		a card reader or an optical drive without a medium may block for
+		seconds.  The devices are added as their probe finishes, the start up
+		waits at most PROBE_TIMEOUT seconds.  The devices of a slower probe
+		that were found at the previous start are added from the cached
+		topology right away and corrected when the probe finished."""
 		print("[Harddisk] enumerating block devices...")
-		for blockdev in os.listdir("/sys/block"):
-			error, blacklisted, removable, is_cdrom, partitions, medium_found = self.addHotplugPartition(blockdev)
-			if not error and not blacklisted and medium_found:
-				for part in partitions:
-					self.addHotplugPartition(part)
-				self.devices_scanned_on_init.append((blockdev, removable, is_cdrom, medium_found))
+		cached = self.loadTopology()
+		self.topology = dict(cached)
+		executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+		futures = {executor.submit(self.probeBlockDevice, blockdev): blockdev for blockdev in os.listdir("/sys/block")}
+		executor.shutdown(wait=False)
+		self.pendingProbes = len(futures)
+		probed = set()
+		try:
+			for future in as_completed(futures, timeout=PROBE_TIMEOUT):
+				probed.add(future)
+				self.blockDeviceProbed(futures[future], future)
+		except FuturesTimeoutError:
+			for future, blockdev in futures.items():
+				if future not in probed:
+					print("[Harddisk] Block device '%s' is not responding, it is added when the probe finished." % blockdev)
+					self.addCachedBlockDevice(blockdev, cached.get(blockdev))
+					future.add_done_callback(lambda future, blockdev=blockdev: self.blockDeviceLate(blockdev, future))
+
+	def probeBlockDevice(self, blockdev):  # Runs in a thread.
+		"""Returns the result of getBlockDevInfo() of the block device, the
+		list of (device, description) of the device and its partitions to be
+		added and whether the device was scanned."""
+		error, blacklisted, removable, is_cdrom, partitions, medium_found = info = self.getBlockDevInfo(blockdev)
+		blacklisted = blacklisted or self.isHidden(blockdev)
+		devices = []
+		if not blacklisted and medium_found:
+			for device in [blockdev] + ([] if error else partitions):
+				devices.append((device, self.getUserfriendlyDeviceName(device, self.getPhysicalDevice(device))))
+		return info, devices, not error and not blacklisted and medium_found
+
+	def blockDeviceLate(self, blockdev, future):  # Runs in the thread of the probe.
+		from twisted.internet import reactor
+		reactor.callFromThread(self.blockDeviceProbed, blockdev, future)
+
+	def blockDeviceProbed(self, blockdev, future):
+		try:
+			info, devices, scanned = future.result()
+		except Exception as err:
+			print("[Harddisk] Error: Unable to probe block device '%s'!  (%s)" % (blockdev, err))
+			info, devices, scanned = (True, False, False, False, [], False), [], False
+		error, blacklisted, removable, is_cdrom, partitions, medium_found = info
+		cached = self.cachedDevices.pop(blockdev, [])
+		names = [device for device, description in devices]
+		self.beginPartitionChanges()
+		for device in cached:
+			if device not in names:
+				self.removeHotplugPartition(device)
+		for device, description in devices:
+			if device not in cached:
+				self.addPartition(device, description, removable)
+			else:
+				for partition in self.partitions:
+					if partition.device == device:
+						partition.description = description
+		self.endPartitionChanges()
+		if scanned:
+			self.devices_scanned_on_init.append((blockdev, removable, is_cdrom, medium_found))
+		if devices:
+			self.topology[blockdev] = {"removable": removable, "cdrom": is_cdrom, "devices": devices}
+		else:
+			self.topology.pop(blockdev, None)
+		self.pendingProbes -= 1
+		if self.pendingProbes == 0:
+			self.saveTopology()
+
+	def addCachedBlockDevice(self, blockdev, entry):
+		if entry:
+			devices = []
+			for device, description in entry["devices"]:
+				if device == blockdev or exists("/sys/block/%s/%s" % (blockdev, device)):
+					self.addPartition(device, description, entry["removable"])
+					devices.append(device)
+			self.cachedDevices[blockdev] = devices
+
+	def loadTopology(self):
+		try:
+			with open(TOPOLOGY_FILE) as fd:
+				return {blockdev: {"removable": bool(entry["removable"]), "cdrom": bool(entry["cdrom"]), "devices": [tuple(device) for device in entry["devices"]]} for blockdev, entry in load(fd).items()}
+		except FileNotFoundError:
+			pass
+		except (OSError, ValueError, KeyError, TypeError, AttributeError) as err:
+			print("[Harddisk] Error: Unable to load the block device topology from '%s'!  (%s)" % (TOPOLOGY_FILE, err))
+		return {}
+
+	def saveTopology(self):
+		if self.topology != self.loadTopology():  # Only write the flash if the devices changed.
+			try:
+				with open("%s.tmp" % TOPOLOGY_FILE, "w") as fd:
+					dump(self.topology, fd)
+				os.rename("%s.tmp" % TOPOLOGY_FILE, TOPOLOGY_FILE)
+			except OSError as err:
+				print("[Harddisk] Error %d: Unable to save the block device topology to '%s'!  (%s)" % (err.errno, TOPOLOGY_FILE, err.strerror))
 
 	def enumerateNetworkMounts(self, refresh=False):
 		print("[Harddisk] Enumerating network mounts...")
@@ -865,7 +953,7 @@ class HarddiskManager:
 			netMounts = (exists(join("/media", mount)) and listdir(join("/media", mount))) or []
 			for netMount in netMounts:
 				path = join("/media", mount, netMount, "")
-				if ismount(path):
+				if mountTable.isMountPoint(path):
 					partition = Partition(mountpoint=path, description=netMount)
 					if str(partition) not in [str(x) for x in self.partitions]:
 						print(f"[Harddisk] New network mount {mount}->{path}.")
@@ -873,7 +961,7 @@ class HarddiskManager:
 							self.addMountedPartition(device=path, desc=netMount)
 						else:
 							self.partitions.append(partition)
-		if ismount("/media/hdd") and "/media/hdd/" not in [x.mountpoint for x in self.partitions]:
+		if mountTable.isMountPoint("/media/hdd") and "/media/hdd/" not in [x.mountpoint for x in self.partitions]:
 			print("[Harddisk] New network mount being used as HDD replacement -> '/media/hdd/'.")
 			if refresh:
 				self.addMountedPartition(device="/media/hdd/", desc="/media/hdd/")
@@ -887,57 +975,55 @@ class HarddiskManager:
 		return r
 
 	def getMountpoint(self, device):
-		dev = "/dev/%s" % device
-		for item in getProcMounts():
-			if item[0] == dev:
-				return item[1] + '/'
-		return None
+		mountpoint = mountTable.getMountPoint("/dev/%s" % device)
+		return None if mountpoint is None else mountpoint + '/'
 
 	def addHotplugPartition(self, device, physdev=None):
 		# device is the device name, without /dev
 		# physdev is the physical device path, which we (might) use to determine the userfriendly name
 		if not physdev:
-			dev, part = self.splitDeviceName(device)
-			try:
-				physdev = os.path.realpath('/sys/block/' + dev + '/device')[4:]
-			except OSError:
-				physdev = dev
-				print("[Harddisk] couldn't determine blockdev physdev for device", device)
+			physdev = self.getPhysicalDevice(device)
 		error, blacklisted, removable, is_cdrom, partitions, medium_found = self.getBlockDevInfo(self.splitDeviceName(device)[0])
-		hw_type = HardwareInfo().get_device_name()
-		if hw_type == 'elite' or hw_type == 'premium' or hw_type == 'premium+' or hw_type == 'ultra':
-			if device[0:3] == "hda":
-				blacklisted = True
+		blacklisted = blacklisted or self.isHidden(device)
 		if not blacklisted and medium_found:
-			description = self.getUserfriendlyDeviceName(device, physdev)
-			p = Partition(mountpoint=self.getMountpoint(device), description=description, force_mounted=True, device=device)
-			self.partitions.append(p)
-			if p.mountpoint:  # Plugins won't expect unmounted devices
-				self.on_partition_list_change("add", p)
-			# see if this is a harddrive
-			l = len(device)
-			if l and (not device[l - 1].isdigit() or (device.startswith('mmcblk') and not re.search(r"mmcblk\dp\d+", device))):
-				self.hdd.append(Harddisk(device, removable))
-				self.hdd.sort()
-				BoxInfo.setItem("Harddisk", True)
+			self.addPartition(device, self.getUserfriendlyDeviceName(device, physdev), removable)
 		return error, blacklisted, removable, is_cdrom, partitions, medium_found
 
+	def addPartition(self, device, description, removable):
+		p = Partition(mountpoint=self.getMountpoint(device), description=description, force_mounted=True, device=device)
+		self.partitions.append(p)
+		if p.mountpoint:  # Plugins won't expect unmounted devices
+			self.partitionListChanged("add", p)
+		# see if this is a harddrive
+		l = len(device)
+		if l and (not device[l - 1].isdigit() or (device.startswith('mmcblk') and not re.search(r"mmcblk\dp\d+", device))):
+			self.hdd.append(Harddisk(device, removable))
+			self.hdd.sort()
+			BoxInfo.setItem("Harddisk", True)
+
+	def getPhysicalDevice(self, device):
+		dev, part = self.splitDeviceName(device)
+		try:
+			return os.path.realpath('/sys/block/' + dev + '/device')[4:]
+		except OSError:
+			print("[Harddisk] couldn't determine blockdev physdev for device", device)
+			return dev
+
+	def isHidden(self, device):
+		hw_type = HardwareInfo().get_device_name()
+		return hw_type in ('elite', 'premium', 'premium+', 'ultra') and device[0:3] == "hda"
+
 	def addHotplugAudiocd(self, device, physdev=None):
 		# device is the device name, without /dev
 		# physdev is the physical device path, which we (might) use to determine the userfriendly name
 		if not physdev:
-			dev, part = self.splitDeviceName(device)
-			try:
-				physdev = os.path.realpath('/sys/block/' + dev + '/device')[4:]
-			except OSError:
-				physdev = dev
-				print("[Harddisk] couldn't determine blockdev physdev for device", device)
+			physdev = self.getPhysicalDevice(device)
 		error, blacklisted, removable, is_cdrom, partitions, medium_found = self.getBlockDevInfo(device)
 		if not blacklisted and medium_found:
 			description = self.getUserfriendlyDeviceName(device, physdev)
 			p = Partition(mountpoint="/media/audiocd", description=description, force_mounted=True, device=device)
 			self.partitions.append(p)
-			self.on_partition_list_change("add", p)
+			self.partitionListChanged("add", p)
 			BoxInfo.setItem("Harddisk", False)
 		return error, blacklisted, removable, is_cdrom, partitions, medium_found
 
@@ -946,7 +1032,7 @@ class HarddiskManager:
 			if x.device == device:
 				self.partitions.remove(x)
 				if x.mountpoint:  # Plugins won't expect unmounted devices
-					self.on_partition_list_change("remove", x)
+					self.partitionListChanged("remove", x)
 		l = len(device)
 		if l and (not device[l - 1].isdigit() or (device.startswith('mmcblk') and not re.search(r"mmcblk\dp\d+", device))):
 			for hdd in self.hdd:
@@ -956,6 +1042,26 @@ class HarddiskManager:
 					break
 			BoxInfo.setItem("Harddisk", len(self.hdd) > 0)
 
+	def partitionListChanged(self, action, partition):
+		self.on_partition_list_change(action, partition)
+		if self.partitionChanges is None:
+			self.on_partition_list_batch([(action, partition)])
+		else:
+			self.partitionChanges.append((action, partition))
+
+	def beginPartitionChanges(self):
+		"""Collects the changes of the partition list until endPartitionChanges()
+		is called, the on_partition_list_batch callbacks are then called once
+		with all of them."""
+		if self.partitionChanges is None:
+			self.partitionChanges = []
+
+	def endPartitionChanges(self):
+		changes = self.partitionChanges
+		self.partitionChanges = None
+		if changes:
+			self.on_partition_list_batch(changes)
+
 	def HDDCount(self):
 		return len(self.hdd)
 
@@ -1027,14 +1133,14 @@ class HarddiskManager:
 				return
 		newpartion = Partition(mountpoint=device, description=desc)
 		self.partitions.append(newpartion)
-		self.on_partition_list_change("add", newpartion)
+		self.partitionListChanged("add", newpartion)
 
 	def removeMountedPartition(self, mountpoint):
 		mountpoint = join(mountpoint, "")
 		for x in self.partitions[:]:
 			if x.mountpoint == mountpoint:
 				self.partitions.remove(x)
-				self.on_partition_list_change("remove", x)
+				self.partitionListChanged("remove", x)
 
 	def setDVDSpeed(self, device, speed=0):
 		ioctl_flag = int(0x5322)
@@ -0,0 +1,160 @@
+from os import statvfs as osStatvfs
+from os.path import abspath, dirname
+from select import POLLERR, POLLPRI, poll
+from threading import Lock
+from time import monotonic
+
+MODULE_NAME = __name__.split(".")[-1]
+
+MOUNTS_FILE = "/proc/self/mounts"
+STATVFS_TTL = 2.0  # Seconds a statvfs() result is reused.
+ESCAPES = (("\\040", " "), ("\\011", "\t"), ("\\012", "\n"), ("\\134", "\\"))
+
+
+def unescape(field):
+	if "\\" in field:
+		for escape, character in ESCAPES:
+			field = field.replace(escape, character)
+	return field
+
+
+class MountTable:
+	"""The table of the mounted file systems.
+
+	The mounts file is only parsed again after the kernel signalled a change
+	of the mounts with POLLPRI / POLLERR, the lookups of the mount point of
+	a path, the file system type and the device use indexes of the table.
+	The statvfs() results are kept for STATVFS_TTL seconds and dropped when
+	the mounts change."""
+
+	def __init__(self, mountsFile=MOUNTS_FILE, ttl=STATVFS_TTL):
+		self.mountsFile = mountsFile
+		self.ttl = ttl
+		self.lock = Lock()
+		self.file = None
+		self.poller = None
+		self.mounts = []  # List of the fields of the mounts file, [device, mount point, file system, options, dump, pass].
+		self.mountPoints = {}  # Indexed by the mount point, the value is the fields of the last mount on it.
+		self.devices = {}  # Indexed by the device, the value is the list of the fields of its mounts.
+		self.statCache = {}  # Indexed by the path, the value is (expiry time, statvfs result).
+		self.generation = 0  # Incremented every time the table was read.
+
+	def open(self):
+		try:
+			self.file = open(self.mountsFile)
+			self.poller = poll()
+			self.poller.register(self.file.fileno(), POLLPRI | POLLERR)
+		except OSError as err:
+			print("[%s] Error %d: Unable to watch '%s'!  (%s)" % (MODULE_NAME, err.errno, self.mountsFile, err.strerror))
+			self.file = None
+			self.poller = None
+
+	def changed(self):
+		if self.file is None:
+			return True  # Without the watch the file is read every time.
+		try:
+			return bool(self.poller.poll(0))
+		except OSError:
+			return True
+
+	def refresh(self):
+		with self.lock:
+			if self.generation and not self.changed():
+				return
+			if self.file is None:
+				self.open()
+			try:
+				if self.file:
+					self.file.seek(0)
+					lines = self.file.readlines()  # Reading the file acknowledges the change.
+				else:
+					with open(self.mountsFile) as fd:
+						lines = fd.readlines()
+			except OSError as err:
+				print("[%s] Error %d: Unable to read '%s'!  (%s)" % (MODULE_NAME, err.errno, self.mountsFile, err.strerror))
+				lines = []
+			mounts = []
+			mountPoints = {}
+			devices = {}
+			for line in lines:
+				fields = [unescape(field) for field in line.strip().split(" ")]
+				if len(fields) < 3:
+					continue
+				mounts.append(fields)
+				mountPoints[fields[1]] = fields
+				devices.setdefault(fields[0], []).append(fields)
+			self.mounts = mounts
+			self.mountPoints = mountPoints
+			self.devices = devices
+			self.statCache = {}
+			self.generation += 1
+
+	def getMounts(self):
+		"""Returns the list of the mounts like getProcMounts()."""
+		self.refresh()
+		return self.mounts[:]
+
+	def isMountPoint(self, path):
+		self.refresh()
+		return self.normalize(path) in self.mountPoints
+
+	def findMountPoint(self, path):
+		"""Returns the mount point of the file system holding path, for
+		example findMountPoint("/media/hdd/movie/file.ts") returns
+		"/media/hdd".  The path is not resolved, like os.path.ismount()."""
+		self.refresh()
+		path = abspath(path)
+		mountPoints = self.mountPoints
+		while path not in mountPoints:
+			parent = dirname(path)
+			if parent == path:
+				break
+			path = parent
+		return path
+
+	def getFileSystem(self, mountPoint, default=""):
+		self.refresh()
+		fields = self.mountPoints.get(self.normalize(mountPoint))
+		return fields[2] if fields else default
+
+	def getDevice(self, mountPoint, default=None):
+		self.refresh()
+		fields = self.mountPoints.get(self.normalize(mountPoint))
+		return fields[0] if fields else default
+
+	def getMountPoint(self, device, default=None):
+		"""Returns the first mount point of the device, for example
+		getMountPoint("/dev/sda1") returns "/media/hdd"."""
+		self.refresh()
+		mounts = self.devices.get(device)
+		return mounts[0][1] if mounts else default
+
+	def getMountPoints(self, device):
+		self.refresh()
+		return [fields[1] for fields in self.devices.get(device, [])]
+
+	def statvfs(self, path):
+		"""Returns os.statvfs(path), reused for STATVFS_TTL seconds.  Raises
+		OSError like os.statvfs()."""
+		self.refresh()
+		now = monotonic()
+		cached = self.statCache.get(path)
+		if cached and cached[0] > now:
+			return cached[1]
+		result = osStatvfs(path)
+		self.statCache[path] = (now + self.ttl, result)
+		return result
+
+	def invalidate(self, path=None):
+		"""Drops the cached statvfs() result of path or of all paths, for
+		example after a large file was written or removed."""
+		if path is None:
+			self.statCache = {}
+		else:
+			self.statCache.pop(path, None)
+
+	def normalize(self, path):
+		return path.rstrip("/") or "/"
+
+
+mountTable = MountTable()
@@ -5,6 +5,7 @@ import random
 from enigma import eListboxPythonMultiContent, eListbox, gFont, iServiceInformation, eSize, RT_HALIGN_LEFT, RT_HALIGN_RIGHT, RT_VALIGN_CENTER, eServiceReference, eServiceReferenceFS, eServiceCenter, eTimer, loadPNG, BT_SCALE, BT_KEEP_ASPECT_RATIO
 
 from Components.GUIComponent import GUIComponent
+from Components.MovieMetaCache import movieMetaCache
 from Tools.FuzzyDate import FuzzyTime
 from Components.MultiContent import MultiContentEntryText, MultiContentEntryPixmapAlphaTest, MultiContentEntryPixmapAlphaBlend, MultiContentEntryProgress
 from Components.config import config
@@ -70,30 +71,25 @@ class StubInfo:
 justStubInfo = StubInfo()
 
 
-def lastPlayPosFromCache(ref):
+def lastPlayPosFromCache(ref, resumePoints=None):
+	if resumePoints is None:
+		from Screens.InfoBarGenerics import resumePointCache as resumePoints
+	return resumePoints.get(ref.toString(), None)
+
+
+def lastPlayPosForDirectory(directory):
+	"""Returns the resume points of all files in a directory in one lookup"""
 	from Screens.InfoBarGenerics import resumePointCache
-	return resumePointCache.get(ref.toString(), None)
+	return resumePointCache.getForDirectory(directory)
 
 
-def moviePlayState(cutsFileName, ref, length):
-	"""Returns None, 0..100 for percentage"""
+def moviePlayState(cutsFileName, ref, length, resumePoints=None):
+	"""Returns None, 0..100 for percentage, resumePoints can be the result of lastPlayPosForDirectory()"""
 	try:
-		# read the cuts file first
-		f = open(cutsFileName, 'rb')
-		lastCut = None
-		cutPTS = None
-		while True:
-			data = f.read(cutsParser.size)
-			if len(data) < cutsParser.size:
-				break
-			cut, cutType = cutsParser.unpack(data)
-			if cutType == 3:  # undocumented, but 3 appears to be the stop
-				cutPTS = cut
-			else:
-				lastCut = cut
-		f.close()
+		# read the cuts file first, unchanged files come from the metadata cache
+		lastCut, cutPTS = movieMetaCache.getCuts(cutsFileName)
 		# See what we have in RAM (it might help)
-		last = lastPlayPosFromCache(ref)
+		last = lastPlayPosFromCache(ref, resumePoints)
 		if last:
 			# Get the length from the cache
 			if not lastCut:
@@ -114,7 +110,7 @@ def moviePlayState(cutsFileName, ref, length):
 			return 100
 		return (100 * cutPTS) // lastCut
 	except:
-		cutPTS = lastPlayPosFromCache(ref)
+		cutPTS = lastPlayPosFromCache(ref, resumePoints)
 		if cutPTS:
 			if not length or (length < 0):
 				length = cutPTS[2]
@@ -169,6 +165,7 @@ class MovieList(GUIComponent):
 	def __init__(self, root, sort_type=None, descr_state=None):
 		GUIComponent.__init__(self)
 		self.list = []
+		self.resumePoints = None
 		self.descr_state = descr_state or self.HIDE_DESCRIPTION
 		self.sort_type = sort_type or self.SORT_GROUPWISE
 		self.firstFileEntry = 0
@@ -407,7 +404,7 @@ class MovieList(GUIComponent):
 			elif (self.playInBackground or self.playInForeground) and serviceref == (self.playInBackground or self.playInForeground):
 				data.icon = self.iconMoviePlay
 			else:
-				data.part = moviePlayState(pathName + '.cuts', serviceref, data.len)
+				data.part = moviePlayState(pathName + '.cuts', serviceref, data.len, self.resumePoints)
 				if switch == 'i':
 					if data.part is not None and data.part > 0:
 						data.icon = self.iconPart[data.part // 25]
@@ -599,6 +596,17 @@ class MovieList(GUIComponent):
 	def __iter__(self):
 		return self.list.__iter__()
 
+	@staticmethod
+	def getMovieTags(serviceref, info):
+		# convert space-seperated list of tags into a list
+		tags = info.getInfoString(serviceref, iServiceInformation.sTags).split(' ')
+		name = info.getName(serviceref)
+		realTags = tags != ['']
+		if not realTags:
+			# No tags? Auto tag!
+			tags = name.replace(',', ' ').replace('.', ' ').replace('_', ' ').replace(':', ' ').split()
+		return name, tags, realTags, info.getInfo(serviceref, iServiceInformation.sTimeCreate)
+
 	def load(self, root, filter_tags):
 		# this lists our root service, then building a
 		# nice list
@@ -613,6 +621,8 @@ class MovieList(GUIComponent):
 		realtags = set()
 		tags = {}
 		rootPath = os.path.normpath(root.getPath())
+		self.resumePoints = lastPlayPosForDirectory(rootPath)
+		directory = movieMetaCache.getDirectory(rootPath) if os.path.isdir(rootPath) else None
 		parent = None
 		# Don't navigate above the "root"
 		if len(rootPath) > 1 and (os.path.realpath(rootPath) != config.movielist.root.value):
@@ -634,25 +644,25 @@ class MovieList(GUIComponent):
 			info = serviceHandler.info(serviceref)
 			if info is None:
 				info = justStubInfo
-			begin = info.getInfo(serviceref, iServiceInformation.sTimeCreate)
 			if serviceref.flags & eServiceReference.mustDescent:
+				begin = info.getInfo(serviceref, iServiceInformation.sTimeCreate)
 				dirname = info.getName(serviceref)
 				if not dirname.endswith('.AppleDouble/') and not dirname.endswith('.AppleDesktop/') and not dirname.endswith('.AppleDB/') and not dirname.endswith('Network Trash Folder/') and not dirname.endswith('Temporary Items/'):
 					self.list.append((serviceref, info, begin, -1))
 					numberOfDirs += 1
 				continue
-			# convert space-seperated list of tags into a set
-			this_tags = info.getInfoString(serviceref, iServiceInformation.sTags).split(' ')
-			name = info.getName(serviceref)
+			# name, tags and begin of unchanged movies come from the metadata cache
+			if directory is not None and os.path.dirname(serviceref.getPath()) == directory.path:
+				meta = movieMetaCache.getMovieMeta(directory, serviceref, info, self.getMovieTags)
+				name, this_tags, realTags, begin = meta.name, meta.tags, meta.realTags, meta.begin
+			else:
+				name, this_tags, realTags, begin = self.getMovieTags(serviceref, info)
 
 			# OSX put a lot of stupid files ._* everywhere... we need to skip them
 			if name[:2] == "._":
 				continue
 
-			if this_tags == ['']:
-				# No tags? Auto tag!
-				this_tags = name.replace(',', ' ').replace('.', ' ').replace('_', ' ').replace(':', ' ').split()
-			else:
+			if realTags:
 				realtags.update(this_tags)
 			for tag in this_tags:
 				if len(tag) >= 4:
@@ -673,6 +683,8 @@ class MovieList(GUIComponent):
 
 			self.list.append((serviceref, info, begin, -1))
 
+		if directory is not None:
+			movieMetaCache.fillInBackground(directory)
 		self.firstFileEntry = numberOfDirs
 		self.parentDirectory = 0
 		self.list.sort(key=self.buildGroupwiseSortkey)
@@ -0,0 +1,170 @@
+from os import scandir, stat
+from os.path import basename, dirname, join, normpath, realpath
+from struct import Struct
+
+from twisted.internet import threads
+
+MODULE_NAME = __name__.split(".")[-1]
+
+BACKGROUND_THRESHOLD = 200  # Directories with more movies than this have their cuts read in the background.
+DESCRIPTION_EXTENSIONS = (".txt", ".info")
+MAXIMUM_DIRECTORIES = 20  # Directories kept in the cache, the least recently listed one is dropped first.
+
+cutsParser = Struct(">QI")  # Big-endian, 64-bit PTS and 32-bit type.
+
+
+def parseCuts(data):  # Returns (lastCut, cutPTS) from the contents of a ".cuts" file.
+	lastCut = None
+	cutPTS = None
+	for cut, cutType in cutsParser.iter_unpack(data[:len(data) - len(data) % cutsParser.size]):
+		if cutType == 3:  # Undocumented, but 3 appears to be the stop.
+			cutPTS = cut
+		else:
+			lastCut = cut
+	return lastCut, cutPTS
+
+
+class MovieMeta:
+	__slots__ = ("key", "name", "tags", "realTags", "begin")
+
+	def __init__(self, key, name, tags, realTags, begin):
+		self.key = key  # (mtime, size) of the movie file and mtime of its ".meta" file.
+		self.name = name
+		self.tags = tags
+		self.realTags = realTags
+		self.begin = begin
+
+
+class DirectoryMeta:
+	__slots__ = ("path", "mtime", "names", "stats", "movies", "cuts")
+
+	def __init__(self, path):
+		self.path = path
+		self.mtime = None
+		self.names = frozenset()
+		self.stats = {}  # Indexed by file name, the value is (mtime, size) or None for files not yet stat'ed.
+		self.movies = {}  # Indexed by movie file name, the value is a MovieMeta.
+		self.cuts = {}  # Indexed by cuts file name, the value is ((mtime, size), (lastCut, cutPTS)).
+
+	def getStat(self, name):
+		if name not in self.names:
+			return None
+		result = self.stats.get(name)
+		if result is None:
+			try:
+				status = stat(join(self.path, name))
+				result = (status.st_mtime_ns, status.st_size)
+			except OSError:
+				result = (0, 0)
+			self.stats[name] = result
+		return result
+
+	def getDescriptionFile(self, name):  # Returns the ".txt" or ".info" file describing a movie or None.
+		for ext in DESCRIPTION_EXTENSIONS:
+			if name + ext in self.names:
+				return join(self.path, name + ext)
+		pos = name.rfind(".")
+		if pos > 0 and len(name) - pos <= 5:
+			for ext in DESCRIPTION_EXTENSIONS:
+				if name[:pos] + ext in self.names:
+					return join(self.path, name[:pos] + ext)
+		return None
+
+
+class MovieMetaCache:
+	"""Per directory cache of the movie details MovieList needs for listing,
+	sorting, tag collection and row rendering.  A directory is listed again
+	when its mtime changes and a movie's details are taken again from the
+	service information when the mtime or size of the movie or the mtime of
+	its ".meta" file changes.  Only the MAXIMUM_DIRECTORIES most recently
+	listed directories are kept."""
+
+	def __init__(self):
+		self.directories = {}  # Indexed by the path, ordered from the least to the most recently listed directory.
+		self.filling = set()
+
+	def getDirectory(self, path):
+		path = normpath(path)
+		directory = self.directories.pop(path, None)
+		if directory is None:
+			directory = DirectoryMeta(path)
+		self.directories[path] = directory
+		if len(self.directories) > MAXIMUM_DIRECTORIES:
+			del self.directories[next(iter(self.directories))]
+		try:
+			mtime = stat(path).st_mtime_ns
+		except OSError:
+			mtime = None
+		if mtime is None or mtime != directory.mtime:
+			try:
+				with scandir(path) as entries:
+					names = frozenset(entry.name for entry in entries)
+			except OSError as err:
+				print("[%s] Error %d: Unable to list directory '%s'!  (%s)" % (MODULE_NAME, err.errno, path, err.strerror))
+				names = frozenset()
+			directory.mtime = mtime
+			directory.names = names
+			for cache in (directory.movies, directory.cuts):
+				for name in [name for name in list(cache) if name not in names]:  # The background reader may add entries.
+					del cache[name]
+		directory.stats = {}  # File details are validated once per listing.
+		return directory
+
+	def getMovieMeta(self, directory, serviceref, info, getTags):
+		"""Returns the MovieMeta for a movie, "getTags" is only called if the
+		movie is not cached and must return (name, tags, realTags, begin)."""
+		name = basename(serviceref.getPath())
+		key = (directory.getStat(name), directory.getStat(name + ".meta"))
+		meta = directory.movies.get(name)
+		if meta is None or meta.key != key:
+			meta = MovieMeta(key, *getTags(serviceref, info))
+			directory.movies[name] = meta
+		return meta
+
+	def getCuts(self, cutsFileName):  # Returns (lastCut, cutPTS) or raises OSError if there is no cuts file.
+		path = normpath(cutsFileName)
+		directory = self.directories.get(dirname(path))
+		name = basename(path)
+		status = stat(path)
+		key = (status.st_mtime_ns, status.st_size)
+		if directory is not None:
+			cached = directory.cuts.get(name)
+			if cached is not None and cached[0] == key:
+				return cached[1]
+		with open(path, "rb") as fd:
+			result = parseCuts(fd.read())
+		if directory is not None:
+			directory.cuts[name] = (key, result)
+		return result
+
+	def getDescriptionFile(self, path):
+		path = realpath(path)
+		return self.getDirectory(dirname(path)).getDescriptionFile(basename(path))
+
+	def invalidate(self, path=None):
+		if path is None:
+			self.directories.clear()
+		else:
+			self.directories.pop(normpath(path), None)
+
+	def fillInBackground(self, directory):
+		if len(directory.movies) <= BACKGROUND_THRESHOLD or directory.path in self.filling:
+			return
+		movies = [name for name in directory.movies if name + ".cuts" in directory.names and name + ".cuts" not in directory.cuts]
+		self.filling.add(directory.path)
+		deferred = threads.deferToThread(self.readCuts, directory, movies)
+		deferred.addBoth(self.fillFinished, directory.path)
+
+	def readCuts(self, directory, movies):  # This runs in a worker thread.
+		for name in movies:
+			try:
+				self.getCuts(join(directory.path, name + ".cuts"))
+			except OSError:
+				pass
+
+	def fillFinished(self, result, path):
+		self.filling.discard(path)
+		return None
+
+
+movieMetaCache = MovieMetaCache()
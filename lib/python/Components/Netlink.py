@@ -2,28 +2,136 @@
 # similar things, like network connections being (un)plugged.
 import os
 import socket
+from time import monotonic
+
+from Tools.CList import CList
+
+MESSAGE_SIZE = 16384  # Larger than any uevent, the kernel limits them to 2048 bytes and udev adds a header.
+RECEIVE_BUFFER_SIZE = 1024 * 1024  # Events queued by the kernel until they are read, a burst must not overflow it.
+COALESCE_DELAY = 500  # Milliseconds without a further event until a batch of events is handed out.
+COALESCE_MAXIMUM = 3000  # Milliseconds a batch of events is held at most during a continuous stream of events.
+
+
+def parseEvent(data):
+	"""Returns the dictionary of a uevent, the "ACTION@DEVPATH" header is
+	stored with the key None."""
+	if isinstance(data, bytes):
+		data = data.decode("utf-8", "ignore")
+	event = {}
+	for item in data.split('\x00'):
+		if item:
+			try:
+				k, v = item.split('=', 1)
+				event[k] = v
+			except ValueError:
+				event[None] = item
+	return event
+
+
+def getPhysicalDevice(event):
+	"""Returns the name of the physical device of an event, the disk of a
+	partition or the PHYSDEVPATH set by the hotplug helper."""
+	physdev = event.get("PHYSDEVPATH")
+	if physdev:
+		return physdev
+	parts = event.get("DEVPATH", "").split("/")
+	if "block" in parts[:-1]:
+		return parts[parts.index("block") + 1]
+	return "/".join(parts)
+
+
+def getEventAction(event):
+	action = event.get("ACTION")
+	media = event.get("X_E2_MEDIA_STATUS")
+	return action if media is None or action in ("add", "remove") else "media%s" % media
+
+
+def coalesceEvents(events):
+	"""Reduces the events of one device to the first and the last event if
+	their actions differ, otherwise to the last event.  For example an
+	"add", "remove", "add" of a device is one "add" and a "remove", "add"
+	stays a "remove" and an "add" as the device has to be probed again."""
+	if len(events) > 1 and getEventAction(events[0]) != getEventAction(events[-1]):
+		return [events[0], events[-1]]
+	return events[-1:]
 
 
 class NetlinkSocket(socket.socket):
 	def __init__(self):
 		NETLINK_KOBJECT_UEVENT = 15 # hasn't landed in socket yet, see linux/netlink.h
 		socket.socket.__init__(self, socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+		for option in (getattr(socket, "SO_RCVBUFFORCE", 33), socket.SO_RCVBUF):  # SO_RCVBUFFORCE ignores the rmem_max limit but needs CAP_NET_ADMIN.
+			try:
+				self.setsockopt(socket.SOL_SOCKET, option, RECEIVE_BUFFER_SIZE)
+				break
+			except OSError:
+				pass
 		self.bind((os.getpid(), -1))
 
 	def parse(self):
-		data = self.recv(512).decode("utf-8", "ignore")
-		event = {}
-		for item in data.split('\x00'):
-			if not item:
-				# terminator
-				yield event
-				event = {}
-			else:
-				try:
-					k, v = item.split('=', 1)
-					event[k] = v
-				except:
-					event[None] = item
+		"""Yields the events of all the queued messages, each message is one
+		event.  The socket is not blocked if there is no further message."""
+		flags = 0
+		while True:
+			try:
+				data = self.recv(MESSAGE_SIZE, flags)
+			except (BlockingIOError, InterruptedError):
+				break
+			except OSError as err:
+				print("[Netlink] Error %d: Unable to receive the event!  (%s)" % (err.errno, err.strerror))  # ENOBUFS if events were lost.
+				break
+			if not data:
+				break
+			yield parseEvent(data)
+			flags = socket.MSG_DONTWAIT
+
+
+class HotplugEventPump:
+	"""Collects hotplug events and hands them to the subscribers in batches.
+
+	A batch is handed out COALESCE_DELAY ms after the last event and at most
+	COALESCE_MAXIMUM ms after the first event of the batch.  The events are
+	grouped by the physical device and the events of each device are
+	coalesced, the subscribers are called once per batch with the list of
+	the remaining events, for example all the partitions of all the disks of
+	a hub that was plugged in."""
+
+	def __init__(self, delay=COALESCE_DELAY, maximum=COALESCE_MAXIMUM):
+		self.delay = delay
+		self.maximum = maximum
+		self.subscribers = CList()
+		self.pending = {}  # Indexed by the physical device, the value is a dictionary of the events of each device, dictionaries keep the order of insertion.
+		self.first = None
+		self.timer = None
+
+	def push(self, event):
+		if not event:
+			return
+		device = event.get("DEVPATH", "").split("/")[-1]
+		self.pending.setdefault(getPhysicalDevice(event), {}).setdefault(device, []).append(event)
+		now = monotonic()
+		if self.first is None:
+			self.first = now
+		if self.timer is None:
+			from enigma import eTimer
+			self.timer = eTimer()
+			self.timer.callback.append(self.flush)
+		remaining = self.maximum - int((now - self.first) * 1000)
+		self.timer.start(max(min(self.delay, remaining), 0), True)
+
+	def flush(self):
+		if self.timer:
+			self.timer.stop()
+		pending = self.pending
+		self.pending = {}
+		self.first = None
+		events = []
+		for devices in pending.values():
+			for deviceEvents in devices.values():
+				events.extend(coalesceEvents(deviceEvents))
+		if events:
+			print("[Netlink] Hotplug batch of %d events for %d devices." % (len(events), len(pending)))
+			self.subscribers(events)
 
 
 # Quick unit test (you can run this on any Linux machine)
@@ -45,13 +45,52 @@ def getConfigSatlist(orbpos, satlist):
 	return ConfigSatlist(satlist, default_orbpos)
 
 
+class SecSetup:
+	"""The setup of the satellite equipment control computed by SecConfigure
+	from the configuration of the tuners.  It takes the place of
+	eDVBSatelliteEquipmentControl while the setup is computed and records
+	the calls, the links of the tuners in links and the parameters of each
+	LNB and its satellites in lnbs, so two setups are compared without the
+	frontends."""
+
+	def __init__(self):
+		self.slotInformations = []  # The list of eDVBResourceManager.setFrontendSlotInformations().
+		self.links = []  # List of (method, arguments) of the links of the tuners.
+		self.lnbs = []  # List of the LNBs, each is the list of (method, arguments) of the LNB and its satellites.
+		self.satellites = set()  # The orbital positions of all the LNBs.
+
+	def __getattr__(self, name):  # The setters of the current LNB and its current satellite.
+		if not name.startswith("set"):
+			raise AttributeError(name)
+		return lambda *args: self.lnbs[-1].append((name, args))
+
+	def addLNB(self):
+		self.lnbs.append([])
+		return 0
+
+	def addSatellite(self, orbpos):
+		self.lnbs[-1].append(("addSatellite", (orbpos,)))
+		self.satellites.add(orbpos)
+
+	def setInternalLink(self, slotid):
+		self.links.append(("setInternalLink", (slotid,)))
+
+	def setTunerLinked(self, nim1, nim2):
+		self.links.append(("setTunerLinked", (nim1, nim2)))
+
+	def setTunerDepends(self, nim1, nim2):
+		self.links.append(("setTunerDepends", (nim1, nim2)))
+
+	def setSlotNotLinked(self, slotid):
+		self.links.append(("setSlotNotLinked", (slotid,)))
+
+
 class SecConfigure:
 	def getConfiguredSats(self):
 		return self.configuredSatellites
 
 	def addSatellite(self, sec, orbpos):
 		sec.addSatellite(orbpos)
-		self.configuredSatellites.add(orbpos)
 
 	def addLNBSimple(self, sec, slotid, diseqcmode, toneburstmode=diseqcParam.NO, diseqcpos=diseqcParam.SENDNO, orbpos=0, longitude=0, latitude=0, loDirection=0, laDirection=0, turningSpeed=rotorParam.FAST, useInputPower=True, inputPowerDelta=50, fastDiSEqC=False, setVoltageTone=True, diseqc13V=False, CircularLNB=False):
 		if orbpos is None or orbpos == 3600 or orbpos == 3601:
@@ -142,7 +181,7 @@ class SecConfigure:
 		print("[NimManager] link tuner %s to tuner %s" % (nim1, nim2))
 		# for internally connect tuner A to B
 		if BoxInfo.getItem("machinebuild") == 'vusolo2' or nim2 == (nim1 - 1):
-			self.linkInternally(nim1)
+			sec.setInternalLink(nim1)
 		sec.setTunerLinked(nim1, nim2)
 
 	def getRoot(self, slotid, connto):
@@ -155,14 +194,30 @@ class SecConfigure:
 		return connto
 
 	def update(self):
-		sec = secClass.getInstance()
-		self.configuredSatellites = set()
-		for slotid in self.NimManager.getNimListOfType("DVB-S"):
-			if self.NimManager.nimInternallyConnectableTo(slotid) is not None:
-				self.NimManager.nimRemoveInternalLink(slotid)
-		sec.clear()  # this do unlinking NIMs too !!
-		print("[NimManager] sec config cleared")
+		self.apply(self.calcSetup())
+		for slot in self.NimManager.nim_slots:  # The frontend types are set on every update, the scan and the Satfinder change them as well.
+			if slot.frontend_id is not None:
+				if slot.isMultiType():
+					eDVBResourceManager.getInstance().setFrontendType(slot.frontend_id, "dummy", False)  # to force a clear of m_delsys_whitelist
+					types = slot.getMultiTypeList()
+					for FeType in types.values():
+						if FeType in ("DVB-S", "DVB-S2", "DVB-S2X") and config.Nims[slot.slot].dvbs.configMode.value == "nothing":
+							continue
+						elif FeType in ("DVB-T", "DVB-T2") and config.Nims[slot.slot].dvbt.configMode.value == "nothing":
+							continue
+						elif FeType in ("DVB-C", "DVB-C2") and config.Nims[slot.slot].dvbc.configMode.value == "nothing":
+							continue
+						elif FeType in ("ATSC") and config.Nims[slot.slot].atsc.configMode.value == "nothing":
+							continue
+						eDVBResourceManager.getInstance().setFrontendType(slot.frontend_id, FeType, True)
+				else:
+					eDVBResourceManager.getInstance().setFrontendType(slot.frontend_id, slot.getType())
+		print("[NimManager] sec config completed")
 
+	def calcSetup(self):
+		"""Returns the SecSetup of the configuration of the tuners, the
+		satellite equipment control is not changed."""
+		sec = SecSetup()
 		self.linked = {}
 		self.satposdepends = {}
 		self.equal = {}
@@ -202,7 +257,7 @@ class SecConfigure:
 					(slot.canBeCompatible("DVB-S2") and (slot.config.dvbs.configMode.value != "nothing" and True or False)),
 					slot.canBeCompatible("DVB-S2X") and (slot.config.dvbs.configMode.value != "nothing" and True or False),
 					slot.frontend_id is None and -1 or slot.frontend_id))
-		eDVBResourceManager.getInstance().setFrontendSlotInformations(used_nim_slots)
+		sec.slotInformations = used_nim_slots
 
 		for slot in nim_slots:
 			x = slot.slot
@@ -310,24 +365,44 @@ class SecConfigure:
 				nim = slot.config.dvbc
 				print("[NimManager] slot: %s configmode: %s" % (str(x), str(nim.configMode.value)))
 
-		for slot in nim_slots:
-			if slot.frontend_id is not None:
-				if slot.isMultiType():
-					eDVBResourceManager.getInstance().setFrontendType(slot.frontend_id, "dummy", False)  # to force a clear of m_delsys_whitelist
-					types = slot.getMultiTypeList()
-					for FeType in types.values():
-						if FeType in ("DVB-S", "DVB-S2", "DVB-S2X") and config.Nims[slot.slot].dvbs.configMode.value == "nothing":
-							continue
-						elif FeType in ("DVB-T", "DVB-T2") and config.Nims[slot.slot].dvbt.configMode.value == "nothing":
-							continue
-						elif FeType in ("DVB-C", "DVB-C2") and config.Nims[slot.slot].dvbc.configMode.value == "nothing":
-							continue
-						elif FeType in ("ATSC") and config.Nims[slot.slot].atsc.configMode.value == "nothing":
-							continue
-						eDVBResourceManager.getInstance().setFrontendType(slot.frontend_id, FeType, True)
+		return sec
+
+	def apply(self, setup):
+		"""Pushes the parts of the setup that differ from the applied setup
+		to the satellite equipment control.  Its LNB table can only be cleared
+		or extended, after a change of the links or of an applied LNB the
+		table is cleared and filled again, LNBs added behind the applied LNBs
+		are just added and an unchanged setup is not pushed at all."""
+		applied = self.setup
+		sec = secClass.getInstance()
+		cleared = applied is None or setup.links != applied.links or setup.lnbs[:len(applied.lnbs)] != applied.lnbs
+		if cleared:
+			for slotid in self.NimManager.getNimListOfType("DVB-S"):
+				if self.NimManager.nimInternallyConnectableTo(slotid) is not None:
+					self.NimManager.nimRemoveInternalLink(slotid)
+			sec.clear()  # this do unlinking NIMs too !!
+			print("[NimManager] sec config cleared")
+			start = 0
+		else:
+			start = len(applied.lnbs)
+		if applied is None or setup.slotInformations != applied.slotInformations:
+			eDVBResourceManager.getInstance().setFrontendSlotInformations(setup.slotInformations)
+		if cleared:
+			for method, args in setup.links:
+				if method == "setInternalLink":
+					self.linkInternally(*args)
 				else:
-					eDVBResourceManager.getInstance().setFrontendType(slot.frontend_id, slot.getType())
-		print("[NimManager] sec config completed")
+					getattr(sec, method)(*args)
+		for index in range(start, len(setup.lnbs)):
+			if sec.addLNB():
+				print("[NimManager] No space left on m_lnbs (max No. 144 LNBs exceeded)")
+				del setup.lnbs[index:]  # Not applied, they are added again by the next update.
+				break
+			for method, args in setup.lnbs[index]:
+				getattr(sec, method)(*args)
+		print("[NimManager] sec config %s, %d of %d LNBs added" % ("applied" if cleared or start < len(setup.lnbs) else "unchanged", len(setup.lnbs) - start, len(setup.lnbs)))
+		self.setup = setup
+		self.configuredSatellites = setup.satellites
 
 	def updateAdvanced(self, sec, slotid):
 		advanced = config.Nims[slotid].dvbs.advanced
@@ -709,6 +784,7 @@ class SecConfigure:
 
 	def __init__(self, nimmgr):
 		self.NimManager = nimmgr
+		self.setup = None  # The SecSetup that was applied last.
 		self.configuredSatellites = set()
 		self.update()
 
@@ -961,6 +1037,8 @@ class NimManager:
 		sec = secClass.getInstance()
 		global maxFixedLnbPositions
 		maxFixedLnbPositions = sec.getMaxFixedLnbPositions()
+		self.satRoutes = {}  # Indexed by the slot, the value is (list of the satellites of getSatListForNim(), frozenset of their orbital positions).
+		self.nimRoutes = None  # Indexed by the orbital position, the value is the tuple of the slots of getNimListForSat().
 		self.satList = []
 		self.cablesList = []
 		self.terrestrialsList = []
@@ -1093,104 +1171,40 @@ class NimManager:
 				from Screens.MessageBox import MessageBox
 
 				def emergencyAid():
-					if not exists("/etc/enigma2/lamedb"):
-						print("[NimManager] /etc/enigma2/lamedb not found")
-						return None
-					f = open("/etc/enigma2/lamedb")
-					lamedb = f.readlines()
-					f.close()
-
-					if lamedb[0].find("/3/") != -1:
-						version = 3
-					elif lamedb[0].find("/4/") != -1:
-						version = 4
-					else:
-						print("[NimManager] unknown lamedb version: %s" % lamedb[0])
+					from Tools.Lamedb import iterLamedb
+					lamedb = "/etc/enigma2/lamedb"
+					if not exists(lamedb):
+						lamedb = "/etc/enigma2/lamedb5"
+						if not exists(lamedb):
+							print("[NimManager] /etc/enigma2/lamedb not found")
+							return None
+					records = iterLamedb(lamedb, services=False)
+					version = next(records)
+					if not version:
+						print("[NimManager] unknown lamedb version: %s" % lamedb)
 						return False
 					print("[NimManager] import version %d" % version)
 
-					collect = False
-					transponders = []
-					tp = []
-					for line in lamedb:
-						if line == "transponders\n":
-							collect = True
-							continue
-						if line == "end\n":
-							break
-						if collect:
-							data = line.strip().split(":")
-							if data[0] == "/":
-								transponders.append(tp)
-								tp = []
-							else:
-								tp.append(data)
-
-					t1 = ("namespace", "tsid", "onid")
-					t2_sv3 = ("frequency",
-						"symbol_rate",
-						"polarization",
-						"fec_inner",
-						"position",
-						"inversion",
-						"system",
-						"modulation",
-						"rolloff",
-						"pilot",
-						)
-					t2_sv4 = ("frequency",
-						"symbol_rate",
-						"polarization",
-						"fec_inner",
-						"position",
-						"inversion",
-						"flags",
-						"system",
-						"modulation",
-						"rolloff",
-						"pilot"
-						)
-
 					tplist = []
-					for x in transponders:
-						tp = {}
-						if len(x[0]) > len(t1):
+					for transponder in records:
+						if transponder.type not in ("s", "S"):
 							continue
-						freq = x[1][0].split()
-						if len(freq) != 2:
+						tp = transponder.getSatelliteParameters(version)
+						if "position" not in tp:
 							continue
-						x[1][0] = freq[1]
-						if freq[0] == "s" or freq[0] == "S":
-							if ((version == 3) and len(x[1]) > len(t2_sv3)) or ((version == 4) and len(x[1]) > len(t2_sv4)):
-								continue
-							for y in list(range(0, len(x[0]))):
-								tp.update({t1[y]: x[0][y]})
-							for y in list(range(0, len(x[1]))):
-								if version == 3:
-									tp.update({t2_sv3[y]: x[1][y]})
-								elif version == 4:
-									tp.update({t2_sv4[y]: x[1][y]})
-							if ((int(tp.get("namespace"), 16) >> 16) & 0xFFF) != int(tp.get("position")):
-								print("[NimManager] Namespace %s and Position %s are not identical" % (tp.get("namespace"), tp.get("position")))
-								continue
-							if version >= 4:
-								tp.update({"supposition": ((int(tp.get("namespace", "0"), 16) >> 24) & 0x0F)})
-						elif freq[0] == "c" or freq[0] == "C":
-							print("[NimManager] DVB-C")
-							continue
-						elif freq[0] == "t" or freq[0] == "T":
-							print("[NimManager] DVB-T")
+						if ((transponder.namespace >> 16) & 0xFFF) != tp["position"]:
+							print("[NimManager] Namespace %08x and Position %s are not identical" % (transponder.namespace, tp["position"]))
 							continue
 						tplist.append(tp)
 
 					satDict = {}
 					for tp in tplist:
-						freq = int(tp.get("frequency", 0))
+						freq = tp.get("frequency", 0)
 						if freq:
-							tmp_sat = satDict.get(int(tp.get("position")), {})
-							tmp_tp = self.transponders.get(int(tp.get("position")), [])
-							sat_pos = int(tp.get("position"))
-							fake_sat_pos = int(tp.get("position"))
+							tmp_sat = satDict.get(tp["position"], {})
+							tmp_tp = self.transponders.get(tp["position"], [])
+							sat_pos = tp["position"]
+							fake_sat_pos = tp["position"]
 							if sat_pos > 1800:
 								sat_pos -= 1800
 								ori = 'W'
@@ -1210,19 +1224,19 @@ class NimManager:
 								#tmp_sat.update({"band":"Ka"})
 							tmp_tp.append((
 									0,			#???
-									int(tp.get("frequency", 0)),
-									int(tp.get("symbol_rate", 0)),
-									int(tp.get("polarization", 0)),
-									int(tp.get("fec_inner", 0)),
-									int(tp.get("system", 0)),
-									int(tp.get("modulation", 0)),
-									int(tp.get("inversion", 0)),
-									int(tp.get("rolloff", 0)),
-									int(tp.get("pilot", 0)),
+									tp.get("frequency", 0),
+									tp.get("symbol_rate", 0),
+									tp.get("polarization", 0),
+									tp.get("fec_inner", 0),
+									tp.get("system", 0),
+									tp.get("modulation", 0),
+									tp.get("inversion", 0),
+									tp.get("rolloff", 0),
+									tp.get("pilot", 0),
 									-1,			#tsid  -1 -> any tsid are valid
 									-1			#onid  -1 -> any tsid are valid
 								))
-							tmp_sat.update({'flags': int(tp.get("flags"))})
+							tmp_sat.update({'flags': tp.get("flags", 0)})
 							satDict.update({fake_sat_pos: tmp_sat})
 							self.transponders.update({fake_sat_pos: tmp_tp})
 
@@ -1246,6 +1260,7 @@ class NimManager:
 		if self.hasNimType("ATSC"):
 			print("[NimManager] Reading atsc.xml")
 			db.readATSC(self.atscList, self.transpondersatsc)
+		self.invalidateRoutes()
 
 	def enumerateNIMs(self):
 		# enum available NIMs. This is currently very dreambox-centric and uses the /proc/bus/nim_sockets interface.
@@ -1269,6 +1284,7 @@ class NimManager:
 
 		# nim_slots is an array which has exactly one entry for each slot, even for empty ones.
 		self.nim_slots = []
+		self.invalidateRoutes()
 
 		try:
 			nimfile = open("/proc/bus/nim_sockets")
@@ -1545,7 +1561,27 @@ class NimManager:
 				res = res or (configMode != "nothing")
 			return res
 
+	def invalidateRoutes(self, configElement=None):
+		"""Drops the routing table of the satellites and the tuners, it is
+		called by the notifiers of the config.Nims elements it depends on."""
+		self.satRoutes = {}
+		self.nimRoutes = None
+
+	def getSatRoute(self, slotid):
+		route = self.satRoutes.get(slotid)
+		if route is None:
+			satList = self.calcSatListForNim(slotid)
+			route = self.satRoutes[slotid] = (satList, frozenset(sat[0] for sat in satList))
+		return route
+
 	def getSatListForNim(self, slotid):
+		return self.getSatRoute(slotid)[0][:]
+
+	def getSatPositionsForNim(self, slotid):
+		"""Returns the frozenset of the orbital positions the tuner can receive."""
+		return self.getSatRoute(slotid)[1]
+
+	def calcSatListForNim(self, slotid):  # Use getSatListForNim(), this walks the configuration of the tuner.
 		result = []
 		if self.nim_slots[slotid].canBeCompatible("DVB-S"):
 			nim = config.Nims[slotid].dvbs
@@ -1599,7 +1635,14 @@ class NimManager:
 		return result
 
 	def getNimListForSat(self, orb_pos):
-		return [nim.slot for nim in self.nim_slots if nim.isCompatible("DVB-S") and not nim.isFBCLink() and orb_pos in [sat[0] for sat in self.getSatListForNim(nim.slot)]]
+		if self.nimRoutes is None:
+			nimRoutes = {}
+			for nim in self.nim_slots:
+				if nim.isCompatible("DVB-S") and not nim.isFBCLink():
+					for position in self.getSatPositionsForNim(nim.slot):
+						nimRoutes.setdefault(position, []).append(nim.slot)
+			self.nimRoutes = {position: tuple(slots) for position, slots in nimRoutes.items()}
+		return list(self.nimRoutes.get(orb_pos, ()))
 
 	def getRotorSatListForNim(self, slotid):
 		result = []
@@ -2181,6 +2224,7 @@ def InitNimManager(nimmgr, update_slots=None):
 				lnb = ConfigSelection(advanced_lnb_choices, "0")
 				lnb.slot_id = slot_id
 				lnb.addNotifier(configLNBChanged, initial_call=False)
+				lnb.addNotifier(nimmgr.invalidateRoutes, initial_call=False)
 				tmp.lnb = lnb
 				nim.advanced.sat[x[0]] = tmp
 				if oldlnbval is not None and sat == x[0]:
@@ -2191,11 +2235,13 @@ def InitNimManager(nimmgr, update_slots=None):
 				tmp.tonemode = ConfigSelection(advanced_tonemode_choices, "band")
 				tmp.usals = ConfigYesNo(default=True)
 				tmp.userSatellitesList = ConfigText('[]')
+				tmp.userSatellitesList.addNotifier(nimmgr.invalidateRoutes, initial_call=False)
 				tmp.rotorposition = ConfigInteger(default=1, limits=(1, 255))
 				lnbnum = maxFixedLnbPositions + x - 3600
 				lnb = ConfigSelection([("0", _("Not configured")), (str(lnbnum), "LNB %d" % (lnbnum))], "0")
 				lnb.slot_id = slot_id
 				lnb.addNotifier(configLNBChanged, initial_call=False)
+				lnb.addNotifier(nimmgr.invalidateRoutes, initial_call=False)
 				tmp.lnb = lnb
 				nim.advanced.sat[x] = tmp
 
@@ -2274,6 +2320,8 @@ def InitNimManager(nimmgr, update_slots=None):
 			nim.fastTurningBegin = ConfigDateTime(default=mktime(btime.timetuple()), formatstring=_("%H:%M"), increment=900)
 			etime = datetime(1970, 1, 1, 19, 0)
 			nim.fastTurningEnd = ConfigDateTime(default=mktime(etime.timetuple()), formatstring=_("%H:%M"), increment=900)
+			for element in (nim.diseqcMode, nim.connectedTo, nim.diseqcA, nim.diseqcB, nim.diseqcC, nim.diseqcD, nim.userSatellitesList):
+				element.addNotifier(nimmgr.invalidateRoutes, initial_call=False)
 
 	def createCableConfig(nim, x):
 		try:
@@ -2367,6 +2415,7 @@ def InitNimManager(nimmgr, update_slots=None):
 			tmp = ConfigSelection(choices=config_mode_choices, default=default)
 			tmp.slot_id = slot_id
 			tmp.addNotifier(configModeChanged, initial_call=False)
+			tmp.addNotifier(nimmgr.invalidateRoutes, initial_call=False)
 			nim.configMode = tmp
 			nim.configMode.connectedToChanged = boundFunction(connectedToChanged, slot_id, nimmgr)
 			nim.connectedTo.addNotifier(boundFunction(connectedToChanged, slot_id, nimmgr), initial_call=False)
@@ -2484,6 +2533,7 @@ def InitNimManager(nimmgr, update_slots=None):
 
 			nim.multiType.fe_id = slot_id - empty_slots
 			nim.multiType.addNotifier(boundFunction(tunerTypeChanged, nimmgr))
+			nim.multiType.addNotifier(nimmgr.invalidateRoutes, initial_call=False)
 
 		print("[NimManager] slotname = %s, slotdescription = %s, multitype = %s, current type = %s" % (slot.input_name, slot.description, (slot.isMultiType()), slot.getType()))
 
@@ -1,4 +1,5 @@
-from time import time
+from os import stat
+from time import monotonic, time
 
 from enigma import eDVBDB, eServiceCenter, eServiceReference, eTimer, iServiceInformation
 
@@ -17,6 +18,8 @@ TYPE_SERVICE = "SERVICE"
 TYPE_BOUQUETSERVICE = "BOUQUETSERVICE"
 TYPE_BOUQUET = "BOUQUET"
 LIST_BLACKLIST = "blacklist"
+BOUQUET_CHECK_INTERVAL = 10  # Seconds between the checks for changed protected bouquets while zapping.
+FLAG_HIDE = 2  # The eDVBDB flag that hides a service in the channel list.
 
 def InitParentalControl():
 	config.ParentalControl = ConfigSubsection()
@@ -104,6 +107,10 @@ class ParentalControl:
 		# probably slow down zapping, that's why I decided to use a timer.
 		self.sessionPinTimer = eTimer()
 		self.sessionPinTimer.callback.append(self.resetSessionPin)
+		self.bouquets = {}  # Indexed by the protected bouquet, the value is (modification time of the bouquet file, list of its services).
+		self.bouquetCheckTime = 0
+		self.hiddenServices = None  # The services flagged as hidden, None until the flags were set the first time.
+		self.ratings = {}  # Indexed by the service, the value is (begin, end, age) of the rating of the current event.
 		self.getConfigValues()
 
 	def __getattr__(self, name):  # This method is called if we lack a property. I'm lazy, so I load the files when someone "hits" this code.
@@ -121,9 +128,7 @@ class ParentalControl:
 	def serviceMethodWrapper(self, service, method, *args):
 		if "FROM BOUQUET" in service:
 			method(service, TYPE_BOUQUET, *args)
-			servicelist = self.readServicesFromBouquet(service, "C")
-			for ref in servicelist:
-				sRef = str(ref[0])
+			for sRef in self.getBouquetServices(service):
 				method(sRef, TYPE_BOUQUETSERVICE, *args)
 		else:
 			ref = ServiceReference(service)
@@ -138,20 +143,19 @@ class ParentalControl:
 		# If true:, read the configuration.
 		if self.storeServicePin != config.ParentalControl.storeservicepin.value:
 			self.getConfigValues()
+		if self.sessionPinCached:  # Every service is playable while the session PIN is cached.
+			return True
+		if self.bouquets and monotonic() - self.bouquetCheckTime > BOUQUET_CHECK_INTERVAL and self.checkBouquets():
+			self.hideBlacklist()
 		service = ref.toCompareString()
-		info = eServiceCenter.getInstance().info(ref)
 		age = 0
 		if service.startswith("1:") and service.rsplit(":", 1)[1].startswith("/"):
+			info = eServiceCenter.getInstance().info(ref)
 			refstr = info and info.getInfoString(ref, iServiceInformation.sServiceref)
 			service = refstr and eServiceReference(refstr).toCompareString()
-		elif int(config.ParentalControl.age.value):
-			event = info and info.getEvent(ref)
-			rating = event and event.getParentalData()
-			age = rating and rating.getRating()
-			age = age and age <= 15 and age + 3 or 0
+		elif int(config.ParentalControl.age.value) and service not in self.blacklist:
+			age = self.getEventAge(ref, service)
 		if (age and age >= int(config.ParentalControl.age.value)) or service and service in self.blacklist:
-			if self.sessionPinCached:  # Check if the session PIN is cached.
-				return True
 			self.callback = callback
 			title = "FROM BOUQUET \"userbouquet." in service and _("This bouquet is protected by a parental control PIN!") or _("This service is protected by a parental control PIN!")
 			if session:
@@ -165,15 +169,35 @@ class ParentalControl:
 		else:
 			return True
 
+	def getEventAge(self, ref, service):
+		"""Returns the minimum age of the current event of the service, the
+		rating is kept until the event ends."""
+		now = time()
+		rating = self.ratings.get(service)
+		if rating and rating[0] <= now < rating[1]:
+			return rating[2]
+		info = eServiceCenter.getInstance().info(ref)
+		event = info and info.getEvent(ref)
+		rating = event and event.getParentalData()
+		age = rating and rating.getRating()
+		age = age and age <= 15 and age + 3 or 0
+		if event:
+			begin = event.getBeginTime()
+			self.ratings[service] = (begin, begin + event.getDuration(), age)
+		return age
+
 	def protectService(self, service):
 		if service not in self.blacklist:
+			self.checkBouquets()
 			self.serviceMethodWrapper(service, self.addServiceToList, self.blacklist)
-			if config.ParentalControl.hideBlacklist.value and not self.sessionPinCached:
-				eDVBDB.getInstance().addFlag(eServiceReference(service), 2)
+			self.setHiddenFlags()
 
 	def unProtectService(self, service):
 		if service in self.blacklist:
+			self.checkBouquets()
 			self.serviceMethodWrapper(service, self.removeServiceFromList, self.blacklist)
+			self.bouquets.pop(service, None)
+			self.setHiddenFlags()
 
 	def getProtectionLevel(self, service):
 		return service not in self.blacklist and -1 or 0
@@ -270,6 +294,43 @@ class ParentalControl:
 			if not vList[service]:
 				del vList[service]
 
+	def getBouquetStamp(self, bouquet):
+		fields = bouquet.split("\"")
+		try:
+			return stat(resolveFilename(SCOPE_CONFIG, fields[1])).st_mtime if len(fields) > 2 else None
+		except OSError:
+			return None
+
+	def getBouquetServices(self, bouquet):
+		"""Returns the services of the bouquet, the bouquet is only read again
+		if its file changed.  An empty bouquet is read again at every check,
+		it may have been read before the bouquets were loaded."""
+		stamp = self.getBouquetStamp(bouquet)
+		cached = self.bouquets.get(bouquet)
+		if cached is None or stamp is None or cached[0] != stamp:
+			servicelist = self.readServicesFromBouquet(bouquet, "C") or []
+			services = [str(ref[0]) for ref in servicelist]
+			cached = (stamp if services else None, services)
+			self.bouquets[bouquet] = cached
+		return cached[1]
+
+	def checkBouquets(self):
+		"""Updates the services of the protected bouquets whose file changed,
+		for example after the bouquets were edited or reloaded.  Returns True
+		if the blacklist changed."""
+		self.bouquetCheckTime = monotonic()
+		changed = False
+		for bouquet, (stamp, services) in list(self.bouquets.items()):
+			if bouquet not in self.blacklist:
+				del self.bouquets[bouquet]
+			elif stamp is None or self.getBouquetStamp(bouquet) != stamp:
+				for sRef in services:
+					self.removeServiceFromList(sRef, TYPE_BOUQUETSERVICE, self.blacklist)
+				for sRef in self.getBouquetServices(bouquet):
+					self.addServiceToList(sRef, TYPE_BOUQUETSERVICE, self.blacklist)
+				changed = changed or services != self.bouquets[bouquet][1]
+		return changed
+
 	def readServicesFromBouquet(self, sBouquetSelection, formatstring):  # This method gives back a list of services for a given bouquet.
 		serviceHandler = eServiceCenter.getInstance()
 		root = eServiceReference(sBouquetSelection)
@@ -281,6 +342,7 @@ class ParentalControl:
 		self.saveListToFile(LIST_BLACKLIST, self.blacklist)
 
 	def open(self):
+		self.bouquets = {}  # The index is built again by openListFromFile() from the protected bouquets of the list.
 		self.blacklist = self.openListFromFile(LIST_BLACKLIST)
 		self.hideBlacklist()
 		if not self.filesOpened:  # Reset PIN cache on standby. Use StandbyCounter-Config-Callback.
@@ -289,16 +351,31 @@ class ParentalControl:
 			refreshServiceList()
 
 	def hideBlacklist(self):
-		if self.blacklist:
-			if config.ParentalControl.servicepinactive.value and config.ParentalControl.storeservicepin.value != "never" and config.ParentalControl.hideBlacklist.value and not self.sessionPinCached:
-				for ref in self.blacklist:
-					if TYPE_BOUQUET not in ref:
-						eDVBDB.getInstance().addFlag(eServiceReference(ref), 2)
-			else:
-				for ref in self.blacklist:
-					if TYPE_BOUQUET not in ref:
-						eDVBDB.getInstance().removeFlag(eServiceReference(ref), 2)
+		self.checkBouquets()
+		if self.setHiddenFlags():
 			refreshServiceList()
 
+	def setHiddenFlags(self):
+		"""Sets the hidden flag of the protected services if they are to be
+		hidden and clears it otherwise.  Only the flags of the services whose
+		state changed are set or cleared, returns True if any flag changed."""
+		if config.ParentalControl.servicepinactive.value and config.ParentalControl.storeservicepin.value != "never" and config.ParentalControl.hideBlacklist.value and not self.sessionPinCached:
+			hidden = set(ref for ref in self.blacklist if TYPE_BOUQUET not in ref)
+		else:
+			hidden = set()
+		if self.hiddenServices is None:  # The flags of the last start are unknown, all the protected services are set.
+			add = hidden
+			remove = set(ref for ref in self.blacklist if TYPE_BOUQUET not in ref) - hidden
+		else:
+			add = hidden - self.hiddenServices
+			remove = self.hiddenServices - hidden
+		self.hiddenServices = hidden
+		db = eDVBDB.getInstance()
+		for ref in add:
+			db.addFlag(eServiceReference(ref), FLAG_HIDE)
+		for ref in remove:
+			db.removeFlag(eServiceReference(ref), FLAG_HIDE)
+		return bool(add or remove)
+
 
 parentalControl = ParentalControl()
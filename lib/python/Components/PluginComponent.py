@@ -1,15 +1,137 @@
 from bisect import insort
-from os import listdir
+from os import listdir, stat
 from os.path import exists, isdir, join
+from pickle import HIGHEST_PROTOCOL, dump, load
 from shutil import rmtree
+from sys import modules
+from time import perf_counter
 from traceback import print_exc
 
 from Components.ActionMap import loadKeymap
+from Components.config import config
+from Components.SystemInfo import BoxInfo
 from Plugins.Plugin import PluginDescriptor
-from Tools.Directories import SCOPE_PLUGINS, resolveFilename
+from Tools.Directories import SCOPE_CONFIG, SCOPE_PLUGINS, resolveFilename
 from Tools.Import import my_import
 from Tools.Profile import profile
 
+PLUGIN_MANIFEST_FILE = resolveFilename(SCOPE_CONFIG, "plugins.manifest")
+PLUGIN_MANIFEST_VERSION = 2
+# Plugins with only these descriptors are called when the user opens a list or menu, they can be imported on first use.
+LAZY_WHERE = frozenset((
+	PluginDescriptor.WHERE_EXTENSIONSMENU,
+	PluginDescriptor.WHERE_MAINMENU,
+	PluginDescriptor.WHERE_MENU,
+	PluginDescriptor.WHERE_PLUGINMENU,
+	PluginDescriptor.WHERE_MOVIELIST,
+	PluginDescriptor.WHERE_TELETEXT,
+	PluginDescriptor.WHERE_EVENTINFO,
+	PluginDescriptor.WHERE_AUDIOMENU,
+	PluginDescriptor.WHERE_CHANNEL_CONTEXT_MENU,
+	PluginDescriptor.WHERE_BUTTONSETUP
+))
+
+
+def getManifestSignature():
+	# The manifest holds the translated plugin names and descriptions and the descriptors
+	# plugins offer depending on the setup level and the hardware of the box.
+	return (PLUGIN_MANIFEST_VERSION, config.osd.language.value, config.usage.setup_level.value, BoxInfo.getItem("model"))
+
+
+def loadPluginManifest():
+	try:
+		with open(PLUGIN_MANIFEST_FILE, "rb") as fd:
+			manifest = load(fd)
+		if manifest.get("signature") == getManifestSignature():
+			return manifest.get("plugins", {})
+	except OSError:
+		pass
+	except Exception as err:
+		print("[PluginComponent] Error: Unable to load plugin manifest '%s'!  (%s)" % (PLUGIN_MANIFEST_FILE, err))
+	return {}
+
+
+def savePluginManifest(plugins):
+	try:
+		with open(PLUGIN_MANIFEST_FILE, "wb") as fd:
+			dump({"signature": getManifestSignature(), "plugins": plugins}, fd, HIGHEST_PROTOCOL)
+	except OSError as err:
+		print("[PluginComponent] Error %d: Unable to save plugin manifest '%s'!  (%s)" % (err.errno, PLUGIN_MANIFEST_FILE, err.strerror))
+
+
+def getPluginStamp(path):  # Returns the name, modification time and size of the plugin file or None if there is none.
+	for filename in ("plugin.py", "plugin.pyc"):
+		try:
+			status = stat(join(path, filename))
+			return (filename, status.st_mtime_ns, status.st_size)
+		except OSError:
+			pass
+	return None
+
+
+def getManifestRecords(plugins):
+	"""Returns the manifest records of the plugin descriptors or None if the
+	plugin must be imported at start up.  A plugin without descriptors is
+	imported at every start, it may offer descriptors once a module it
+	depends on is installed or a setting changed."""
+	if not plugins:
+		return None
+	records = []
+	for index, plugin in enumerate(plugins):
+		if not plugin.where or not LAZY_WHERE.issuperset(plugin.where) or not callable(plugin.function) or isinstance(plugin.function, type) or plugin.wakeupfnc or plugin.iconData is not None or not isinstance(plugin.name, str) or not isinstance(plugin.description, str):
+			return None
+		records.append((index, plugin.name, plugin.where, plugin.description, plugin.iconString, plugin.needsRestart, plugin.internal, plugin.weight))
+	return records
+
+
+class LazyPluginFunction:
+	"""Stands in for the function of a plugin descriptor registered from the
+	plugin manifest.  The plugin is imported when the function is first
+	used."""
+
+	def __init__(self, moduleName, path, index, name, where):
+		self.moduleName = moduleName
+		self.path = path
+		self.index = index
+		self.name = name
+		self.where = where
+		self.function = None
+
+	def load(self):
+		if self.function is None:
+			print("[PluginComponent] Importing plugin '%s' on first use." % self.moduleName)
+			plugins = my_import(self.moduleName).Plugins(path=self.path)
+			if not isinstance(plugins, list):
+				plugins = [plugins]
+			for plugin in plugins:
+				if plugin.name == self.name and plugin.where == self.where:
+					break
+			else:  # The descriptors differ from the manifest, import the plugin at the next start.
+				print("[PluginComponent] Warning: Plugin '%s' no longer offers '%s' as recorded in the manifest!" % (self.moduleName, self.name))
+				pluginComponent.forgetManifestEntry(self.path)
+				plugin = plugins[self.index] if self.index < len(plugins) else None
+			self.function = plugin.function if plugin and callable(plugin.function) else (lambda *args, **kwargs: [])
+		return self.function
+
+	def __call__(self, *args, **kwargs):
+		return self.load()(*args, **kwargs)
+
+	def __getattr__(self, name):  # For example "__code__", the plugin is imported to answer.
+		if name.startswith("__") and name not in ("__code__", "__name__", "__qualname__", "__module__", "__defaults__"):
+			raise AttributeError(name)
+		return getattr(self.load(), name)
+
+	def __eq__(self, other):
+		if isinstance(other, LazyPluginFunction):
+			return (self.moduleName, self.name, self.where) == (other.moduleName, other.name, other.where)
+		return self.function is not None and self.function == other
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash((self.moduleName, self.name))
+
 
 class PluginComponent:
 	firstRun = True
@@ -21,6 +143,7 @@ class PluginComponent:
 		self.installedPluginList = []
 		self.setPluginPrefix("Plugins.")
 		self.pluginWarnings = []
+		self.manifest = None
 
 	def setPluginPrefix(self, prefix):
 		self.prefix = prefix
@@ -44,8 +167,16 @@ class PluginComponent:
 				plugin(reason=PluginDescriptor.REASON_STOP)
 
 	def readPluginList(self, directory):
-		"""Enumerates plugins."""
+		"""Enumerates plugins.  Plugins that are only called from lists and
+		menus are registered from the plugin manifest when the plugin file is
+		unchanged and imported on first use."""
 		newPlugins = []
+		useManifest = config.usage.lazyPluginLoading.value
+		if self.manifest is None:
+			self.manifest = loadPluginManifest() if useManifest else {}
+		manifest = {}
+		lazyCount = 0
+		lazySaving = 0.0
 		for pluginDirectory in listdir(directory):
 			pluginPath = join(directory, pluginDirectory)
 			if not isdir(pluginPath):
@@ -55,29 +186,45 @@ class PluginComponent:
 					continue
 				path = join(pluginPath, pluginName)
 				if isdir(path):
-					profile("Plugin %s" % pluginName)
-					try:
-						plugin = my_import(".".join(["Plugins", pluginDirectory, pluginName, "plugin"]))
-						plugins = plugin.Plugins(path=path)
-					except Exception as err:
-						if pluginName != "WebInterface":  # Ignore old WebInterface plugin
-							print("[PluginComponent] Error: Plugin '%s/%s' failed to load!  (%s)" % (pluginDirectory, pluginName, str(err)))
-							for filename in ("plugin.py", "plugin.pyc"):  # Suppress errors due to missing plugin.py* files (badly removed plugin).
-								if exists(join(path, filename)):
-									warning = (join(pluginDirectory, pluginName), str(err))
-									if warning not in self.pluginWarnings:
-										self.pluginWarnings.append(warning)
-									print_exc()
-									break
-							else:
-								print("[PluginComponent] Plugin probably removed, but not cleanly, in '%s'; trying to remove it." % path)
-								try:
-									rmtree(path)
-								except OSError as err:
-									print("[PluginComponent] Error %d: Unable to remove directory tree '%s'!  (%s)" % (err.errno, path, err.strerror))
-						continue
-					if not isinstance(plugins, list):
-						plugins = [plugins]
+					moduleName = ".".join(["Plugins", pluginDirectory, pluginName, "plugin"])
+					stamp = getPluginStamp(path)
+					entry = self.manifest.get(path)
+					if useManifest and stamp and entry and entry[0] == stamp and entry[1] is not None and moduleName not in modules:
+						plugins = []
+						for index, name, where, description, iconString, needsRestart, internal, weight in entry[1]:
+							plugins.append(PluginDescriptor(name=name, where=where, description=description, icon=iconString, fnc=LazyPluginFunction(moduleName, path, index, name, where), needsRestart=needsRestart, internal=internal, weight=weight))
+						manifest[path] = entry
+						lazyCount += 1
+						lazySaving += entry[2]
+					else:
+						profile("Plugin %s" % pluginName)
+						start = perf_counter()
+						try:
+							plugin = my_import(moduleName)
+							plugins = plugin.Plugins(path=path)
+						except Exception as err:
+							if pluginName != "WebInterface":  # Ignore old WebInterface plugin
+								print("[PluginComponent] Error: Plugin '%s/%s' failed to load!  (%s)" % (pluginDirectory, pluginName, str(err)))
+								for filename in ("plugin.py", "plugin.pyc"):  # Suppress errors due to missing plugin.py* files (badly removed plugin).
+									if exists(join(path, filename)):
+										warning = (join(pluginDirectory, pluginName), str(err))
+										if warning not in self.pluginWarnings:
+											self.pluginWarnings.append(warning)
+										print_exc()
+										break
+								else:
+									print("[PluginComponent] Plugin probably removed, but not cleanly, in '%s'; trying to remove it." % path)
+									try:
+										rmtree(path)
+									except OSError as err:
+										print("[PluginComponent] Error %d: Unable to remove directory tree '%s'!  (%s)" % (err.errno, path, err.strerror))
+							continue
+						if not isinstance(plugins, list):
+							plugins = [plugins]
+						if stamp:
+							# An entry of a module that was already imported keeps the import time of the first import.
+							importTime = entry[2] if entry and entry[0] == stamp else (perf_counter() - start) * 1000.0
+							manifest[path] = (stamp, getManifestRecords(plugins), importTime)
 					for plugin in plugins:
 						plugin.path = path
 						plugin.updateIcon(path)
@@ -91,6 +238,11 @@ class PluginComponent:
 							warning = (join(pluginDirectory, pluginName), str(err))
 							if warning not in self.pluginWarnings:
 								self.pluginWarnings.append(warning)
+		if useManifest and manifest != self.manifest:
+			self.manifest = manifest
+			savePluginManifest(manifest)
+		if lazyCount:
+			print("[PluginComponent] %d plugins registered from the manifest without importing them, saving about %.0f ms." % (lazyCount, lazySaving))
 		# Build a diff between the old list of plugins and the new one internally, the "fnc" argument will be compared with "__eq__".
 		pluginsAdded = [x for x in newPlugins if x not in self.pluginList]
 		pluginsRemoved = [x for x in self.pluginList if not x.internal and x not in newPlugins]
@@ -112,6 +264,11 @@ class PluginComponent:
 			self.firstRun = False
 			self.installedPluginList = self.pluginList
 
+	def forgetManifestEntry(self, path):
+		if self.manifest and path in self.manifest:
+			del self.manifest[path]
+			savePluginManifest(self.manifest)
+
 	def getPlugins(self, where):
 		"""Get list of plugins in a specific category."""
 		if not isinstance(where, list):
@@ -1,10 +1,10 @@
 # original code is from openmips gb Team: [OMaClockLcd] Renderer #
 # Thx to arn354 #
 
-from math import sin, cos, pi
-from enigma import eCanvas, eSize, gRGB, eRect
+from enigma import eCanvas, eSize, gRGB
 from Components.Renderer.Renderer import Renderer
 from skin import parseColor
+from Tools.AnalogClock import ClockHand, getHandRects
 
 
 class AnalogClockLCD(Renderer):
@@ -19,6 +19,7 @@ class AnalogClockLCD(Renderer):
 		self.positionheight = 1
 		self.positionwidth = 1
 		self.linesize = 10
+		self.clockHand = ClockHand()
 
 	def applySkin(self, desktop, parent):  # HINT: clock center = position="(x + linesize / 2), (y + linesize / 2)"
 		attribs = []
@@ -40,39 +41,9 @@ class AnalogClockLCD(Renderer):
 		self.skinAttributes = attribs
 		return Renderer.applySkin(self, desktop, parent)
 
-	def calc(self, w, r, m, m1):
-		a, z = w * 6, pi / 180
-		x = int(round(r * sin(a * z)))
-		y = int(round(r * cos(a * z)))
-		return m + x, m1 - y
-
 	def hand(self):
-		width = self.positionwidth
-		height = self.positionheight
-		r, r1 = width / 2, height / 2
-		x, y = self.calc(self.forend, self.linesize, r, r1)
-		self.line_draw(r, r1, x, y)
-
-	def line_draw(self, x0, y0, x1, y1):
-		steep = abs(y1 - y0) > abs(x1 - x0)
-		if steep:
-			x0, y0 = y0, x0
-			x1, y1 = y1, x1
-		if x0 > x1:
-			x0, x1 = x1, x0
-			y0, y1 = y1, y0
-		ystep = 1 if y0 < y1 else -1
-		deltax = x1 - x0
-		deltay = abs(y1 - y0)
-		error = -deltax / 2
-		y = int(y0)
-		for x in range(int(x0), (int(x1) + 1)):
-			a, b = (y, x) if steep else (x, y)
-			self.instance.fillRect(eRect(a, b, self.linewidth, self.linewidth), self.fColor)
-			error = error + deltay
-			if error > 0:
-				y = y + ystep
-				error = error - deltax
+		rects = getHandRects(self.forend, self.positionwidth // 2, self.positionheight // 2, self.linesize, self.linewidth, self.linewidth)
+		self.clockHand.draw(self.instance, rects, self.fColor, self.bColor)
 
 	def changed(self, what):
 		opt = self.source.text.split(",")
@@ -84,7 +55,6 @@ class AnalogClockLCD(Renderer):
 				self.instance.show()
 				if self.forend != sopt:
 					self.forend = sopt
-					self.instance.clear(self.bColor)
 					self.hand()
 
 	def parseSize(self, str):
@@ -96,3 +66,4 @@ class AnalogClockLCD(Renderer):
 			if attrib == "size":
 				self.instance.setSize(self.parseSize(value))
 		self.instance.clear(self.bColor)
+		self.clockHand.reset()
@@ -9,17 +9,21 @@ class EGclock(VariableValue, Renderer):
 	def __init__(self):
 		Renderer.__init__(self)
 		VariableValue.__init__(self)
+		self.lastValue = None
 
 	def changed(self, what):
 		if what[0] != self.CHANGED_CLEAR:
 			value = self.source.value
 			if value is None:
 				value = 0
-			self.setValue(value)
+			if value != self.lastValue:  # eGauge repaints the whole dial on every setValue().
+				self.lastValue = value
+				self.setValue(value)
 
 	GUI_WIDGET = eGauge
 
 	def postWidgetCreate(self, instance):
+		self.lastValue = None
 		instance.setValue(0)
 
 	def setValue(self, value):
@@ -101,11 +101,12 @@ def onMountpointRemoved(mountpoint):
 	except Exception:
 		pass
 
-def onPartitionChange(why, part):
-	if why == "add":
-		onMountpointAdded(part.mountpoint)
-	elif why == "remove":
-		onMountpointRemoved(part.mountpoint)
+def onPartitionChange(changes):
+	for why, part in changes:
+		if why == "add":
+			onMountpointAdded(part.mountpoint)
+		elif why == "remove":
+			onMountpointRemoved(part.mountpoint)
 
 def findLcdPicon(serviceName):
 	global lastLcdPiconPath
@@ -216,5 +217,5 @@ class LcdPicon(Renderer):
 				self.instance.hide()
 
 
-harddiskmanager.on_partition_list_change.append(onPartitionChange)
+harddiskmanager.on_partition_list_batch.append(onPartitionChange)
 initLcdPiconPaths()
@@ -1,12 +1,11 @@
 from __future__ import division
 from __future__ import absolute_import
-from builtins import round
-import math
 from Components.Renderer.Renderer import Renderer
 from skin import parseColor
-from enigma import eCanvas, eSize, gRGB, eRect
+from enigma import eCanvas, eSize, gRGB
 from Components.VariableText import VariableText
 from Components.config import config
+from Tools.AnalogClock import ClockHand, getHandRects
 
 from boxbranding import getBoxType
 
@@ -35,6 +34,7 @@ class OMaClockLcd(Renderer):
 		self.bColor = gRGB(0, 0, 0, 255)
 		self.forend = -1
 		self.linewidth = 1
+		self.clockHand = ClockHand()
 
 	GUI_WIDGET = eCanvas
 
@@ -54,13 +54,6 @@ class OMaClockLcd(Renderer):
 		self.skinAttributes = attribs
 		return Renderer.applySkin(self, desktop, parent)
 
-	def calc(self, w, r, m, m1):
-		a = (w * 6)
-		z = (math.pi / 180)
-		x = int(round((r * math.sin((a * z)))))
-		y = int(round((r * math.cos((a * z)))))
-		return ((m + x), (m1 - y))
-
 	def hand(self, opt):
 		if LCDSIZE400:
 			width = 396
@@ -74,8 +67,8 @@ class OMaClockLcd(Renderer):
 			width = 218
 			height = 176
 			l = 35
-		r = (width / 2)
-		r1 = (height / 2)
+		r = width // 2
+		r1 = height // 2
 
 		if opt == 'sec':
 			if LCDSIZE400:
@@ -95,34 +88,7 @@ class OMaClockLcd(Renderer):
 			self.fColor = self.fColorm
 		else:
 			self.fColor = self.fColorh
-		(endX, endY,) = self.calc(self.forend, l, r, r1)
-		self.line_draw(r, r1, endX, endY)
-
-	def line_draw(self, x0, y0, x1, y1):
-		steep = (abs((y1 - y0)) > abs((x1 - x0)))
-		if steep:
-			x0, y0 = y0, x0
-			x1, y1 = y1, x1
-		if (x0 > x1):
-			x0, x1 = x1, x0
-			y0, y1 = y1, y0
-		if (y0 < y1):
-			ystep = 1
-		else:
-			ystep = -1
-		deltax = (x1 - x0)
-		deltay = abs((y1 - y0))
-		error = (-deltax / 2)
-		y = int(y0)
-		for x in list(range(int(x0), (int(x1) + 1))):
-			if steep:
-				self.instance.fillRect(eRect(y, x, self.linewidth, self.linewidth), self.fColor)
-			else:
-				self.instance.fillRect(eRect(x, y, self.linewidth, self.linewidth), self.fColor)
-			error = (error + deltay)
-			if (error > 0):
-				y = (y + ystep)
-				error = (error - deltax)
+		self.clockHand.draw(self.instance, getHandRects(self.forend, r, r1, l, self.linewidth, self.linewidth), self.fColor, self.bColor)
 
 	def changed(self, what):
 		opt = (self.source.text).split(',')
@@ -139,7 +105,6 @@ class OMaClockLcd(Renderer):
 			self.instance.show()
 			if (self.forend != sopt):
 				self.forend = sopt
-				self.instance.clear(self.bColor)
 				self.hand(opt[1])
 
 	def parseSize(self, str):
@@ -151,3 +116,4 @@ class OMaClockLcd(Renderer):
 			if ((attrib == 'size') and self.instance.setSize(self.parseSize(value))):
 				pass
 		self.instance.clear(self.bColor)
+		self.clockHand.reset()
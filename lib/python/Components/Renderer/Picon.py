@@ -84,11 +84,12 @@ def onMountpointRemoved(mountpoint):
 				pass
 	#################################################################################
 
-def onPartitionChange(why, part):
-	if why == "add":
-		onMountpointAdded(part.mountpoint)
-	elif why == "remove":
-		onMountpointRemoved(part.mountpoint)
+def onPartitionChange(changes):
+	for why, part in changes:
+		if why == "add":
+			onMountpointAdded(part.mountpoint)
+		elif why == "remove":
+			onMountpointRemoved(part.mountpoint)
 
 
 def findPicon(serviceName):
@@ -213,5 +214,5 @@ def setPiconPath():
 	initPiconPaths()
 #####################################
 
-harddiskmanager.on_partition_list_change.append(onPartitionChange)
+harddiskmanager.on_partition_list_batch.append(onPartitionChange)
 initPiconPaths()
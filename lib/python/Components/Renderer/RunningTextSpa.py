@@ -21,10 +21,11 @@
 
 ################################################################################
 
-from enigma import eWidget, eLabel, eTimer, ePoint, eSize, gFont, \
+from enigma import eWidget, eLabel, ePoint, eSize, gFont, \
 	RT_HALIGN_LEFT, RT_HALIGN_CENTER, RT_HALIGN_RIGHT, RT_HALIGN_BLOCK, \
 	RT_VALIGN_TOP, RT_VALIGN_CENTER, RT_VALIGN_BOTTOM, RT_WRAP
 
+from Components.AnimationScheduler import animationScheduler
 from Components.Renderer.Renderer import Renderer
 from skin import parseColor, parseFont
 
@@ -78,7 +79,7 @@ class RunningTextSpa(Renderer):
 		self.instance.move(ePoint(0,0))
 		self.instance.resize( eSize(self.W,self.H) )
 		self.scroll_label = eLabel(instance)
-		self.mTimer = eTimer()
+		self.mTimer = animationScheduler.createTimer()
 		self.mTimer.callback.append(self.movingLoop)
 
 	def preWidgetRemove(self, instance):
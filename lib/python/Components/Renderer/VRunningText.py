@@ -6,7 +6,8 @@
 # Support: http://dream.altmaster.net/
 #
 
-from enigma import eCanvas, eLabel, ePoint, eRect, eSize, eTimer, gFont, gRGB, RT_WRAP, RT_HALIGN_LEFT, RT_HALIGN_CENTER, RT_HALIGN_RIGHT, RT_HALIGN_BLOCK, RT_VALIGN_TOP, RT_VALIGN_CENTER, RT_VALIGN_BOTTOM
+from enigma import eCanvas, eLabel, ePoint, eRect, eSize, gFont, gRGB, RT_WRAP, RT_HALIGN_LEFT, RT_HALIGN_CENTER, RT_HALIGN_RIGHT, RT_HALIGN_BLOCK, RT_VALIGN_TOP, RT_VALIGN_CENTER, RT_VALIGN_BOTTOM
+from Components.AnimationScheduler import animationScheduler
 from Components.Renderer.Renderer import Renderer
 from skin import parseColor, parseFont
 
@@ -61,7 +62,7 @@ class VRunningText(Renderer):
 
 		self.instance.setSize(eSize(self.W, self.H))
 		self.test_label = eLabel(instance)
-		self.mTimer = eTimer()
+		self.mTimer = animationScheduler.createTimer()
 		self.mTimer.callback.append(self.movingLoop)
 
 	def preWidgetRemove(self, instance):
@@ -15,10 +15,10 @@
 #
 #######################################################################
 
-import math
-from enigma import eCanvas, eRect, eSize, gRGB
+from enigma import eCanvas, eSize, gRGB
 from Components.Renderer.Renderer import Renderer
 from skin import parseColor
+from Tools.AnalogClock import ClockHand, getHandRects
 
 
 class VWatches(Renderer):
@@ -29,6 +29,7 @@ class VWatches(Renderer):
 		self.fColor = gRGB(255, 255, 255, 0)
 		self.bColor = gRGB(0, 0, 0, 255)
 		self.numval = -1
+		self.clockHand = ClockHand()
 
 	def applySkin(self, desktop, parent):
 		attribs = []
@@ -42,49 +43,16 @@ class VWatches(Renderer):
 		self.skinAttributes = attribs
 		return Renderer.applySkin(self, desktop, parent)
 
-	def calculate(self, w, r, m):
-		a = (w * 6)
-		z = (math.pi / 180)
-		x = int(round(r * math.sin(a * z)))
-		y = int(round(r * math.cos(a * z)))
-		return ((m + x), (m - y))
-
 	def hand(self):
-		width = self.instance.size().width()
-		height = self.instance.size().height()
-		r = (min(width, height) / 2)
-		(endX, endY,) = self.calculate(self.numval, r, r)
-		self.draw_line(r, r, endX, endY)
-
-	def draw_line(self, x0, y0, x1, y1):
-		steep = abs(y1 - y0) > abs(x1 - x0)
-		if steep:
-			x0, y0 = y0, x0
-			x1, y1 = y1, x1
-		if x0 > x1:
-			x0, x1 = x1, x0
-			y0, y1 = y1, y0
-		ystep = 1 if y0 < y1 else -1
-		deltax = x1 - x0
-		deltay = abs(y1 - y0)
-		error = -deltax / 2
-		y = int(y0)
-		for x in range(int(x0), int(x1 + 1)):
-			if steep:
-				self.instance.fillRect(eRect(y, x, 1, 3), self.fColor)
-			else:
-				self.instance.fillRect(eRect(x, y, 1, 3), self.fColor)
-			error = error + deltay
-			if error > 0:
-				y = y + ystep
-				error = error - deltax
+		size = self.instance.size()
+		r = min(size.width(), size.height()) // 2
+		self.clockHand.draw(self.instance, getHandRects(self.numval, r, r, r, 1, 3), self.fColor, self.bColor)
 
 	def changed(self, what):
 		if what[0] != self.CHANGED_CLEAR:
 			value = self.source.value
 			if self.instance and self.numval != value:
 				self.numval = value
-				self.instance.clear(self.bColor)
 				self.hand()
 
 	def postWidgetCreate(self, instance):
@@ -96,3 +64,4 @@ class VWatches(Renderer):
 			if ((attrib == "size") and self.instance.setSize(parseSize(value))):
 				pass
 		self.instance.clear(self.bColor)
+		self.clockHand.reset()
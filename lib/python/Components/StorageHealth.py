@@ -0,0 +1,270 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from json import dump, load
+from os import W_OK, access, makedirs, rename, statvfs
+from os.path import getsize, isdir, realpath
+from time import time
+
+from enigma import eTimer
+from twisted.internet.threads import deferToThread
+
+from Components.MountTable import mountTable
+from Tools.Directories import SCOPE_CONFIG, resolveFilename
+
+MODULE_NAME = __name__.split(".")[-1]
+
+BITRATES_FILE = resolveFilename(SCOPE_CONFIG, "recordingbitrates.json")
+PROBE_INTERVAL = 60  # Seconds between the probes of the locations of the running and upcoming recordings.
+PROBE_TIMEOUT = 10  # Seconds after which a location that did not answer is unresponsive.
+PROBE_WAIT = 2  # Seconds the check of a location after a write error waits for its probe.
+PROBE_WORKERS = 4  # Threads probing the locations, a location that does not answer keeps one busy.
+LOOKAHEAD = 3600  # Seconds ahead that upcoming recordings are probed and counted in the needed space.
+MINIMUM_FREE = 1024 * 1000000  # Bytes that must be free to start a recording.
+DEFAULT_BITRATE = 1000000  # Bytes per second of a service without a finished recording, about 8 Mbit/s.
+BITRATE_WEIGHT = 0.3  # Weight of a new measurement in the average bitrate of a service.
+MINIMUM_DURATION = 60  # Seconds a recording must have run to measure the bitrate.
+
+
+class StorageVerdict:
+	PENDING = 0
+	OK = 1
+	NOT_FOUND = 2
+	NOT_WRITABLE = 3
+	FULL = 4
+	UNRESPONSIVE = 5
+
+	ERROR_NUMBERS = {PENDING: 1, NOT_FOUND: 1, UNRESPONSIVE: 1, NOT_WRITABLE: 2, FULL: 3}  # The mountPathErrorNumber of RecordTimerEntry.
+	TEXTS = {PENDING: _("being checked"), OK: _("available"), NOT_FOUND: _("not available"), NOT_WRITABLE: _("not writable"), FULL: _("full"), UNRESPONSIVE: _("not responding")}
+
+	def __init__(self, path, state, mountPoint=None, free=None, safePath=None):
+		self.path = path
+		self.state = state
+		self.mountPoint = mountPoint
+		self.free = free
+		self.safePath = safePath  # The real path of the location, it exists on a mounted storage.
+		self.needed = 0
+		self.time = time()
+
+	def __repr__(self):
+		return "StorageVerdict(path=%s, state=%s, free=%s, needed=%s)" % (self.path, self.getText(), self.free, self.needed)
+
+	def getText(self):
+		return self.TEXTS[self.state]
+
+	def getErrorNumber(self):
+		return self.ERROR_NUMBERS.get(self.state, 0)
+
+	def isPending(self):
+		return self.state == self.PENDING
+
+	def isUsable(self):
+		return self.state == self.OK
+
+	def isShort(self):
+		"""Returns True if the running and upcoming recordings on the mount
+		will need more space than is free."""
+		return self.free is not None and self.needed + MINIMUM_FREE > self.free
+
+
+def probePath(path):  # Runs in a thread, this may block on a network mount.
+	"""Returns the state, mount point, free bytes and safe path of the
+	location, a missing directory on a mounted storage is created like
+	findSafeRecordPath() of RecordTimer does."""
+	path = realpath(path)
+	mountPoint = mountTable.findMountPoint(path)
+	if not mountTable.isMountPoint(mountPoint):
+		return StorageVerdict.NOT_FOUND, mountPoint, None, None
+	if not isdir(path):
+		try:
+			makedirs(path)
+		except OSError as err:
+			print("[%s] Error %d: Failed to create directory '%s'!  (%s)" % (MODULE_NAME, err.errno, path, err.strerror))
+			return StorageVerdict.NOT_FOUND, mountPoint, None, None
+	if not access(path, W_OK):
+		return StorageVerdict.NOT_WRITABLE, mountPoint, None, path
+	status = statvfs(path)  # Not the cached statvfs of the mount table, the probe must reach the storage.
+	free = status.f_bavail * status.f_frsize
+	return StorageVerdict.FULL if free < MINIMUM_FREE else StorageVerdict.OK, mountPoint, free, path
+
+
+class StorageHealthMonitor:
+	"""Checks the recording locations in the background.
+
+	The locations of the running and upcoming recordings are probed in
+	threads every PROBE_INTERVAL seconds, a location that does not answer
+	within PROBE_TIMEOUT seconds is unresponsive and no further probe is
+	started until it answered.  The record timers only read the verdicts
+	and never wait for the storage, the locations of new timers are probed
+	when they are added.  Only the check after a write error waits up to
+	PROBE_WAIT seconds for a new probe.  The space needed on a mount is the
+	bitrate of each service, measured on its finished recordings, times the
+	remaining duration of all the running and upcoming recordings on it."""
+
+	def __init__(self):
+		self.recordTimer = None
+		self.timer = None
+		self.verdicts = {}  # Indexed by the path, the value is the last StorageVerdict.
+		self.probing = {}  # Indexed by the path, the value is the time the probe started and its future.
+		self.executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+		self.warned = set()  # The timers that were already warned about missing space.
+		self.bitrates = self.loadBitrates()  # Indexed by the service reference, the value is the average bytes per second.
+
+	def start(self, recordTimer):
+		self.recordTimer = recordTimer
+		if self.timer is None:
+			self.timer = eTimer()
+			self.timer.callback.append(self.probeAll)
+			self.timer.start(PROBE_INTERVAL * 1000, False)
+
+	def loadBitrates(self):
+		try:
+			with open(BITRATES_FILE) as fd:
+				return {service: float(bitrate) for service, bitrate in load(fd).items()}
+		except FileNotFoundError:
+			pass
+		except (OSError, ValueError, AttributeError) as err:
+			print("[%s] Error: Unable to load the recording bitrates from '%s'!  (%s)" % (MODULE_NAME, BITRATES_FILE, err))
+		return {}
+
+	def saveBitrates(self):
+		try:
+			with open("%s.tmp" % BITRATES_FILE, "w") as fd:
+				dump(self.bitrates, fd)
+			rename("%s.tmp" % BITRATES_FILE, BITRATES_FILE)
+		except OSError as err:
+			print("[%s] Error %d: Unable to save the recording bitrates to '%s'!  (%s)" % (MODULE_NAME, err.errno, BITRATES_FILE, err.strerror))
+
+	def getBitrate(self, service):
+		return self.bitrates.get(str(service), DEFAULT_BITRATE)
+
+	def addRecording(self, service, filename, duration):
+		"""Measures the bitrate of a finished recording of the service."""
+		if duration >= MINIMUM_DURATION:
+			deferToThread(getsize, filename).addCallbacks(self.recordingMeasured, self.recordingNotMeasured, callbackArgs=(str(service), duration), errbackArgs=(filename,))
+
+	def recordingMeasured(self, size, service, duration):
+		if size:
+			bitrate = size / duration
+			previous = self.bitrates.get(service)
+			self.bitrates[service] = bitrate if previous is None else previous + BITRATE_WEIGHT * (bitrate - previous)
+			self.saveBitrates()
+
+	def recordingNotMeasured(self, failure, filename):
+		print("[%s] Error: Unable to measure the recording '%s'!  (%s)" % (MODULE_NAME, filename, failure.getErrorMessage()))
+
+	def getTimerPath(self, timer):
+		from Components.UsageConfig import defaultMoviePath
+		return timer.dirname or defaultMoviePath()
+
+	def getTimers(self, now):
+		"""Returns the running and upcoming recordings within LOOKAHEAD."""
+		if self.recordTimer is None:
+			return []
+		return [timer for timer in self.recordTimer.timer_list if not timer.justplay and not timer.disabled and timer.begin < now + LOOKAHEAD and timer.end > now]
+
+	def getNeeded(self, mountPoint, now=None):
+		"""Returns the bytes the running and upcoming recordings will still
+		write to the mount."""
+		now = now or time()
+		needed = 0
+		for timer in self.getTimers(now):
+			verdict = self.verdicts.get(self.getTimerPath(timer))
+			if verdict and verdict.mountPoint == mountPoint:
+				needed += self.getBitrate(timer.service_ref) * (timer.end - max(timer.begin, now))
+		return int(needed)
+
+	def getVerdict(self, path, maximumAge=PROBE_INTERVAL):
+		"""Returns the last verdict of the path, a probe is started if it is
+		older than maximumAge seconds.  A path without a verdict is PENDING."""
+		verdict = self.verdicts.get(path)
+		if verdict is None or time() - verdict.time > maximumAge:
+			self.probe(path)
+			verdict = self.verdicts.get(path) or StorageVerdict(path, StorageVerdict.PENDING)
+		if verdict.mountPoint:
+			verdict.needed = self.getNeeded(verdict.mountPoint)
+		return verdict
+
+	def checkPath(self, path):
+		"""Returns the verdict of a new probe of the path, the probe is waited
+		for up to PROBE_WAIT seconds.  This is only used after a write error,
+		a path that did not answer in time is UNRESPONSIVE."""
+		started, future = self.probing.get(path, (None, None))
+		if started is None or time() - started <= PROBE_TIMEOUT:  # A location that is not responding is not probed again.
+			self.probing.pop(path, None)  # A running probe may have reached the storage before the write error.
+			self.probe(path)
+			self.waitForProbe(path, PROBE_WAIT)
+		if path in self.probing:
+			verdict = self.verdicts.get(path)
+			return StorageVerdict(path, StorageVerdict.UNRESPONSIVE, verdict and verdict.mountPoint)
+		return self.verdicts[path]
+
+	def probeTimer(self, timer):
+		"""Starts a probe of the location of a new timer that was not
+		probed yet."""
+		if not timer.justplay and not timer.disabled:
+			path = self.getTimerPath(timer)
+			if path not in self.verdicts:
+				self.probe(path)
+
+	def probe(self, path):
+		if path not in self.probing:
+			future = self.executor.submit(probePath, path)
+			self.probing[path] = (time(), future)
+			future.add_done_callback(lambda future, path=path: self.probeLate(path, future))
+		elif time() - self.probing[path][0] > PROBE_TIMEOUT:
+			verdict = self.verdicts.get(path)
+			if verdict is None or verdict.state != StorageVerdict.UNRESPONSIVE:
+				print("[%s] Recording location '%s' is not responding." % (MODULE_NAME, path))
+				self.verdicts[path] = StorageVerdict(path, StorageVerdict.UNRESPONSIVE, verdict and verdict.mountPoint)
+
+	def waitForProbe(self, path, timeout):
+		started, future = self.probing.get(path, (None, None))
+		if future and wait((future,), timeout=timeout).done:
+			self.probeDone(path, future)
+
+	def probeLate(self, path, future):  # Runs in the thread of the probe.
+		from twisted.internet import reactor
+		reactor.callFromThread(self.probeDone, path, future)
+
+	def probeDone(self, path, future):
+		started, current = self.probing.get(path, (None, None))
+		if current is not future:  # The result was already taken by waitForProbe().
+			return
+		del self.probing[path]
+		try:
+			state, mountPoint, free, safePath = future.result()
+		except Exception as err:
+			print("[%s] Error: Unable to check the recording location '%s'!  (%s)" % (MODULE_NAME, path, err))
+			state, mountPoint, free, safePath = StorageVerdict.NOT_FOUND, None, None, None
+		self.verdicts[path] = StorageVerdict(path, state, mountPoint, free, safePath)
+
+	def probeAll(self):
+		now = time()
+		timers = self.getTimers(now)
+		paths = set(self.getTimerPath(timer) for timer in timers)
+		for path in paths:
+			self.probe(path)
+		for timer in timers:
+			self.checkTimer(timer, now)
+		self.warned.intersection_update(timers)
+
+	def checkTimer(self, timer, now):
+		if timer in self.warned:
+			return
+		verdict = self.verdicts.get(self.getTimerPath(timer))
+		if verdict is None or verdict.state == StorageVerdict.PENDING:
+			return
+		if verdict.isUsable():
+			verdict.needed = self.getNeeded(verdict.mountPoint, now)
+			if not verdict.isShort():
+				return
+			text = _("The recording '%s' may not fit on '%s', %d MB are free but the recordings need about %d MB.") % (timer.name, verdict.mountPoint, verdict.free // 1000000, (verdict.needed + MINIMUM_FREE) // 1000000)
+		else:
+			text = _("The location '%s' of the recording '%s' is %s.") % (verdict.path, timer.name, verdict.getText())
+		print("[%s] %s" % (MODULE_NAME, text))
+		self.warned.add(timer)
+		from Screens.MessageBox import MessageBox
+		from Tools.Notifications import AddPopup
+		AddPopup(text, type=MessageBox.TYPE_WARNING, timeout=20, id="RecordingStorageWarning")
+
+
+storageHealth = StorageHealthMonitor()
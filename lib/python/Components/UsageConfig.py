@@ -78,6 +78,7 @@ def InitUsageConfig():
 	config.usage.sort_extensionslist = ConfigYesNo(default=False)
 	config.usage.show_restart_network_extensionslist = ConfigYesNo(default=True)
 	config.usage.sort_pluginlist = ConfigYesNo(default=True)
+	config.usage.lazyPluginLoading = ConfigYesNo(default=True)
 	config.usage.helpSortOrder = ConfigSelection(default="headings+alphabetic", choices=[
 		("headings+alphabetic", _("Alphabetical under headings")),
 		("flat+alphabetic", _("Flat alphabetical")),
@@ -1279,7 +1280,7 @@ def InitUsageConfig():
 	config.misc.epgcachepath.addNotifier(EpgCacheChanged, immediate_feedback=False)
 	config.misc.epgcachefilename.addNotifier(EpgCacheChanged, immediate_feedback=False)
 
-	def partitionListChanged(action, device):
+	def partitionListChanged(changes):
 		hddchoises = [("/etc/enigma2/", _("Internal Flash"))]
 		for partition in harddiskmanager.getMountedPartitions():
 			if exists(partition.mountpoint):
@@ -1292,7 +1293,7 @@ def InitUsageConfig():
 			eEPGCache.getInstance().setCacheFile("")
 			config.misc.epgcachepath.value = config.misc.epgcachepath.saved_value
 
-	harddiskmanager.on_partition_list_change.append(partitionListChanged)
+	harddiskmanager.on_partition_list_batch.append(partitionListChanged)
 
 	choiceList = [
 		("", _("Auto Detect")),
@@ -1467,6 +1468,23 @@ def InitUsageConfig():
 	config.crash.pystackonspinner = ConfigYesNo(default=True)
 	config.crash.pystackonspinner.addNotifier(updateStackTracePrinter, immediate_feedback=False, call_on_save_or_cancel=True, initial_call=True)
 
+	def updateLoopTraceThreshold(configElement):
+		from Tools.LoopTracer import loopTracer
+		loopTracer.threshold = configElement.value
+
+	config.crash.looptrace = ConfigYesNo(default=False)  # This is read by enigma2.sh, it sets ENIGMA_LOOP_TRACE.
+	config.crash.looptracethreshold = ConfigSelectionNumber(default=50, stepwidth=10, min=10, max=500, wraparound=True)
+	config.crash.looptracethreshold.addNotifier(updateLoopTraceThreshold)
+
+	def updateKeyLatency(configElement):
+		from Tools.KeyLatency import keyLatency
+		if keyLatency.enabled and not configElement.value:
+			keyLatency.dump()
+		keyLatency.setEnabled(configElement.value)
+
+	config.crash.keylatency = ConfigYesNo(default=False)
+	config.crash.keylatency.addNotifier(updateKeyLatency)
+
 	config.usage.timerlist_finished_timer_position = ConfigSelection(default="end", choices=[
 		("beginning", _("At beginning")),
 		("end", _("At end"))
@@ -1,9 +1,10 @@
-from Components.Task import Task, Job, DiskspacePrecondition, Condition
+from Components.Task import Task, Job, PythonTask, DiskspacePrecondition, Condition
 from Components.Harddisk import harddiskmanager
 from Tools.Directories import SCOPE_HDD, resolveFilename, createDir
 from time import strftime
 from .Process import CheckDiskspaceTask, getISOfilename, BurnTask, RemoveWorkspaceFolder
 from .Project import iso639language
+from .EntryPoints import packEPMap, scanEntrypoints
 import struct
 import os
 import re
@@ -17,6 +18,12 @@ AUDIO_CHANNELS = {"reserved": 0, "mono": 1, "dual mono": 2, "stereo": 3, "multi"
 AUDIO_RATES = {48000: 1, 96000: 4, 192000: 5, 48 / 192: 12, 48 / 96: 14}
 
 
+def writeBDMVFile(workspace, filename, data):
+	for directory in ("BDMV/", "BDMV/BACKUP/"):
+		with open(workspace + directory + filename, "wb") as fd:
+			fd.write(data)
+
+
 class BludiscTitle:
 	def __init__(self, title):
 		object.__setattr__(self, "_title", title)
@@ -60,24 +67,24 @@ class BludiscTitle:
 
 	def getInTimeBytes(self):
 		in_time = self.entrypoints[0][1]  # first keyframe (in 90khz pts)
-		return struct.pack('>L', in_time / 2)  # start time (in 45khz ticks)
+		return struct.pack('>L', in_time // 2)  # start time (in 45khz ticks)
 
 	def getOutTimeBytes(self):
 		out_time = self.entrypoints[-1][1]  # last keyframe (in 90khz pts)
-		struct.pack('>L', out_time / 2)  # end time (in 45khz ticks)
+		return struct.pack('>L', out_time // 2)  # end time (in 45khz ticks)
 
 	InTime = property(getInTimeBytes)
 	OutTime = property(getOutTimeBytes)
 
 	def getNumSourcePackets(self):
-		num_source_packets = self.muxed_size / 192
+		num_source_packets = self.muxed_size // 192
 		return struct.pack('>L', num_source_packets)
 
 	def getTsRecordingRate(self):
-		clip_len_seconds = (self.entrypoints[-1][1] - self.entrypoints[0][1]) / 90000
+		clip_len_seconds = (self.entrypoints[-1][1] - self.entrypoints[0][1]) // 90000
 		if self.length > clip_len_seconds:
 			clip_len_seconds = self.length
-		ts_recording_rate = self.muxed_size / clip_len_seconds  # ! possible lack in accuracy
+		ts_recording_rate = self.muxed_size // max(clip_len_seconds, 1)  # ! possible lack in accuracy
 		return struct.pack('>L', ts_recording_rate)
 
 	def getEPforOffsetPTS(self, requested_pts):
@@ -87,7 +94,7 @@ class BludiscTitle:
 				best_pts = ep_pts
 			else:
 				break
-		return best_pts / 2
+		return best_pts // 2
 
 
 class BludiscStream:
@@ -207,7 +214,7 @@ class RemuxTask(Task):
 		self.outputfile = self.job.workspace + 'BDMV/STREAM/%05d.m2ts' % self.title_no
 		self.args += [inputfile, self.outputfile, "--entrypoints", "--cutlist"]
 		self.args += self.getPIDs()
-		self.end = (self.title.filesize / 188)
+		self.end = (self.title.filesize // 188)
 		self.weighting = 1000
 
 	def getPIDs(self):
@@ -275,6 +282,25 @@ class RemuxTask(Task):
 			self.title.muxed_size = os.path.getsize(self.outputfile)
 
 
+class ScanEntrypointsTask(PythonTask):
+	# The I-frames are read from the remuxed m2ts file in one pass in a
+	# thread, the entrypoints reported by bdremux are kept as fallback.
+	def __init__(self, job, title, title_no):
+		PythonTask.__init__(self, job, "Scan entrypoints")
+		self.title = title
+		self.inputfile = job.workspace + 'BDMV/STREAM/%05d.m2ts' % title_no
+		self.entrypoints = []
+
+	def work(self):
+		self.entrypoints = scanEntrypoints(self.inputfile, 0x1011, self.title.inputfile + ".ap")
+
+	def cleanup(self, failed):
+		if not failed:
+			print("[Bludisc] Scanned %d entrypoints, bdremux reported %d." % (len(self.entrypoints), len(self.title.entrypoints)))
+			if self.entrypoints:
+				self.title.entrypoints = self.entrypoints
+
+
 class GenericPostcondition(Condition):
 	def check(self, task):
 		return task.returncode == 0
@@ -323,35 +349,35 @@ class CreateIndexTask(Task):
 			#Task.processFinished(self, 1)
 
 	def conduct(self):
-		indexbuffer = bytearray("INDX0200")
-		indexbuffer += '\x00\x00\x00\x4E'  # index_start
+		indexbuffer = bytearray(b"INDX0200")
+		indexbuffer += b'\x00\x00\x00\x4E'  # index_start
 		indexbuffer += zeros[0:4]		# extension_data_start
 		indexbuffer += zeros[0:24]		# reserved
-		indexbuffer += '\x00\x00\x00\x22'  # app_info length
-		indexbuffer += '\x00' 			# 1 bit reserved, 1 bit initial_output_mode_preference, 1 bit content_exist_flag, 5 bits reserved
+		indexbuffer += b'\x00\x00\x00\x22'  # app_info length
+		indexbuffer += b'\x00' 			# 1 bit reserved, 1 bit initial_output_mode_preference, 1 bit content_exist_flag, 5 bits reserved
 
 		num_titles = len(self.job.titles)
 		if (num_titles == 1 and len(self.job.titles[0].VideoStreams) == 1):
 			indexbuffer += self.job.titles[0].VideoStreams[0].formatByte  # video_format & frame_rate
 		else:
-			indexbuffer += '\x00' 		# video_format & frame_rate
-		indexbuffer += 'Provider Name: Dream Multimedia '  # 32 byte user data
+			indexbuffer += b'\x00' 		# video_format & frame_rate
+		indexbuffer += b'Provider Name: Dream Multimedia '  # 32 byte user data
 
 		INDEXES = bytearray(4)			# length of indexes
-		INDEXES += '\x40'			# object_type (HDMV = 0x40)
+		INDEXES += b'\x40'			# object_type (HDMV = 0x40)
 		INDEXES += zeros[0:3] 			# first playback:
-		INDEXES += '\x00\x00' 			# playback_type (Movie = 0x00)
-		INDEXES += '\x00\x00' 			# id_ref
+		INDEXES += b'\x00\x00' 			# playback_type (Movie = 0x00)
+		INDEXES += b'\x00\x00' 			# id_ref
 		INDEXES += zeros[0:4] 			# skip
-		INDEXES += '\x40'
+		INDEXES += b'\x40'
 		INDEXES += zeros[0:3]			# top menu:
-		INDEXES += '\x40\x00'			# playback_type (Interactive = 0x40)
-		INDEXES += '\xFF\xFF'			# id_ref
+		INDEXES += b'\x40\x00'			# playback_type (Interactive = 0x40)
+		INDEXES += b'\xFF\xFF'			# id_ref
 		INDEXES += zeros[0:4]
 
 		INDEXES += struct.pack('>H', num_titles)
 		for i in list(range(num_titles)):
-			HDMV_OBJ = bytearray('\x40')  # object_type & access_type
+			HDMV_OBJ = bytearray(b'\x40')  # object_type & access_type
 			HDMV_OBJ += zeros[0:3]		# skip 3 bytes
 			HDMV_OBJ += zeros[0:2]
 			HDMV_OBJ += struct.pack('>H', i)  # index 2 bytes
@@ -360,12 +386,7 @@ class CreateIndexTask(Task):
 		INDEXES[0:4] = struct.pack('>L', len(INDEXES) - 4)
 		indexbuffer += INDEXES
 
-		f = open(self.job.workspace + "BDMV/index.bdmv", 'w')
-		f.write(buffer(indexbuffer))
-		f.close()
-		f = open(self.job.workspace + "BDMV/BACKUP/index.bdmv", 'w')
-		f.write(buffer(indexbuffer))
-		f.close()
+		writeBDMVFile(self.job.workspace, "index.bdmv", indexbuffer)
 
 
 class CreateMobjTask(Task):
@@ -386,7 +407,7 @@ class CreateMobjTask(Task):
 			#Task.processFinished(self, 1)
 
 	def conduct(self):
-		mob = bytearray("MOBJ0200")
+		mob = bytearray(b"MOBJ0200")
 		mob += zeros[0:4]  # extension_data_start
 		mob += zeros[0:28]  # reserved?
 
@@ -395,12 +416,12 @@ class CreateMobjTask(Task):
 		for i in list(range(len(self.job.titles))):
 			# load title number into register0
 			instructions.append([
-				['\x50\x40\x00\x01', '\x00\x00\x00\x00', struct.pack('>L', i)],
+				[b'\x50\x40\x00\x01', b'\x00\x00\x00\x00', struct.pack('>L', i)],
 				# PLAY_PL
-				['\x22\x00\x00\x00', '\x00\x00\x00\x00', '\x00\x00\x00\x00']
+				[b'\x22\x00\x00\x00', b'\x00\x00\x00\x00', b'\x00\x00\x00\x00']
 			])
 			if i < len(self.job.titles) - 1:  # on all except last title JUMP_TITLE i+2 (JUMP_TITLE is one-based)
-				instructions[-1].append(['\x21\x81\x00\x00', struct.pack('>L', i + 2), '\x00\x00\x00\x00'])
+				instructions[-1].append([b'\x21\x81\x00\x00', struct.pack('>L', i + 2), b'\x00\x00\x00\x00'])
 
 		#SETSTREAM (first audio stream as default track) ['\x51\xC0\x00\x01','\x00\x00\x00\x00','\x80\x01\x00\x00'] #!
 
@@ -410,7 +431,7 @@ class CreateMobjTask(Task):
 		OBJECTS += struct.pack('>H', num_objects)
 		for i in list(range(num_objects)):
 			MOBJ = bytearray()
-			MOBJ += '\x80\x00'  # resume_intention_flag, menu_call_mask, title_search_maskplayback_type, 13 reserved
+			MOBJ += b'\x80\x00'  # resume_intention_flag, menu_call_mask, title_search_maskplayback_type, 13 reserved
 			num_commands = len(instructions[i])
 			MOBJ += struct.pack('>H', num_commands)
 			for c in list(range(num_commands)):
@@ -424,12 +445,7 @@ class CreateMobjTask(Task):
 
 		mob += OBJECTS
 
-		f = open(self.job.workspace + "BDMV/MovieObject.bdmv", 'w')
-		f.write(memoryview(mob))
-		f.close()
-		f = open(self.job.workspace + "BDMV/BACKUP/MovieObject.bdmv", 'w')
-		f.write(memoryview(mob))
-		f.close()
+		writeBDMVFile(self.job.workspace, "MovieObject.bdmv", mob)
 
 
 class CreateMplsTask(Task):
@@ -450,9 +466,9 @@ class CreateMplsTask(Task):
 			Task.processFinished(self, 1)
 
 	def conduct(self):
-		mplsbuffer = bytearray("MPLS0200")
+		mplsbuffer = bytearray(b"MPLS0200")
 
-		mplsbuffer += '\x00\x00\x00\x3a'  # playlist_start_address #Position of PlayList, from beginning of file
+		mplsbuffer += b'\x00\x00\x00\x3a'  # playlist_start_address #Position of PlayList, from beginning of file
 
 		mplsbuffer += zeros[0:4]  # playlist_mark_start_address Position of PlayListMark, from beginning of file
 		mplsbuffer += zeros[0:4]  # extension_data_start_address= bytearray(4)
@@ -460,12 +476,12 @@ class CreateMplsTask(Task):
 
 		AppInfoPlayList = bytearray()  # length of AppInfoPlayList (4 bytes)
 
-		AppInfoPlayList += '\x00'  # reserved 1 byte
-		AppInfoPlayList += '\x01'  # playlist_playback_type
+		AppInfoPlayList += b'\x00'  # reserved 1 byte
+		AppInfoPlayList += b'\x01'  # playlist_playback_type
 		AppInfoPlayList += zeros[0:2]  # reserved 2 bytes
 		AppInfoPlayList += zeros[0:8]  # UO_mask_table
 
-		AppInfoPlayList += '\x40\x00'  # playlist_random_access_flag, audio_mix_app_flag, lossless_may_bypass_mixer_flag, 13 bit reserved_for_word_align
+		AppInfoPlayList += b'\x40\x00'  # playlist_random_access_flag, audio_mix_app_flag, lossless_may_bypass_mixer_flag, 13 bit reserved_for_word_align
 
 		mplsbuffer += bytearray(struct.pack('>L', len(AppInfoPlayList)))
 		mplsbuffer += AppInfoPlayList
@@ -497,15 +513,15 @@ class CreateMplsTask(Task):
 		for item_i in list(range(num_of_playitems)):
 			PlayItem = bytearray()
 			clip_no = "%05d" % self.mpls_num
-			PlayItem += bytearray(clip_no)
-			PlayItem += "M2TS"
-			PlayItem += '\x00\x01'			# reserved 11 bits & 1 bit is_multi_angle & connection_condition
-			PlayItem += '\x00'			# stc_id
+			PlayItem += clip_no.encode()
+			PlayItem += b"M2TS"
+			PlayItem += b'\x00\x01'			# reserved 11 bits & 1 bit is_multi_angle & connection_condition
+			PlayItem += b'\x00'			# stc_id
 			PlayItem += self.title.InTime		# start time (in 45khz ticks)
 			PlayItem += self.title.OutTime		# end time (in 45khz ticks)
 			PlayItem += zeros[0:8]			# UO_mask_table
-			PlayItem += '\x00'			# random_access_flag (uppermost bit, 0=permit) & reserved 7 bits
-			PlayItem += '\x01\x00\x02'		# still_mode & still_time (in s)
+			PlayItem += b'\x00'			# random_access_flag (uppermost bit, 0=permit) & reserved 7 bits
+			PlayItem += b'\x01\x00\x02'		# still_mode & still_time (in s)
 
 			StnTable = bytearray()  # len 4 bytes
 			StnTable += zeros[0:2]  # reserved
@@ -521,33 +537,33 @@ class CreateMplsTask(Task):
 			for vid in self.title.VideoStreams:
 				print("adding vid", vid, type(vid))
 				VideoEntry = bytearray(1)  # len
-				VideoEntry += '\x01'		# type 01 = elementary stream of the clip used by the PlayItem
+				VideoEntry += b'\x01'		# type 01 = elementary stream of the clip used by the PlayItem
 
 				VideoEntry += vid.pid		# stream_pid
 				VideoEntry += zeros[0:6]  # reserved
-				VideoEntry[0] = struct.pack('B', len(VideoEntry) - 1)
+				VideoEntry[0] = len(VideoEntry) - 1
 
 				VideoAttr = bytearray(1)  # len
 				VideoAttr += vid.streamType  # Video type
 				VideoAttr += vid.formatByte  # Format & Framerate
 				VideoAttr += zeros[0:3]		# reserved
-				VideoAttr[0] = struct.pack('B', len(VideoAttr) - 1)
+				VideoAttr[0] = len(VideoAttr) - 1
 
 				StnTable += VideoEntry
 				StnTable += VideoAttr
 
 			for aud in self.title.AudioStreams:
 				AudioEntry = bytearray(1)  # len
-				AudioEntry += '\x01'		# type 01 = elementary stream of the clip used by the PlayItem
+				AudioEntry += b'\x01'		# type 01 = elementary stream of the clip used by the PlayItem
 				AudioEntry += aud.pid		# stream_pid
 				AudioEntry += zeros[0:6]  # reserved
-				AudioEntry[0] = struct.pack('B', len(AudioEntry) - 1)
+				AudioEntry[0] = len(AudioEntry) - 1
 
 				AudioAttr = bytearray(1)  # len
 				AudioAttr += aud.streamType  # stream_coding_type
 				AudioAttr += aud.formatByte  # Audio Format & Samplerate
-				AudioAttr += aud.languageCode  # Audio Language Code
-				AudioAttr[0] = struct.pack('B', len(AudioAttr) - 1)
+				AudioAttr += aud.languageCode.encode()  # Audio Language Code
+				AudioAttr[0] = len(AudioAttr) - 1
 
 				StnTable += AudioEntry
 				StnTable += AudioAttr
@@ -566,11 +582,11 @@ class CreateMplsTask(Task):
 
 		if len(self.title.entrypoints) == 0:
 			print("no entry points found for this title!")
-			self.title.entrypoints.append(0)
+			self.title.entrypoints.append((0, 0))
 
 		#playlist mark list [(id, type, timestamp, skip duration)]
 		#! implement cutlist / skip marks
-		markslist = [(0, 1, self.title.entrypoints[0][1] / 2, 0)]
+		markslist = [(0, 1, self.title.entrypoints[0][1] // 2, 0)]
 		mark_id = 1
 		try:
 			for chapter_pts in self.title.chaptermarks:
@@ -592,19 +608,14 @@ class CreateMplsTask(Task):
 			MarkEntry += struct.pack('B', mark_type)  # mark_type 00=resume, 01=bookmark, 02=skip mark
 			MarkEntry += struct.pack('>H', item_i)  # play_item_ref (number of PlayItem that the mark is for
 			MarkEntry += struct.pack('>L', mark_ts)  # (in 45khz time ticks)
-			MarkEntry += '\xFF\xFF'			# entry_ES_PID
+			MarkEntry += b'\xFF\xFF'			# entry_ES_PID
 			MarkEntry += struct.pack('>L', skip_dur)  # for skip marks: skip duration
 			PlayListMark += MarkEntry
 
 		mplsbuffer += struct.pack('>L', len(PlayListMark))
 		mplsbuffer += PlayListMark
 
-		f = open(self.job.workspace + "BDMV/PLAYLIST/%05d.mpls" % self.mpls_num, 'w')
-		f.write(buffer(mplsbuffer))
-		f.close()
-		f = open(self.job.workspace + "BDMV/BACKUP/PLAYLIST/%05d.mpls" % self.mpls_num, 'w')
-		f.write(buffer(mplsbuffer))
-		f.close()
+		writeBDMVFile(self.job.workspace, "PLAYLIST/%05d.mpls" % self.mpls_num, mplsbuffer)
 
 
 class CreateClpiTask(Task):
@@ -627,10 +638,10 @@ class CreateClpiTask(Task):
 			#Task.processFinished(self, 1)
 
 	def conduct(self):
-		clpibuffer = bytearray("HDMV0200")		#type_indicator
+		clpibuffer = bytearray(b"HDMV0200")		#type_indicator
 
-		clpibuffer += '\x00\x00\x00\xdc'		#sequence_info_start_address
-		clpibuffer += '\x00\x00\x00\xf6'		#program_info_start_address
+		clpibuffer += b'\x00\x00\x00\xdc'		#sequence_info_start_address
+		clpibuffer += b'\x00\x00\x00\xf6'		#program_info_start_address
 		clpibuffer += zeros[0:4]			#cpi_start_address
 		clpibuffer += zeros[0:4]			#clip_mark_start_address
 		clpibuffer += zeros[0:4]			#ext_data_start_address
@@ -638,16 +649,16 @@ class CreateClpiTask(Task):
 
 		ClipInfo = bytearray(4)				# len 4 bytes
 		ClipInfo += zeros[0:2]				# reserved
-		ClipInfo += '\x01'				# clip_stream_type
-		ClipInfo += '\x01'				# application_type
-		ClipInfo += '\x00\x00\x00\x00'			# 31 bit reserved + 1 bit is_cc5 (seamless connection condition)
+		ClipInfo += b'\x01'				# clip_stream_type
+		ClipInfo += b'\x01'				# application_type
+		ClipInfo += b'\x00\x00\x00\x00'			# 31 bit reserved + 1 bit is_cc5 (seamless connection condition)
 		ClipInfo += self.title.getTsRecordingRate()  # transport stream bitrate
 		ClipInfo += self.title.getNumSourcePackets()  # number_source_packets
 		ClipInfo += zeros[0:128]
 
-		TS_type_info_block = bytearray('\x00\x1E')  # len 2 bytes
-		TS_type_info_block += '\x80'			# validity flags
-		TS_type_info_block += 'HDMV'			# format_id
+		TS_type_info_block = bytearray(b'\x00\x1E')  # len 2 bytes
+		TS_type_info_block += b'\x80'			# validity flags
+		TS_type_info_block += b'HDMV'			# format_id
 		TS_type_info_block += zeros[0:25]		# nit/stream_format_name?
 		ClipInfo += TS_type_info_block
 
@@ -655,16 +666,16 @@ class CreateClpiTask(Task):
 
 		num_stc_sequences = 1
 		SequenceInfo = bytearray(4)			# len 4 bytes
-		SequenceInfo += '\x00'				# reserved
-		SequenceInfo += '\x01'				# num_atc_sequences
-		SequenceInfo += '\x00\x00\x00\x00'		# spn_atc_start
+		SequenceInfo += b'\x00'				# reserved
+		SequenceInfo += b'\x01'				# num_atc_sequences
+		SequenceInfo += b'\x00\x00\x00\x00'		# spn_atc_start
 		SequenceInfo += struct.pack('B', num_stc_sequences)
-		SequenceInfo += '\x00'				# offset_stc_id
+		SequenceInfo += b'\x00'				# offset_stc_id
 		num_of_playitems = 1
 		for _ in range(num_of_playitems):
 			STCEntry = bytearray()
-			STCEntry += '\x10\x01'			# pcr_pid #!
-			STCEntry += '\x00\x00\x00\x00'		# spn_stc_start
+			STCEntry += b'\x10\x01'			# pcr_pid #!
+			STCEntry += b'\x00\x00\x00\x00'		# spn_stc_start
 			STCEntry += self.title.InTime		# presentation_start_time (in 45khz)
 			STCEntry += self.title.OutTime		# presentation_end_time (in 45khz)
 			SequenceInfo += STCEntry
@@ -674,18 +685,18 @@ class CreateClpiTask(Task):
 		num_streams_in_ps = len(self.title.VideoStreams) + len(self.title.AudioStreams)
 
 		ProgramInfo = bytearray(4)			# len 4 bytes
-		ProgramInfo += '\x00'				# reserved align
+		ProgramInfo += b'\x00'				# reserved align
 		ProgramInfo += struct.pack('B', num_program_sequences)
 		for _ in range(num_program_sequences):
 			ProgramEntry = bytearray()
-			ProgramEntry += '\x00\x00\x00\x00'  # spn_program_sequence_start
-			ProgramEntry += '\x01\x00'		# program_map_pid
+			ProgramEntry += b'\x00\x00\x00\x00'  # spn_program_sequence_start
+			ProgramEntry += b'\x01\x00'		# program_map_pid
 			ProgramEntry += struct.pack('B', num_streams_in_ps)
-			ProgramEntry += '\x00'			# num_groups
+			ProgramEntry += b'\x00'			# num_groups
 			for stream in self.title.VideoStreams + self.title.AudioStreams:
 				StreamEntry = bytearray()
 				StreamEntry += stream.pid  # stream_pid
-				StreamCodingInfo = bytearray('\x15')		# len 1 byte
+				StreamCodingInfo = bytearray(b'\x15')		# len 1 byte
 				StreamCodingInfo += stream.streamType
 				if stream.isVideo:
 					StreamCodingInfo += stream.formatByte  # video_format & framerate
@@ -693,35 +704,20 @@ class CreateClpiTask(Task):
 					StreamCodingInfo += zeros[0:2]		#reserved
 				elif stream.isAudio:
 					StreamCodingInfo += stream.formatByte  # audio_presentation_type & samplerate
-					StreamCodingInfo += stream.languageCode  # audio language code
+					StreamCodingInfo += stream.languageCode.encode()  # audio language code
 				for _ in range(12):
-					StreamCodingInfo += '\x30'  # 12 byte padding with ascii char '0'
+					StreamCodingInfo += b'\x30'  # 12 byte padding with ascii char '0'
 				StreamCodingInfo += zeros[0:4]		# 4 byte reserved
 				StreamEntry += StreamCodingInfo
 				ProgramEntry += StreamEntry
 			ProgramInfo += ProgramEntry
 		ProgramInfo[0:4] = struct.pack('>L', len(ProgramInfo) - 4)
 
-		coarse_entrypoints = []  # [(presentation_time_stamp, source_packet_number, ref_ep_fine_id)]
-		fine_entrypoints = []  # [(presentation_time_stamp, source_packet_number)]
-
-		prev_coarse = -1
-		prev_spn = -1
-		fine_ref = -1
-		for entrypoint in self.title.entrypoints:
-			fine_entrypoints.append((entrypoint[1], entrypoint[0]))
-			coarse_pts = entrypoint[1] & 0x1FFF80000
-			high_spn = (entrypoint[0] & 0xFFFE0000)
-			fine_ref += 1
-
-			if coarse_pts > prev_coarse or high_spn > prev_spn:
-				coarse_entrypoints.append((entrypoint[1], entrypoint[0], fine_ref))
-			prev_coarse = coarse_pts
-			prev_spn = high_spn
+		num_ep_coarse, num_ep_fine, EP_MAP_STREAM = packEPMap(self.title.entrypoints)
 
 		CPI = bytearray(4)		# len 4 bytes
-		CPI += '\x00\x01' 		# reserved_align & cpi_type = ep_map
-		EP_MAP = bytearray('\x00')  # reserved_align
+		CPI += b'\x00\x01' 		# reserved_align & cpi_type = ep_map
+		EP_MAP = bytearray(b'\x00')  # reserved_align
 		num_stream_pid = len(self.title.VideoStreams)
 		EP_MAP += struct.pack('B', num_stream_pid)
 
@@ -730,73 +726,33 @@ class CreateClpiTask(Task):
 			EP_STREAMS += stream.pid
 
 			ap_stream_type = 1
-			num_ep_coarse = len(coarse_entrypoints)
-			num_ep_fine = len(fine_entrypoints)
 			ep_bits = ((num_ep_fine & 0x3FFFF) + ((num_ep_coarse & 0xFFFF) << 0x12) + ((ap_stream_type & 0xF) << 0x22))
 			# 10 bits align, 4 bits ap_stream_type, 16 bits number_ep_coarse, 18 bits number_ep_fine
 			EP_STREAMS += struct.pack('>3H', ((ep_bits & 0xFFFF00000000) >> 0x20), ((ep_bits & 0xFFFF0000) >> 0x10), ep_bits & 0xFFFF)
-			EP_STREAMS += '\x00\x00\x00\x0e'  # ep_map_stream_start_addr
+			EP_STREAMS += b'\x00\x00\x00\x0e'  # ep_map_stream_start_addr
 			EP_MAP += EP_STREAMS
 
-		EP_MAP_STREAM = ""
-		for stream in self.title.VideoStreams:
-			EP_MAP_STREAM = bytearray(4)  # len
-			for ep in coarse_entrypoints:
-				EP_MAP_STREAM_COARSE = bytearray()
-
-				pts_ep_coarse = (ep[0] & 0x1FFF80000) >> 19
-				spn_ep_coarse = ep[1]
-				ref_ep_fine_id = ep[2]
-
-				coarse_bits = (pts_ep_coarse & 0x3FFF) + ((ref_ep_fine_id & 0x3FFFF) << 0xE)
-
-				EP_MAP_STREAM_COARSE += struct.pack('>L', coarse_bits)
-				EP_MAP_STREAM_COARSE += struct.pack('>L', spn_ep_coarse)
-
-				EP_MAP_STREAM += EP_MAP_STREAM_COARSE
-
-			EP_MAP_STREAM[0:4] = struct.pack('>L', len(EP_MAP_STREAM))
-
-			for ep in fine_entrypoints:
-				EP_MAP_STREAM_FINE = bytearray()
-
-				is_angle_change_point = 0
-				i_end_position_offset = 1
-
-				pts_ep_fine = (ep[0] & 0xFFE00) >> 0x09
-				spn_ep_fine = (ep[1] & 0x1FFFF)
-
-				fine_bits = (spn_ep_fine & 0x1FFFF) + ((pts_ep_fine & 0x7FF) << 0x11) + (i_end_position_offset << 0x1C) + (is_angle_change_point << 0x1F)
-
-				EP_MAP_STREAM_FINE += struct.pack('>L', fine_bits)
-
-				EP_MAP_STREAM += EP_MAP_STREAM_FINE
-
-		EP_MAP += EP_MAP_STREAM
+		if self.title.VideoStreams:
+			EP_MAP += EP_MAP_STREAM
 		CPI += EP_MAP
 		CPI[0:4] = struct.pack('>L', len(CPI) - 4)
 
 		clpibuffer += ClipInfo
 		while len(clpibuffer) < 0xDC:
-			clpibuffer += '\x30'  # insert padding
+			clpibuffer += b'\x30'  # insert padding
 		clpibuffer += SequenceInfo
 		while len(clpibuffer) < 0xF6:
-			clpibuffer += '\x30'  # insert padding
+			clpibuffer += b'\x30'  # insert padding
 		clpibuffer += ProgramInfo
 		while len(clpibuffer) < 0x134:
-			clpibuffer += '\x30'  # insert padding
+			clpibuffer += b'\x30'  # insert padding
 		clpibuffer[0x10:0x14] = struct.pack('>L', len(clpibuffer))  # cpi_start_address
 
 		clpibuffer += CPI
 		clpibuffer[0x14:0x18] = struct.pack('>L', len(clpibuffer))  # clip_mark_start_address
 		clpibuffer += zeros[0:4]
 
-		f = open(self.job.workspace + "BDMV/CLIPINF/%05d.clpi" % self.clip_num, 'w')
-		f.write(memoryview(clpibuffer))
-		f.close()
-		f = open(self.job.workspace + "BDMV/BACKUP/CLIPINF/%05d.clpi" % self.clip_num, 'w')
-		f.write(memoryview(clpibuffer))
-		f.close()
+		writeBDMVFile(self.job.workspace, "CLIPINF/%05d.clpi" % self.clip_num, clpibuffer)
 
 
 class CopyThumbTask(Task):
@@ -877,6 +833,7 @@ class BDMVJob(Job):
 		CreateStructureTask(self)
 		for i, title in enumerate(self.titles):
 			RemuxTask(self, title, i)
+			ScanEntrypointsTask(self, title, i)
 		CreateIndexTask(self)
 		CreateMobjTask(self)
 		for i, title in enumerate(self.titles):
@@ -0,0 +1,134 @@
+from array import array
+from os.path import exists
+from sys import byteorder
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+M2TS_PACKET_SIZE = 192  # 4 byte TP_extra_header + 188 byte transport packet
+SCAN_CHUNK_SIZE = M2TS_PACKET_SIZE * 4096
+UINT32 = "I" if array("I").itemsize == 4 else "L"
+UINT64 = "Q"
+
+
+def _toBigEndian(data):
+	if byteorder == "little":
+		data.byteswap()
+	return data.tobytes()
+
+
+def _fineEntry(spn, pts):
+	# 1 bit is_angle_change_point, 3 bits i_end_position_offset, 11 bits pts_ep_fine, 17 bits spn_ep_fine
+	return (spn & 0x1FFFF) | (((pts & 0xFFE00) >> 9) << 17) | (1 << 28)
+
+
+def packEPMap(entrypoints):
+	"""Pack [(source_packet_number, presentation_time_stamp)] into the coarse
+	and fine tables of a CLPI EP map stream.  Returns (number_ep_coarse,
+	number_ep_fine, ep_map_stream) with ep_map_stream already starting with
+	the 4 byte ep_fine_table_start_address."""
+	count = len(entrypoints)
+	if numpy is not None and count:
+		ep = numpy.array(entrypoints, dtype=numpy.int64).reshape(-1, 2)
+		spn = ep[:, 0]
+		pts = ep[:, 1]
+		coarsePts = pts & 0x1FFF80000
+		highSpn = spn & 0xFFFE0000
+		mask = numpy.ones(count, dtype=bool)
+		mask[1:] = (coarsePts[1:] > coarsePts[:-1]) | (highSpn[1:] > highSpn[:-1])
+		fineRef = numpy.nonzero(mask)[0]
+		coarse = numpy.empty((len(fineRef), 2), dtype=">u4")
+		coarse[:, 0] = ((coarsePts[fineRef] >> 19) & 0x3FFF) | ((fineRef & 0x3FFFF) << 14)
+		coarse[:, 1] = spn[fineRef] & 0xFFFFFFFF
+		fine = ((spn & 0x1FFFF) | (((pts & 0xFFE00) >> 9) << 17) | (1 << 28)).astype(">u4")
+		numCoarse = len(fineRef)
+		coarseBytes = coarse.tobytes()
+		fineBytes = fine.tobytes()
+	else:
+		coarse = array(UINT32)
+		prevCoarse = -1
+		prevSpn = -1
+		for fineRef, (spn, pts) in enumerate(entrypoints):
+			coarsePts = pts & 0x1FFF80000
+			highSpn = spn & 0xFFFE0000
+			if coarsePts > prevCoarse or highSpn > prevSpn:
+				coarse.append(((coarsePts >> 19) & 0x3FFF) | ((fineRef & 0x3FFFF) << 14))
+				coarse.append(spn & 0xFFFFFFFF)
+			prevCoarse = coarsePts
+			prevSpn = highSpn
+		numCoarse = len(coarse) // 2
+		coarseBytes = _toBigEndian(coarse)
+		fineBytes = _toBigEndian(array(UINT32, [_fineEntry(spn, pts) for spn, pts in entrypoints]))
+	fineStart = array(UINT32, [4 + len(coarseBytes)])
+	return numCoarse, count, _toBigEndian(fineStart) + coarseBytes + fineBytes
+
+
+def readAccessPoints(filename):
+	"""Read the (offset, pts) pairs of a recording's ".ap" index."""
+	data = array(UINT64)
+	try:
+		with open(filename, "rb") as fd:
+			raw = fd.read()
+	except OSError as err:
+		print("[EntryPoints] Error %d: Unable to read access points from '%s'!  (%s)" % (err.errno, filename, err.strerror))
+		return []
+	data.frombytes(raw[:len(raw) - len(raw) % 16])
+	if byteorder == "little":
+		data.byteswap()
+	return list(zip(data[0::2], data[1::2]))
+
+
+def _parsePTS(packet, offset):
+	# packet[offset] is the first byte of the PES packet_start_code_prefix.
+	if len(packet) < offset + 14 or packet[offset:offset + 3] != b"\x00\x00\x01" or not packet[offset + 7] & 0x80:
+		return None
+	p = packet[offset + 9:offset + 14]
+	return ((p[0] >> 1) & 0x07) << 30 | p[1] << 22 | (p[2] >> 1) << 15 | p[3] << 7 | p[4] >> 1
+
+
+def scanEntrypoints(filename, pid=0x1011, apfile=None):
+	"""Derive [(source_packet_number, presentation_time_stamp)] for the
+	I-frames of a BDAV m2ts file in a single pass.  A video PES start is an
+	entry point if its adaptation field carries the random_access_indicator
+	or, when the source recording's ".ap" file is given, if its PTS is one
+	of the recording's access points."""
+	apPts = set()
+	if apfile and exists(apfile):
+		apPts = set(pts for offset, pts in readAccessPoints(apfile))
+	# Sync byte followed by payload_unit_start_indicator and the PID.
+	header = bytes((0x47, 0x40 | ((pid >> 8) & 0x1F), pid & 0xFF))
+	entrypoints = []
+	base = 0
+	try:
+		with open(filename, "rb") as fd:
+			while True:
+				chunk = fd.read(SCAN_CHUNK_SIZE)
+				if len(chunk) < M2TS_PACKET_SIZE:
+					break
+				pos = chunk.find(header, 4)
+				while pos != -1:
+					start = pos - 4
+					if start % M2TS_PACKET_SIZE:
+						pos = chunk.find(header, pos + 1)
+						continue
+					packet = chunk[start:start + M2TS_PACKET_SIZE]
+					if len(packet) < M2TS_PACKET_SIZE:
+						break
+					control = (packet[7] >> 4) & 0x03
+					payload = 8
+					randomAccess = False
+					if control & 0x02:
+						randomAccess = packet[8] > 0 and bool(packet[9] & 0x40)
+						payload += 1 + packet[8]
+					if control & 0x01 and payload < M2TS_PACKET_SIZE:
+						pts = _parsePTS(packet, payload)
+						if pts is not None and (randomAccess or pts in apPts):
+							entrypoints.append(((base + start) // M2TS_PACKET_SIZE, pts))
+					pos = chunk.find(header, start + M2TS_PACKET_SIZE + 4)
+				base += len(chunk)
+	except OSError as err:
+		print("[EntryPoints] Error %d: Unable to scan '%s'!  (%s)" % (err.errno, filename, err.strerror))
+		return []
+	return entrypoints
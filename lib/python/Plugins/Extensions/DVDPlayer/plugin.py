@@ -72,16 +72,17 @@ def filescan(**kwargs):
 		)]
 
 
-def onPartitionChange(action, partition):
-	print("[@] onPartitionChange", action, partition)
-	if partition != harddiskmanager.getCD():
-		global detected_DVD
-		if action == 'remove':
-			print("[DVDplayer] DVD removed")
-			detected_DVD = False
-		elif action == 'add':
-			print("[DVDplayer] DVD Inserted")
-			detected_DVD = None
+def onPartitionChange(changes):
+	global detected_DVD
+	for action, partition in changes:
+		print("[@] onPartitionChange", action, partition)
+		if partition != harddiskmanager.getCD():
+			if action == 'remove':
+				print("[DVDplayer] DVD removed")
+				detected_DVD = False
+			elif action == 'add':
+				print("[DVDplayer] DVD Inserted")
+				detected_DVD = None
 
 
 def menu(menuid, **kwargs):
@@ -95,8 +96,8 @@ def menu(menuid, **kwargs):
 				detected_DVD = True
 			else:
 				detected_DVD = False
-			if onPartitionChange not in harddiskmanager.on_partition_list_change:
-				harddiskmanager.on_partition_list_change.append(onPartitionChange)
+			if onPartitionChange not in harddiskmanager.on_partition_list_batch:
+				harddiskmanager.on_partition_list_batch.append(onPartitionChange)
 		if detected_DVD:
 			return [(_("DVD player"), play, "dvd_player", 46)]
 	return []
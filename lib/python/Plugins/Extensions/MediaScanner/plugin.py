@@ -77,14 +77,15 @@ def menuHook(menuid):
 global_session = None
 
 
-def partitionListChanged(action, device):
+def partitionListChanged(changes):
 	if InfoBar.instance:
 		if InfoBar.instance.execing:
-			if action == 'add' and device.is_hotplug:
-				#print "mountpoint", device.mountpoint
-				#print "description", device.description
-				#print "force_mounted", device.force_mounted
-				mountpoint_choosen((device.description, device.mountpoint, global_session))
+			parts = [(device.description, device.mountpoint, global_session) for action, device in changes if action == 'add' and device.is_hotplug]
+			if len(parts) == 1:
+				mountpoint_choosen(parts[0])
+			elif parts:  # Several media were plugged in at once.
+				from Screens.ChoiceBox import ChoiceBox
+				global_session.openWithCallback(mountpoint_choosen, ChoiceBox, title=_("Please select medium to be scanned"), list=parts)
 		#else:
 			#print "main infobar is not execing... so we ignore hotplug event!"
 	#else:
@@ -99,9 +100,9 @@ def sessionstart(reason, session):
 def autostart(reason, **kwargs):
 	global global_session
 	if reason == 0:
-		harddiskmanager.on_partition_list_change.append(partitionListChanged)
+		harddiskmanager.on_partition_list_batch.append(partitionListChanged)
 	elif reason == 1:
-		harddiskmanager.on_partition_list_change.remove(partitionListChanged)
+		harddiskmanager.on_partition_list_batch.remove(partitionListChanged)
 		global_session = None
 
 
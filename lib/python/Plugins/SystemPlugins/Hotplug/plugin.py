@@ -5,9 +5,11 @@ from twisted.internet.protocol import Protocol, Factory
 
 from Plugins.Plugin import PluginDescriptor
 from Components.Harddisk import harddiskmanager
+from Components.Netlink import HotplugEventPump, parseEvent
 
 # globals
-hotplugNotifier = []
+hotplugNotifier = []  # Called with (dev, action) for every change.
+hotplugBatchNotifier = []  # Called once per batch with the list of (dev, action) of all the changes.
 audiocd = False
 
 
@@ -20,6 +22,20 @@ def AudiocdAdded():
 
 
 def processHotplugData(self, v):
+	change = processHotplugEvent(v)
+	notifyHotplugChanges([change])
+
+
+def processHotplugBatch(events):
+	harddiskmanager.beginPartitionChanges()
+	try:
+		changes = [processHotplugEvent(v) for v in events if v.get("DEVPATH")]
+	finally:
+		harddiskmanager.endPartitionChanges()
+	notifyHotplugChanges(changes)
+
+
+def processHotplugEvent(v):
 	print("[Hotplug.plugin.py]:", v)
 	action = v.get("ACTION")
 	device = v.get("DEVPATH")
@@ -61,12 +77,26 @@ def processHotplugData(self, v):
 			harddiskmanager.addHotplugPartition(dev, physdevpath)
 		elif media_state == "0":
 			harddiskmanager.removeHotplugPartition(dev)
+	return dev, action or media_state
 
-	for callback in hotplugNotifier:
+
+def notifyHotplugChanges(changes):
+	for callback in hotplugNotifier[:]:
+		for dev, action in changes:
+			try:
+				callback(dev, action)
+			except AttributeError:
+				hotplugNotifier.remove(callback)
+				break
+	for callback in hotplugBatchNotifier[:]:
 		try:
-			callback(dev, action or media_state)
+			callback(changes)
 		except AttributeError:
-			hotplugNotifier.remove(callback)
+			hotplugBatchNotifier.remove(callback)
+
+
+hotplugPump = HotplugEventPump()
+hotplugPump.subscribers.append(processHotplugBatch)
 
 
 class Hotplug(Protocol):
@@ -85,13 +115,7 @@ class Hotplug(Protocol):
 
 	def connectionLost(self, reason):
 		print("[Hotplug.plugin.py] connection lost!")
-		data = self.received.split("\0")[:-1]
-		v = {}
-		for x in data:
-			i = x.find("=")
-			var, val = x[:i], x[i + 1:]
-			v[var] = val
-		processHotplugData(self, v)
+		hotplugPump.push(parseEvent(self.received))
 
 
 def autostart(reason, **kwargs):
@@ -355,6 +355,11 @@ class EPGFetcher:
         self.channel_service_map = None
         self.service_set = None
 
+        # Local timer index and the timer updates batched while
+        # processTimers() reconciles the server's timer list.
+        self.timer_index = None
+        self.pending_updates = None
+
         # Status updates for timers that can't be processed at
         # the time that a status change is flagged (e.g. for instant
         # timers that don't initially have an IceTV id.
@@ -400,6 +405,8 @@ class EPGFetcher:
         # print "[IceTV] timer added: ", entry
         if not self.shouldProcessTimer(entry):
             return
+        if self.queueTimerUpdate(entry):
+            return
         # print "[IceTV] Add timer job"
         reactor.callInThread(self.postTimer, entry)
 
@@ -425,6 +432,9 @@ class EPGFetcher:
             # New timer as far as IceTV is concerned
             # print "[IceTV] Add timer job"
             reactor.callInThread(self.postTimer, entry)
+        elif self.queueTimerUpdate(entry):
+            # Sent with the other timer updates at the end of the sync
+            return
         else:
             # print "[IceTV] Modify timer jobs"
             ice_timer_id = entry.ice_timer_id
@@ -805,94 +815,166 @@ class EPGFetcher:
         self.addLog("EPG download OK")
         return res
 
+    def buildTimerIndex(self):
+        # Hash the local timers once per sync so that reconciling the
+        # server's timer list is linear rather than quadratic
+        record_timer = _session.nav.RecordTimer
+        index = {
+            "active": {},
+            "processed": {},
+            "service_begin": {},
+        }
+        for timer in record_timer.timer_list:
+            if timer.ice_timer_id:
+                index["active"][timer.ice_timer_id] = timer
+            index["service_begin"][(str(timer.service_ref), timer.begin)] = timer
+        for timer in record_timer.processed_timers:
+            if timer.ice_timer_id:
+                index["processed"][timer.ice_timer_id] = timer
+        return index
+
+    def startTimerBatch(self):
+        self.timer_index = self.buildTimerIndex()
+        self.pending_updates = {}
+
+    def finishTimerBatch(self, update_queue):
+        # Merge the updates queued by onTimerAdded()/onTimerChanged()
+        # during the sync with the server state changes, so that they
+        # are all sent in a single putTimers() call
+        pending = self.pending_updates or {}
+        self.pending_updates = None
+        self.timer_index = None
+        queued = set(six.ensure_str(iceTimer["id"]) for iceTimer in update_queue)
+        for ice_timer_id, local_timer in pending.items():
+            if ice_timer_id not in queued:
+                timer = self.makeTimerUpdate(local_timer)
+                if timer:
+                    update_queue.append(timer)
+        return update_queue
+
+    def queueTimerUpdate(self, entry):
+        if self.pending_updates is not None and entry.ice_timer_id:
+            self.pending_updates[entry.ice_timer_id] = entry
+            return True
+        return False
+
     def processTimers(self, timers):
         update_queue = []
-        for iceTimer in timers:
-            # print "[IceTV] iceTimer:", iceTimer
-            try:
-                action = six.ensure_str(iceTimer.get("action", ""))
-                state = six.ensure_str(iceTimer.get("state", ""))
-                name = six.ensure_str(iceTimer.get("name", ""))
-                start = int(timegm(strptime(iceTimer["start_time"].split("+")[0], "%Y-%m-%dT%H:%M:%S")))
-                duration = 60 * int(iceTimer["duration_minutes"])
-                channel_id = int(iceTimer["channel_id"])
-                ice_timer_id = six.ensure_str(iceTimer["id"])
-                if action == "forget":
-                    for timer in _session.nav.RecordTimer.timer_list:
-                        if timer.ice_timer_id == ice_timer_id:
+        save_timers = False
+        record_timer = _session.nav.RecordTimer
+        self.startTimerBatch()
+        index = self.timer_index
+        try:
+            for iceTimer in timers:
+                # print "[IceTV] iceTimer:", iceTimer
+                try:
+                    action = six.ensure_str(iceTimer.get("action", ""))
+                    state = six.ensure_str(iceTimer.get("state", ""))
+                    name = six.ensure_str(iceTimer.get("name", ""))
+                    start = int(timegm(strptime(iceTimer["start_time"].split("+")[0], "%Y-%m-%dT%H:%M:%S")))
+                    duration = 60 * int(iceTimer["duration_minutes"])
+                    channel_id = int(iceTimer["channel_id"])
+                    ice_timer_id = six.ensure_str(iceTimer["id"])
+                    if action == "forget":
+                        timer = index["active"].pop(ice_timer_id, None)
+                        if timer is not None:
                             # print "[IceTV] removing timer:", timer
-                            _session.nav.RecordTimer.removeEntry(timer)
-                            break
-                    else:
-                        self.deleteTimer(ice_timer_id)
-                elif state == "completed":
-                    continue    # Completely ignore completed timers - the server should not be sending those back to us anyway.
-                elif channel_id in self.channel_service_map:
-                    completed = False
-                    for timer in _session.nav.RecordTimer.processed_timers:
-                        if timer.ice_timer_id == ice_timer_id:
+                            index["service_begin"].pop((str(timer.service_ref), timer.begin), None)
+                            record_timer.removeEntry(timer, dosave=False)
+                            save_timers = True
+                        else:
+                            self.deleteTimer(ice_timer_id)
+                    elif state == "completed":
+                        continue    # Completely ignore completed timers - the server should not be sending those back to us anyway.
+                    elif channel_id in self.channel_service_map:
+                        completed = False
+                        if ice_timer_id in index["processed"]:
                             # print "[IceTV] completed timer:", timer
                             iceTimer["state"] = "completed"
                             iceTimer["message"] = "Done"
                             update_queue.append(iceTimer)
                             completed = True
-                    updated = False
-                    if not completed:
-                        for timer in _session.nav.RecordTimer.timer_list:
-                            if timer.ice_timer_id == ice_timer_id:
-                                # print "[IceTV] updating timer:", timer
-                                eit = int(iceTimer.get("eit_id", -1))
-                                if eit <= 0:
-                                    eit = None
-                                if self.updateTimer(timer, name, start - config.recording.margin_before.value * 60, start + duration + config.recording.margin_after.value * 60, eit, self.channel_service_map[channel_id]):
-                                    if not self.modifyTimer(timer):
-                                        iceTimer["state"] = "failed"
-                                        iceTimer["message"] = "Failed to update timer '%s'" % name
-                                        update_queue.append(iceTimer)
-                                        self.addLog("Failed to update timer '%s" % name)
-                                else:
-                                    iceTimer["state"] = "pending"
-                                    iceTimer["message"] = "Timer already up to date '%s'" % name
-                                    update_queue.append(iceTimer)
-                                updated = True
-                    created = False
-                    if not completed and not updated:
-                        channels = self.channel_service_map[channel_id]
-                        # print "[IceTV] channel_id %s maps to" % channel_id, channels
-                        db = eDVBDB.getInstance()
-                        # Sentinel values used if there are no channel matches
-                        iceTimer["state"] = "failed"
-                        iceTimer["message"] = "No matching service"
-                        for channel in channels:
-                            serviceref = db.searchReference(channel[1], channel[0], channel[2])
-                            if serviceref.valid():
-                                serviceref = ServiceReference(eServiceReference(serviceref))
-                                # print "[IceTV] New %s is valid" % str(serviceref), serviceref.getServiceName()
-                                eit = int(iceTimer.get("eit_id", -1))
-                                if eit <= 0:
-                                    eit = None
-                                recording = RecordTimerEntry(serviceref, start - config.recording.margin_before.value * 60, start + duration + config.recording.margin_after.value * 60, name, "", eit, ice_timer_id=ice_timer_id)
-                                conflicts = _session.nav.RecordTimer.record(recording)
-                                if conflicts is None:
-                                    iceTimer["state"] = "pending"
-                                    iceTimer["message"] = "Added"
-                                    created = True
-                                    break
+                        updated = False
+                        timer = None if completed else index["active"].get(ice_timer_id)
+                        if timer is not None:
+                            # print "[IceTV] updating timer:", timer
+                            eit = int(iceTimer.get("eit_id", -1))
+                            if eit <= 0:
+                                eit = None
+                            old_key = (str(timer.service_ref), timer.begin)
+                            if self.updateTimer(timer, name, start - config.recording.margin_before.value * 60, start + duration + config.recording.margin_after.value * 60, eit, self.channel_service_map[channel_id]):
+                                if self.modifyTimer(timer):
+                                    save_timers = True
                                 else:
-                                    names = [r.name for r in conflicts]
                                     iceTimer["state"] = "failed"
-                                    iceTimer["message"] = "Timer conflict: '%s'" % "', '".join(names)
-                                    # print "[IceTV] Timer conflict:", conflicts
-                                    self.addLog("Timer '%s' conflicts with %s" % (name, "', '".join([n for n in names if n != name])))
-                    if not completed and not updated and not created:
+                                    iceTimer["message"] = "Failed to update timer '%s'" % name
+                                    update_queue.append(iceTimer)
+                                    self.addLog("Failed to update timer '%s" % name)
+                                if index["service_begin"].get(old_key) is timer:
+                                    del index["service_begin"][old_key]
+                                index["service_begin"][(str(timer.service_ref), timer.begin)] = timer
+                            else:
+                                iceTimer["state"] = "pending"
+                                iceTimer["message"] = "Timer already up to date '%s'" % name
+                                update_queue.append(iceTimer)
+                            updated = True
+                        created = False
+                        if not completed and not updated:
+                            channels = self.channel_service_map[channel_id]
+                            # print "[IceTV] channel_id %s maps to" % channel_id, channels
+                            db = eDVBDB.getInstance()
+                            # Sentinel values used if there are no channel matches
+                            iceTimer["state"] = "failed"
+                            iceTimer["message"] = "No matching service"
+                            for channel in channels:
+                                serviceref = db.searchReference(channel[1], channel[0], channel[2])
+                                if serviceref.valid():
+                                    serviceref = ServiceReference(eServiceReference(serviceref))
+                                    # print "[IceTV] New %s is valid" % str(serviceref), serviceref.getServiceName()
+                                    eit = int(iceTimer.get("eit_id", -1))
+                                    if eit <= 0:
+                                        eit = None
+                                    begin = start - config.recording.margin_before.value * 60
+                                    local_timer = index["service_begin"].get((str(serviceref), begin))
+                                    if local_timer is not None and not local_timer.ice_timer_id:
+                                        # A local timer for the same event that IceTV
+                                        # does not know about yet - adopt it
+                                        local_timer.ice_timer_id = ice_timer_id
+                                        index["active"][ice_timer_id] = local_timer
+                                        iceTimer["state"] = "pending"
+                                        iceTimer["message"] = "Added"
+                                        created = True
+                                        save_timers = True
+                                        break
+                                    recording = RecordTimerEntry(serviceref, begin, start + duration + config.recording.margin_after.value * 60, name, "", eit, ice_timer_id=ice_timer_id)
+                                    conflicts = record_timer.record(recording, dosave=False)
+                                    if conflicts is None:
+                                        index["active"][ice_timer_id] = recording
+                                        index["service_begin"][(str(serviceref), begin)] = recording
+                                        iceTimer["state"] = "pending"
+                                        iceTimer["message"] = "Added"
+                                        created = True
+                                        save_timers = True
+                                        break
+                                    else:
+                                        names = [r.name for r in conflicts]
+                                        iceTimer["state"] = "failed"
+                                        iceTimer["message"] = "Timer conflict: '%s'" % "', '".join(names)
+                                        # print "[IceTV] Timer conflict:", conflicts
+                                        self.addLog("Timer '%s' conflicts with %s" % (name, "', '".join([n for n in names if n != name])))
+                        if not completed and not updated and not created:
+                            iceTimer["state"] = "failed"
+                            update_queue.append(iceTimer)
+                    else:
                         iceTimer["state"] = "failed"
+                        iceTimer["message"] = "No valid service mapping for channel_id %d" % channel_id
                         update_queue.append(iceTimer)
-                else:
-                    iceTimer["state"] = "failed"
-                    iceTimer["message"] = "No valid service mapping for channel_id %d" % channel_id
-                    update_queue.append(iceTimer)
-            except (OSError, RuntimeError, KeyError) as ex:
-                print("[IceTV] Can not process iceTimer:", ex)
+                except (OSError, RuntimeError, KeyError) as ex:
+                    print("[IceTV] Can not process iceTimer:", ex)
+        finally:
+            update_queue = self.finishTimerBatch(update_queue)
+        if save_timers:
+            record_timer.saveTimers()
         # Send back updated timer states
         res = True
         try:
@@ -915,14 +997,10 @@ class EPGFetcher:
 
     def isIceTimerInLocalTimerList(self, iceTimer, ignoreCompleted=False):
         ice_timer_id = six.ensure_str(iceTimer["id"])
-        for timer in _session.nav.RecordTimer.timer_list:
-            if timer.ice_timer_id == ice_timer_id:
-                return True
-        if not ignoreCompleted:
-            for timer in _session.nav.RecordTimer.processed_timers:
-                if timer.ice_timer_id == ice_timer_id:
-                    return True
-        return False
+        index = self.timer_index or self.buildTimerIndex()
+        if ice_timer_id in index["active"]:
+            return True
+        return not ignoreCompleted and ice_timer_id in index["processed"]
 
     def isIceTVEpgChannel(self, service):
         sref = eServiceReference(service)
@@ -1010,30 +1088,36 @@ class EPGFetcher:
             return res.get("timers", [])
         return []
 
+    def makeTimerUpdate(self, local_timer):
+        if not local_timer.eit:
+            self.addLog("Timer '%s' has no event id; update not sent to IceTV" % local_timer.name)
+            return None
+        timer = {}
+        timer["id"] = local_timer.ice_timer_id
+        timer["eit_id"] = local_timer.eit
+        timer["start_time"] = strftime("%Y-%m-%dT%H:%M:%S+00:00", gmtime(local_timer.begin + config.recording.margin_before.value * 60))
+        timer["duration_minutes"] = ((local_timer.end - config.recording.margin_after.value * 60) - (local_timer.begin + config.recording.margin_before.value * 60)) // 60
+        if local_timer.isRunning():
+            timer["state"] = "running"
+            timer["message"] = "Recording on %s" % config.plugins.icetv.device.label.value
+        elif local_timer.state == RecordTimerEntry.StateEnded:
+            timer["state"] = "completed"
+            timer["message"] = "Recorded on %s" % config.plugins.icetv.device.label.value
+        elif local_timer.state == RecordTimerEntry.StateFailed:
+            timer["state"] = "failed"
+            timer["message"] = "Failed to record"
+        else:
+            timer["state"] = "pending"
+            timer["message"] = "Will record on %s" % config.plugins.icetv.device.label.value
+        return timer
+
     def putTimer(self, local_timer):
         try:
             # print "[IceTV] updating ice_timer", local_timer.ice_timer_id
             req = ice.Timer(local_timer.ice_timer_id)
-            timer = {}
-            if not local_timer.eit:
-                self.addLog("Timer '%s' has no event id; update not sent to IceTV" % local_timer.name)
+            timer = self.makeTimerUpdate(local_timer)
+            if not timer:
                 return
-            timer["id"] = local_timer.ice_timer_id
-            timer["eit_id"] = local_timer.eit
-            timer["start_time"] = strftime("%Y-%m-%dT%H:%M:%S+00:00", gmtime(local_timer.begin + config.recording.margin_before.value * 60))
-            timer["duration_minutes"] = ((local_timer.end - config.recording.margin_after.value * 60) - (local_timer.begin + config.recording.margin_before.value * 60)) // 60
-            if local_timer.isRunning():
-                timer["state"] = "running"
-                timer["message"] = "Recording on %s" % config.plugins.icetv.device.label.value
-            elif local_timer.state == RecordTimerEntry.StateEnded:
-                timer["state"] = "completed"
-                timer["message"] = "Recorded on %s" % config.plugins.icetv.device.label.value
-            elif local_timer.state == RecordTimerEntry.StateFailed:
-                timer["state"] = "failed"
-                timer["message"] = "Failed to record"
-            else:
-                timer["state"] = "pending"
-                timer["message"] = "Will record on %s" % config.plugins.icetv.device.label.value
             req.data["timers"] = [timer]
             res = req.put().json()
             self.addLog("Timer '%s' updated OK" % local_timer.name)
@@ -9,10 +9,89 @@ from Components.ConfigList import ConfigListScreen
 from Components.config import getConfigListEntry, config, ConfigSubsection, ConfigYesNo, ConfigSelection, configfile
 from Tools.Directories import resolveFilename, SCOPE_CONFIG
 from Plugins.Plugin import PluginDescriptor
+from bisect import insort
+import ast
 import os
 import sys
 import xml.etree.cElementTree
 
+DUPLICATE_OFFSET = 16536  # Added to the LCN of a service that lost a clash, the duplicates follow the regular services.
+
+
+class RenumberRule():
+	"""A "renumber" rule of rules.xml.  The expression is parsed once and may
+	only be integer arithmetic of the LCN called "value", for example
+	"value * 10"."""
+	NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.UAdd, ast.USub)
+
+	def __init__(self, range, expression):
+		low, high = range.split("-")  # ValueError if the range is not "min-max".
+		self.low = int(low)
+		self.high = int(high)
+		self.expression = (expression or "").strip()
+		tree = ast.parse(self.expression, mode="eval")  # SyntaxError is a ValueError.
+		for node in ast.walk(tree):
+			if not isinstance(node, self.NODES) or (isinstance(node, ast.Name) and node.id != "value") or (isinstance(node, ast.Constant) and type(node.value) is not int):
+				raise ValueError("%s is not allowed in the rule '%s'" % (type(node).__name__, self.expression))
+		self.code = compile(tree, "<renumber %s>" % range, "eval")
+
+	def apply(self, lcn):
+		if self.low <= lcn <= self.high:
+			return int(eval(self.code, {"__builtins__": {}}, {"value": lcn}))
+		return lcn
+
+
+class LCNTable():
+	"""The allocation of the LCNs.  The services are indexed by their LCN and
+	the LCNs are kept sorted.  A clash is won by the stronger signal and on
+	the same signal by the lower service reference, so the result does not
+	depend on the order of the lcndb.  The service that lost moves up by
+	DUPLICATE_OFFSET, where it may clash again."""
+
+	def __init__(self):
+		self.services = {}  # Indexed by the LCN, the value is [lcn, namespace, nid, tsid, sid, signal].
+		self.lcns = []  # The sorted keys of self.services.
+		self.requested = set()  # The (lcn, namespace, nid, tsid, sid) that were added.
+
+	def __len__(self):
+		return len(self.lcns)
+
+	def add(self, namespace, nid, tsid, sid, lcn, signal):
+		key = (lcn, namespace, nid, tsid, sid)
+		if lcn == 0 or key in self.requested:
+			return
+		self.requested.add(key)
+		self.allocate([lcn, namespace, nid, tsid, sid, signal])
+
+	def allocate(self, entry):
+		lcn = entry[0]
+		while True:
+			current = self.services.get(lcn)
+			if current is None:
+				entry[0] = lcn
+				self.services[lcn] = entry
+				insort(self.lcns, lcn)
+				return
+			if (-entry[5], entry[1:5]) < (-current[5], current[1:5]):
+				entry[0] = lcn
+				self.services[lcn] = entry
+				entry = current
+			lcn += DUPLICATE_OFFSET
+
+	def renumber(self, rule):
+		entries = self.getList()
+		self.services = {}
+		self.lcns = []
+		for entry in entries:
+			entry[0] = rule.apply(entry[0])
+			if entry[0] > 0:
+				self.allocate(entry)
+			else:
+				print("[LCNScanner] Renumber rule '%d-%d' moved service %x:%x:%x:%x to LCN %d, it is dropped." % (rule.low, rule.high, entry[4], entry[3], entry[2], entry[1], entry[0]))
+
+	def getList(self):
+		return [self.services[lcn] for lcn in self.lcns]
+
 
 class LCN():
 	service_types_tv = '1:7:1:0:0:0:0:0:0:0:(type == 1) || (type == 17) || (type == 22) || (type == 25) || (type == 134) || (type == 195)'
@@ -21,105 +100,77 @@ class LCN():
 	def __init__(self, dbfile, rulefile, rulename, bouquetfile):
 		self.dbfile = dbfile
 		self.bouquetfile = bouquetfile
+		self.table = LCNTable()
 		self.lcnlist = []
 		self.markers = []
 		self.e2services = []
+		self.e2index = {}  # Indexed by the sid, tsid, onid and namespace fields of the service reference, the value is the reference.
+		self.rules = []  # List of (type, rule) of the ruleset, the rule is a RenumberRule or the (position, text) of a marker.
 		mdom = xml.etree.cElementTree.parse(rulefile)
-		self.root = None
 		for x in mdom.getroot():
 			if x.tag == "ruleset" and x.get("name") == rulename:
-				self.root = x
+				for rule in x:
+					if rule.tag == "rule":
+						try:
+							if rule.get("type") == "renumber":
+								self.rules.append(("renumber", RenumberRule(rule.get("range"), rule.text)))
+							elif rule.get("type") == "marker":
+								self.rules.append(("marker", (int(rule.get("position")), rule.text)))
+						except (ValueError, TypeError, AttributeError) as err:
+							print("[LCNScanner] Error: Ignoring the rule '%s' of ruleset '%s'!  (%s)" % (rule.text, rulename, err))
 				return
 
 	def addLcnToList(self, namespace, nid, tsid, sid, lcn, signal):
-		for x in self.lcnlist:
-			if x[0] == lcn and x[1] == namespace and x[2] == nid and x[3] == tsid and x[4] == sid:
-				return
-
-		if lcn == 0:
-			return
-
-		for i in list(range(0, len(self.lcnlist))):
-			if self.lcnlist[i][0] == lcn:
-				if self.lcnlist[i][5] > signal:
-					self.addLcnToList(namespace, nid, tsid, sid, lcn + 16536, signal)
-				else:
-					znamespace = self.lcnlist[i][1]
-					znid = self.lcnlist[i][2]
-					ztsid = self.lcnlist[i][3]
-					zsid = self.lcnlist[i][4]
-					zsignal = self.lcnlist[i][5]
-					self.lcnlist[i][1] = namespace
-					self.lcnlist[i][2] = nid
-					self.lcnlist[i][3] = tsid
-					self.lcnlist[i][4] = sid
-					self.lcnlist[i][5] = signal
-					self.addLcnToList(znamespace, znid, ztsid, zsid, lcn + 16536, zsignal)
-				return
-			elif self.lcnlist[i][0] > lcn:
-				self.lcnlist.insert(i, [lcn, namespace, nid, tsid, sid, signal])
-				return
-
-		self.lcnlist.append([lcn, namespace, nid, tsid, sid, signal])
+		self.table.add(namespace, nid, tsid, sid, lcn, signal)
 
 	def renumberLcn(self, range, rule):
-		tmp = range.split("-")
-		if len(tmp) != 2:
-			return
-
-		min = int(tmp[0])
-		max = int(tmp[1])
-
-		for x in self.lcnlist:
-			if x[0] >= min and x[0] <= max:
-				value = x[0]
-				cmd = "x[0] = " + rule
-				try:
-					exec(cmd)
-				except Exception as e:
-					print(e)
+		try:
+			self.table.renumber(RenumberRule(range, rule))
+		except (ValueError, TypeError, AttributeError) as err:
+			print("[LCNScanner] Error: Ignoring the renumber rule '%s'!  (%s)" % (rule, err))
 
 	def addMarker(self, position, text):
 		self.markers.append([position, text])
 
 	def read(self, serviceType):
 		self.readE2Services(serviceType)
+		self.readLcnDb()
+		self.applyRules()
 
+	def readLcnDb(self):
+		self.table = LCNTable()
+		self.lcnlist = []
 		try:
 			f = open(self.dbfile)
 		except Exception as e:
 			print(e)
 			return
 
-		while True:
-			line = f.readline()
-			if line == "":
-				break
-
-			line = line.strip()
-			#print line
-			if len(line) != 38:
-				continue
-
-			tmp = line.split(":")
-			if len(tmp) != 6:
-				continue
+		with f:
+			for line in f:
+				line = line.strip()
+				if len(line) != 38:
+					continue
 
-			self.addLcnToList(int(tmp[0], 16), int(tmp[1], 16), int(tmp[2], 16), int(tmp[3], 16), int(tmp[4]), int(tmp[5]))
+				tmp = line.split(":")
+				if len(tmp) != 6:
+					continue
 
-		if self.root is not None:
-			for x in self.root:
-				if x.tag == "rule":
-					if x.get("type") == "renumber":
-						self.renumberLcn(x.get("range"), x.text)
-						self.lcnlist.sort(key=lambda z: int(z[0]))
-					elif x.get("type") == "marker":
-						self.addMarker(int(x.get("position")), x.text)
+				self.addLcnToList(int(tmp[0], 16), int(tmp[1], 16), int(tmp[2], 16), int(tmp[3], 16), int(tmp[4]), int(tmp[5]))
 
+	def applyRules(self):
+		self.markers = []
+		for type, rule in self.rules:
+			if type == "renumber":
+				self.table.renumber(rule)
+			elif type == "marker":
+				self.addMarker(*rule)
+		self.lcnlist = self.table.getList()
 		self.markers.sort(key=lambda z: int(z[0]))
 
 	def readE2Services(self, serviceType):
 		self.e2services = []
+		self.e2index = {}
 		if serviceType == "TV":
 			refstr = '%s ORDER BY name' % (self.service_types_tv)
 		elif serviceType == "RADIO":
@@ -135,7 +186,9 @@ class LCN():
 
 				unsigned_orbpos = service.getUnsignedData(4) >> 16
 				if unsigned_orbpos == 0xEEEE:  # Terrestrial
-					self.e2services.append(service.toString())
+					refstr = service.toString()
+					self.e2services.append(refstr)
+					self.e2index.setdefault(tuple(refstr.split(":")[3:7]), refstr)
 
 	def writeTVBouquet(self):
 		try:
@@ -180,16 +233,10 @@ class LCN():
 					f.write("#DESCRIPTION ------- " + self.markers[0][1] + " -------\n")
 					self.markers.remove(self.markers[0])
 			refstr = "1:0:1:%x:%x:%x:%x:0:0:0:" % (x[4], x[3], x[2], x[1])  # temporary ref
-			refsplit = eServiceReference(refstr).toString().split(":")
-			added = False
-			for tref in self.e2services:
-				tmp = tref.split(":")
-				if tmp[3] == refsplit[3] and tmp[4] == refsplit[4] and tmp[5] == refsplit[5] and tmp[6] == refsplit[6]:
-					f.write("#SERVICE " + tref + "\n")
-					added = True
-					break
-
-			if not added:  # no service found? something wrong? a log should be a good idea. Anyway we add an empty line so we keep the numeration
+			tref = self.e2index.get(tuple(eServiceReference(refstr).toString().split(":")[3:7]))
+			if tref:
+				f.write("#SERVICE " + tref + "\n")
+			else:  # no service found? something wrong? a log should be a good idea. Anyway we add an empty line so we keep the numeration
 				f.write("#SERVICE 1:832:d:0:0:0:0:0:0:0:\n")
 
 		f.close()
@@ -257,16 +304,10 @@ class LCN():
 					f.write("#DESCRIPTION ------- " + self.markers[0][1] + " -------\n")
 					self.markers.remove(self.markers[0])
 			refstr = "1:0:2:%x:%x:%x:%x:0:0:0:" % (x[4], x[3], x[2], x[1])  # temporary ref
-			refsplit = eServiceReference(refstr).toString().split(":")
-			added = False
-			for tref in self.e2services:
-				tmp = tref.split(":")
-				if tmp[3] == refsplit[3] and tmp[4] == refsplit[4] and tmp[5] == refsplit[5] and tmp[6] == refsplit[6]:
-					f.write("#SERVICE " + tref + "\n")
-					added = True
-					break
-
-			if not added:  # no service found? something wrong? a log should be a good idea. Anyway we add an empty line so we keep the numeration
+			tref = self.e2index.get(tuple(eServiceReference(refstr).toString().split(":")[3:7]))
+			if tref:
+				f.write("#SERVICE " + tref + "\n")
+			else:  # no service found? something wrong? a log should be a good idea. Anyway we add an empty line so we keep the numeration
 				f.write("#SERVICE 1:832:d:0:0:0:0:0:0:0:\n")
 
 		f.close()
@@ -1,16 +1,20 @@
 from datetime import date
 from os import popen, makedirs, listdir, stat, rename, remove
 from os.path import exists, isdir, join
+from shutil import rmtree
+
+from twisted.internet import threads
 
 from enigma import eTimer, eEnv, eConsoleAppContainer, eEPGCache
 from Components.ActionMap import ActionMap, NumberActionMap, HelpableActionMap
 from Components.Button import Button
-from Components.config import NoSave, configfile, ConfigSubsection, ConfigText, ConfigLocations
+from Components.config import NoSave, configfile, ConfigSubsection, ConfigText, ConfigLocations, ConfigSelection, ConfigYesNo
 from Components.config import config
 from Components.ConfigList import ConfigListScreen
 from Components.FileList import MultiFileSelectList
 from Components.Label import Label
 from Components.MenuList import MenuList
+from Components.SelectionList import SelectionList
 from Components.Sources.List import List
 from Components.Sources.StaticText import StaticText
 from Components.SystemInfo import BoxInfo, getBoxDisplayName
@@ -21,6 +25,7 @@ from Screens.Screen import Screen
 from Tools.Directories import resolveFilename, SCOPE_GUISKIN
 from Tools.LoadPixmap import LoadPixmap
 from . import ShellCompatibleFunctions
+from .BackupStore import BackupStore, BackupStoreError
 
 
 MACHINEBUILD = BoxInfo.getItem("machinebuild")
@@ -85,6 +90,9 @@ def InitConfig():
 	config.plugins.configurationbackup.backupdirs_default = NoSave(ConfigLocations(default=backupset))
 	config.plugins.configurationbackup.backupdirs = ConfigLocations(default=[])  # "backupdirs_addon" is called "backupdirs" for backwards compatibility, holding the user"s old selection, duplicates are removed during backup
 	config.plugins.configurationbackup.backupdirs_exclude = ConfigLocations(default=[])
+	config.plugins.configurationbackup.incremental = ConfigYesNo(default=False)
+	config.plugins.configurationbackup.snapshots = ConfigSelection(default=7, choices=[(x, str(x)) for x in (1, 3, 5, 7, 14, 30)])
+	config.plugins.configurationbackup.exportarchive = ConfigYesNo(default=True)
 	return config.plugins.configurationbackup
 
 
@@ -105,6 +113,14 @@ def getBackupFilename():
 	return "enigma2settingsbackup.tar.gz"
 
 
+def getBackupStore():
+	return BackupStore(join(getBackupPath(), "store"))
+
+
+def getBackupExcludes():
+	return [f.strip("/") for f in config.plugins.configurationbackup.backupdirs_exclude.value] + [f.strip("/") for f in BLACKLISTED]
+
+
 def SettingsEntry(name, checked):
 	picture = LoadPixmap(cached=True, path=resolveFilename(SCOPE_GUISKIN, "skin_default/icons/lock_%s.png" % ("on" if checked else "off")))
 	return (name, picture, checked)
@@ -185,6 +201,9 @@ class BackupScreen(Screen, ConfigListScreen):
 			for f in BLACKLISTED:
 				cmd3 += " --exclude %s" % f.strip("/")
 			cmd3 += " %s" % self.backupdirs
+			if config.plugins.configurationbackup.incremental.value:
+				self.session.open(Console, title=_("Backup is running..."), cmdlist=[cmd2], finishedCallback=self.createSnapshot, closeOnSuccess=True)
+				return
 			cmd = [cmd2, cmd3]
 			if exists(self.fullbackupfilename):
 				dt = str(date.fromtimestamp(stat(self.fullbackupfilename).st_ctime))
@@ -202,6 +221,30 @@ class BackupScreen(Screen, ConfigListScreen):
 			else:
 				self.session.openWithCallback(self.backupErrorCB, MessageBox, _("Sorry, your backup destination is not writeable.\nPlease select a different one."), MessageBox.TYPE_INFO, timeout=10)
 
+	def createSnapshot(self, retval=None):
+		self.setTitle(_("Creating snapshot..."))
+		threads.deferToThread(self.storeSnapshot, self.backupdirs.split(), getBackupExcludes()).addCallbacks(self.snapshotFinished, self.snapshotFailed)
+
+	def storeSnapshot(self, paths, excludes):  # Runs in a thread, only the changed files are read and stored.
+		store = getBackupStore()
+		name, statistics = store.createSnapshot(paths, excludes)
+		if config.plugins.configurationbackup.exportarchive.value:
+			store.exportTar(name, self.fullbackupfilename)
+		store.pruneSnapshots(config.plugins.configurationbackup.snapshots.value)
+		return name
+
+	def snapshotFinished(self, name):
+		self.backupFinishedCB()
+		if self.finished_cb:
+			self.finished_cb()
+
+	def snapshotFailed(self, failure):
+		print("[BackupRestore] Error: Snapshot failed!  (%s)" % failure.getErrorMessage())
+		config.usage.shutdownOK.setValue(self.save_shutdownOK)
+		config.usage.shutdownOK.save()
+		configfile.save()
+		self.session.openWithCallback(self.finished_cb or self.backupErrorCB, MessageBox, _("Sorry, the backup failed:\n%s") % failure.getErrorMessage(), MessageBox.TYPE_ERROR, timeout=10)
+
 	def backupFinishedCB(self, retval=None):
 		config.usage.shutdownOK.setValue(self.save_shutdownOK)
 		config.usage.shutdownOK.save()
@@ -346,6 +389,8 @@ class RestoreMenu(Screen):
 		self.exe = False
 
 		self.path = ""
+		self.store = None
+		self.snapshots = {}  # Indexed by the list entry, the value is the name of the snapshot.
 
 		self["actions"] = NumberActionMap(["SetupActions"],
 		{
@@ -379,15 +424,59 @@ class RestoreMenu(Screen):
 				self.flist.append(file)
 				self.entry = True
 		self.flist.sort(reverse=True)
+		self.store = getBackupStore()
+		self.snapshots = {}
+		for name in self.store.getSnapshots():
+			entry = "%s (%s)" % (name, _("snapshot"))
+			self.snapshots[entry] = name
+			self.flist.append(entry)
+			self.entry = True
 		self["filelist"].l.setList(self.flist)
 
 	def KeyOk(self):
 		if (self.exe is False) and (self.entry is True):
 			self.sel = self["filelist"].getCurrent()
-			if self.sel:
+			if self.sel in self.snapshots:
+				choices = [(_("Restore everything"), "all"), (_("Select files and folders to restore"), "select"), (_("Export as tar.gz archive"), "export"), (_("Cancel"), None)]
+				self.session.openWithCallback(self.snapshotAction, MessageBox, _("What do you want to do with the snapshot\n%s?") % self.snapshots[self.sel], list=choices, windowTitle=_("Restore backups"))
+			elif self.sel:
 				self.val = join(self.path, self.sel)
 				self.session.openWithCallback(self.startRestore, MessageBox, _("Are you sure you want to restore\nthe following backup:\n%s\nYour receiver will restart after the backup has been restored!") % self.sel)
 
+	def snapshotAction(self, action):
+		name = self.snapshots.get(self.sel)
+		if action == "all":
+			self.session.openWithCallback(self.startRestore, MessageBox, _("Are you sure you want to restore\nthe following backup:\n%s\nYour receiver will restart after the backup has been restored!") % name)
+		elif action == "select":
+			self.session.openWithCallback(self.restoreSelection, SnapshotSelection, self.store, name)
+		elif action == "export":
+			self.exe = True
+			filename = join(self.path, "%s-%s" % (name, getBackupFilename()))
+			threads.deferToThread(self.store.exportTar, name, filename).addCallbacks(self.snapshotDone, self.snapshotFailed)
+
+	def restoreSelection(self, paths=None):
+		if paths:
+			self.exe = True
+			threads.deferToThread(self.store.restore, self.snapshots[self.sel], paths, BLACKLISTED).addCallbacks(self.selectionRestored, self.snapshotFailed)
+
+	def selectionRestored(self, count):
+		self.exe = False
+		self.session.openWithCallback(self.restartGUI, MessageBox, _("%d files and folders have been restored.\nDo you want to restart the GUI now?") % count)
+
+	def restartGUI(self, ret=False):
+		if ret:
+			self.session.open(Console, title=_("Restoring..."), cmdlist=[MANDATORY_RIGHTS, "killall -9 enigma2"])
+
+	def snapshotDone(self, result=None):
+		self.exe = False
+		self.fill_list()
+
+	def snapshotFailed(self, failure):
+		self.exe = False
+		print("[BackupRestore] Error: %s" % failure.getErrorMessage())
+		self.session.open(MessageBox, _("Sorry, the snapshot could not be processed:\n%s") % failure.getErrorMessage(), MessageBox.TYPE_ERROR, timeout=10)
+		self.fill_list()
+
 	def keyCancel(self):
 		self.close()
 
@@ -405,6 +494,9 @@ class RestoreMenu(Screen):
 
 	def CB_startRestore(self, ret=False):
 		self.exe = True
+		if self.sel in self.snapshots:
+			threads.deferToThread(self.restoreSnapshot, self.snapshots[self.sel], ret).addCallbacks(self.snapshotRestored, self.snapshotFailed)
+			return
 		tarcmd = "tar -C / -xzvf %s" % join(self.path, self.sel)
 		for f in BLACKLISTED:
 			tarcmd += " --exclude %s" % f.strip("/")
@@ -414,6 +506,14 @@ class RestoreMenu(Screen):
 			cmds.insert(0, "rm -R /etc/enigma2")
 		self.session.open(Console, title=_("Restoring..."), cmdlist=cmds)
 
+	def restoreSnapshot(self, name, clean):  # Runs in a thread.
+		if clean:
+			rmtree("/etc/enigma2", ignore_errors=True)
+		return self.store.restore(name, excludes=BLACKLISTED)
+
+	def snapshotRestored(self, count):
+		self.session.open(Console, title=_("Restoring..."), cmdlist=[MANDATORY_RIGHTS, "/etc/init.d/autofs restart", "killall -9 enigma2"])
+
 	def deleteFile(self):
 		if (self.exe is False) and (self.entry is True):
 			self.sel = self["filelist"].getCurrent()
@@ -425,6 +525,9 @@ class RestoreMenu(Screen):
 		if ret:
 			self.exe = True
 			print("removing: %s" % self.val)
+			if self.sel in self.snapshots:
+				threads.deferToThread(self.store.deleteSnapshot, self.snapshots[self.sel]).addCallbacks(self.snapshotDone, self.snapshotFailed)
+				return
 			if exists(self.val):
 				remove(self.val)
 			self.exe = False
@@ -435,6 +538,51 @@ class RestoreMenu(Screen):
 		self["summary_description"].text = cur
 
 
+class SnapshotSelection(Screen):
+	skin = """
+		<screen name="SnapshotSelection" position="center,center" size="560,400" title="Select files/folders to restore" >
+			<ePixmap pixmap="buttons/red.png" position="0,0" size="140,40" alphatest="on" />
+			<ePixmap pixmap="buttons/green.png" position="140,0" size="140,40" alphatest="on" />
+			<ePixmap pixmap="buttons/blue.png" position="420,0" size="140,40" alphatest="on" />
+			<widget source="key_red" render="Label" position="0,0" zPosition="1" size="140,40" font="Regular;20" halign="center" valign="center" backgroundColor="#9f1313" transparent="1" />
+			<widget source="key_green" render="Label" position="140,0" zPosition="1" size="140,40" font="Regular;20" halign="center" valign="center" backgroundColor="#1f771f" transparent="1" />
+			<widget source="key_blue" render="Label" position="420,0" zPosition="1" size="140,40" font="Regular;20" halign="center" valign="center" backgroundColor="#18188b" transparent="1" />
+			<widget name="list" position="5,50" size="550,340" scrollbarMode="showOnDemand" />
+		</screen>"""
+
+	def __init__(self, session, store, name):
+		Screen.__init__(self, session)
+		self.setTitle(_("Select files/folders to restore"))
+		self["key_red"] = StaticText(_("Cancel"))
+		self["key_green"] = StaticText(_("Restore"))
+		self["key_blue"] = StaticText(_("Invert"))
+		self.selectionList = SelectionList()
+		self["list"] = self.selectionList
+		self["actions"] = ActionMap(["OkCancelActions", "ColorActions"],
+		{
+			"ok": self.selectionList.toggleSelection,
+			"cancel": self.close,
+			"red": self.close,
+			"green": self.restore,
+			"blue": self.selectionList.toggleAllSelection
+		}, -1)
+		try:  # The backed up paths and the files and folders directly in them.
+			snapshot = store.loadSnapshot(name)
+		except BackupStoreError as err:
+			print("[BackupRestore] Error: %s" % err)
+			snapshot = {"paths": [], "entries": []}
+		paths = [path.strip("/") for path in snapshot["paths"]]
+		index = 0
+		for entry in snapshot["entries"]:
+			path = entry["path"]
+			if path in paths or path.rpartition("/")[0] in paths:
+				self.selectionList.addSelection("/%s%s" % (path, "/" if entry["type"] == "d" else ""), path, index, False)
+				index += 1
+
+	def restore(self):
+		self.close([item[1] for item in self.selectionList.getSelectionsList()])
+
+
 class RestoreScreen(Screen, ConfigListScreen):
 	skin = """
 		<screen position="135,144" size="350,310" title="Restore is running..." >
@@ -0,0 +1,361 @@
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from gzip import open as gzipOpen
+from hashlib import sha256
+from json import dump, load
+from os import chmod, chown, cpu_count, listdir, lstat, makedirs, readlink, remove, rename, rmdir, scandir, symlink, utime
+from os.path import exists, isdir, islink, join
+from stat import S_IMODE, S_ISDIR, S_ISLNK, S_ISREG
+from tarfile import DIRTYPE, REGTYPE, SYMTYPE, TarInfo, open as tarOpen
+from time import localtime, strftime
+from zlib import compress, decompress
+
+MODULE_NAME = __name__.split(".")[-1]
+
+CHUNK_SIZE = 1024 * 1024  # Files are stored in chunks of this size, identical chunks are stored once.
+COMPRESS_LEVEL = 6
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".json.gz"
+
+
+class BackupStoreError(Exception):
+	pass
+
+
+class ChunkReader:
+	"""File like reader of the content of a stored file for tarfile."""
+
+	def __init__(self, store, chunks):
+		self.store = store
+		self.chunks = iter(chunks)
+		self.buffer = b""
+
+	def read(self, size=-1):
+		while size < 0 or len(self.buffer) < size:
+			chunk = next(self.chunks, None)
+			if chunk is None:
+				break
+			self.buffer += self.store.readChunk(chunk)
+		if size < 0:
+			size = len(self.buffer)
+		data, self.buffer = self.buffer[:size], self.buffer[size:]
+		return data
+
+
+class BackupStore:
+	"""Content addressed store of settings backups.
+
+	Every snapshot lists the files, directories and symbolic links of the
+	backup with the SHA-256 hashes of the chunks of the files, the chunks are
+	stored compressed and only once in "chunks/".  A file whose size, mtime
+	and mode did not change since the last snapshot is not read again, a
+	changed file only adds the chunks that are not in the store yet.  The
+	chunks are compressed by a pool of threads."""
+
+	def __init__(self, path, threads=None):
+		self.path = path
+		self.chunkPath = join(path, "chunks")
+		self.snapshotPath = join(path, "snapshots")
+		self.threads = threads or min(4, cpu_count() or 1)
+		self.knownChunks = None
+
+	def getSnapshots(self):
+		"""Returns the names of the snapshots, the newest first."""
+		try:
+			return sorted((name[:-len(SNAPSHOT_EXTENSION)] for name in listdir(self.snapshotPath) if name.endswith(SNAPSHOT_EXTENSION)), reverse=True)
+		except OSError:
+			return []
+
+	def loadSnapshot(self, name):
+		try:
+			with gzipOpen(join(self.snapshotPath, "%s%s" % (name, SNAPSHOT_EXTENSION)), "rt", encoding="UTF-8") as fd:
+				snapshot = load(fd)
+		except (OSError, ValueError) as err:
+			raise BackupStoreError("Snapshot '%s' can't be read!  (%s)" % (name, err))
+		if snapshot.get("version") != SNAPSHOT_VERSION:
+			raise BackupStoreError("Snapshot '%s' has the unsupported version %s!" % (name, snapshot.get("version")))
+		return snapshot
+
+	def saveSnapshot(self, name, snapshot):
+		makedirs(self.snapshotPath, exist_ok=True)
+		filename = join(self.snapshotPath, "%s%s" % (name, SNAPSHOT_EXTENSION))
+		with gzipOpen("%s.tmp" % filename, "wt", encoding="UTF-8") as fd:
+			dump(snapshot, fd, separators=(",", ":"))
+		rename("%s.tmp" % filename, filename)  # The snapshot only exists once all its chunks have been written.
+
+	def getChunkFilename(self, chunk):
+		return join(self.chunkPath, chunk[:2], chunk)
+
+	def getKnownChunks(self):
+		if self.knownChunks is None:
+			self.knownChunks = set()
+			try:
+				for directory in scandir(self.chunkPath):
+					if directory.is_dir():
+						self.knownChunks.update(name for name in listdir(directory.path) if not name.endswith(".tmp"))
+			except OSError:
+				pass
+		return self.knownChunks
+
+	def readChunk(self, chunk):
+		try:
+			with open(self.getChunkFilename(chunk), "rb") as fd:
+				data = decompress(fd.read())
+		except (OSError, ValueError) as err:  # The zlib.error is a ValueError.
+			raise BackupStoreError("Chunk '%s' can't be read!  (%s)" % (chunk, err))
+		if sha256(data).hexdigest() != chunk:
+			raise BackupStoreError("Chunk '%s' is damaged!" % chunk)
+		return data
+
+	def writeChunk(self, chunk, data):  # Runs in the compression threads.
+		filename = self.getChunkFilename(chunk)
+		makedirs(join(self.chunkPath, chunk[:2]), exist_ok=True)
+		with open("%s.tmp" % filename, "wb") as fd:
+			fd.write(compress(data, COMPRESS_LEVEL))
+		rename("%s.tmp" % filename, filename)
+		return len(data)
+
+	def createSnapshot(self, paths, excludes=(), root="/"):
+		"""Stores the files below the "paths" relative to "root" as a new
+		snapshot and returns its name and a dictionary with the statistics.
+		The "excludes" are shell patterns of paths relative to "root"."""
+		known = self.getKnownChunks()
+		previous = {}
+		snapshots = self.getSnapshots()
+		if snapshots:
+			try:
+				previous = {entry["path"]: entry for entry in self.loadSnapshot(snapshots[0])["entries"]}
+			except BackupStoreError as err:
+				print("[%s] Warning: %s  All the files are read again." % (MODULE_NAME, err))
+		statistics = {"files": 0, "unchanged": 0, "read": 0, "stored": 0, "storedChunks": 0}
+		try:
+			entries = self.storeEntries(paths, excludes, root, known, previous, statistics)
+		except Exception:
+			self.knownChunks = None  # Chunks of the failed snapshot may be missing.
+			raise
+		name = strftime("%Y-%m-%d_%H-%M-%S", localtime())
+		while exists(join(self.snapshotPath, "%s%s" % (name, SNAPSHOT_EXTENSION))):
+			name += "_"
+		self.saveSnapshot(name, {"version": SNAPSHOT_VERSION, "paths": list(paths), "entries": entries})
+		print("[%s] Snapshot '%s' with %d files, %d unchanged, %d bytes read, %d new chunks with %d bytes stored." % (MODULE_NAME, name, statistics["files"], statistics["unchanged"], statistics["read"], statistics["storedChunks"], statistics["stored"]))
+		return name, statistics
+
+	def storeEntries(self, paths, excludes, root, known, previous, statistics):
+		entries = []
+		pending = []
+		with ThreadPoolExecutor(max_workers=self.threads) as executor:
+			for path, status in self.walk(paths, excludes, root):
+				entry = {"path": path, "mode": S_IMODE(status.st_mode), "uid": status.st_uid, "gid": status.st_gid, "mtime": status.st_mtime_ns}
+				if S_ISDIR(status.st_mode):
+					entry["type"] = "d"
+				elif S_ISLNK(status.st_mode):
+					entry["type"] = "l"
+					entry["target"] = readlink(join(root, path))
+				else:
+					entry["type"] = "f"
+					entry["size"] = status.st_size
+					statistics["files"] += 1
+					old = previous.get(path)
+					if old and old["type"] == "f" and old["size"] == status.st_size and old["mtime"] == status.st_mtime_ns and old["mode"] == entry["mode"] and all(chunk in known for chunk in old["chunks"]):
+						entry["chunks"] = old["chunks"]
+						statistics["unchanged"] += 1
+					else:
+						try:
+							entry["chunks"] = self.storeFile(join(root, path), known, executor, pending, statistics)
+						except OSError as err:
+							print("[%s] Error %d: Unable to read '%s'!  (%s)" % (MODULE_NAME, err.errno, path, err.strerror))
+							continue
+				entries.append(entry)
+			for future in pending:
+				statistics["stored"] += future.result()  # Raises the errors of the threads.
+		return entries
+
+	def storeFile(self, filename, known, executor, pending, statistics):
+		chunks = []
+		with open(filename, "rb") as fd:
+			while True:
+				data = fd.read(CHUNK_SIZE)
+				if not data:
+					break
+				statistics["read"] += len(data)
+				chunk = sha256(data).hexdigest()
+				chunks.append(chunk)
+				if chunk not in known:
+					known.add(chunk)
+					statistics["storedChunks"] += 1
+					pending.append(executor.submit(self.writeChunk, chunk, data))
+					if len(pending) > self.threads * 2:  # Limit the chunks held in memory.
+						statistics["stored"] += pending.pop(0).result()
+		return chunks
+
+	def walk(self, paths, excludes, root):
+		seen = set()
+		for path in paths:
+			path = path.strip("/")
+			if not path or self.isExcluded(path, excludes):
+				continue
+			try:
+				status = lstat(join(root, path))
+			except OSError:
+				continue
+			parent = ""
+			for part in path.split("/")[:-1]:  # The parent directories keep their modes on restore.
+				parent = "%s/%s" % (parent, part) if parent else part
+				if parent not in seen:
+					seen.add(parent)
+					yield parent, lstat(join(root, parent))
+			if path in seen:
+				continue
+			seen.add(path)
+			yield path, status
+			if S_ISDIR(status.st_mode):
+				for item in self.walkDirectory(path, excludes, root, seen):
+					yield item
+
+	def walkDirectory(self, path, excludes, root, seen):
+		try:
+			items = sorted(scandir(join(root, path)), key=lambda item: item.name)
+		except OSError as err:
+			print("[%s] Error %d: Unable to read directory '%s'!  (%s)" % (MODULE_NAME, err.errno, path, err.strerror))
+			return
+		for item in items:
+			itemPath = "%s/%s" % (path, item.name)
+			if itemPath in seen or self.isExcluded(itemPath, excludes):
+				continue
+			try:
+				status = item.stat(follow_symlinks=False)
+			except OSError:
+				continue
+			if not (S_ISDIR(status.st_mode) or S_ISLNK(status.st_mode) or S_ISREG(status.st_mode)):
+				continue  # Devices, sockets and pipes aren't settings.
+			seen.add(itemPath)
+			yield itemPath, status
+			if S_ISDIR(status.st_mode):
+				for entry in self.walkDirectory(itemPath, excludes, root, seen):
+					yield entry
+
+	def isExcluded(self, path, excludes):
+		for exclude in excludes:
+			exclude = exclude.strip("/")
+			if exclude and (fnmatch(path, exclude) or path.startswith("%s/" % exclude)):
+				return True
+		return False
+
+	def getEntries(self, name, paths=None, excludes=()):
+		"""Returns the entries of the snapshot below the "paths", all entries
+		if "paths" is None."""
+		selected = [path.strip("/") for path in paths] if paths is not None else None
+		entries = []
+		for entry in self.loadSnapshot(name)["entries"]:
+			path = entry["path"]
+			if selected is not None and not any(path == item or path.startswith("%s/" % item) or item.startswith("%s/" % path) for item in selected):
+				continue
+			if selected is not None and entry["type"] != "d" and not any(path == item or path.startswith("%s/" % item) for item in selected):
+				continue  # Only the parent directories of the selection.
+			if not self.isExcluded(path, excludes):
+				entries.append(entry)
+		return entries
+
+	def restore(self, name, paths=None, excludes=(), root="/"):
+		"""Restores the files of the snapshot below the "paths" to "root",
+		everything if "paths" is None.  Returns the number of restored
+		entries."""
+		entries = self.getEntries(name, paths, excludes)
+		directories = []
+		for entry in entries:
+			target = join(root, entry["path"])
+			if entry["type"] == "d":
+				if islink(target) or (exists(target) and not isdir(target)):
+					remove(target)
+				makedirs(target, exist_ok=True)
+				directories.append(entry)
+				continue
+			makedirs(join(root, entry["path"].rpartition("/")[0]), exist_ok=True)
+			if isdir(target) and not islink(target):
+				print("[%s] Warning: Directory '%s' is not replaced by a %s!" % (MODULE_NAME, target, "file" if entry["type"] == "f" else "link"))
+				continue
+			if entry["type"] == "l":
+				if islink(target) or exists(target):
+					remove(target)
+				symlink(entry["target"], target)
+			else:
+				with open("%s.restore" % target, "wb") as fd:
+					for chunk in entry["chunks"]:
+						fd.write(self.readChunk(chunk))
+				rename("%s.restore" % target, target)
+			self.setAttributes(target, entry)
+		for entry in reversed(directories):  # Restoring the files changed the mtime of the directories.
+			self.setAttributes(join(root, entry["path"]), entry)
+		print("[%s] Restored %d entries of snapshot '%s' to '%s'." % (MODULE_NAME, len(entries), name, root))
+		return len(entries)
+
+	def setAttributes(self, target, entry):
+		try:
+			chown(target, entry["uid"], entry["gid"], follow_symlinks=False)
+		except OSError:
+			pass  # Only root can change the owner.
+		if entry["type"] != "l":
+			chmod(target, entry["mode"])
+			utime(target, ns=(entry["mtime"], entry["mtime"]))
+
+	def exportTar(self, name, filename, paths=None, excludes=()):
+		"""Writes the snapshot as a tar.gz archive like "tar -C / -czf" does,
+		for the restore of older images and the first start wizard."""
+		with tarOpen("%s.tmp" % filename, "w:gz") as tar:
+			for entry in self.getEntries(name, paths, excludes):
+				info = TarInfo(entry["path"])
+				info.mode = entry["mode"]
+				info.uid = entry["uid"]
+				info.gid = entry["gid"]
+				info.mtime = entry["mtime"] // 1000000000
+				if entry["type"] == "d":
+					info.type = DIRTYPE
+					tar.addfile(info)
+				elif entry["type"] == "l":
+					info.type = SYMTYPE
+					info.linkname = entry["target"]
+					tar.addfile(info)
+				else:
+					info.type = REGTYPE
+					info.size = entry["size"]
+					tar.addfile(info, ChunkReader(self, entry["chunks"]))
+		rename("%s.tmp" % filename, filename)
+
+	def deleteSnapshot(self, name):
+		remove(join(self.snapshotPath, "%s%s" % (name, SNAPSHOT_EXTENSION)))
+		self.collectGarbage()
+
+	def pruneSnapshots(self, keep):
+		"""Deletes all but the "keep" newest snapshots."""
+		snapshots = self.getSnapshots()
+		for name in snapshots[keep:]:
+			remove(join(self.snapshotPath, "%s%s" % (name, SNAPSHOT_EXTENSION)))
+		if snapshots[keep:]:
+			self.collectGarbage()
+
+	def collectGarbage(self):
+		"""Deletes the chunks that no snapshot refers to any more."""
+		used = set()
+		for name in self.getSnapshots():
+			try:
+				for entry in self.loadSnapshot(name)["entries"]:
+					used.update(entry.get("chunks", ()))
+			except BackupStoreError as err:
+				print("[%s] Error: %s  The unused chunks are kept." % (MODULE_NAME, err))
+				return 0
+		count = 0
+		for chunk in list(self.getKnownChunks()):
+			if chunk not in used:
+				try:
+					remove(self.getChunkFilename(chunk))
+					count += 1
+				except OSError:
+					pass
+				self.knownChunks.discard(chunk)
+		for directory in listdir(self.chunkPath) if isdir(self.chunkPath) else []:
+			try:
+				rmdir(join(self.chunkPath, directory))
+			except OSError:
+				pass  # The directory isn't empty.
+		print("[%s] %d unused chunks deleted." % (MODULE_NAME, count))
+		return count
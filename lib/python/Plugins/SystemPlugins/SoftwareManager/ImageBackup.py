@@ -1,6 +1,6 @@
 from datetime import timedelta
 from os import listdir, makedirs, system
-from os.path import exists, isdir, isfile, join as pathjoin
+from os.path import basename, exists, getsize, isdir, isfile, join as pathjoin
 from subprocess import getoutput
 from time import localtime, strftime, time
 
@@ -10,13 +10,16 @@ from Components.ChoiceList import ChoiceList, ChoiceEntryComponent
 from Components.Harddisk import Freespace, getFolderSize
 from Components.Sources.StaticText import StaticText
 from Components.SystemInfo import BoxInfo
+from Components.Task import job_manager
 from Screens.Console import Console
 from Screens.ChoiceBox import ChoiceBox
 from Screens.MessageBox import MessageBox
 from Screens.Screen import Screen
+from Screens.TaskView import JobView
 from Tools.BoundFunction import boundFunction
 from Tools.MultiBoot import MultiBoot
 from Tools.Directories import fileReadLines
+from .ImageStream import ImageStreamJob
 
 MODULE_NAME = __name__.split(".")[-1]
 
@@ -28,6 +31,8 @@ MACHINENAME = BoxInfo.getItem("displaymodel")
 
 USEP = "_________________________________________________"
 
+ROOTFS_EXCLUDES = ("./boot/kernel.img", "./var/nmbd", "./.resizerootfs", "./.resize-rootfs", "./.resize-linuxrootfs", "./.resize-userdata", "./var/lib/samba/private/msg.sock", "./var/lib/samba/msg.sock/*", "./run/avahi-daemon/socket", "./run/chrony/chronyd.sock")
+
 
 class ImageBackup(Screen):
 
@@ -247,7 +252,6 @@ class ImageBackup(Screen):
 				self.DATE = strftime("%Y%m%d_%H%M", localtime(self.START))
 				self.MKFS_UBI = "/usr/sbin/mkfs.ubifs"
 				self.MKFS_TAR = "/bin/tar"
-				self.BZIP2 = "/usr/bin/bzip2"
 				self.MKFS_JFFS2 = "/usr/sbin/mkfs.jffs2"
 				self.UBINIZE = "/usr/sbin/ubinize"
 				self.NANDDUMP = "/usr/sbin/nanddump"
@@ -346,9 +350,10 @@ class ImageBackup(Screen):
 				self.message += "%s\n" % USEP
 				self.message += "'"
 
+				# The rootfs archive and the partition dumps are written in one pass by the stream job before the remaining commands run.
+				self.stream = ImageStreamJob(self.TITLE)
 				cmd1 = None
 				cmd2 = None
-				cmd3 = None
 				if "jffs2" in self.ROOTFSTYPE.split():
 					cmd1 = "%s --root=%s --faketime --output=%s/root.jffs2 %s" % (self.MKFS_JFFS2, self.backuproot, self.WORKDIR, self.MKUBIFS_ARGS)
 				elif "ubi" in self.ROOTFSTYPE.split():
@@ -366,9 +371,7 @@ class ImageBackup(Screen):
 					cmd1 = "%s -r %s -o %s/root.ubi %s" % (self.MKFS_UBI, self.backuproot, self.WORKDIR, self.MKUBIFS_ARGS)
 					cmd2 = "%s -o %s/root.ubifs %s %s/ubinize.cfg" % (self.UBINIZE, self.WORKDIR, self.UBINIZE_ARGS, self.WORKDIR)
 				elif not self.RECOVERY:
-					cmd1 = "%s -cf %s/rootfs.tar -C %s --exclude ./boot/kernel.img --exclude ./var/nmbd --exclude ./.resizerootfs --exclude ./.resize-rootfs --exclude ./.resize-linuxrootfs --exclude ./.resize-userdata --exclude ./var/lib/samba/private/msg.sock --exclude ./var/lib/samba/msg.sock/* --exclude ./run/avahi-daemon/socket --exclude ./run/chrony/chronyd.sock ." % (self.MKFS_TAR, self.WORKDIR, self.backuproot)
-					cmd2 = "sync"
-					cmd3 = "%s %s/rootfs.tar" % (self.BZIP2, self.WORKDIR)
+					self.stream.addArchive(self.backuproot, "%s/rootfs.tar.bz2" % self.WORKDIR, ROOTFS_EXCLUDES, self.MKFS_TAR)
 
 				cmdlist = []
 				cmdlist.append(self.message)
@@ -377,19 +380,14 @@ class ImageBackup(Screen):
 					cmdlist.append(cmd1)
 				if cmd2:
 					cmdlist.append(cmd2)
-				if cmd3:
-					cmdlist.append(cmd3)
 
 				if self.MODEL in ("gbquad4k", "gbue4k", "gbx34k"):
-					cmdlist.append(self.makeEchoCreate("boot dump"))
-					cmdlist.append("dd if=/dev/mmcblk0p1 of=%s/boot.bin" % self.WORKDIR)
-					cmdlist.append(self.makeEchoCreate("rescue dump"))
-					cmdlist.append("dd if=/dev/mmcblk0p3 of=%s/rescue.bin" % self.WORKDIR)
+					self.stream.addDump("/dev/mmcblk0p1", "%s/boot.bin" % self.WORKDIR)
+					self.stream.addDump("/dev/mmcblk0p3", "%s/rescue.bin" % self.WORKDIR)
 
 				if self.MACHINEBUILD in ("h9", "i55plus"):
 					for index, value in enumerate(["fastboot", "bootargs", "baseparam", "pq_param", "logo"]):
-						cmdlist.append(self.makeEchoCreate("%s dump" % value))
-						cmdlist.append("dd if=/dev/mtd%d of=%s/%s.bin" % (index, self.WORKDIR, value))
+						self.stream.addDump("/dev/mtd%d" % index, "%s/%s.bin" % (self.WORKDIR, value))
 
 				if self.EMMCIMG == "usb_update.bin" and self.RECOVERY:
 					SEEK_CONT = int((getFolderSize(self.backuproot) / 1024) + 100000)
@@ -402,23 +400,14 @@ class ImageBackup(Screen):
 					cmdlist.append(self.makeCopyBinFile("bootargs", self.WORKDIR))
 					#cmdlist.append("dd if=/dev/mmcblk0p2 of=%s/bootargs.bin" % self.WORKDIR)
 
-					cmdlist.append(self.makeEchoCreate("boot dump"))
-					cmdlist.append("dd if=/dev/mmcblk0p3 of=%s/boot.img" % self.WORKDIR)
-
-					cmdlist.append(self.makeEchoCreate("baseparam dump"))
+					self.stream.addDump("/dev/mmcblk0p3", "%s/boot.img" % self.WORKDIR)
 					#cmdlist.append("cp -f /usr/share/bootargs.bin %s/baseparam.img" %(self.WORKDIR))
-					cmdlist.append("dd if=/dev/mmcblk0p4 of=%s/baseparam.img" % self.WORKDIR)
-
-					cmdlist.append(self.makeEchoCreate("pq_param dump"))
+					self.stream.addDump("/dev/mmcblk0p4", "%s/baseparam.img" % self.WORKDIR)
 					#cmdlist.append("cp -f /usr/share/bootargs.bin %s/pq_param.bin" %(self.WORKDIR))
-					cmdlist.append("dd if=/dev/mmcblk0p5 of=%s/pq_param.bin" % self.WORKDIR)
-
-					cmdlist.append(self.makeEchoCreate("logo dump"))
-					cmdlist.append("dd if=/dev/mmcblk0p6 of=%s/logo.img" % self.WORKDIR)
-
-					cmdlist.append(self.makeEchoCreate("deviceinfo dump"))
+					self.stream.addDump("/dev/mmcblk0p5", "%s/pq_param.bin" % self.WORKDIR)
+					self.stream.addDump("/dev/mmcblk0p6", "%s/logo.img" % self.WORKDIR)
 					#cmdlist.append("cp -f /usr/share/bootargs.bin %s/deviceinfo.bin" %(self.WORKDIR))
-					cmdlist.append("dd if=/dev/mmcblk0p7 of=%s/deviceinfo.bin" % self.WORKDIR)
+					self.stream.addDump("/dev/mmcblk0p7", "%s/deviceinfo.bin" % self.WORKDIR)
 
 					cmdlist.append(self.makeEchoCreate("apploader dump"))
 					cmdlist.append(self.makeCopyBinFile("apploader", self.WORKDIR))
@@ -435,13 +424,13 @@ class ImageBackup(Screen):
 					cmdlist.append("rsync -aAX %s/ %s/userdata/linuxrootfs1/" % (self.backuproot, self.WORKDIR))
 					cmdlist.append("umount %s/userdata" % (self.WORKDIR))
 
-				cmdlist.append(self.makeEchoCreate("kerneldump"))
 				if MultiBoot.canMultiBoot() or self.MTDKERNEL.startswith("mmcblk0") or self.MACHINEBUILD in ("h8", "hzero"):
 					if BoxInfo.getItem("HasKexecMultiboot") or BoxInfo.getItem("HasGPT"):
-						cmdlist.append("cp /%s %s/%s" % (self.MTDKERNEL, self.WORKDIR, self.KERNELBIN))
+						self.stream.addDump("/%s" % self.MTDKERNEL, "%s/%s" % (self.WORKDIR, self.KERNELBIN))
 					else:
-						cmdlist.append("dd if=/dev/%s of=%s/%s" % (self.MTDKERNEL, self.WORKDIR, self.KERNELBIN))
+						self.stream.addDump("/dev/%s" % self.MTDKERNEL, "%s/%s" % (self.WORKDIR, self.KERNELBIN))
 				else:
+					cmdlist.append(self.makeEchoCreate("kerneldump"))
 					cmdlist.append("nanddump -a -f %s/vmlinux.gz /dev/%s" % (self.WORKDIR, self.MTDKERNEL))
 
 				if self.EMMCIMG == "disk.img" and self.RECOVERY:
@@ -557,12 +546,43 @@ class ImageBackup(Screen):
 					f.write("</Partition_Info>\n")
 					f.close()
 					cmdlist.append("mkupdate -s 00000003-00000001-01010101 -f %s/emmc_partitions.xml -d %s/%s" % (self.WORKDIR, self.WORKDIR, self.EMMCIMG))
-				self.session.open(Console, title=self.TITLE, cmdlist=cmdlist, finishedCallback=self.doFullBackupCB, closeOnSuccess=True)
+				if self.stream.isEmpty():
+					self.runCommands(cmdlist)
+				else:
+					job_manager.AddJob(self.stream, onSuccess=boundFunction(self.streamFinished, cmdlist), onFail=boundFunction(self.streamFailed, cmdlist))
+					self.session.open(JobView, self.stream, backgroundable=False, afterEventChangeable=False, afterEvent="close")
 			else:
 				self.close()
 		else:
 			self.close()
 
+	def streamFinished(self, cmdlist, job):
+		self.runCommands(cmdlist)
+
+	def streamFailed(self, cmdlist, job, task, problems):
+		if task.aborted:  # Cancelled in the JobView, the remaining steps are skipped and only the work directory is removed.
+			print("[Image Backup] The backup was cancelled.")
+			cmdlist = [self.makeEcho(_("The backup was cancelled.")), self.makeSpace()] + self.makeCleanup()
+			self.session.open(Console, title=self.TITLE, cmdlist=cmdlist, closeOnSuccess=True)
+			return False
+		print("[Image Backup] Error: Writing the backup files failed!  (%s)" % problems[0].getErrorMessage(task))
+		self.runCommands(cmdlist)  # The missing files are reported and the work directory is removed by doFullBackupCB.
+		return False
+
+	def runCommands(self, cmdlist):
+		self.session.open(Console, title=self.TITLE, cmdlist=cmdlist, finishedCallback=self.doFullBackupCB, closeOnSuccess=True)
+
+	def writeChecksums(self):
+		names = {"rootfs.tar.bz2": self.ROOTFSBIN}
+		lines = []
+		for name, (checksum, size) in sorted(self.stream.getChecksums().items()):
+			path = pathjoin(self.MAINDEST, names.get(name, name))
+			if isfile(path) and getsize(path) == size:
+				lines.append("%s  %s\n" % (checksum, basename(path)))
+		if lines:
+			with open("%s/checksums.sha256" % self.MAINDEST, "w") as fd:
+				fd.writelines(lines)
+
 	def makeEchoCreate(self, txt):
 		return self.makeEcho("%s %s" % (_("Create:"), txt))
 
@@ -578,6 +598,10 @@ class ImageBackup(Screen):
 	def makeCopyBinFile(self, fileName, destination):
 		return "cp -f /usr/share/%s.bin %s/%s.bin" % (fileName, destination, fileName)
 
+	def makeCleanup(self):
+		rdir = "RootSubdir" if self.ROOTFSSUBDIR != "none" else "root"
+		return ["umount /tmp/bi/%s" % rdir, "rmdir /tmp/bi/%s" % rdir, "rmdir /tmp/bi", "rm -rf %s" % self.WORKDIR]
+
 	def doFullBackupCB(self):
 		cmdlist = []
 		cmdlist.append(self.message)
@@ -668,6 +692,8 @@ class ImageBackup(Screen):
 			cmdlist.append(self.makeCopyBinFile("fastboot", self.MAINDESTROOT))
 			cmdlist.append(self.makeCopyBinFile("bootargs", self.MAINDESTROOT))
 
+		self.writeChecksums()
+
 		iname = "recovery_emmc" if BoxInfo.getItem("canRecovery") and self.RECOVERY else "usb"
 
 		## OPENSPA [morser] Add build revision in name ############################
@@ -727,11 +753,7 @@ class ImageBackup(Screen):
 			cmdlist.append(self.makeSpace())
 
 		cmdlist.append("rm -rf %s/build_%s" % (self.DIRECTORY, self.MODEL))
-		rdir = "RootSubdir" if self.ROOTFSSUBDIR != "none" else "root"
-		cmdlist.append("umount /tmp/bi/%s" % rdir)
-		cmdlist.append("rmdir /tmp/bi/%s" % rdir)
-		cmdlist.append("rmdir /tmp/bi")
-		cmdlist.append("rm -rf %s" % self.WORKDIR)
+		cmdlist += self.makeCleanup()
 		cmdlist.append("sleep 5")
 		END = time()
 		DIFF = int(END - self.START)
@@ -0,0 +1,242 @@
+from bz2 import BZ2Compressor
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from os import O_RDONLY, close, major, minor, open as osOpen, read, remove, rename, stat, statvfs
+from os.path import basename, dirname, exists, ismount, join, realpath
+from stat import S_ISBLK, S_ISCHR
+from subprocess import DEVNULL, PIPE, Popen
+from tempfile import TemporaryFile
+from threading import Event, Lock
+
+from Components.Harddisk import getFolderSize
+from Components.Task import Job, PythonTask
+
+MODULE_NAME = __name__.split(".")[-1]
+
+BLOCK_SIZE = 1024 * 1024  # Bytes read from a partition or the tar stream at a time.
+COMPRESS_LEVEL = 9  # The level of the bzip2 tool.
+MAX_WORKERS = 3  # Storage devices read at the same time.
+TAR_WARNINGS = (0, 1)  # GNU tar exits with 1 if a file changed while it was read.
+
+
+class ImageStreamError(Exception):
+	pass
+
+
+def getStorage(path):
+	"""Returns the name of the storage device holding the partition, file or
+	directory of path, for example "mmcblk0" for "/dev/mmcblk0p3"."""
+	try:
+		status = stat(path)
+		if S_ISCHR(status.st_mode):
+			return "mtd" if basename(path).startswith("mtd") else path  # All the MTD partitions are on the same flash.
+		device = status.st_rdev if S_ISBLK(status.st_mode) else status.st_dev
+		sysPath = realpath("/sys/dev/block/%d:%d" % (major(device), minor(device)))
+	except OSError:
+		return path
+	if exists(join(sysPath, "partition")):
+		sysPath = dirname(sysPath)
+	return basename(sysPath)
+
+
+class StreamSource:
+	def __init__(self, target):
+		self.target = target
+		self.size = 0
+		self.storage = None
+
+	def open(self):
+		raise NotImplementedError("open")
+
+	def run(self, task):
+		"""Writes the stream to the target and returns the SHA-256 of the
+		written file, the target only appears once it is complete."""
+		temporary = "%s.tmp" % self.target
+		checksum = sha256()
+		try:
+			with open(temporary, "wb") as fd:
+				for data in self.open():
+					task.checkStopped()
+					fd.write(data)
+					checksum.update(data)
+			self.close()
+			rename(temporary, self.target)
+		except BaseException:
+			self.close()
+			if exists(temporary):
+				remove(temporary)
+			raise
+		return checksum.hexdigest()
+
+	def close(self):
+		pass
+
+
+class PartitionDump(StreamSource):
+	"""Copy of a partition, a character device or a file, like dd."""
+
+	def __init__(self, source, target):
+		StreamSource.__init__(self, target)
+		self.source = source
+		self.storage = getStorage(source)
+		self.fd = None
+
+	def open(self):
+		self.fd = osOpen(self.source, O_RDONLY)
+		try:
+			from os import POSIX_FADV_SEQUENTIAL, posix_fadvise
+			posix_fadvise(self.fd, 0, 0, POSIX_FADV_SEQUENTIAL)
+		except (ImportError, OSError):
+			pass
+		return self.blocks()
+
+	def blocks(self):
+		while True:
+			data = read(self.fd, BLOCK_SIZE)
+			if not data:
+				break
+			self.task.addProgress(len(data))
+			yield data
+
+	def close(self):
+		if self.fd is not None:
+			close(self.fd)
+			self.fd = None
+
+
+class RootfsArchive(StreamSource):
+	"""The tar.bz2 archive of a directory tree.  The tree is archived by the
+	tar tool into a pipe and compressed in this process, the tar archive is
+	never written to the storage."""
+
+	def __init__(self, root, target, excludes, tar="tar"):
+		StreamSource.__init__(self, target)
+		self.root = root
+		self.excludes = excludes
+		self.tar = tar
+		self.storage = getStorage(root)
+		self.process = None
+		self.errors = None
+
+	def estimateSize(self):
+		if ismount(self.root):
+			status = statvfs(self.root)
+			return (status.f_blocks - status.f_bfree) * status.f_frsize
+		return getFolderSize(self.root)
+
+	def open(self):
+		command = [self.tar, "-cf", "-", "-C", self.root]
+		for exclude in self.excludes:
+			command.extend(("--exclude", exclude))
+		command.append(".")
+		self.errors = TemporaryFile()
+		self.process = Popen(command, stdin=DEVNULL, stdout=PIPE, stderr=self.errors)
+		return self.blocks()
+
+	def blocks(self):
+		compressor = BZ2Compressor(COMPRESS_LEVEL)
+		while True:
+			data = self.process.stdout.read(BLOCK_SIZE)
+			if not data:
+				break
+			self.task.addProgress(len(data))
+			data = compressor.compress(data)
+			if data:
+				yield data
+		returnCode = self.process.wait()
+		if returnCode not in TAR_WARNINGS:
+			self.errors.seek(0)
+			raise ImageStreamError("tar error %d: %s" % (returnCode, self.errors.read().decode("UTF-8", "replace").strip()))
+		yield compressor.flush()
+
+	def close(self):
+		if self.process:
+			if self.process.poll() is None:
+				self.process.kill()
+				self.process.wait()
+			self.process.stdout.close()
+			self.process = None
+		if self.errors:
+			self.errors.close()
+			self.errors = None
+
+
+class ImageStreamTask(PythonTask):
+	"""Writes all the sources in one pass.  The sources on different storage
+	devices are read at the same time, the sources on one storage device one
+	after the other.  The progress is counted in bytes read."""
+
+	def __init__(self, job, name):
+		PythonTask.__init__(self, job, name)
+		self.sources = []
+		self.checksums = {}  # Indexed by the file name of the target, the value is (SHA-256, size).
+		self.lock = Lock()
+		self.stopped = Event()
+		self.error = None
+
+	def prepare(self):
+		self.stopped.clear()
+		self.pos = 0
+		self.end = max(sum(source.size for source in self.sources), 1)
+
+	def addProgress(self, size):
+		with self.lock:
+			self.pos += size
+
+	def checkStopped(self):
+		if self.aborted or self.stopped.is_set():
+			raise ImageStreamError(_("Aborted"))
+
+	def work(self):
+		storages = {}
+		for source in self.sources:
+			source.task = self
+			storages.setdefault(source.storage, []).append(source)
+		self.error = None
+		with ThreadPoolExecutor(max_workers=min(len(storages), MAX_WORKERS) or 1) as executor:
+			for sources in storages.values():
+				executor.submit(self.runStorage, sources)
+		if self.error:
+			raise self.error
+
+	def runStorage(self, sources):
+		try:
+			for source in sources:
+				print("[%s] Writing '%s' from storage '%s'." % (MODULE_NAME, source.target, source.storage))
+				checksum = source.run(self)
+				self.checksums[basename(source.target)] = (checksum, stat(source.target).st_size)
+		except Exception as err:
+			with self.lock:
+				if self.error is None:  # The other storage devices stop with "Aborted" after the first error.
+					self.error = err
+					print("[%s] Error: Unable to write '%s'!  (%s)" % (MODULE_NAME, source.target, err))
+			self.stopped.set()
+
+
+class ImageStreamJob(Job):
+	"""Job that writes the partition dumps and the rootfs archive of an
+	image backup, the progress is shown in the JobView."""
+
+	def __init__(self, name):
+		Job.__init__(self, name)
+		self.task = ImageStreamTask(self, _("Writing the backup files"))
+
+	def addDump(self, source, target):
+		dump = PartitionDump(source, target)
+		try:
+			with open(source, "rb") as fd:
+				dump.size = fd.seek(0, 2)
+		except OSError as err:
+			print("[%s] Error %d: Unable to get the size of '%s'!  (%s)" % (MODULE_NAME, err.errno, source, err.strerror))
+		self.task.sources.append(dump)
+
+	def addArchive(self, root, target, excludes, tar="tar"):
+		archive = RootfsArchive(root, target, excludes, tar)
+		archive.size = archive.estimateSize()
+		self.task.sources.append(archive)
+
+	def isEmpty(self):
+		return not self.task.sources
+
+	def getChecksums(self):
+		return self.task.checksums
@@ -1,8 +1,7 @@
 from bisect import insort
 from datetime import datetime
-from os import access, fsync, makedirs, remove, rename, statvfs, W_OK
-from os.path import exists, isdir, realpath, ismount
-from threading import Thread, Timer as ThreadTimer
+from os import fsync, makedirs, remove, rename
+from os.path import exists, isdir, realpath
 from time import ctime, localtime, strftime, time
 
 from enigma import eEPGCache, getBestPlayableServiceReference, eStreamServer, eServiceEventEnums, eServiceReference, iRecordableService, quitMainloop, eActionMap, setPreferredTuner, pNavigation
@@ -11,6 +10,8 @@ import NavigationInstance
 from timer import Timer, TimerEntry
 from Components.config import config
 from Components.Harddisk import findMountPoint
+from Components.MountTable import mountTable
+from Components.StorageHealth import storageHealth
 import Components.RecordingConfig
 Components.RecordingConfig.InitRecordingConfig()
 from Components.SystemInfo import getBoxDisplayName
@@ -106,6 +107,7 @@ class RecordTimer(Timer):
 		self.onTimerAdded = []
 		self.onTimerRemoved = []
 		self.onTimerChanged = []
+		storageHealth.start(self)
 
 	def loadTimers(self):
 		if exists(TIMER_XML_FILE):
@@ -397,13 +399,14 @@ class RecordTimer(Timer):
 		if not timer.log_entries:
 			timer.log(0, "Timer created")
 		self.addTimerEntry(timer)
+		storageHealth.probeTimer(timer)  # The first verdict is ready when the recording starts.
 		for callback in self.onTimerAdded:  # Trigger onTimerAdded callbacks.
 			callback(timer)
 		if dosave:
 			self.saveTimers()
 		return None
 
-	def removeEntry(self, timer):
+	def removeEntry(self, timer, dosave=True):
 		print("[RecordTimer] Remove timer '%s'." % str(timer))
 		timer.repeated = False  # Avoid re-queuing.
 		timer.autoincrease = False
@@ -421,7 +424,8 @@ class RecordTimer(Timer):
 			self.processed_timers.remove(timer)
 		for callback in self.onTimerRemoved:  # Trigger onTimerRemoved callbacks.
 			callback(timer)
-		self.saveTimers()
+		if dosave:
+			self.saveTimers()
 
 	def getNextZapTime(self):
 		now = int(time())
@@ -579,7 +583,7 @@ def findSafeRecordPath(dirname):  # Also called from InfoBarGenerics.
 		return None
 	dirname = realpath(dirname)
 	mountPoint = findMountPoint(dirname)
-	if not ismount(mountPoint):
+	if not mountTable.isMountPoint(mountPoint):
 		print("[RecordTimer] Media is not mounted for '%s'." % dirname)
 		return None
 	if not isdir(dirname):
@@ -666,6 +670,7 @@ class RecordTimerEntry(TimerEntry):
 		self.justTriedFreeingTuner = False
 		self.mountPathRetryCounter = 0
 		self.mountPathErrorNumber = 0
+		self.mountPathPending = False
 		self.lastend = 0
 		if descramble == "notset" and record_ecm == "notset":
 			if config.recording.ecm_data.value == "descrambled+ecm":
@@ -727,6 +732,9 @@ class RecordTimerEntry(TimerEntry):
 				self.justTriedFreeingTuner = False
 				return False
 			if not self.justplay and not self.freespace():
+				if self.mountPathPending:  # The location is still being checked, this is not counted as a try.
+					self.start_prepare = int(time()) + 1
+					return False
 				if self.mountPathErrorNumber < 3 and self.mountPathRetryCounter < 3:
 					self.mountPathRetryCounter += 1
 					self.start_prepare = int(time()) + 5  # tryPrepare in 5 seconds.
@@ -933,6 +941,8 @@ class RecordTimerEntry(TimerEntry):
 				self.log(12, "Stop recording.")
 			if not self.justplay:
 				if self.record_service:
+					if not self.failed:
+						storageHealth.addRecording(self.service_ref, "%s%s" % (self.Filename, self.record_service.getFilenameExtension()), min(int(time()), self.end) - self.begin)
 					NavigationInstance.instance.stopRecordService(self.record_service)
 					self.record_service = None
 			if self.lastend and self.failed:
@@ -1089,81 +1099,42 @@ class RecordTimerEntry(TimerEntry):
 			else:
 				AddNotification(session, 1)
 
-	def mountTest(self, dirname, cmd):
-		if cmd == "writeable":
-			if not access(dirname, W_OK):
-				self.stopMountText(None, cmd)
-		elif cmd == "freespace":
-			try:
-				s = statvfs(dirname)
-				if (s.f_bavail * s.f_bsize) // 1000000 < 1024:
-					self.stopMountText(None, cmd)
-			except FileNotFoundError:
-				self.stopMountText(None, "writeable")
-
-	def stopMountText(self, thread, cmd):
-		if thread and thread.is_alive():
-			print("[RecordTimer] Timeout thread: '%s'." % cmd)
-			thread.join(timeout=1)
-		if cmd == "writeable":
-			self.mountPathErrorNumber = 2
-		elif cmd == "freespace":
-			self.mountPathErrorNumber = 3
-
 	def freespace(self, WRITEERROR=False):
 		if WRITEERROR:
 			dirname = self.mountPath
-			if findSafeRecordPath(dirname) is None:
+			verdict = storageHealth.checkPath(dirname)  # A new probe, the last verdict was taken before the write error.
+			errorNumber = verdict.getErrorNumber()
+			if errorNumber == 1:
 				return ("mount '%s' is not available." % dirname, 1)
-		else:
-			self.mountPath = None
-			if not self.dirname:
-				dirname = findSafeRecordPath(defaultMoviePath())
-			else:
-				dirname = findSafeRecordPath(self.dirname)
-				if dirname is None:
-					dirname = findSafeRecordPath(defaultMoviePath())
-					self.dirnameHadToFallback = True
-			if not dirname:
-				dirname = self.dirname
-				if not dirname:
-					dirname = defaultMoviePath() or "-"
-				self.log(0, "Mount '%s' is not available." % dirname)
-				self.mountPathErrorNumber = 1
-				return False
-		self.mountPathErrorNumber = 0
-		for cmd in ("writeable", "freespace"):
-			print("[RecordTimer] Starting thread: '%s'." % cmd)
-			processThread = Thread(target=self.mountTest, args=(dirname, cmd))
-			timerThread = ThreadTimer(5, self.stopMountText, args=(processThread, cmd))
-			timerThread.start()
-			processThread.start()
-			processThread.join()
-			timerThread.cancel()
-			if self.mountPathErrorNumber:
-				print("[RecordTimer] Break: Error number %d." % self.mountPathErrorNumber)
-				break
-			print("[RecordTimer] Finished thread: '%s'." % cmd)
-		if WRITEERROR:
-			if self.mountPathErrorNumber == 2:
+			elif errorNumber == 2:
 				return ("mount '%s' is not writable." % dirname, 2)
-			elif self.mountPathErrorNumber == 3:
+			elif errorNumber == 3:
 				return ("mount '%s' has not enough free space to record." % dirname, 3)
-			else:
-				return ("unknown error.", 0)
-		if self.mountPathErrorNumber == 2:
-			self.log(0, "Mount '%s' is not writable." % dirname)
-			return False
-		elif self.mountPathErrorNumber == 3:
-			self.log(0, "Mount '%s' has insufficient free space to record." % dirname)
+			return ("unknown error.", 0)
+		self.mountPath = None
+		dirname = self.dirname or defaultMoviePath()
+		verdict = storageHealth.getVerdict(dirname)
+		if self.dirname and not verdict.isPending() and (not verdict.isUsable() or verdict.isShort()):
+			fallback = defaultMoviePath()
+			fallbackVerdict = storageHealth.getVerdict(fallback)
+			if fallback and fallbackVerdict.isUsable() and fallbackVerdict.mountPoint != verdict.mountPoint and (not verdict.isUsable() or not fallbackVerdict.isShort()):
+				self.log(0, "Mount '%s' is %s, using the default location '%s'." % (dirname, verdict.getText() if not verdict.isUsable() else "short of space", fallback))
+				dirname = fallback
+				verdict = fallbackVerdict
+				self.dirnameHadToFallback = True
+		self.mountPathErrorNumber = verdict.getErrorNumber()
+		self.mountPathPending = verdict.isPending()
+		if self.mountPathErrorNumber:
+			self.log(0, "Mount '%s' is %s." % (dirname, verdict.getText()))
 			return False
-		else:
-			if DEBUG:
-				self.log(0, "Found enough free space to record.")
-			self.mountPathRetryCounter = 0
-			self.mountPathErrorNumber = 0
-			self.mountPath = dirname
-			return True
+		safeDirname = verdict.safePath  # Resolved and created by the probe, not on the main thread.
+		if verdict.isShort():
+			self.log(0, "Mount '%s' has %d MB free space, the recordings need about %d MB." % (dirname, verdict.free // 1000000, verdict.needed // 1000000))
+		elif DEBUG:
+			self.log(0, "Found enough free space to record.")
+		self.mountPathRetryCounter = 0
+		self.mountPath = safeDirname
+		return True
 
 	def calculateFilename(self, name=None):
 		beginDate = strftime("%Y%m%d %H%M", localtime(self.begin))
@@ -1,9 +1,7 @@
 # -*- coding: UTF-8 -*-
 # CCcam Info by AliAbdul
 # CCcam Line Editor by egami and openATV
-from base64 import b64encode
 from glob import glob
-import requests
 from os import listdir, remove, rename, system
 from os.path import dirname, exists, isfile
 from urllib.parse import urlparse, urlunparse
@@ -27,6 +25,7 @@ from Screens.Screen import Screen
 from Screens.Setup import Setup
 from Screens.VirtualKeyBoard import VirtualKeyBoard
 from Tools.Directories import fileExists, SCOPE_GUISKIN, resolveFilename, fileReadLines, fileWriteLines
+from Tools.SoftcamAPI import SoftcamAPIError, softcamAPI
 
 #TOGGLE_SHOW = InfoBar.toggleShow
 
@@ -36,9 +35,6 @@ CFG = "/etc/CCcam.cfg"
 CFG_path = '/etc'
 global Counter
 Counter = 0
-AuthHeaders = {
-	"User-Agent": "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/60.0.3112.113 Safari/537.36",
-}
 #############################################################
 
 ###global
@@ -66,46 +62,43 @@ def _parse(url):
 	host, port = parsed[1], 80
 	username = ""
 	password = ""
-	print("[CCcamInfo]1 parsed=%s scheme=%s path=%s host=%s port=%s" % (parsed, scheme, path, host, port))
+	print("[CCcamInfo]1 scheme=%s path=%s host=%s port=%s" % (scheme, path, host.split('@')[-1], port))
 	if '@' in host:
 		username, host = host.split('@')
 		if ':' in username:
 			username, password = username.split(':')
-			base64string = "%s:%s" % (username, password)
-			base64string = b64encode(base64string.encode('utf-8'))
-			authHeader = "Basic " + base64string.decode()
-			AuthHeaders["Authorization"] = authHeader
 	if ':' in host:
 		host, port = host.split(':')
 		port = int(port)
-	print("[CCcamInfo]2 parsed=%s scheme=%s path=%s host=%s port=%s" % (parsed, scheme, path, host, port))
 	url = scheme + '://' + host + ':' + str(port) + path
-	print("[CCcamInfo]1 url=%s AuthHeaders=%s" % (url, AuthHeaders))
-	return url, AuthHeaders
+	print("[CCcamInfo]1 url=%s" % url)
+	return url, username, password
 
 
 def getPage(url, callback, errback):
-	global Counter
-	errormsg = ""
-	url, AuthHeaders = _parse(url)
+	url, username, password = _parse(url)
 	print("[CCcamInfo]2 url=%s" % url)
+	softcamAPI.getPage(url, username, password).addCallbacks(pageDone, pageFailed, callbackArgs=(callback,), errbackArgs=(callback, errback))
+
+
+def pageDone(content, callback):
 	try:
-		response = requests.get(url, headers=AuthHeaders)  # to get content after redirection
-		response.raise_for_status()
-	except requests.exceptions.RequestException as error:
-		print("[CCcamInfo][getPage] incorrect response: %s" % error)
-		if Counter == 0:
-			Counter += 1
-			errormsg = "[CCcamInfo][getPage] incorrect response: %s" % error
-			errback(errormsg)
-		else:
-			data = ""
-			callback(data)
+		data = content.decode(encoding='UTF-8')
+	except UnicodeDecodeError:
+		data = content.decode(encoding='latin-1')
+	callback(data)
+
+
+def pageFailed(failure, callback, errback):
+	global Counter
+	failure.trap(SoftcamAPIError)
+	print("[CCcamInfo][getPage] incorrect response: %s" % failure.getErrorMessage())
+	if Counter == 0:
+		Counter += 1
+		errormsg = "[CCcamInfo][getPage] incorrect response: %s" % failure.getErrorMessage()
+		errback(errormsg)
 	else:
-		try:
-			data = response.content.decode(encoding='UTF-8')
-		except:
-			data = response.content.decode(encoding='latin-1')
+		data = ""
 		callback(data)
 #############################################################
 
@@ -110,7 +110,7 @@ class FactoryReset(Setup, ProtectedScreen):
 				self.userInterfaces.append(file)
 			elif file in ("automounts.xml",):
 				self.mounts.append(file)
-			elif file in ("resumepoints.pkl",):
+			elif file in ("resumepoints.pkl", "resumepoints.pkl.journal"):
 				self.resumePoints.append(file)
 			elif file in ("settings",):
 				self.settings.append(file)
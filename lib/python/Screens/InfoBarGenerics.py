@@ -2,8 +2,7 @@ from bisect import insort
 from datetime import datetime
 from itertools import groupby
 from os import listdir
-from os.path import exists, isfile, ismount, realpath, splitext
-import pickle
+from os.path import exists, isfile, splitext
 from sys import maxsize
 from time import localtime, strftime, time
 
@@ -15,7 +14,7 @@ from ServiceReference import ServiceReference, isPlayableForCur
 from Components.ActionMap import ActionMap, HelpableActionMap, HelpableNumberActionMap, NumberActionMap
 from Components.AVSwitch import iAVSwitch
 from Components.config import ConfigBoolean, ConfigClock, config, configfile
-from Components.Harddisk import findMountPoint, harddiskmanager
+from Components.Harddisk import harddiskmanager
 from Components.Input import Input
 from Components.Label import Label
 from Components.MovieList import AUDIO_EXTENSIONS, DVD_EXTENSIONS, MOVIE_EXTENSIONS
@@ -56,6 +55,7 @@ from Screens.UnhandledKey import UnhandledKey
 from Tools import Notifications
 from Tools.ServiceReference import hdmiInServiceRef
 from Tools.Directories import pathExists, fileReadLines, fileWriteLines, isPluginInstalled
+from Tools.ResumePoints import ResumePoints
 
 MODULE_NAME = __name__.split(".")[-1]
 
@@ -86,69 +86,43 @@ def setResumePoint(session):
 			pos = seek.getPlayPosition()
 			if not pos[0]:
 				key = ref.toString()
-				lru = int(time())
 				l = seek.getLength()
 				if l:
 					l = l[1]
 				else:
 					l = None
-				resumePointCache[key] = [lru, pos[1], l]
-				for k, v in list(resumePointCache.items()):
-					if v[0] < lru:
-						candidate = k
-						filepath = realpath(candidate.split(':')[-1])
-						mountpoint = findMountPoint(filepath)
-						if ismount(mountpoint) and not exists(filepath):
-							del resumePointCache[candidate]
-				saveResumePoints()
+				resumePointCache.set(key, pos[1], l)
+				resumePointCacheLast = int(time())
+				resumePointCache.pruneStale()
 
 
 def delResumePoint(ref):
 	global resumePointCache, resumePointCacheLast
-	try:
-		del resumePointCache[ref.toString()]
-	except KeyError:
-		pass
-	saveResumePoints()
+	resumePointCache.delete(ref.toString())
+	resumePointCacheLast = int(time())
 
 
 def getResumePoint(session):
 	global resumePointCache
 	ref = session.nav.getCurrentlyPlayingServiceOrGroup()
 	if (ref is not None) and (ref.type != 1):
-		try:
-			entry = resumePointCache[ref.toString()]
-			entry[0] = int(time())  # update LRU timestamp
-			return entry[1]
-		except KeyError:
-			return None
+		entry = resumePointCache.touch(ref.toString())  # update LRU timestamp
+		return entry and entry[1]
 
 
 def saveResumePoints():
 	global resumePointCache, resumePointCacheLast
-	try:
-		f = open('/etc/enigma2/resumepoints.pkl', 'wb')
-		pickle.dump(resumePointCache, f, pickle.HIGHEST_PROTOCOL)
-		f.close()
-	except Exception as ex:
-		print("[InfoBarGenerics] Failed to write resumepoints:", ex)
+	resumePointCache.save()
 	resumePointCacheLast = int(time())
 
 
 def loadResumePoints():
-	try:
-		file = open('/etc/enigma2/resumepoints.pkl', 'rb')
-		PickleFile = pickle.load(file)
-		file.close()
-		return PickleFile
-	except Exception as ex:
-		print("[InfoBarGenerics] Failed to load resumepoints:", ex)
-		return {}
+	return ResumePoints()
 
 
 def updateresumePointCache():
 	global resumePointCache
-	resumePointCache = loadResumePoints()
+	resumePointCache.load()
 
 
 def ToggleVideo():
@@ -1,10 +1,8 @@
 from operator import itemgetter
 from os.path import exists
 from time import localtime, strftime
-from urllib.error import URLError
-from urllib.parse import quote_plus
-from urllib.request import build_opener, HTTPDigestAuthHandler, HTTPHandler, HTTPPasswordMgrWithDefaultRealm, install_opener, Request, urlopen
-from xml.etree import ElementTree
+from twisted.internet.defer import CancelledError, succeed
+from twisted.python.failure import Failure
 from enigma import eTimer, RT_HALIGN_LEFT, eListboxPythonMultiContent, gFont, getDesktop
 
 from Components.ActionMap import ActionMap, NumberActionMap
@@ -21,6 +19,7 @@ from skin import parameters, getSkinFactor
 
 from Tools.Directories import SCOPE_GUISKIN, resolveFilename, fileExists
 from Tools.LoadPixmap import LoadPixmap
+from Tools.SoftcamAPI import OscamAPI, SoftcamAPIError
 
 ###global
 sf = getSkinFactor()
@@ -134,14 +133,15 @@ class OscamInfo:
 
 		return ret
 
-	def openWebIF(self, part=None, reader=None):
+	def getAPI(self):
+		"""Returns the OscamAPI of the web interface or the error message."""
 		self.proto = "http"
 		self.api = "oscamapi"
 
 		if config.oscaminfo.userdatafromconf.value:
 			udata = self.getUserData()
 			if isinstance(udata, str):
-				return False, udata
+				return udata
 			else:
 				self.port = udata[2]
 				self.username = udata[0]
@@ -150,7 +150,7 @@ class OscamInfo:
 				self.api = udata[4]
 
 			if self.ipaccess == "yes":
-				self.ip = "::1"
+				self.ip = "[::1]"
 			else:
 				self.ip = "127.0.0.1"
 		else:
@@ -161,196 +161,145 @@ class OscamInfo:
 
 		if self.port.startswith('+'):
 			self.proto = "https"
-			self.port.replace("+", "")
-
-		if part is None:
-			self.url = "%s://%s:%s/%s.html?part=status" % (self.proto, self.ip, self.port, self.api)
-		else:
-			self.url = "%s://%s:%s/%s.html?part=%s" % (self.proto, self.ip, self.port, self.api, part)
-		if part is not None and reader is not None:
-			self.url = "%s://%s:%s/%s.html?part=%s&label=%s" % (self.proto, self.ip, self.port, self.api, part, quote_plus(reader))
-
-		opener = build_opener(HTTPHandler)
-		if not self.username == "":
-			pwman = HTTPPasswordMgrWithDefaultRealm()
-			pwman.add_password(None, self.url, self.username, self.password)
-			handlers = HTTPDigestAuthHandler(pwman)
-			opener = build_opener(HTTPHandler, handlers)
-			install_opener(opener)
-		request = Request(self.url)
-		err = False
-		try:
-			data = urlopen(request).read()
-			# print data
-		except URLError as e:
-			if hasattr(e, "reason"):
-				err = str(e.reason)
-			elif hasattr(e, "code"):
-				err = str(e.code)
-		if err is not False:
-			print("[openWebIF] error: %s" % err)
-			return False, err
-		else:
-			return True, data
+			self.port = self.port[1:]
+
+		return OscamAPI("%s://%s:%s/%s.html" % (self.proto, self.ip, self.port, self.api), self.username, self.password)
+
+	def runRequest(self, deferred, callback, *args):
+		"""Calls callback with the result of the web interface request unless
+		the screen has been closed in the meantime."""
+		if not hasattr(self, "webIFRequests"):
+			self.webIFRequests = set()
+			self.onClose.append(self.cancelRequests)
+		self.webIFRequests.add(deferred)
+		deferred.addBoth(self.requestDone, deferred, callback, args)
+
+	def requestDone(self, result, deferred, callback, args):
+		if deferred in self.webIFRequests:
+			self.webIFRequests.discard(deferred)
+			if isinstance(result, Failure):  # An invalid response, the callbacks show the error message.
+				print("[OScamInfo] Error: %s" % result.getErrorMessage())
+				result = result.getErrorMessage()
+			callback(result, *args)
+
+	def cancelRequests(self):
+		requests = list(self.webIFRequests)
+		self.webIFRequests.clear()
+		for deferred in requests:
+			deferred.cancel()
+
+	def isRequestRunning(self):
+		return bool(getattr(self, "webIFRequests", None))
+
+	def webIFError(self, failure):
+		failure.trap(SoftcamAPIError, CancelledError)
+		print("[OScamInfo] Error: %s" % failure.getErrorMessage())
+		return failure.getErrorMessage()
 
 	def readXML(self, typ):
-		if typ == "l":
-			self.showLog = True
-			part = "status&appendlog=1"
-		else:
-			self.showLog = False
-			part = None
-		result = self.openWebIF(part)
+		"""Returns a Deferred that fires with the list of clients, servers or
+		log lines or with the error message."""
+		self.showLog = typ == "l"
+		api = self.getAPI()
+		if isinstance(api, str):
+			return succeed(api)
+		deferred = api.getLog() if self.showLog else api.getStatus()
+		return deferred.addCallbacks(self.parseXML, self.webIFError, callbackArgs=(typ,))
+
+	def parseXML(self, data, typ):
 		retval = []
 		tmp = {}
-		if result[0]:
-			if not self.showLog:
-				data = ElementTree.XML(result[1])
-#				if typ=="version":
-#					if "version" in data.attrib:
-#						self.version = data.attrib["version"]
-#					else:
-#						self.version = "n/a"
-#					return self.version
-				status = data.find("status")
-				clients = status.findall("client")
-				for cl in clients:
-					name = cl.attrib["name"]
-					proto = cl.attrib["protocol"]
-					if "au" in cl.attrib:
-						au = cl.attrib["au"]
-					else:
-						au = ""
-					caid = cl.find("request").attrib["caid"]
-					srvid = cl.find("request").attrib["srvid"]
-					if "ecmtime" in cl.find("request").attrib:
-						ecmtime = cl.find("request").attrib["ecmtime"]
-						if ecmtime == "0" or ecmtime == "":
-							ecmtime = _("n/a")
-						else:
-							ecmtime = str(float(ecmtime) / 1000)[:5]
-					else:
-						ecmtime = "not available"
-					srvname = cl.find("request").text
-					if srvname is not None:
-						if ":" in srvname:
-							srvname_short = srvname.split(":")[1].strip()
-						else:
-							srvname_short = srvname
+		self.version = data.attrib.get("version", _("n/a"))
+		if typ != "l":
+			status = data.find("status")
+			clients = status.findall("client")
+			for cl in clients:
+				name = cl.attrib["name"]
+				proto = cl.attrib["protocol"]
+				if "au" in cl.attrib:
+					au = cl.attrib["au"]
+				else:
+					au = ""
+				caid = cl.find("request").attrib["caid"]
+				srvid = cl.find("request").attrib["srvid"]
+				if "ecmtime" in cl.find("request").attrib:
+					ecmtime = cl.find("request").attrib["ecmtime"]
+					if ecmtime == "0" or ecmtime == "":
+						ecmtime = _("n/a")
 					else:
-						srvname_short = _("n/a")
-					login = cl.find("times").attrib["login"]
-					online = cl.find("times").attrib["online"]
-					if proto.lower() == "dvbapi":
-						ip = ""
+						ecmtime = str(float(ecmtime) / 1000)[:5]
+				else:
+					ecmtime = "not available"
+				srvname = cl.find("request").text
+				if srvname is not None:
+					if ":" in srvname:
+						srvname_short = srvname.split(":")[1].strip()
 					else:
-						ip = cl.find("connection").attrib["ip"]
-						if ip == "0.0.0.0":
-							ip = ""
-					port = cl.find("connection").attrib["port"]
-					connstatus = cl.find("connection").text
-					if name != "" and name != "anonymous" and proto != "":
-						try:
-							tmp[cl.attrib["type"]].append((name, proto, "%s:%s" % (caid, srvid), srvname_short, ecmtime, ip, connstatus))
-						except KeyError:
-							tmp[cl.attrib["type"]] = []
-							tmp[cl.attrib["type"]].append((name, proto, "%s:%s" % (caid, srvid), srvname_short, ecmtime, ip, connstatus))
-			else:
-				if b"<![CDATA" not in result[1]:
-					tmp = result[1].replace("<log>", "<log><![CDATA[").replace("</log>", "]]></log>")
+						srvname_short = srvname
 				else:
-					tmp = result[1]
-				data = ElementTree.XML(tmp)
-				log = data.find("log")
-				logtext = log.text
-			if typ == "s":
-				if "r" in tmp:
-					for i in tmp["r"]:
-						retval.append(i)
-				if "p" in tmp:
-					for i in tmp["p"]:
-						retval.append(i)
-			elif typ == "c":
-				if "c" in tmp:
-					for i in tmp["c"]:
-						retval.append(i)
-			elif typ == "l":
-				tmp = logtext.split("\n")
-				retval = []
-				for i in tmp:
-					tmp2 = i.split(" ")
-					if len(tmp2) > 2:
-						del tmp2[2]
-						txt = ""
-						for j in tmp2:
-							txt += "%s " % j.strip()
-						retval.append(txt)
-
-			return retval
-
-		else:
-			return result[1]
-
-	def getVersion(self):
-		xmldata = self.openWebIF()
-		if xmldata[0]:
-			data = ElementTree.XML(xmldata[1])
-			if "version" in data.attrib:
-				self.version = data.attrib["version"]
-			else:
-				self.version = _("n/a")
-			return self.version
-		else:
-			self.version = _("n/a")
-		return self.version
-
-	def getTotalCards(self, reader):
-		xmldata = self.openWebIF(part="entitlement", reader=reader)
-		if xmldata[0]:
-			xmld = ElementTree.XML(xmldata[1])
-			cards = xmld.find("reader").find("cardlist")
-			cardTotal = cards.attrib["totalcards"]
-			return cardTotal
+					srvname_short = _("n/a")
+				login = cl.find("times").attrib["login"]
+				online = cl.find("times").attrib["online"]
+				if proto.lower() == "dvbapi":
+					ip = ""
+				else:
+					ip = cl.find("connection").attrib["ip"]
+					if ip == "0.0.0.0":
+						ip = ""
+				port = cl.find("connection").attrib["port"]
+				connstatus = cl.find("connection").text
+				if name != "" and name != "anonymous" and proto != "":
+					try:
+						tmp[cl.attrib["type"]].append((name, proto, "%s:%s" % (caid, srvid), srvname_short, ecmtime, ip, connstatus))
+					except KeyError:
+						tmp[cl.attrib["type"]] = []
+						tmp[cl.attrib["type"]].append((name, proto, "%s:%s" % (caid, srvid), srvname_short, ecmtime, ip, connstatus))
 		else:
-			return None
+			log = data.find("log")
+			logtext = log.text or ""
+		if typ == "s":
+			if "r" in tmp:
+				for i in tmp["r"]:
+					retval.append(i)
+			if "p" in tmp:
+				for i in tmp["p"]:
+					retval.append(i)
+		elif typ == "c":
+			if "c" in tmp:
+				for i in tmp["c"]:
+					retval.append(i)
+		elif typ == "l":
+			tmp = logtext.split("\n")
+			retval = []
+			for i in tmp:
+				tmp2 = i.split(" ")
+				if len(tmp2) > 2:
+					del tmp2[2]
+					txt = ""
+					for j in tmp2:
+						txt += "%s " % j.strip()
+					retval.append(txt)
+		return retval
 
 	def getReaders(self, spec=None):
-		xmldata = self.openWebIF()
-		readers = []
-		if xmldata[0]:
-			data = ElementTree.XML(xmldata[1])
-			status = data.find("status")
-			clients = status.findall("client")
-			for cl in clients:
-				if "type" in cl.attrib:
-					if cl.attrib["type"] == "p" or cl.attrib["type"] == "r":
-						if spec is not None:
-							proto = cl.attrib["protocol"]
-							if spec in proto:
-								name = cl.attrib["name"]
-								cards = self.getTotalCards(name)
-								readers.append((_("%s ( %s Cards )") % (name, cards), name))
-						else:
-							if cl.attrib["name"] != "" and cl.attrib["name"] != "" and cl.attrib["protocol"] != "":
-								readers.append((cl.attrib["name"], cl.attrib["name"]))  # return tuple for later use in Choicebox
-			return readers
+		"""Returns a Deferred that fires with the list of (label, name) of the
+		readers and proxies for a ChoiceBox or with None.  With "spec" only
+		the readers of that protocol are listed with their number of cards,
+		the cards of all the readers are requested at the same time."""
+		api = self.getAPI()
+		if isinstance(api, str):
+			return succeed(None)
+		deferred = api.getReaders(spec)
+		if spec is not None:
+			deferred.addCallback(lambda readers: api.getTotalCards([name for name, proto in readers]))
+			deferred.addCallback(lambda totals: [(_("%s ( %s Cards )") % (name, cards), name) for name, cards in totals.items()])
 		else:
-			return None
+			deferred.addCallback(lambda readers: [(name, name) for name, proto in readers])  # return tuple for later use in Choicebox
+		return deferred.addErrback(self.readersFailed)
 
-	def getClients(self):  # TODO not used ??
-		xmldata = self.openWebIF()
-		clientnames = []
-		if xmldata[0]:
-			data = ElementTree.XML(xmldata[1])
-			status = data.find("status")
-			clients = status.findall("client")
-			for cl in clients:
-				if "type" in cl.attrib:
-					if cl.attrib["type"] == "c":
-						readers.append((cl.attrib["name"], cl.attrib["name"]))  # return tuple for later use in Choicebox
-			return clientnames
-		else:
-			return None
+	def readersFailed(self, failure):
+		self.webIFError(failure)
+		return None
 
 	def getECMInfo(self, ecminfo):
 		result = []
@@ -389,11 +338,10 @@ class oscMenuList(MenuList):
 		self.l.setFont(3, gFont("Regular", int(12 * sf)))
 
 
-class OscamInfoMenu(Screen):
+class OscamInfoMenu(Screen, OscamInfo):
 	def __init__(self, session):
 		self.menu = [_("Show /tmp/ecm.info"), _("Show Clients"), _("Show Readers/Proxies"), _("Show Log"), _("Card infos (CCcam-Reader)"), _("ECM Statistics"), _("Setup")]
 		Screen.__init__(self, session)
-		self.osc = OscamInfo()
 		self["mainmenu"] = oscMenuList([])
 		self["actions"] = NumberActionMap(["OkCancelActions", "InputActions", "ColorActions"],
 					{
@@ -460,7 +408,7 @@ class OscamInfoMenu(Screen):
 		pass
 
 	def goEntry(self, entry):
-		if entry in (1, 2, 3) and config.oscaminfo.userdatafromconf.value and self.osc.confPath()[0] is None:
+		if entry in (1, 2, 3) and config.oscaminfo.userdatafromconf.value and self.confPath()[0] is None:
 			config.oscaminfo.userdatafromconf.setValue(False)
 			config.oscaminfo.userdatafromconf.save()
 			self.session.openWithCallback(self.ErrMsgCallback, MessageBox, _("File oscam.conf not found.\nPlease enter username/password manually."), MessageBox.TYPE_ERROR)
@@ -476,28 +424,31 @@ class OscamInfoMenu(Screen):
 		elif entry == 3:
 			self.session.open(oscInfo, "l")
 		elif entry == 4:
-			osc = OscamInfo()
-			reader = osc.getReaders("cccam")  # get list of available CCcam-Readers
-			if isinstance(reader, list):
-				if len(reader) == 1:
-					self.session.open(oscEntitlements, reader[0][1])
-				else:
-					self.callbackmode = "cccam"
-					self.session.openWithCallback(self.chooseReaderCallback, ChoiceBox, title=_("Please choose CCcam-Reader"), list=reader)
+			if not self.isRequestRunning():
+				self.runRequest(self.getReaders("cccam"), self.showCCcamReaders)  # get list of available CCcam-Readers
 		elif entry == 5:
-			osc = OscamInfo()
-			reader = osc.getReaders()
-			if reader is not None:
-				reader.append((_("All"), "all"))
-				if isinstance(reader, list):
-					if len(reader) == 1:
-						self.session.open(oscReaderStats, reader[0][1])
-					else:
-						self.callbackmode = "readers"
-						self.session.openWithCallback(self.chooseReaderCallback, ChoiceBox, title=_("Please choose reader"), list=reader)
+			if not self.isRequestRunning():
+				self.runRequest(self.getReaders(), self.showReaders)
 		elif entry == 6:
 			self.session.open(OscamInfoSetup)
 
+	def showCCcamReaders(self, reader):
+		if isinstance(reader, list):
+			if len(reader) == 1:
+				self.session.open(oscEntitlements, reader[0][1])
+			else:
+				self.callbackmode = "cccam"
+				self.session.openWithCallback(self.chooseReaderCallback, ChoiceBox, title=_("Please choose CCcam-Reader"), list=reader)
+
+	def showReaders(self, reader):
+		if isinstance(reader, list):
+			reader.append((_("All"), "all"))
+			if len(reader) == 1:
+				self.session.open(oscReaderStats, reader[0][1])
+			else:
+				self.callbackmode = "readers"
+				self.session.openWithCallback(self.chooseReaderCallback, ChoiceBox, title=_("Please choose reader"), list=reader)
+
 	def chooseReaderCallback(self, retval):
 		print(retval)
 		if retval is not None:
@@ -596,10 +547,9 @@ class oscInfo(Screen, OscamInfo):
 	def __init__(self, session, what):
 		global HDSKIN, sizeH
 		self.what = what
-		self.firstrun = True
 		self.listchange = True
 		self.scrolling = False
-		self.webif_data = self.readXML(typ=self.what)
+		self.out = []
 		ypos = 10
 		ysize = 350
 		self.rows = 12
@@ -771,11 +721,10 @@ class oscInfo(Screen, OscamInfo):
 		return res
 
 	def showData(self):
-		if self.firstrun:
-			data = self.webif_data
-			self.firstrun = False
-		else:
-			data = self.readXML(typ=self.what)
+		if not self.isRequestRunning():  # The auto update doesn't queue requests behind a slow web interface.
+			self.runRequest(self.readXML(typ=self.what), self.showResult)
+
+	def showResult(self, data):
 		self.out = []
 		self.itemheight = 25
 		if not isinstance(data, str):
@@ -790,17 +739,17 @@ class oscInfo(Screen, OscamInfo):
 					if i != "":
 						self.out.append(self.buildLogListEntry((i,)))
 			if self.what == "c":
-				self.setTitle(_("Client Info ( Oscam-Version: %s )") % self.getVersion())
+				self.setTitle(_("Client Info ( Oscam-Version: %s )") % self.version)
 				self["key_green"].setText("")
 				self["key_yellow"].setText(_("Servers"))
 				self["key_blue"].setText(_("Log"))
 			elif self.what == "s":
-				self.setTitle(_("Server Info ( Oscam-Version: %s )") % self.getVersion())
+				self.setTitle(_("Server Info ( Oscam-Version: %s )") % self.version)
 				self["key_green"].setText(_("Clients"))
 				self["key_yellow"].setText("")
 				self["key_blue"].setText(_("Log"))
 			elif self.what == "l":
-				self.setTitle(_("Oscam Log ( Oscam-Version: %s )") % self.getVersion())
+				self.setTitle(_("Oscam Log ( Oscam-Version: %s )") % self.version)
 				self["key_green"].setText(_("Clients"))
 				self["key_yellow"].setText(_("Servers"))
 				self["key_blue"].setText("")
@@ -932,8 +881,20 @@ class oscEntitlements(Screen, OscamInfo):
 		return res
 
 	def showData(self):
-		xmldata_for_reader = self.openWebIF(part="entitlement", reader=self.cccamreader)
-		xdata = ElementTree.XML(xmldata_for_reader[1])
+		if not self.isRequestRunning():
+			api = self.getAPI()
+			if isinstance(api, str):
+				self.showError(api)
+			else:
+				self.runRequest(api.getEntitlements(self.cccamreader).addErrback(self.webIFError), self.showResult)
+
+	def showError(self, error):
+		self.setTitle(_("Error") + ": " + error)
+
+	def showResult(self, xdata):
+		if isinstance(xdata, str):
+			self.showError(xdata)
+			return
 		reader = xdata.find("reader")
 		if "hostaddress" in reader.attrib:
 			hostadr = reader.attrib["hostaddress"]
@@ -1076,14 +1037,24 @@ class oscReaderStats(Screen, OscamInfo):
 		return sorted(datalist, key=itemgetter(sort_col), reverse=reverse)
 
 	def showData(self):
-		readers = self.getReaders()
+		if not self.isRequestRunning():
+			api = self.getAPI()
+			if isinstance(api, str):
+				self.setTitle(_("Error") + ": " + api)
+			elif self.allreaders:  # The statistics of all the readers are requested at the same time.
+				deferred = self.getReaders().addCallback(lambda readers: api.getAll(api.getReaderStats, [name for label, name in readers or []]))
+				self.runRequest(deferred, self.showResult)
+			else:
+				self.runRequest(api.getAll(api.getReaderStats, [self.reader]), self.showResult)
+
+	def showResult(self, readers):
 		result = []
 		title2 = ""
-		for i in readers:
-			xmldata = self.openWebIF(part="readerstats", reader=i[1])
+		if not isinstance(readers, list):  # The request failed or was cancelled.
+			readers = []
+		for name, xdata in readers:
 			emm_wri = emm_ski = emm_blk = emm_err = ""
-			if xmldata[0]:
-				xdata = ElementTree.XML(xmldata[1])
+			if xdata is not None:
 				rdr = xdata.find("reader")
 #					emms = rdr.find("emmstats")
 #					if "totalwritten" in emms.attrib:
@@ -1125,11 +1096,11 @@ class oscReaderStats(Screen, OscamInfo):
 #						if lastreq != "":
 #							last_req = lastreq.split("T")[1][:-5]
 						if self.allreaders:
-							result.append((i[1], caid, channel, avg_time, last_time, rcs, last_req, int(num)))
+							result.append((name, caid, channel, avg_time, last_time, rcs, last_req, int(num)))
 							title2 = _("( All readers)")
 						else:
-							if i[1] == self.reader:
-								result.append((i[1], caid, channel, avg_time, last_time, rcs, last_req, int(num)))
+							if name == self.reader:
+								result.append((name, caid, channel, avg_time, last_time, rcs, last_req, int(num)))
 							title2 = _("(Show only reader:") + "%s )" % self.reader
 
 		outlist = self.sortData(result, 7, True)
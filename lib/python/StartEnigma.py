@@ -1,5 +1,5 @@
 from errno import ENOENT
-from os import remove
+from os import environ, remove
 from os.path import exists
 import sys  # This is needed for the twisted redirection access to stderr and stdout.
 from time import time
@@ -15,6 +15,11 @@ enigma.eTimer = eBaseImpl.eTimer
 enigma.eSocketNotifier = eBaseImpl.eSocketNotifier
 enigma.eConsoleAppContainer = eConsoleImpl.eConsoleAppContainer
 
+from Tools.KeyLatency import keyLatency
+from Tools.LoopTracer import loopTracer
+if "ENIGMA_LOOP_TRACE" in environ:  # This must be done before the eTimers are imported and created.
+	loopTracer.install()
+
 MODULE_NAME = "StartEnigma"  # This is done here as "__name__.split(".")[-1]" returns "__main__" for this module.
 
 
@@ -96,10 +101,12 @@ class Session:
 		if first:
 			self.instantiateSummaryDialog(currentDialog)
 		currentDialog.saveKeyboardMode()
-		currentDialog.execBegin()
+		with keyLatency.phase("execBegin", currentDialog):
+			currentDialog.execBegin()
 		# When execBegin opened a new dialog, don't bother showing the old one.
 		if currentDialog == self.current_dialog and do_show:
-			currentDialog.show()
+			with keyLatency.phase("show", currentDialog):
+				currentDialog.show()
 
 	def execEnd(self, last=True):
 		assert self.in_exec
@@ -134,12 +141,15 @@ class Session:
 			screen.addSummary(self.summary)
 
 	def doInstantiateDialog(self, screen, arguments, kwargs, desktop):
-		dialog = screen(self, *arguments, **kwargs)  # Create dialog.
+		with keyLatency.phase("init", screen):
+			dialog = screen(self, *arguments, **kwargs)  # Create dialog.
 		if dialog is None:
 			return
-		readSkin(dialog, None, dialog.skinName, desktop)  # Read skin data.
-		dialog.setDesktop(desktop)  # Create GUI view of this dialog.
-		dialog.applySkin()
+		with keyLatency.phase("readSkin", dialog):
+			readSkin(dialog, None, dialog.skinName, desktop)  # Read skin data.
+		with keyLatency.phase("applySkin", dialog):
+			dialog.setDesktop(desktop)  # Create GUI view of this dialog.
+			dialog.applySkin()
 		return dialog
 
 	def pushCurrent(self):
@@ -464,6 +474,10 @@ def runScreenTest():
 	from Components.FrontPanelLed import FrontPanelLed
 	runReactor()
 	session.shutdown = True
+	if loopTracer.enabled:
+		loopTracer.dump()
+	if keyLatency.enabled:
+		keyLatency.dump()
 	FrontPanelLed.shutdown()
 	print("[StartEnigma] Normal shutdown.")
 	config.misc.startCounter.save()
@@ -0,0 +1,74 @@
+from math import cos, pi, sin
+
+from enigma import eRect
+
+handCache = {}  # Indexed by (centerX, centerY, length, rectWidth, rectHeight), the value is a tuple of the rectangles of the 60 hand positions.
+
+
+def getHandEnd(position, length, centerX, centerY):
+	angle = position * pi / 30
+	return centerX + int(round(length * sin(angle))), centerY - int(round(length * cos(angle)))
+
+
+def getLineRects(x0, y0, x1, y1, rectWidth=1, rectHeight=1):
+	"""Returns the Bresenham line from (x0, y0) to (x1, y1) as a list of
+	(x, y, width, height) tuples.  Every step is a rectWidth x rectHeight
+	rectangle and consecutive steps in the same row or column are merged
+	into a single rectangle."""
+	steep = abs(y1 - y0) > abs(x1 - x0)
+	if steep:
+		x0, y0 = y0, x0
+		x1, y1 = y1, x1
+	if x0 > x1:
+		x0, x1 = x1, x0
+		y0, y1 = y1, y0
+	ystep = 1 if y0 < y1 else -1
+	deltax = x1 - x0
+	deltay = abs(y1 - y0)
+	error = -deltax / 2
+	y = int(y0)
+	runs = []  # Each run is [y, firstX, lastX].
+	for x in range(int(x0), int(x1) + 1):
+		if runs and runs[-1][0] == y:
+			runs[-1][2] = x
+		else:
+			runs.append([y, x, x])
+		error += deltay
+		if error > 0:
+			y += ystep
+			error -= deltax
+	if steep:
+		return [(y, first, rectWidth, last - first + rectHeight) for y, first, last in runs]
+	return [(first, y, last - first + rectWidth, rectHeight) for y, first, last in runs]
+
+
+def getHandRects(position, centerX, centerY, length, rectWidth=1, rectHeight=1):
+	"""Returns the cached eRect tuple of a clock hand at one of the 60 dial
+	positions.  All 60 positions are calculated on the first use of a hand
+	geometry."""
+	key = (centerX, centerY, length, rectWidth, rectHeight)
+	hands = handCache.get(key)
+	if hands is None:
+		hands = tuple(tuple(eRect(*rect) for rect in getLineRects(centerX, centerY, *getHandEnd(index, length, centerX, centerY), rectWidth=rectWidth, rectHeight=rectHeight)) for index in range(60))
+		handCache[key] = hands
+	return hands[int(position) % 60]
+
+
+class ClockHand:
+	"""Draws a clock hand on an eCanvas and erases only the rectangles of the
+	previous hand position on the next draw instead of clearing the canvas."""
+
+	def __init__(self):
+		self.rects = ()
+
+	def draw(self, canvas, rects, color, background):
+		if rects is self.rects:
+			return
+		for rect in self.rects:
+			canvas.fillRect(rect, background)
+		for rect in rects:
+			canvas.fillRect(rect, color)
+		self.rects = rects
+
+	def reset(self):  # The canvas was cleared.
+		self.rects = ()
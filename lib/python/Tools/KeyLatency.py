@@ -0,0 +1,190 @@
+from collections import deque
+from contextlib import nullcontext
+from os.path import join
+from time import perf_counter, strftime
+
+import enigma
+
+from Tools.LoopTracer import getCallsiteName, loopTracer
+
+MODULE_NAME = __name__.split(".")[-1]
+
+SAMPLES = 500  # Number of the latest latencies kept per action and screen for the percentiles.
+RECORD_LIMIT = 10000  # Maximum number of key presses recorded for a replay.
+DUMP_FILE = "enigma2-keylatency.json"
+NO_PHASE = nullcontext()
+
+
+class LatencyStats:
+	__slots__ = ("count", "total", "peak", "samples")
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.peak = 0.0
+		self.samples = deque(maxlen=SAMPLES)
+
+	def add(self, latency):
+		self.count += 1
+		self.total += latency
+		if latency > self.peak:
+			self.peak = latency
+		self.samples.append(latency)
+
+	def getPercentile(self, percent):
+		samples = sorted(self.samples)
+		return samples[min(int(len(samples) * percent / 100), len(samples) - 1)] if samples else 0.0
+
+	def getResult(self):
+		return {
+			"count": self.count,
+			"mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+			"median_ms": round(self.getPercentile(50), 3),
+			"p95_ms": round(self.getPercentile(95), 3),
+			"max_ms": round(self.peak, 3)
+		}
+
+
+class KeyPress:
+	__slots__ = ("name", "start", "callback", "phases")
+
+	def __init__(self, name, start):
+		self.name = name
+		self.start = start
+		self.callback = None  # Milliseconds until the action callback returned.
+		self.phases = []  # List of (screen, phase, milliseconds) of the screens opened by the action.
+
+
+class Phase:
+	__slots__ = ("keyLatency", "key", "screen", "name", "start")
+
+	def __init__(self, keyLatency, key, screen, name):
+		self.keyLatency = keyLatency
+		self.key = key
+		self.screen = screen
+		self.name = name
+
+	def __enter__(self):
+		self.start = perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		duration = (perf_counter() - self.start) * 1000.0
+		screen = getCallsiteName(self.screen)
+		self.key.phases.append((screen, self.name, duration))
+		self.keyLatency.getStats(self.keyLatency.phases, "%s %s" % (screen, self.name)).add(duration)
+		return False
+
+
+class KeyLatency:
+	"""Measures the time from a key press to the next GUI repaint.  The key
+	press starts when ActionMap.action() dispatches it, readSkin, applySkin
+	and execBegin of the screens opened by the action are measured as
+	phases and the key press ends when the main loop runs again after the
+	action, at that point the widgets invalidated by the action have been
+	painted.  The latencies are collected per action and per opened screen
+	class and the key presses are recorded so tests/replay_keys.py can feed
+	them through the test environment to compare builds."""
+
+	def __init__(self):
+		self.enabled = False
+		self.current = None  # The key press that has not been painted yet.
+		self.depth = 0  # Nesting of the action dispatches of the current key press.
+		self.actions = {}  # Indexed by "context:action".
+		self.screens = {}  # Indexed by the qualified screen class name.
+		self.phases = {}  # Indexed by "screen phase".
+		self.keys = []  # The (context, action) of the recorded key presses.
+		self.paintTimer = None
+
+	def setEnabled(self, enabled):
+		if not enabled and self.enabled:
+			self.current = None
+			self.depth = 0
+		self.enabled = enabled
+
+	def keyPressed(self, context, action):
+		if self.current is None:  # Further dispatches before the repaint belong to the same key press.
+			self.current = KeyPress("%s:%s" % (context, action), perf_counter())
+			if len(self.keys) < RECORD_LIMIT:
+				self.keys.append((context, action))
+		self.depth += 1
+
+	def actionDone(self):
+		if self.depth:
+			self.depth -= 1
+		key = self.current
+		if self.depth == 0 and key is not None and key.callback is None:
+			key.callback = (perf_counter() - key.start) * 1000.0
+			if self.paintTimer is None:
+				self.paintTimer = enigma.eTimer()
+				self.paintTimer.callback.append(self.painted)
+			self.paintTimer.start(0, True)
+
+	def phase(self, name, screen):
+		"""Returns a context manager that measures a phase of the screen for
+		the current key press."""
+		return Phase(self, self.current, screen, name) if self.current is not None else NO_PHASE
+
+	def painted(self):
+		key = self.current
+		if key is None:
+			return
+		self.current = None
+		latency = (perf_counter() - key.start) * 1000.0
+		self.getStats(self.actions, key.name).add(latency)
+		screens = []
+		for screen, phase, duration in key.phases:
+			if screen not in screens:
+				screens.append(screen)
+				self.getStats(self.screens, screen).add(latency)
+		details = "".join(", %s %s %.1f ms" % (screen.rpartition(".")[2], phase, duration) for screen, phase, duration in key.phases)
+		print("[%s] Action '%s' took %.1f ms to paint, callback %.1f ms%s." % (MODULE_NAME, key.name, latency, key.callback or 0.0, details))
+
+	def getStats(self, statistics, name):
+		stats = statistics.get(name)
+		if stats is None:
+			stats = statistics[name] = LatencyStats()
+		return stats
+
+	def reset(self):
+		self.current = None
+		self.depth = 0
+		self.actions = {}
+		self.screens = {}
+		self.phases = {}
+		self.keys = []
+
+	def getResults(self):
+		return {
+			"created": strftime("%Y-%m-%dT%H:%M:%S"),
+			"actions": {name: stats.getResult() for name, stats in self.actions.items()},
+			"screens": {name: stats.getResult() for name, stats in self.screens.items()},
+			"phases": {name: stats.getResult() for name, stats in self.phases.items()},
+			"keys": [list(key) for key in self.keys]
+		}
+
+	def dump(self, filename=None):
+		from json import dump
+		if filename is None:
+			from Components.config import config
+			filename = join(config.crash.debug_path.value, DUMP_FILE)
+		try:
+			with open(filename, "w") as fd:
+				dump(self.getResults(), fd, indent="\t", sort_keys=True)
+		except OSError as err:
+			print("[%s] Error %d: Unable to write key latency results to '%s'!  (%s)" % (MODULE_NAME, err.errno, filename, err.strerror))
+
+
+def runAction(context, action, function, *args):
+	"""Run the callback of an action and follow the key press if the key
+	latency measurement or the main loop tracer are enabled."""
+	if keyLatency.enabled:
+		keyLatency.keyPressed(context, action)
+		try:
+			return loopTracer.call("action", function, function, *args) if loopTracer.enabled else function(*args)
+		finally:
+			keyLatency.actionDone()
+	return loopTracer.call("action", function, function, *args) if loopTracer.enabled else function(*args)
+
+
+keyLatency = KeyLatency()
@@ -0,0 +1,246 @@
+from os.path import exists
+
+MODULE_NAME = __name__.split(".")[-1]
+
+NAMESPACE_CABLE = 0xFFFF
+NAMESPACE_TERRESTRIAL = 0xEEEE
+SATELLITE_PARAMETERS = {  # Field names of the "s" transponder data by lamedb version.
+	3: ("frequency", "symbol_rate", "polarization", "fec_inner", "position", "inversion", "system", "modulation", "rolloff", "pilot"),
+	4: ("frequency", "symbol_rate", "polarization", "fec_inner", "position", "inversion", "flags", "system", "modulation", "rolloff", "pilot"),
+	5: ("frequency", "symbol_rate", "polarization", "fec_inner", "position", "inversion", "flags", "system", "modulation", "rolloff", "pilot")
+}
+
+
+def getOrbitalPosition(namespace):  # Cable and terrestrial namespaces are returned as 0xFFFF and 0xEEEE.
+	position = namespace >> 16
+	return position if position in (NAMESPACE_CABLE, NAMESPACE_TERRESTRIAL) else position & 0xFFF
+
+
+class Transponder:
+	__slots__ = ("namespace", "tsid", "onid", "type", "data")
+
+	def __init__(self, namespace, tsid, onid, type, data):
+		self.namespace = namespace
+		self.tsid = tsid
+		self.onid = onid
+		self.type = type  # "s", "c", "t" or "a".
+		self.data = data  # Tuple of the integer fields of the transponder line.
+
+	def __repr__(self):
+		return "Transponder(%08X:%04X:%04X %s %s)" % (self.namespace, self.tsid, self.onid, self.type, ":".join(str(x) for x in self.data))
+
+	@property
+	def key(self):
+		return (self.namespace, self.tsid, self.onid)
+
+	@property
+	def orbitalPosition(self):
+		return getOrbitalPosition(self.namespace)
+
+	def getSatelliteParameters(self, version=4):  # Returns a dict of the named "s" fields, additional fields are ignored.
+		return dict(zip(SATELLITE_PARAMETERS.get(version, SATELLITE_PARAMETERS[4]), self.data)) if self.type == "s" else {}
+
+
+class Service:
+	__slots__ = ("sid", "namespace", "tsid", "onid", "serviceType", "number", "name", "provider", "data")
+
+	def __init__(self, sid, namespace, tsid, onid, serviceType, number, name, provider, data):
+		self.sid = sid
+		self.namespace = namespace
+		self.tsid = tsid
+		self.onid = onid
+		self.serviceType = serviceType
+		self.number = number
+		self.name = name
+		self.provider = provider
+		self.data = data  # The remaining "c:", "f:" and "C:" data as a string.
+
+	def __repr__(self):
+		return "Service(%s %s)" % (self.getServiceReference(), self.name)
+
+	@property
+	def transponderKey(self):
+		return (self.namespace, self.tsid, self.onid)
+
+	@property
+	def orbitalPosition(self):
+		return getOrbitalPosition(self.namespace)
+
+	def getServiceReference(self):
+		return "1:0:%X:%X:%X:%X:%X:0:0:0:" % (self.serviceType, self.sid, self.tsid, self.onid, self.namespace)
+
+
+class BouquetEntry:
+	__slots__ = ("reference", "description")
+
+	def __init__(self, reference, description=None):
+		self.reference = reference
+		self.description = description
+
+	def __repr__(self):
+		return "BouquetEntry(%s)" % self.reference
+
+
+def _splitProvider(data):  # Split the "p:provider,c:..." service data into the provider and the remaining data.
+	if data.startswith("p:"):
+		provider, sep, rest = data[2:].partition(",")
+		return provider, rest
+	return "", data
+
+
+def _parseServiceRef(text):  # "SID:NS:TSID:ONID:STYPE:NUMBER[:SRCID]", the service type and number are decimal.
+	fields = text.split(":")
+	return int(fields[0], 16), int(fields[1], 16), int(fields[2], 16), int(fields[3], 16), int(fields[4]), int(fields[5]) if len(fields) > 5 and fields[5] else 0
+
+
+def _parseTransponderData(text):
+	type, sep, data = text.strip().partition(" ")
+	if not sep:  # Version 5 uses "s:" instead of "s ".
+		type, sep, data = text.strip().partition(":")
+	try:
+		values = tuple(int(value) for value in data.split(":") if value)
+	except ValueError:
+		values = ()
+	return type, values
+
+
+def readLamedbVersion(line):
+	for version in (3, 4, 5):
+		if "/%d/" % version in line:
+			return version
+	return 0
+
+
+def iterLamedb(filename, services=True):
+	"""Stream the transponders and services of a version 3, 4 or 5 lamedb
+	file as Transponder and Service records.  The first record is the lamedb
+	version number.  If services is False reading stops after the
+	transponders."""
+	with open(filename, encoding="UTF-8", errors="replace") as fd:
+		version = readLamedbVersion(fd.readline())
+		yield version
+		if version == 5:
+			for line in fd:
+				if line.startswith("t:"):
+					head, sep, data = line[2:].rstrip("\n").partition(",")
+					namespace, tsid, onid = head.split(":")[:3]
+					type, values = _parseTransponderData(data)
+					yield Transponder(int(namespace, 16), int(tsid, 16), int(onid, 16), type, values)
+				elif line.startswith("s:"):
+					if not services:
+						return
+					head, sep, rest = line[2:].rstrip("\n").partition(",\"")
+					name, sep, data = rest.rpartition("\"")
+					provider, data = _splitProvider(data[1:])
+					sid, namespace, tsid, onid, serviceType, number = _parseServiceRef(head)
+					yield Service(sid, namespace, tsid, onid, serviceType, number, name, provider, data)
+		elif version in (3, 4):
+			section = None
+			key = None
+			for line in fd:
+				line = line.rstrip("\n")
+				if section is None:
+					if line in ("transponders", "services"):
+						section = line
+						if section == "services" and not services:
+							return
+				elif line == "end":
+					section = None
+				elif section == "transponders":
+					if line == "/":
+						key = None
+					elif key is None:
+						key = line.split(":")
+					else:
+						type, values = _parseTransponderData(line)
+						yield Transponder(int(key[0], 16), int(key[1], 16), int(key[2], 16), type, values)
+				else:  # A service is three lines, the reference, the name and the provider data.
+					name = next(fd, "\n").rstrip("\n")
+					provider, data = _splitProvider(next(fd, "\n").rstrip("\n"))
+					sid, namespace, tsid, onid, serviceType, number = _parseServiceRef(line)
+					yield Service(sid, namespace, tsid, onid, serviceType, number, name, provider, data)
+		else:
+			print("[%s] Error: Unknown lamedb version in '%s'!" % (MODULE_NAME, filename))
+
+
+def iterTransponders(filename):
+	records = iterLamedb(filename, services=False)
+	next(records)  # Skip the version.
+	return records
+
+
+def iterBouquet(filename):
+	"""Stream the entries of a userbouquet file as BouquetEntry records and
+	the bouquet name as a string."""
+	with open(filename, encoding="UTF-8", errors="replace") as fd:
+		entry = None  # An entry is yielded once its "#DESCRIPTION" line had a chance to follow.
+		for line in fd:
+			line = line.strip()
+			if line.startswith("#SERVICE "):
+				if entry is not None:
+					yield entry
+				entry = BouquetEntry(line[9:])
+			elif line.startswith("#DESCRIPTION "):
+				if entry is not None:
+					entry.description = line[13:]
+			elif line.startswith("#NAME "):
+				yield line[6:]
+		if entry is not None:
+			yield entry
+
+
+class Lamedb:
+	"""A lamedb file loaded into Transponder and Service records with indexes
+	by transponder, service reference, orbital position and provider."""
+
+	def __init__(self, filename=None):
+		self.version = 0
+		self.transponders = {}  # Indexed by (namespace, tsid, onid).
+		self.services = {}  # Indexed by service reference string.
+		self.positions = {}  # Indexed by orbital position, the value is a list of services.
+		self.providers = {}  # Indexed by provider name, the value is a list of services.
+		if filename:
+			self.load(filename)
+
+	def load(self, filename):
+		if not exists(filename):
+			print("[%s] Error: Lamedb file '%s' not found!" % (MODULE_NAME, filename))
+			return False
+		records = iterLamedb(filename)
+		self.version = next(records)
+		transponders = self.transponders
+		services = self.services
+		positions = self.positions
+		providers = self.providers
+		for record in records:
+			if isinstance(record, Service):
+				services[record.getServiceReference()] = record
+				positions.setdefault(record.orbitalPosition, []).append(record)
+				providers.setdefault(record.provider, []).append(record)
+			else:
+				transponders[record.key] = record
+		return self.version != 0
+
+	def getTransponder(self, service):
+		return self.transponders.get(service.transponderKey)
+
+	def getService(self, reference):  # The reference may be given with or without the trailing ":".
+		return self.services.get(reference if reference.endswith(":") else "%s:" % reference)
+
+	def getServicesByPosition(self, position):
+		return self.positions.get(position, [])
+
+	def getServicesByProvider(self, provider):
+		return self.providers.get(provider, [])
+
+
+def readBouquet(filename):
+	"""Returns (name, [BouquetEntry, ...]) of a userbouquet file."""
+	name = ""
+	entries = []
+	for record in iterBouquet(filename):
+		if isinstance(record, BouquetEntry):
+			entries.append(record)
+		elif record:
+			name = record
+	return name, entries
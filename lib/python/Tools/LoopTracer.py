@@ -0,0 +1,151 @@
+from bisect import bisect_left
+from os.path import join
+from time import perf_counter, strftime
+from weakref import ref
+
+import enigma
+
+MODULE_NAME = __name__.split(".")[-1]
+
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)  # Upper limits in milliseconds of the histogram buckets, the last bucket is for longer calls.
+BUCKET_LABELS = tuple("<=%d" % limit for limit in BUCKETS) + (">%d" % BUCKETS[-1],)
+DEFAULT_THRESHOLD = 50  # Calls that take longer than this many milliseconds are logged.
+DUMP_INTERVAL = 600  # Seconds between the summary dumps.
+DUMP_FILE = "enigma2-looptrace.txt"
+
+
+def getCallsiteName(site):
+	"""Returns the qualified name of a function, method or object."""
+	function = getattr(site, "__func__", site)  # Bound methods.
+	name = getattr(function, "__qualname__", None)
+	if name is None:  # An instance, use its class.
+		function = type(site)
+		name = function.__qualname__
+	module = getattr(function, "__module__", None)
+	return "%s.%s" % (module, name) if module else name
+
+
+class CallsiteStats:
+	__slots__ = ("count", "total", "peak", "histogram")
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.peak = 0.0
+		self.histogram = [0] * (len(BUCKETS) + 1)
+
+	def add(self, duration):
+		self.count += 1
+		self.total += duration
+		if duration > self.peak:
+			self.peak = duration
+		self.histogram[bisect_left(BUCKETS, duration)] += 1
+
+
+class LoopTracer:
+	"""Measures the callbacks that run on the enigma main loop: reactor reads
+	and writes, eTimer callbacks, ActionMap actions and Source change
+	notifications.  Durations are collected in a histogram per call site,
+	every call over the threshold is logged with the qualified name of the
+	callback and a summary is dumped to the debug log folder.
+
+	The tracer is enabled by install() at start up when the ENIGMA_LOOP_TRACE
+	environment variable is set, see config.crash.looptrace.  When it is not
+	enabled the hooks only test the "enabled" attribute."""
+
+	def __init__(self):
+		self.enabled = False
+		self.threshold = DEFAULT_THRESHOLD
+		self.stats = {}  # Indexed by (kind, name).
+		self.started = None
+		self.dumpTimer = None
+
+	def install(self):
+		if self.enabled:
+			return
+		print("[%s] Tracing main loop callbacks." % MODULE_NAME)
+		timerClass = enigma.eTimer
+		self.dumpTimer = timerClass()  # This timer is not traced.
+		self.dumpTimer.callback.append(self.dump)
+		self.dumpTimer.start(DUMP_INTERVAL * 1000)
+		enigma.eTimer = lambda: TracedTimer(timerClass())
+		self.started = perf_counter()
+		self.enabled = True
+
+	def call(self, kind, site, function, *args, **kwargs):
+		"""Call function(*args, **kwargs) and record the duration under the
+		call site.  The site is the callback or the object the call is made
+		for and is only named once the call is recorded."""
+		start = perf_counter()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			duration = (perf_counter() - start) * 1000.0
+			name = getCallsiteName(site)
+			stats = self.stats.get((kind, name))
+			if stats is None:
+				stats = self.stats[(kind, name)] = CallsiteStats()
+			stats.add(duration)
+			if duration > self.threshold:
+				print("[%s] Slow %s callback '%s' took %.1f ms." % (MODULE_NAME, kind, name, duration))
+
+	def reset(self):
+		self.stats = {}
+		self.started = perf_counter()
+
+	def getSummary(self, limit=50):
+		"""Returns the summary of the call sites with the longest total time
+		as a list of text lines."""
+		elapsed = perf_counter() - self.started if self.started else 0.0
+		lines = [
+			"Main loop trace of %.0f seconds, threshold %d ms, created %s." % (elapsed, self.threshold, strftime("%Y-%m-%d %H:%M:%S")),
+			"",
+			"%-8s %8s %10s %8s %8s  %s" % ("Kind", "Calls", "Total ms", "Avg ms", "Max ms", "Call site"),
+		]
+		ranked = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+		for (kind, name), stats in ranked[:limit]:
+			lines.append("%-8s %8d %10.1f %8.2f %8.1f  %s" % (kind, stats.count, stats.total, stats.total / stats.count, stats.peak, name))
+			lines.append("%-8s %s" % ("", "  ".join("%s:%d" % (label, count) for label, count in zip(BUCKET_LABELS, stats.histogram) if count)))
+		return lines
+
+	def dump(self, filename=None):
+		if filename is None:
+			from Components.config import config
+			filename = join(config.crash.debug_path.value, DUMP_FILE)
+		try:
+			with open(filename, "w") as fd:
+				fd.write("\n".join(self.getSummary()))
+				fd.write("\n")
+		except OSError as err:
+			print("[%s] Error %d: Unable to write main loop trace to '%s'!  (%s)" % (MODULE_NAME, err.errno, filename, err.strerror))
+
+
+class TracedTimer:
+	"""Wrapper of an eTimer that times every callback.  Callbacks added with
+	"timeout.get()" are passed to the eTimer and are not traced."""
+
+	def __init__(self, timer):
+		self.timer = timer
+		self.callback = []
+		tracer = ref(self)  # The eTimer must not keep its wrapper alive, the eTimer stops when the wrapper is released.
+
+		def timeout():
+			wrapper = tracer()
+			if wrapper is not None:
+				wrapper.run()
+
+		timer.callback.append(timeout)
+
+	def __getattr__(self, name):
+		return getattr(self.timer, name)
+
+	def run(self):
+		for callback in self.callback[:]:
+			try:
+				loopTracer.call("eTimer", callback, callback)
+			except Exception:
+				from traceback import print_exc
+				print_exc()
+
+
+loopTracer = LoopTracer()
@@ -3,12 +3,12 @@
 
 from os import path
 
+from Components.MovieMetaCache import movieMetaCache
+
 
 def getExtendedMovieDescription(ref):
-	f = None
 	extended_desc = ""
 	name = ""
-	extensions = (".txt", ".info")
 	info_file = path.realpath(ref.getPath())
 	name = path.basename(info_file)
 	ext_pos = name.rfind('.')
@@ -16,20 +16,7 @@ def getExtendedMovieDescription(ref):
 		name = (name[:ext_pos]).replace("_", " ")
 	else:
 		name = name.replace("_", " ")
-	for ext in extensions:
-		if path.exists(info_file + ext):
-			f = info_file + ext
-			break
-	if not f:
-		ext_pos = info_file.rfind('.')
-		name_len = len(info_file)
-		ext_len = name_len - ext_pos
-		if ext_len <= 5:
-			info_file = info_file[:ext_pos]
-			for ext in extensions:
-				if path.exists(info_file + ext):
-					f = info_file + ext
-					break
+	f = movieMetaCache.getDescriptionFile(info_file)  # Uses the cached directory listing instead of probing each extension.
 	if f:
 		with open(f) as txtfile:
 			extended_desc = txtfile.read()
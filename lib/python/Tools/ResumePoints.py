@@ -0,0 +1,219 @@
+from collections import OrderedDict
+from os import listdir, rename
+from os.path import dirname, ismount, realpath
+from pickle import HIGHEST_PROTOCOL, Pickler, UnpicklingError, Unpickler, dump, load
+from time import time
+
+from twisted.internet import threads
+
+from Components.Harddisk import findMountPoint
+
+MODULE_NAME = __name__.split(".")[-1]
+
+RESUME_POINTS_FILE = "/etc/enigma2/resumepoints.pkl"
+MAX_ENTRIES = 2000  # Least recently used entries beyond this are dropped.
+MAX_JOURNAL = 100  # Journal records before the journal is compacted into the resume points file.
+PRUNE_INTERVAL = 3600  # Minimum number of seconds between stale entry checks.
+
+
+def getPathFromKey(key):  # The key is the string form of the file service reference.
+	return key.split(":", 10)[-1]
+
+
+class ResumePoints:
+	"""Resume point store keyed by service reference string.  Each entry is a
+	[lru, position, length] list, the same layout as the former plain dict
+	cache.  Updates are appended to a journal next to the resume points file
+	which is folded back into that file every MAX_JOURNAL records."""
+
+	def __init__(self, filename=RESUME_POINTS_FILE, maxEntries=MAX_ENTRIES):
+		self.filename = filename
+		self.journalName = "%s.journal" % filename
+		self.maxEntries = maxEntries
+		self.entries = OrderedDict()  # Oldest first.
+		self.directories = {}  # Indexed by directory, the value is the set of keys in that directory.
+		self.journalCount = 0
+		self.lastPrune = 0
+		self.pruneActive = False
+		self.load()
+
+	def __contains__(self, key):
+		return key in self.entries
+
+	def __getitem__(self, key):
+		return self.entries[key]
+
+	def __setitem__(self, key, value):
+		self.set(key, value[1], value[2], value[0])
+
+	def __delitem__(self, key):
+		if not self.delete(key):
+			raise KeyError(key)
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __iter__(self):
+		return iter(list(self.entries.keys()))
+
+	def get(self, key, default=None):
+		return self.entries.get(key, default)
+
+	def items(self):
+		return list(self.entries.items())
+
+	def keys(self):
+		return list(self.entries.keys())
+
+	def _index(self, key):
+		self.directories.setdefault(dirname(getPathFromKey(key)), set()).add(key)
+
+	def _unindex(self, key):
+		directory = dirname(getPathFromKey(key))
+		keys = self.directories.get(directory)
+		if keys is not None:
+			keys.discard(key)
+			if not keys:
+				del self.directories[directory]
+
+	def _store(self, key, entry):
+		if key in self.entries:
+			self.entries.move_to_end(key)
+		else:
+			self._index(key)
+		self.entries[key] = entry
+		while len(self.entries) > self.maxEntries:
+			oldKey, oldEntry = self.entries.popitem(last=False)
+			self._unindex(oldKey)
+
+	def _remove(self, key):
+		if key in self.entries:
+			del self.entries[key]
+			self._unindex(key)
+			return True
+		return False
+
+	def load(self):
+		entries = {}
+		try:
+			with open(self.filename, "rb") as fd:
+				entries = load(fd)
+		except FileNotFoundError:
+			pass
+		except Exception as err:
+			print("[%s] Error: Failed to load resume points!  (%s)" % (MODULE_NAME, err))
+		self.entries.clear()
+		self.directories.clear()
+		for key, entry in sorted(entries.items(), key=lambda item: item[1][0]):
+			self._store(key, entry)
+		self.journalCount = 0
+		try:
+			with open(self.journalName, "rb") as fd:
+				unpickler = Unpickler(fd)
+				while True:
+					try:
+						action, key, entry = unpickler.load()
+					except (EOFError, UnpicklingError, ValueError):  # A truncated last record is ignored.
+						break
+					if action == "S":
+						self._store(key, entry)
+					else:
+						self._remove(key)
+					self.journalCount += 1
+		except FileNotFoundError:
+			pass
+		except Exception as err:
+			print("[%s] Error: Failed to replay resume points journal!  (%s)" % (MODULE_NAME, err))
+		if self.journalCount > MAX_JOURNAL:
+			self.save()
+
+	def _journal(self, action, key, entry):
+		try:
+			with open(self.journalName, "ab") as fd:
+				Pickler(fd, HIGHEST_PROTOCOL).dump((action, key, entry))
+			self.journalCount += 1
+		except OSError as err:
+			print("[%s] Error %d: Failed to write resume points journal!  (%s)" % (MODULE_NAME, err.errno, err.strerror))
+			self.save()
+			return
+		if self.journalCount > MAX_JOURNAL:
+			self.save()
+
+	def save(self):  # Compact the journal into the resume points file.
+		tempName = "%s.tmp" % self.filename
+		try:
+			with open(tempName, "wb") as fd:
+				dump(dict(self.entries), fd, HIGHEST_PROTOCOL)
+			rename(tempName, self.filename)
+			open(self.journalName, "wb").close()
+			self.journalCount = 0
+		except OSError as err:
+			print("[%s] Error %d: Failed to write resume points!  (%s)" % (MODULE_NAME, err.errno, err.strerror))
+
+	def set(self, key, position, length, lru=None):
+		entry = [int(time()) if lru is None else lru, position, length]
+		self._store(key, entry)
+		self._journal("S", key, entry)
+
+	def touch(self, key):  # Mark an entry as used without journaling it, the next set() or save() persists it.
+		entry = self.entries.get(key)
+		if entry is not None:
+			entry[0] = int(time())
+			self.entries.move_to_end(key)
+		return entry
+
+	def delete(self, key):
+		if self._remove(key):
+			self._journal("D", key, None)
+			return True
+		return False
+
+	def getMany(self, keys):
+		entries = self.entries
+		return dict((key, entries[key]) for key in keys if key in entries)
+
+	def getForDirectory(self, directory):  # Returns all entries of the files in a directory.
+		directory = directory.rstrip("/") or "/"
+		entries = self.entries
+		return dict((key, entries[key]) for key in self.directories.get(directory, ()) if key in entries)
+
+	def pruneStale(self, force=False):  # Remove entries of deleted files in the background.
+		now = int(time())
+		if self.pruneActive or (not force and now - self.lastPrune < PRUNE_INTERVAL):
+			return
+		self.lastPrune = now
+		self.pruneActive = True
+		directories = dict((directory, list(keys)) for directory, keys in self.directories.items())
+		deferred = threads.deferToThread(self.findStale, directories)
+		deferred.addCallback(self.removeStale)
+		deferred.addErrback(self.pruneFailed)
+
+	def findStale(self, directories):  # This runs in a worker thread and must not change the store.
+		mounts = {}
+		for directory, keys in directories.items():
+			path = realpath(directory)
+			mounts.setdefault(findMountPoint(path), []).append((path, keys))
+		stale = []
+		for mountPoint, paths in mounts.items():
+			if not ismount(mountPoint):  # Don't judge the files of unmounted media.
+				continue
+			for path, keys in paths:
+				try:
+					files = set(listdir(path))
+				except OSError:  # A missing directory is more likely unavailable media than deleted files.
+					continue
+				for key in keys:
+					if getPathFromKey(key).rsplit("/", 1)[-1] not in files:
+						stale.append(key)
+		return stale
+
+	def removeStale(self, stale):
+		self.pruneActive = False
+		removed = [key for key in stale if self._remove(key)]
+		if removed:
+			print("[%s] Removed %d stale resume points." % (MODULE_NAME, len(removed)))
+			self.save()
+
+	def pruneFailed(self, failure):
+		self.pruneActive = False
+		print("[%s] Error: Failed to check for stale resume points!  (%s)" % (MODULE_NAME, failure.getErrorMessage()))
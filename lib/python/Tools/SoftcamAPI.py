@@ -0,0 +1,285 @@
+from base64 import b64encode
+from hashlib import md5
+from os import urandom
+from re import compile
+from time import monotonic
+from urllib.parse import quote_plus, urlsplit
+from xml.etree.ElementTree import ParseError, XML
+
+from twisted.internet.defer import CancelledError, Deferred, DeferredList, DeferredSemaphore, succeed
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+
+MODULE_NAME = __name__.split(".")[-1]
+
+TIMEOUT = 10  # Seconds until a request to the softcam is abandoned.
+CONCURRENCY = 4  # Maximum number of requests to one softcam running at the same time.
+CACHE_TTL = 2  # Seconds a parsed response is reused by further requests for the same URL.
+CACHE_SIZE = 64  # Number of parsed responses kept before the expired ones are removed.
+USER_AGENT = b"Enigma2 SoftcamAPI"
+
+CHALLENGE_PARAMETER = compile(r'(\w+)\s*=\s*(?:"([^"]*)"|([^\s,]*))')
+
+
+class SoftcamAPIError(Exception):
+	pass
+
+
+class BasicAuthorization:
+	def __init__(self, username, password):
+		self.header = ("Basic %s" % b64encode(("%s:%s" % (username, password)).encode("UTF-8")).decode()).encode()
+
+	def getHeader(self, method, uri):
+		return self.header
+
+
+class DigestAuthorization:
+	"""The RFC 2617 digest authorization the OScam and NCam web interfaces
+	use.  The challenge is kept, further requests to the same server send
+	the authorization with the next nonce count without a round trip."""
+
+	def __init__(self, username, password, challenge):
+		self.username = username
+		self.password = password
+		self.realm = challenge.get("realm", "")
+		self.nonce = challenge.get("nonce", "")
+		self.opaque = challenge.get("opaque")
+		self.algorithm = challenge.get("algorithm", "MD5")
+		self.qop = "auth" if "auth" in challenge.get("qop", "").split(",") else None
+		self.count = 0
+
+	def getHeader(self, method, uri):
+		self.count += 1
+		count = "%08x" % self.count
+		clientNonce = urandom(8).hex()
+		hash1 = md5(("%s:%s:%s" % (self.username, self.realm, self.password)).encode("UTF-8")).hexdigest()
+		if self.algorithm.upper() == "MD5-SESS":
+			hash1 = md5(("%s:%s:%s" % (hash1, self.nonce, clientNonce)).encode()).hexdigest()
+		hash2 = md5(("%s:%s" % (method, uri)).encode("UTF-8")).hexdigest()
+		if self.qop:
+			response = md5(("%s:%s:%s:%s:%s:%s" % (hash1, self.nonce, count, clientNonce, self.qop, hash2)).encode()).hexdigest()
+		else:
+			response = md5(("%s:%s:%s" % (hash1, self.nonce, hash2)).encode()).hexdigest()
+		header = ['Digest username="%s"' % self.username, 'realm="%s"' % self.realm, 'nonce="%s"' % self.nonce, 'uri="%s"' % uri, 'response="%s"' % response, "algorithm=%s" % self.algorithm]
+		if self.opaque is not None:
+			header.append('opaque="%s"' % self.opaque)
+		if self.qop:
+			header.extend(("qop=%s" % self.qop, "nc=%s" % count, 'cnonce="%s"' % clientNonce))
+		return ", ".join(header).encode("UTF-8")
+
+
+def parseChallenge(header):
+	scheme, separator, parameters = header.partition(" ")
+	return scheme.lower(), {name.lower(): quoted if quoted or not token else token for name, quoted, token in CHALLENGE_PARAMETER.findall(parameters)}
+
+
+def getUnverifiedPolicy():
+	"""Returns the TLS policy for the "+port" HTTPS web interfaces, these use
+	self signed certificates.  None if TLS is not available."""
+	try:
+		from twisted.internet.ssl import CertificateOptions
+		from twisted.web.iweb import IPolicyForHTTPS
+		from zope.interface import implementer
+	except ImportError:
+		return None
+
+	@implementer(IPolicyForHTTPS)
+	class UnverifiedPolicy:
+		def creatorForNetloc(self, hostname, port):
+			return CertificateOptions(verify=False)
+
+	return UnverifiedPolicy()
+
+
+class SoftcamAPI:
+	"""Asynchronous HTTP client for the web interfaces of the softcams.
+
+	The requests run on the reactor over persistent connections, at most
+	"concurrency" requests at the same time, and fail after "timeout"
+	seconds.  getXML() returns the parsed response and reuses it for "ttl"
+	seconds, requests for a URL that is already being fetched wait for that
+	response rather than starting another request."""
+
+	def __init__(self, timeout=TIMEOUT, concurrency=CONCURRENCY, ttl=CACHE_TTL, reactor=None):
+		if reactor is None:
+			from twisted.internet import reactor
+		self.reactor = reactor
+		self.timeout = timeout
+		self.ttl = ttl
+		self.pool = HTTPConnectionPool(reactor, persistent=True)
+		self.pool.maxPersistentPerHost = concurrency
+		policy = getUnverifiedPolicy()
+		if policy is None:
+			self.agent = Agent(reactor, connectTimeout=timeout, pool=self.pool)
+		else:
+			self.agent = Agent(reactor, contextFactory=policy, connectTimeout=timeout, pool=self.pool)
+		self.semaphore = DeferredSemaphore(concurrency)
+		self.cache = {}  # Indexed by URL, the value is (expiry time, parsed XML).
+		self.pending = {}  # Indexed by URL, the value is the list of Deferreds waiting for the running request.
+		self.authorizations = {}  # Indexed by (scheme, host, port, username), the value is the authorization of the last challenge.
+
+	def getPage(self, url, username=None, password=None):
+		"""Returns a Deferred that fires with the body of the page or fails
+		with a SoftcamAPIError."""
+		deferred = self.semaphore.run(self.fetch, url, username, password)
+		deferred.addErrback(self.fetchFailed, url)
+		return deferred
+
+	def fetch(self, url, username, password):
+		deferred = self.request(url, username, password, True)
+		deferred.addTimeout(self.timeout, self.reactor, onTimeoutCancel=self.timedOut)
+		return deferred
+
+	def timedOut(self, result, timeout):
+		raise SoftcamAPIError("No response within %d seconds" % timeout)
+
+	def request(self, url, username, password, retry):
+		parts = urlsplit(url)
+		key = (parts.scheme, parts.hostname, parts.port, username)
+		uri = parts.path + ("?%s" % parts.query if parts.query else "")
+		headers = Headers({b"User-Agent": [USER_AGENT]})
+		authorization = self.authorizations.get(key) if username else None
+		if authorization:
+			headers.addRawHeader(b"Authorization", authorization.getHeader("GET", uri))
+		deferred = self.agent.request(b"GET", url.encode("UTF-8"), headers)
+		deferred.addCallback(self.response, url, username, password, retry, key)
+		return deferred
+
+	def response(self, response, url, username, password, retry, key):
+		if response.code == 401 and username and retry:
+			challenges = response.headers.getRawHeaders(b"www-authenticate", [])
+			for challenge in challenges:
+				scheme, parameters = parseChallenge(challenge.decode("UTF-8", "replace"))
+				if scheme == "digest":
+					self.authorizations[key] = DigestAuthorization(username, password or "", parameters)
+					break
+				elif scheme == "basic":
+					self.authorizations[key] = BasicAuthorization(username, password or "")
+					break
+			else:
+				return readBody(response).addCallback(self.httpError, response.code, response.phrase)
+			# The body must be read before the connection can be used again.
+			return readBody(response).addCallback(lambda body: self.request(url, username, password, False))
+		if response.code != 200:
+			return readBody(response).addCallback(self.httpError, response.code, response.phrase)
+		return readBody(response)
+
+	def httpError(self, body, code, phrase):
+		raise SoftcamAPIError("HTTP error %d %s" % (code, phrase.decode("UTF-8", "replace") if isinstance(phrase, bytes) else phrase))
+
+	def fetchFailed(self, failure, url):
+		if failure.check(CancelledError):
+			return failure
+		message = failure.getErrorMessage()
+		print("[%s] Error: Request '%s' failed!  (%s)" % (MODULE_NAME, url, message))
+		if failure.check(SoftcamAPIError):
+			return failure
+		raise SoftcamAPIError(message)
+
+	def getXML(self, url, username=None, password=None, ttl=None, fixLog=False):
+		"""Returns a Deferred that fires with the parsed XML response or fails
+		with a SoftcamAPIError.  "fixLog" wraps an unquoted <log> element
+		in CDATA before the response is parsed."""
+		cached = self.cache.get(url)
+		if cached and cached[0] > monotonic():
+			return succeed(cached[1])
+		deferred = Deferred()
+		waiting = self.pending.get(url)
+		if waiting is None:
+			self.pending[url] = [deferred]
+			request = self.getPage(url, username, password)
+			request.addCallback(self.parseXML, fixLog)
+			request.addCallbacks(self.xmlDone, self.xmlFailed, callbackArgs=(url, self.ttl if ttl is None else ttl), errbackArgs=(url,))
+		else:
+			waiting.append(deferred)
+		return deferred
+
+	def parseXML(self, data, fixLog):
+		if fixLog and b"<![CDATA" not in data:
+			data = data.replace(b"<log>", b"<log><![CDATA[").replace(b"</log>", b"]]></log>")
+		try:
+			return XML(data)
+		except ParseError as err:
+			raise SoftcamAPIError("Invalid XML response (%s)" % err)
+
+	def xmlDone(self, element, url, ttl):
+		if ttl > 0:
+			now = monotonic()
+			if len(self.cache) >= CACHE_SIZE:
+				self.cache = {key: value for key, value in self.cache.items() if value[0] > now}
+			self.cache[url] = (now + ttl, element)
+		for deferred in self.pending.pop(url, []):
+			deferred.callback(element)
+
+	def xmlFailed(self, failure, url):
+		for deferred in self.pending.pop(url, []):
+			deferred.errback(failure)
+
+	def clearCache(self):
+		self.cache.clear()
+
+
+class OscamAPI:
+	"""The oscamapi.html or ncamapi.html interface of an OScam or NCam web
+	interface, for example OscamAPI("http://127.0.0.1:8888/oscamapi.html")."""
+
+	def __init__(self, url, username=None, password=None, client=None):
+		self.url = url
+		self.username = username or None
+		self.password = password
+		self.client = client or softcamAPI
+
+	def request(self, part="status", reader=None, ttl=None):
+		url = "%s?part=%s" % (self.url, part)
+		if reader is not None:
+			url = "%s&label=%s" % (url, quote_plus(reader))
+		return self.client.getXML(url, self.username, self.password, ttl=ttl, fixLog="appendlog" in part)
+
+	def getStatus(self):
+		return self.request()
+
+	def getLog(self):
+		return self.request("status&appendlog=1", ttl=0)
+
+	def getEntitlements(self, reader):
+		return self.request("entitlement", reader)
+
+	def getReaderStats(self, reader):
+		return self.request("readerstats", reader)
+
+	def getReaders(self, protocol=None):
+		"""Returns a Deferred that fires with the list of (name, protocol) of
+		the readers and proxies, optionally only those of the protocol."""
+		return self.getStatus().addCallback(self.readersFromStatus, protocol)
+
+	def readersFromStatus(self, element, protocol):
+		readers = []
+		status = element.find("status")
+		for client in status.findall("client") if status is not None else []:
+			name = client.attrib.get("name", "")
+			clientProtocol = client.attrib.get("protocol", "")
+			if client.attrib.get("type") in ("p", "r") and name and clientProtocol and (protocol is None or protocol in clientProtocol):
+				readers.append((name, clientProtocol))
+		return readers
+
+	def getAll(self, function, readers):
+		"""Returns a Deferred that fires with a list of (reader, parsed XML or
+		None) of function(reader) for all the readers, the requests run at
+		the same time up to the concurrency limit of the client."""
+		def collect(results):
+			return [(reader, element if success else None) for reader, (success, element) in zip(readers, results)]
+		return DeferredList([function(reader) for reader in readers], consumeErrors=True).addCallback(collect)
+
+	def getTotalCards(self, readers):
+		"""Returns a Deferred that fires with a dictionary of the total cards
+		of the readers, None for the readers that did not answer."""
+		def collect(results):
+			totals = {}
+			for reader, element in results:
+				cardList = element.find("reader/cardlist") if element is not None else None
+				totals[reader] = cardList.attrib.get("totalcards") if cardList is not None else None
+			return totals
+		return self.getAll(self.getEntitlements, readers).addCallback(collect)
+
+
+softcamAPI = SoftcamAPI()
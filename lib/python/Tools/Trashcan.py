@@ -1,5 +1,5 @@
 from errno import ENOTEMPTY
-from os import W_OK, access, mkdir, rmdir, stat, statvfs, walk
+from os import W_OK, access, mkdir, rmdir, stat, walk
 from os.path import getsize, isdir, join, realpath, split
 from time import time
 
@@ -8,10 +8,10 @@ from enigma import eBackgroundFileEraser, eLabel, iRecordableService, pNavigatio
 from Components.config import config
 from Components.GUIComponent import GUIComponent
 from Components.Harddisk import findMountPoint
+from Components.MountTable import mountTable
 from Components.Task import Job, PythonTask, job_manager as jobManager
 from Components.VariableText import VariableText
 from Tools.Conversions import scaleNumber
-from Tools.Directories import fileReadLines
 
 MODULE_NAME = __name__.split(".")[-1]
 TRASHCAN = ".Trash"  # This should this be ".Trashcan" to be consistent with the module.
@@ -143,11 +143,8 @@ class CleanTrashTask(PythonTask):
 
 	def work(self):
 		print("[Trashcan] Probing for trashcan folders.")
-		lines = []
-		lines = fileReadLines("/proc/mounts", default=lines, source=MODULE_NAME)
 		mounts = []
-		for line in lines:
-			parts = line.strip().split()
+		for parts in mountTable.getMounts():
 			if parts[1] == "/media/autofs":
 				continue
 			if config.usage.movielist_trashcan_network_clean.value and (parts[1].startswith("/media/net") or parts[1].startswith("/media/autofs")):
@@ -165,7 +162,7 @@ class CleanTrashTask(PythonTask):
 			print("[Trashcan] Looking in trashcan '%s'." % trashcan)
 			trashcanSize = getTrashcanSize(trashcan)
 			try:
-				trashcanStatus = statvfs(trashcan)
+				trashcanStatus = mountTable.statvfs(trashcan)
 				freeSpace = trashcanStatus.f_bfree * trashcanStatus.f_bsize
 			except OSError as err:
 				print("[Trashcan] Error %d: Unable to get status for directory '%s'!  (%s)" % (err.errno, trashcan, err.strerror))
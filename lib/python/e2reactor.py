@@ -20,6 +20,8 @@ from twisted.internet import main, posixbase, error
 
 from enigma import getApplication
 
+from Tools.LoopTracer import loopTracer
+
 # globals
 reads = {}
 writes = {}
@@ -163,6 +165,7 @@ class PollReactor(posixbase.PosixReactorBase):
 			else:
 				raise
 		_drdw = self._doReadOrWrite
+		tracing = loopTracer.enabled
 		for fd, event in l:
 			try:
 				selectable = selectables[fd]
@@ -170,7 +173,10 @@ class PollReactor(posixbase.PosixReactorBase):
 				# Handles the infrequent case where one selectable's
 				# handler disconnects another.
 				continue
-			log.callWithLogger(selectable, _drdw, selectable, fd, event, POLLIN, POLLOUT, log)
+			if tracing:
+				loopTracer.call("reactor", selectable, log.callWithLogger, selectable, _drdw, selectable, fd, event, POLLIN, POLLOUT, log)
+			else:
+				log.callWithLogger(selectable, _drdw, selectable, fd, event, POLLIN, POLLOUT, log)
 
 	doIteration = doPoll
 
@@ -32,6 +32,8 @@ GUI_SKIN_ID = 0  # Main frame-buffer.
 DISPLAY_SKIN_ID = 2 if BoxInfo.getItem("model").startswith("dm") else 1  # Front panel / display / LCD.
 
 domScreens = {}  # Dictionary of skin based screens.
+compiledScreens = {}  # Dictionary of compiled screens, see getCompiledScreenKey().
+skinGeneration = 0  # Incremented when the skin data changes, this invalidates the compiled screens.
 colors = {  # Dictionary of skin color names.
 	"key_back": gRGB(0x00313131),
 	"key_blue": gRGB(0x0018188B),
@@ -167,6 +169,7 @@ def loadSkin(filename, replace = False, scope=SCOPE_SKINS, desktop=getDesktop(GU
 	print(f"[Skin] Loading skin file '{filename}'.")
 	domSkin = fileReadXML(filename, source=MODULE_NAME)
 	if domSkin:
+		invalidateCompiledScreens()
 		# For loadSingleSkinData colors, bordersets etc. are applied one after
 		# the other in order of ascending priority.
 		loadSingleSkinData(desktop, screenID, domSkin, filename, scope=scope)
@@ -211,6 +214,7 @@ def loadSkin(filename, replace = False, scope=SCOPE_SKINS, desktop=getDesktop(GU
 def reloadSkins():
 	global colors, domScreens, fonts, menus, parameters, setups, switchPixmap
 	domScreens.clear()
+	invalidateCompiledScreens()
 	colors.clear()
 	colors = {
 		"key_back": gRGB(0x00313131),
@@ -1593,9 +1597,66 @@ class SkinError(Exception):
 		return f"[Skin] Error: {self.errorMessage}!"
 
 
+class CompiledScreen:
+	"""The result of walking the XML of a screen skin for one set of screen
+	components.  It holds the collected and parsed attributes of the screen
+	and its widgets as steps, so further opens of the screen only bind the
+	steps to the new screen instance without walking the XML again."""
+
+	__slots__ = ("name", "element", "embedded", "skinAttributes", "steps", "usedComponents", "message", "cacheable")
+
+	def __init__(self, name, element, embedded):
+		self.name = name
+		self.element = element
+		self.embedded = embedded
+		self.skinAttributes = []
+		self.steps = []  # List of (tag, processor, arguments).
+		self.usedComponents = set()
+		self.message = None
+		self.cacheable = True
+
+
+def invalidateCompiledScreens():
+	global skinGeneration
+	skinGeneration += 1
+	compiledScreens.clear()
+
+
+def getCompiledScreenKey(screen, names, desktop):
+	"""Returns the key of the compiled screen cache for this screen or None
+	if the screen can't be cached.  Besides the skin names, desktop and skin
+	generation the key holds the names and classes of the screen components
+	as the "conditional", "includes", "excludes" and "objectTypes" widget
+	attributes depend on them."""
+	if getattr(screen, "parsedSkin", None) is not None:  # The screen brings its own parsed skin.
+		return None
+	embeddedSkin = getattr(screen, "skin", None)
+	if isinstance(embeddedSkin, list):
+		embeddedSkin = tuple(embeddedSkin)
+	bounds = desktop.bounds()
+	key = (tuple(names), tuple(screen.mandatoryWidgets or ()), getattr(screen, "skin_path", None), embeddedSkin, (bounds.left(), bounds.top(), bounds.width(), bounds.height()), skinGeneration, tuple(sorted((name, component.__class__.__name__) for name, component in screen.items())))
+	try:
+		hash(key)
+	except TypeError:
+		return None
+	return key
+
+
 def readSkin(screen, skin, names, desktop):
 	if not isinstance(names, list):
 		names = [names]
+	key = getCompiledScreenKey(screen, names, desktop)
+	compiled = compiledScreens.get(key) if key else None
+	if compiled is None:
+		compiled = compileScreen(screen, names, desktop)
+		if key and compiled.cacheable:
+			compiledScreens[key] = compiled
+	elif compiled.element is not None and screen.mandatoryWidgets is None:
+		screen.mandatoryWidgets = []
+	applyCompiledScreen(screen, compiled)
+
+
+def compileScreen(screen, names, desktop):
 	for name in names:  # Try all skins, first existing one has priority.
 		myScreen, path = domScreens.get(name, (None, None))
 		if myScreen is not None:
@@ -1612,6 +1673,7 @@ def readSkin(screen, skin, names, desktop):
 				myScreen = None
 	else:
 		myName = f"<embedded-in-{screen.__class__.__name__}>"
+	compiled = CompiledScreen(myName, myScreen, myScreen is None)
 	if myScreen is None:  # Otherwise try embedded skin.
 		myScreen = getattr(screen, "parsedSkin", None)
 	if myScreen is None and getattr(screen, "skin", None):  # Try uncompiled embedded skin.
@@ -1638,16 +1700,18 @@ def readSkin(screen, skin, names, desktop):
 	if myScreen is None:
 		print("[Skin] No skin to read or screen to display.")
 		myScreen = screen.parsedSkin = fromstring("<screen></screen>")
+	if compiled.embedded:
+		compiled.element = myScreen
 
 	#mpiero sdhd convert 
 	try:
 		if config.plugins.sdhdmaster.enable.value and config.plugins.sdhdmaster.ready.value and "OpenStarHD" not in str(config.skin.primary_skin.value).split("/")[0]:
+			compiled.cacheable = False  # The conversion changes the screen depending on the screen instance.
 			from Plugins.Extensions.spazeMenu.spacvsd.spacvsd import openspa_sdhd
 			openspa_sdhd(myScreen,screen,path,names)
 	except:
 		pass
 
-	screen.skinAttributes = []
 	skinPath = getattr(screen, "skin_path", path)  # TODO: It may be possible for "path" to be undefined!
 	context = SkinContextStack()
 	bounds = desktop.bounds()
@@ -1658,11 +1722,10 @@ def readSkin(screen, skin, names, desktop):
 	resolution = tuple([parseInteger(x.strip()) for x in myScreen.attrib.get("resolution", f"{context.w},{context.h}").split(",")])
 	context.scale = ((context.w, resolution[0]), (context.h, resolution[1]))
 	del bounds
-	collectAttributes(screen.skinAttributes, myScreen, context, skinPath, ignore=("name",))
+	collectAttributes(compiled.skinAttributes, myScreen, context, skinPath, ignore=("name",))
 	context = SkinContext(context, myScreen.attrib.get("position"), myScreen.attrib.get("size"))
-	screen.additionalWidgets = []
-	screen.renderer = []
-	usedComponents = set()
+	steps = compiled.steps
+	usedComponents = compiled.usedComponents
 
 	def processConstant(constant_widget, context):
 		widgetName = constant_widget.attrib.get("name")
@@ -1708,39 +1771,16 @@ def readSkin(screen, skin, names, desktop):
 		if widgetName:
 			# print(f"[Skin] DEBUG: Widget name='{widgetName}'.")
 			usedComponents.add(widgetName)
-			try:  # Get corresponding "gui" object.
-				attributes = screen[widgetName].skinAttributes = []
-			except Exception:
+			if widgetName not in screen:
 				raise SkinError(f"Component with name '{widgetName}' was not found in skin of screen '{myName}'")
 			# assert screen[widgetName] is not Source
+			attributes = []
 			collectAttributes(attributes, widget, context, skinPath, ignore=("name",))
+			steps.append((widget.tag, bindWidget, (widgetName, attributes)))
 		elif widgetSource:
 			# print(f"[Skin] DEBUG: Widget source='{widgetSource}'.")
-			while True:  # Get corresponding source until we found a non-obsolete source.
-				# Parse our current "widgetSource", which might specify a "related screen" before the dot,
-				# for example to reference a parent, global or session-global screen.
-				scr = screen
-				path = widgetSource.split(".")  # Resolve all path components.
-				while len(path) > 1:
-					scr = screen.getRelatedScreen(path[0])
-					if scr is None:
-						raise SkinError(f"Specified related screen '{widgetSource}' was not found in screen '{myName}'")
-					path = path[1:]
-				source = scr.get(path[0])  # Resolve the source.
-				if isinstance(source, ObsoleteSource):
-					# If we found an "obsolete source", issue warning, and resolve the real source.
-					print(f"[Skin] WARNING: SKIN '{myName}' USES OBSOLETE SOURCE '{widgetSource}', USE '{source.newSource}' INSTEAD!")
-					print(f"[Skin] OBSOLETE SOURCE WILL BE REMOVED {source.removalDate}, PLEASE UPDATE!")
-					if source.description:
-						print(f"[Skin] Source description: '{source.description}'.")
-					widgetSource = source.new_source
-				else:
-					break  # Otherwise, use the source.
-			if source is None:
-				raise SkinError(f"The source '{widgetSource}' was not found in screen '{myName}'")
 			widgetRenderer = widget.attrib.get("render")
-			if not widgetRenderer:
-				raise SkinError(f"For source '{widgetSource}' a renderer must be defined with a 'render=' attribute")
+			converters = []
 			for converter in widget.findall("convert"):
 				converterType = converter.get("type")
 				assert converterType, "[Skin] The 'convert' tag needs a 'type' attribute!"
@@ -1750,27 +1790,10 @@ def readSkin(screen, skin, names, desktop):
 				except Exception:
 					parms = ""
 				# print(f"[Skin] DEBUG: Params='{parms}'.")
-				try:
-					converterClass = my_import(".".join(("Components", "Converter", converterType))).__dict__.get(converterType)
-				except ImportError as err:
-					raise SkinError(f"Converter '{converterType}' not found")
-				connection = None
-				for element in source.downstream_elements:
-					if isinstance(element, converterClass) and element.converter_arguments == parms:
-						connection = element
-				if connection is None:
-					connection = converterClass(parms)
-					connection.connect(source)
-				source = connection
-			try:
-				rendererClass = my_import(".".join(("Components", "Renderer", widgetRenderer))).__dict__.get(widgetRenderer)
-			except ImportError as err:
-				raise SkinError(f"Renderer '{widgetRenderer}' not found")
-			renderer = rendererClass()  # Instantiate renderer.
-			renderer.connect(source)  # Connect to source.
-			attributes = renderer.skinAttributes = []
+				converters.append((converterType, parms))
+			attributes = []
 			collectAttributes(attributes, widget, context, skinPath, ignore=("render", "source"))
-			screen.renderer.append(renderer)
+			steps.append((widget.tag, bindSource, (widgetSource, widgetRenderer, tuple(converters), attributes)))
 
 	def processApplet(widget, context):
 		try:
@@ -1780,30 +1803,14 @@ def readSkin(screen, skin, names, desktop):
 		except Exception as err:
 			raise SkinError(f"Applet failed to compile: '{str(err)}'")
 		if widgetType == "onLayoutFinish":
-			screen.onLayoutFinish.append(code)
+			steps.append((widget.tag, bindApplet, (code,)))
 		else:
 			raise SkinError(f"Applet type '{widgetType}' is unknown")
 
-	def processLabel(widget, context):
-		item = additionalWidget()
-		item.widget = eLabel
-		item.skinAttributes = []
-		collectAttributes(item.skinAttributes, widget, context, skinPath, ignore=("name",))
-		screen.additionalWidgets.append(item)
-
-	def processPixmap(widget, context):
-		item = additionalWidget()
-		item.widget = ePixmap
-		item.skinAttributes = []
-		collectAttributes(item.skinAttributes, widget, context, skinPath, ignore=("name",))
-		screen.additionalWidgets.append(item)
-
-	def processRectangle(widget, context):
-		item = additionalWidget()
-		item.widget = eRectangle
-		item.skinAttributes = []
-		collectAttributes(item.skinAttributes, widget, context, skinPath, ignore=("name",))
-		screen.additionalWidgets.append(item)
+	def processAdditional(widget, context):
+		attributes = []
+		collectAttributes(attributes, widget, context, skinPath, ignore=("name",))
+		steps.append((widget.tag, bindAdditional, ({"eLabel": eLabel, "ePixmap": ePixmap, "eRectangle": eRectangle}[widget.tag], attributes)))
 
 	def processScreen(widget, context):
 		widgets = widget
@@ -1828,7 +1835,7 @@ def readSkin(screen, skin, names, desktop):
 			try:
 				processor(widget, context)
 			except SkinError as err:
-				print(f"[Skin] Error in screen '{myName}' widget '{widget.tag}' {str(err)}!")
+				steps.append((widget.tag, None, (str(err),)))
 
 	def processPanel(widget, context):
 		name = widget.attrib.get("name")
@@ -1853,9 +1860,9 @@ def readSkin(screen, skin, names, desktop):
 		"layout": processLayouts,
 		"widget": processWidget,
 		"applet": processApplet,
-		"eLabel": processLabel,
-		"ePixmap": processPixmap,
-		"eRectangle": processRectangle,
+		"eLabel": processAdditional,
+		"ePixmap": processAdditional,
+		"eRectangle": processAdditional,
 		"panel": processPanel
 	}
 
@@ -1865,21 +1872,111 @@ def readSkin(screen, skin, names, desktop):
 		posY = "?" if context.y is None else str(context.y)
 		sizeW = "?" if context.w is None else str(context.w)
 		sizeH = "?" if context.h is None else str(context.h)
-		print(f"[Skin] Processing screen '{myName}'{msg}, position=({posX}, {posY}), size=({sizeW}x{sizeH}) for module '{screen.__class__.__name__}'.")
+		compiled.message = f"[Skin] Processing screen '{myName}'{msg}, position=({posX}, {posY}), size=({sizeW}x{sizeH}) for module '{screen.__class__.__name__}'."
 		context.x = 0  # Reset offsets, all components are relative to screen coordinates.
 		context.y = 0
 		processScreen(myScreen, context)
 	except Exception as err:
-		print(f"[Skin] Error in screen '{myName}' {str(err)}!")
-
-	from Components.GUIComponent import GUIComponent
-	unusedComponents = [x for x in set(screen.keys()) - usedComponents if isinstance(x, GUIComponent)]
-	assert not unusedComponents, f"[Skin] The following components in '{myName}' don't have a skin entry: {', '.join(unusedComponents)}"
+		steps.append((None, None, (str(err),)))
+		compiled.cacheable = False
 	# This may look pointless, but it unbinds "screen" from the nested scope. A better
 	# solution is to avoid the nested scope above and use the context object to pass
 	# things around.
 	screen = None
-	usedComponents = None
+	return compiled
+
+
+def bindWidget(screen, myName, widgetName, attributes):
+	try:  # Get corresponding "gui" object.
+		screen[widgetName].skinAttributes = list(attributes)
+	except Exception:
+		raise SkinError(f"Component with name '{widgetName}' was not found in skin of screen '{myName}'")
+
+
+def bindSource(screen, myName, widgetSource, widgetRenderer, converters, attributes):
+	while True:  # Get corresponding source until we found a non-obsolete source.
+		# Parse our current "widgetSource", which might specify a "related screen" before the dot,
+		# for example to reference a parent, global or session-global screen.
+		scr = screen
+		path = widgetSource.split(".")  # Resolve all path components.
+		while len(path) > 1:
+			scr = screen.getRelatedScreen(path[0])
+			if scr is None:
+				raise SkinError(f"Specified related screen '{widgetSource}' was not found in screen '{myName}'")
+			path = path[1:]
+		source = scr.get(path[0])  # Resolve the source.
+		if isinstance(source, ObsoleteSource):
+			# If we found an "obsolete source", issue warning, and resolve the real source.
+			print(f"[Skin] WARNING: SKIN '{myName}' USES OBSOLETE SOURCE '{widgetSource}', USE '{source.newSource}' INSTEAD!")
+			print(f"[Skin] OBSOLETE SOURCE WILL BE REMOVED {source.removalDate}, PLEASE UPDATE!")
+			if source.description:
+				print(f"[Skin] Source description: '{source.description}'.")
+			widgetSource = source.new_source
+		else:
+			break  # Otherwise, use the source.
+	if source is None:
+		raise SkinError(f"The source '{widgetSource}' was not found in screen '{myName}'")
+	if not widgetRenderer:
+		raise SkinError(f"For source '{widgetSource}' a renderer must be defined with a 'render=' attribute")
+	for converterType, parms in converters:
+		try:
+			converterClass = my_import(".".join(("Components", "Converter", converterType))).__dict__.get(converterType)
+		except ImportError as err:
+			raise SkinError(f"Converter '{converterType}' not found")
+		connection = None
+		for element in source.downstream_elements:
+			if isinstance(element, converterClass) and element.converter_arguments == parms:
+				connection = element
+		if connection is None:
+			connection = converterClass(parms)
+			connection.connect(source)
+		source = connection
+	try:
+		rendererClass = my_import(".".join(("Components", "Renderer", widgetRenderer))).__dict__.get(widgetRenderer)
+	except ImportError as err:
+		raise SkinError(f"Renderer '{widgetRenderer}' not found")
+	renderer = rendererClass()  # Instantiate renderer.
+	renderer.connect(source)  # Connect to source.
+	renderer.skinAttributes = list(attributes)
+	screen.renderer.append(renderer)
+
+
+def bindApplet(screen, myName, code):
+	screen.onLayoutFinish.append(code)
+
+
+def bindAdditional(screen, myName, widget, attributes):
+	item = additionalWidget()
+	item.widget = widget
+	item.skinAttributes = list(attributes)
+	screen.additionalWidgets.append(item)
+
+
+def applyCompiledScreen(screen, compiled):
+	myName = compiled.name
+	if compiled.embedded:
+		screen.parsedSkin = compiled.element
+	screen.skinAttributes = list(compiled.skinAttributes)
+	screen.additionalWidgets = []
+	screen.renderer = []
+	if compiled.message:
+		print(compiled.message)
+	for tag, binder, arguments in compiled.steps:
+		if binder is None:  # An error found while compiling the screen.
+			if tag is None:
+				print(f"[Skin] Error in screen '{myName}' {arguments[0]}!")
+			else:
+				print(f"[Skin] Error in screen '{myName}' widget '{tag}' {arguments[0]}!")
+			continue
+		try:
+			binder(screen, myName, *arguments)
+		except SkinError as err:
+			print(f"[Skin] Error in screen '{myName}' widget '{tag}' {str(err)}!")
+		except Exception as err:  # A failing converter or renderer only skips the widget.
+			print(f"[Skin] Error in screen '{myName}' {str(err)}!")
+	from Components.GUIComponent import GUIComponent
+	unusedComponents = [x for x in set(screen.keys()) - compiled.usedComponents if isinstance(x, GUIComponent)]
+	assert not unusedComponents, f"[Skin] The following components in '{myName}' don't have a skin entry: {', '.join(unusedComponents)}"
 
 
 # Return a set of all the widgets found in a screen. Panels will be expanded
@@ -0,0 +1,85 @@
+# Benchmark of the streaming lamedb parser against a generated lamedb.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python benchmark_lamedb.py [services] [--legacy]
+#
+# --legacy also times the former readlines() and list slicing reader of the
+# picon tools, which is quadratic and takes about 20 s for 50000 services.
+
+import os
+import sys
+import tempfile
+import time
+
+from Tools.Lamedb import Lamedb, Service, iterLamedb
+
+SERVICES_PER_TRANSPONDER = 25
+
+
+def writeLamedb(filename, count):
+	transponders = (count + SERVICES_PER_TRANSPONDER - 1) // SERVICES_PER_TRANSPONDER
+	with open(filename, "w") as fd:
+		fd.write("eDVB services /4/\ntransponders\n")
+		for index in range(transponders):
+			position = (130, 192, 282, 3300)[index % 4]
+			fd.write("%08x:%04x:%04x\n" % (position << 16, index + 1, 1))
+			fd.write("\ts %d:27500000:%d:3:%d:2:0:1:2:0:2\n/\n" % (10700000 + (index % 500) * 3000, index % 2, position))
+		fd.write("end\nservices\n")
+		for index in range(count):
+			transponder = index // SERVICES_PER_TRANSPONDER
+			position = (130, 192, 282, 3300)[transponder % 4]
+			fd.write("%04x:%08x:%04x:%04x:%d:0\n" % (index + 1, position << 16, transponder + 1, 1, (1, 2, 25)[index % 3]))
+			fd.write("Service %d\n" % index)
+			fd.write("p:Provider %d,c:000064,c:010065,f:01\n" % (index % 40))
+		fd.write("end\nHave a lot of bugs!\n")
+
+
+def readLegacy(filename):  # The reader the picon tools used before Tools.Lamedb.
+	f = open(filename).readlines()
+	f = f[f.index("services\n") + 1:-3]
+	count = 0
+	while len(f) > 2:
+		ref = [int(x, 0x10) for x in f[0][:-1].split(':')]
+		name = f[1][:-1]
+		fields = f[2].split(',')
+		provider = fields[0].split(':')[1] if len(fields) and fields[0][0] == 'p' else 'unknown'
+		count += 1
+		f = f[3:]
+	return count
+
+
+def measure(label, function, *args):
+	start = time.perf_counter()
+	result = function(*args)
+	print("%-40s %8.3f s" % (label, time.perf_counter() - start))
+	return result
+
+
+def countServices(filename):
+	return sum(1 for record in iterLamedb(filename) if isinstance(record, Service))
+
+
+def main():
+	arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+	count = int(arguments[0]) if arguments else 50000
+	fd, filename = tempfile.mkstemp(suffix=".lamedb")
+	os.close(fd)
+	try:
+		writeLamedb(filename, count)
+		print("lamedb with %d services, %d bytes" % (count, os.path.getsize(filename)))
+		streamed = measure("iterLamedb() streaming", countServices, filename)
+		lamedb = measure("Lamedb() with indexes", Lamedb, filename)
+		assert streamed == count == len(lamedb.services), (streamed, len(lamedb.services))
+		references = list(lamedb.services.keys())
+		measure("%d reference lookups" % len(references), lambda: [lamedb.getService(reference) for reference in references])
+		measure("position and provider lookups", lambda: [len(lamedb.getServicesByPosition(position)) + len(lamedb.getServicesByProvider("Provider %d" % position)) for position in range(4000)])
+		print("positions: %s" % ", ".join("%d=%d" % (position, len(services)) for position, services in sorted(lamedb.positions.items())))
+		if "--legacy" in sys.argv:
+			legacy = measure("legacy readlines() and slicing", readLegacy, filename)
+			print("legacy reader found %d services" % legacy)  # Its [:-3] slice drops the last service.
+	finally:
+		os.unlink(filename)
+
+
+if __name__ == "__main__":
+	main()
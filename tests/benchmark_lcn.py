@@ -0,0 +1,123 @@
+# Benchmark of the LCN allocation of the LCNScanner plugin against a generated
+# lcndb.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python benchmark_lcn.py [services] [--legacy]
+#
+# The lcndb has the given number of services, default 5000, on 40
+# multiplexes that are received from several transmitters, so a part of the
+# services clash on their LCN with different signal levels.  The "Italia"
+# ruleset of rules.xml is applied after the allocation.
+#
+# --legacy also times the former list scan allocation and the exec() of the
+# renumber rules, which is quadratic and takes minutes for 5000 services.
+
+import os
+import sys
+import tempfile
+import time
+
+import enigma  # This must be the first import, it sets up the fake environment.
+
+MULTIPLEXES = 40
+TRANSMITTERS = 3  # Each multiplex is received from this number of transmitters, each one a namespace.
+
+
+def writeLcnDb(filename, count):
+	with open(filename, "w") as fd:
+		for index in range(count):
+			multiplex = index % MULTIPLEXES
+			transmitter = (index // MULTIPLEXES) % TRANSMITTERS
+			lcn = 1 + (index * 13) % (count // TRANSMITTERS or 1)
+			signal = 30000 + (index * 7919) % 35000
+			fd.write("%08x:%04x:%04x:%04x:%05d:%08d\n" % (0xEEEE0000 + transmitter, 0x217c, multiplex + 1, index + 1, lcn, signal))
+
+
+class LegacyLCN():  # The allocation of the LCNScanner plugin before the LCNTable.
+	def __init__(self):
+		self.lcnlist = []
+
+	def addLcnToList(self, namespace, nid, tsid, sid, lcn, signal):
+		for x in self.lcnlist:
+			if x[0] == lcn and x[1] == namespace and x[2] == nid and x[3] == tsid and x[4] == sid:
+				return
+		if lcn == 0:
+			return
+		for i in list(range(0, len(self.lcnlist))):
+			if self.lcnlist[i][0] == lcn:
+				if self.lcnlist[i][5] > signal:
+					self.addLcnToList(namespace, nid, tsid, sid, lcn + 16536, signal)
+				else:
+					znamespace, znid, ztsid, zsid, zsignal = self.lcnlist[i][1:6]
+					self.lcnlist[i][1:6] = [namespace, nid, tsid, sid, signal]
+					self.addLcnToList(znamespace, znid, ztsid, zsid, lcn + 16536, zsignal)
+				return
+			elif self.lcnlist[i][0] > lcn:
+				self.lcnlist.insert(i, [lcn, namespace, nid, tsid, sid, signal])
+				return
+		self.lcnlist.append([lcn, namespace, nid, tsid, sid, signal])
+
+	def renumberLcn(self, range, rule):
+		min, max = [int(x) for x in range.split("-")]
+		for x in self.lcnlist:
+			if x[0] >= min and x[0] <= max:
+				value = x[0]
+				exec("x[0] = " + rule)
+
+
+def readLegacy(filename, rules):
+	lcn = LegacyLCN()
+	with open(filename) as fd:
+		for line in fd:
+			tmp = line.strip().split(":")
+			lcn.addLcnToList(int(tmp[0], 16), int(tmp[1], 16), int(tmp[2], 16), int(tmp[3], 16), int(tmp[4]), int(tmp[5]))
+	for type, rule in rules:
+		if type == "renumber":
+			lcn.renumberLcn("%d-%d" % (rule.low, rule.high), rule.expression)
+			lcn.lcnlist.sort(key=lambda z: int(z[0]))
+	return lcn.lcnlist
+
+
+def createLCN(filename):
+	from benchmarks import initUsageConfig
+	initUsageConfig()
+	from Plugins.SystemPlugins.LCNScanner.plugin import LCN
+	rulefile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "python", "Plugins", "SystemPlugins", "LCNScanner", "rules.xml")
+	return LCN(filename, rulefile, "Italia", None)
+
+
+def readLcn(lcn):
+	lcn.readLcnDb()
+	lcn.applyRules()
+	return lcn.lcnlist
+
+
+def measure(label, function, *args):
+	start = time.perf_counter()
+	result = function(*args)
+	print("%-40s %8.3f s" % (label, time.perf_counter() - start))
+	return result
+
+
+def main():
+	arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+	count = int(arguments[0]) if arguments else 5000
+	fd, filename = tempfile.mkstemp(suffix=".lcndb")
+	os.close(fd)
+	try:
+		writeLcnDb(filename, count)
+		print("lcndb with %d services, %d bytes" % (count, os.path.getsize(filename)))
+		lcn = createLCN(filename)
+		lcnlist = measure("LCNTable allocation and rules", readLcn, lcn)
+		lcns = [entry[0] for entry in lcnlist]
+		assert lcns == sorted(set(lcns)) and len(lcnlist) == count, "LCNs are not unique and sorted"
+		print("%d services, %d requested LCNs" % (len(lcnlist), len(set(key[0] for key in lcn.table.requested))))
+		if "--legacy" in sys.argv:
+			legacy = measure("legacy list scan and exec()", readLegacy, filename, lcn.rules)
+			print("legacy allocation found %d services, %d with the same LCN" % (len(legacy), len(set(tuple(entry) for entry in legacy) & set(tuple(entry) for entry in lcnlist))))
+	finally:
+		os.unlink(filename)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,105 @@
+# Report of the start up time saved by the plugin manifest.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python benchmark_plugins.py [--repeat=N] [--manifest=FILE]
+#
+# Without options the plugins of this tree are enumerated twice, each time in
+# a new process: first without a manifest, this imports every plugin like the
+# first start after an update, then with the manifest written by the first
+# run, each --repeat times, default 5.  The plugins are enumerated through a directory of symbolic links to
+# the plugins that have a plugin file, the clean up of badly removed plugins
+# in PluginComponent must not remove anything from the tree.
+#
+# --manifest=FILE only reports the plugins recorded in FILE, for example the
+# /etc/enigma2/plugins.manifest copied from a box.
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def mirrorPlugins(source, target):
+	source = os.path.abspath(source)
+	for category in os.listdir(source):
+		categoryPath = os.path.join(source, category)
+		if os.path.isdir(categoryPath) and category != "__pycache__":
+			os.mkdir(os.path.join(target, category))
+			for name in os.listdir(categoryPath):
+				path = os.path.join(categoryPath, name)
+				if os.path.exists(os.path.join(path, "plugin.py")) or os.path.exists(os.path.join(path, "plugin.pyc")):
+					os.symlink(path, os.path.join(target, category, name))
+
+
+def enumerate(directory, manifest):  # Runs in the child process.
+	import enigma  # This must be the first import, it sets up the fake environment.
+	from benchmarks import initUsageConfig
+	initUsageConfig()
+	import Components.PluginComponent
+	Components.PluginComponent.PLUGIN_MANIFEST_FILE = manifest
+	from Components.PluginComponent import plugins
+	modules = len(sys.modules)
+	start = time.perf_counter()
+	plugins.readPluginList(directory)
+	duration = (time.perf_counter() - start) * 1000.0
+	return {"ms": duration, "descriptors": len(plugins.pluginList), "modules": len(sys.modules) - modules}
+
+
+def report(manifest):
+	with open(manifest, "rb") as fd:
+		document = pickle.load(fd)
+	print("Manifest '%s', signature %s." % (manifest, document.get("signature")))
+	entries = sorted(document.get("plugins", {}).items(), key=lambda item: item[1][2], reverse=True)
+	lazy = [entry for path, entry in entries if entry[1] is not None]
+	print("%d plugins, %d imported on first use, %.1f ms of %.1f ms import time saved at start up." % (len(entries), len(lazy), sum(entry[2] for entry in lazy), sum(entry[2] for path, entry in entries)))
+	print()
+	print("%10s  %-8s %s" % ("Import ms", "Loading", "Plugin"))
+	for path, entry in entries:
+		print("%10.1f  %-8s %s" % (entry[2], "on use" if entry[1] is not None else "start", "/".join(path.split(os.sep)[-2:])))
+
+
+def main(argv):
+	options = {}
+	for argument in argv:
+		if argument.startswith("--"):
+			key, sep, value = argument[2:].partition("=")
+			options[key] = value if sep else True
+	if "child" in options:
+		result = enumerate(options["child"], options["manifest"])
+		with open(options["result"], "w") as fd:
+			json.dump(result, fd)
+		return 0
+	if "manifest" in options:
+		report(options["manifest"])
+		return 0
+	source = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "python", "Plugins"))
+	directory = tempfile.mkdtemp()
+	mirror = os.path.join(directory, "Plugins")
+	manifest = os.path.join(directory, "plugins.manifest")
+	resultFile = os.path.join(directory, "result.json")
+	os.mkdir(mirror)
+	mirrorPlugins(source, mirror)
+	results = []
+	for label in ("without manifest", "with manifest"):
+		runs = []
+		for index in range(int(options.get("repeat", "5"))):
+			if label == "without manifest" and os.path.exists(manifest):
+				os.unlink(manifest)
+			subprocess.run([sys.executable, os.path.abspath(__file__), "--child=%s" % mirror, "--manifest=%s" % manifest, "--result=%s" % resultFile], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+			with open(resultFile) as fd:
+				runs.append(json.load(fd))
+		runs.sort(key=lambda result: result["ms"])
+		result = runs[len(runs) // 2]
+		results.append(result)
+		print("%-18s %8.1f ms median of %d, %d descriptors, %d modules imported" % (label, result["ms"], len(runs), result["descriptors"], result["modules"]))
+	print("Start up saving %.1f ms." % (results[0]["ms"] - results[1]["ms"]))
+	print()
+	report(manifest)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
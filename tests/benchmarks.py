@@ -0,0 +1,386 @@
+# Performance benchmarks on the fake enigma test environment.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python benchmarks.py [options] [scenario ...]
+#
+# Options:
+#   --repeat=N          run every scenario N times, default 5
+#   --output=FILE       write the results as JSON to FILE, default benchmark_results.json
+#   --baseline=FILE     compare against FILE, default benchmark_baseline.json
+#   --tolerance=F       report a regression when the median is more than F times
+#                       slower than the baseline median, default 0.25
+#   --save-baseline     store the results as the new baseline
+#
+# The process exits with 1 if a scenario regressed or failed and 0 otherwise.
+# Scenarios that can't be set up in this environment are reported as errors.
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+import enigma  # This must be the first import, it sets up the fake environment.
+
+SCENARIOS = []
+
+
+def scenario(name):
+	def register(function):
+		SCENARIOS.append((name, function))
+		return function
+	return register
+
+
+class ItemSize:
+	def __init__(self, width, height):
+		self.w = width
+		self.h = height
+
+	def width(self):
+		return self.w
+
+	def height(self):
+		return self.h
+
+
+class ListContent:  # Stand-in for eListboxPythonMultiContent.
+	def __init__(self, width=1200, height=40):
+		self.size = ItemSize(width, height)
+
+	def getItemSize(self):
+		return self.size
+
+	def __getattr__(self, name):
+		return lambda *args, **kwargs: None
+
+
+class NoTimers:  # Stand-in for the RecordTimer of the EPG list.
+	def isInTimer(self, eventId, begin, duration, service, getTimer=False):
+		return None
+
+
+class MovieInfo:  # Stand-in for iStaticServiceInformation.
+	def __init__(self, name):
+		self.name = name
+
+	def getName(self, serviceref):
+		return self.name
+
+
+class MovieRef:
+	def __init__(self, path, flags=0):
+		self.path = path
+		self.flags = flags
+		self.type = 1
+
+	def getPath(self):
+		return self.path
+
+
+def initCrashConfig():  # The config.crash settings StartEnigma.py creates.
+	from Components.config import config, ConfigSubsection, ConfigYesNo
+	if "crash" not in config.content.items:
+		config.crash = ConfigSubsection()
+		for name in ("debugActionMaps", "debugDVBScan", "debugEPG", "debugKeyboards", "debugScreens", "debugTimers"):
+			setattr(config.crash, name, ConfigYesNo(default=False))
+
+
+def initUsageConfig():  # The start up steps of StartEnigma.py the scenarios depend on.
+	initCrashConfig()
+	from Components.config import config, ConfigInteger, ConfigSubsection, ConfigText
+	if "osd" not in config.content.items:
+		config.osd = ConfigSubsection()
+		config.osd.language = ConfigText(default="en_US")
+	if "plugins" not in config.content.items:
+		config.plugins = ConfigSubsection()
+		config.plugins.remotecontroltype = ConfigSubsection()
+		config.plugins.remotecontroltype.rctype = ConfigInteger(default=0)
+	if "usage" not in config.content.items:
+		from Components.StackTrace import StackTracePrinter
+		from Components.UsageConfig import InitUsageConfig
+		stackTracePrinter = StackTracePrinter()
+		stackTracePrinter.daemon = True
+		InitUsageConfig()
+		stackTracePrinter.deactivate()
+	import Screens.InfoBar  # StartEnigma.py imports this before Navigation, the other order is circular.
+
+
+# Config tree load and save with a large settings file.
+
+@scenario("config_load_save")
+def configLoadSave():
+	from Components.config import config, ConfigInteger, ConfigSelection, ConfigSubsection, ConfigText, ConfigYesNo
+	config.benchmark = ConfigSubsection()
+	lines = []
+	for section in range(40):
+		subsection = ConfigSubsection()
+		setattr(config.benchmark, "section%d" % section, subsection)
+		for entry in range(50):
+			kind = entry % 4
+			if kind == 0:
+				setattr(subsection, "entry%d" % entry, ConfigYesNo(default=False))
+				value = "True"
+			elif kind == 1:
+				setattr(subsection, "entry%d" % entry, ConfigInteger(default=0, limits=(0, 100000)))
+				value = str(section * entry)
+			elif kind == 2:
+				setattr(subsection, "entry%d" % entry, ConfigText(default=""))
+				value = "text %d %d" % (section, entry)
+			else:
+				setattr(subsection, "entry%d" % entry, ConfigSelection(default="a", choices=["a", "b", "c"]))
+				value = "b"
+			lines.append("config.benchmark.section%d.entry%d=%s\n" % (section, entry, value))
+	for index in range(5000):  # Settings of components that are not loaded.
+		lines.append("config.plugins.benchmark%d.setting%d=%d\n" % (index // 100, index, index))
+	directory = tempfile.mkdtemp()
+	settings = os.path.join(directory, "settings")
+	saved = os.path.join(directory, "settings.saved")
+	with open(settings, "w") as fd:
+		fd.writelines(lines)
+
+	def run():
+		config.loadFromFile(settings)
+		config.benchmark.save()
+		config.saveToFile(saved)
+
+	def cleanup():
+		for filename in (settings, saved):
+			if os.path.exists(filename):
+				os.unlink(filename)
+		os.rmdir(directory)
+		del config.benchmark
+	return run, cleanup
+
+
+# Timer activation, sanity check and isInTimer() lookups.
+
+def createRecordTimer(count):
+	initUsageConfig()
+	import NavigationInstance
+	if NavigationInstance.instance is None:
+		enigma.init_nav()
+		enigma.init_record_config()
+	import RecordTimer
+	from ServiceReference import ServiceReference
+	recordTimer = RecordTimer.RecordTimer()
+	now = int(time.time())
+	timers = []
+	for index in range(count):
+		service = ServiceReference("1:0:19:%X:1:1:C00000:0:0:0:" % (index % 50 + 1))
+		begin = now + 3600 + index * 600
+		timers.append(RecordTimer.RecordTimerEntry(service, begin, begin + 1800, "Timer %d" % index, "", index))
+	return recordTimer, timers
+
+
+def timerActivation(count):
+	from Components.TimerSanityCheck import TimerSanityCheck
+	recordTimer, timers = createRecordTimer(count)
+
+	def run():
+		recordTimer.timer_list = []
+		recordTimer.processed_timers = []
+		for timer in timers:
+			TimerSanityCheck(recordTimer.timer_list, timer).check()
+			recordTimer.addTimerEntry(timer, noRecalc=True)
+		recordTimer.calcNextActivation()
+	return run, None
+
+
+def isInTimer(count):
+	recordTimer, timers = createRecordTimer(count)
+	for timer in timers:
+		recordTimer.addTimerEntry(timer, noRecalc=True)
+	queries = [(timer.eit, timer.begin + 60, 1200, "1:0:19:%X:1:1:C00000:0:0:0:" % (index % 50 + 1)) for index, timer in enumerate(timers)]
+	queries = (queries * (1000 // len(queries) + 1))[:1000]
+
+	def run():
+		for eventId, begin, duration, service in queries:
+			recordTimer.isInTimer(eventId, begin, duration, service)
+	return run, None
+
+
+for count in (10, 100, 1000):
+	scenario("timer_activation_%d" % count)(lambda count=count: timerActivation(count))
+	scenario("isintimer_%d" % count)(lambda count=count: isInTimer(count))
+
+
+# Skin XML load.
+
+@scenario("skin_load")
+def skinLoad():
+	initCrashConfig()
+	import skin
+	from Tools.Directories import SCOPE_SKINS
+
+	def run():
+		skin.domScreens.clear()
+		skin.loadSkin("skin_default.xml", scope=SCOPE_SKINS)
+	return run, None
+
+
+# EPG list entry building with synthetic EPG.
+
+@scenario("epg_list_entries")
+def epgListEntries():
+	initUsageConfig()
+	from Components.EpgList import EPG_TYPE_SINGLE, EPGList
+	epgList = EPGList(type=EPG_TYPE_SINGLE, timer=NoTimers())
+	epgList.l = ListContent()
+	epgList.recalcEntrySize()
+	now = int(time.time())
+	service = "1:0:19:1:1:1:C00000:0:0:0:"
+	events = [(service, index, now - 7200 + index * 900, 900, "Event %d with a longer title" % index) for index in range(2000)]
+
+	def run():
+		for event in events:
+			epgList.buildSingleEntry(*event)
+	return run, None
+
+
+# MovieList sorting over 10000 entries.
+
+@scenario("movielist_sort_10k")
+def movieListSort():
+	from Components.MovieList import MovieList
+	movieList = MovieList.__new__(MovieList)  # Only the sort keys are needed, they don't use the GUI.
+	entries = []
+	for index in range(10000):
+		path = "/media/hdd/movie/%05d - Recording %d.ts" % ((index * 7919) % 10000, index)
+		entries.append((MovieRef(path), MovieInfo(os.path.basename(path)), 1600000000 + (index * 104729) % 10000000, -1))
+
+	def run():
+		sorted(entries, key=movieList.buildAlphaNumericSortKey)
+		sorted(entries, key=movieList.buildBeginTimeSortKey)
+		sorted(entries, key=movieList.buildAlphaDateSortKey, reverse=True)
+	return run, None
+
+
+# Lamedb parsing, see also benchmark_lamedb.py.
+
+@scenario("lamedb_load_50k")
+def lamedbLoad():
+	from benchmark_lamedb import writeLamedb
+	from Tools.Lamedb import Lamedb
+	fd, filename = tempfile.mkstemp(suffix=".lamedb")
+	os.close(fd)
+	writeLamedb(filename, 50000)
+	return (lambda: Lamedb(filename)), (lambda: os.unlink(filename))
+
+
+# LCN allocation and renumber rules of the LCNScanner plugin, see also benchmark_lcn.py.
+
+@scenario("lcn_allocate_5k")
+def lcnAllocate():
+	from benchmark_lcn import createLCN, readLcn, writeLcnDb
+	fd, filename = tempfile.mkstemp(suffix=".lcndb")
+	os.close(fd)
+	writeLcnDb(filename, 5000)
+	lcn = createLCN(filename)
+	return (lambda: readLcn(lcn)), (lambda: os.unlink(filename))
+
+
+# FileList of a directory with 20000 files, listing, selecting all and clearing the selection.
+
+@scenario("filelist_changedir_20k")
+def fileListChangeDir():
+	from Components.FileList import FileListMultiSelect
+	directory = tempfile.mkdtemp()
+	for index in range(20000):
+		open(os.path.join(directory, "%05d - Recording.ts" % ((index * 7919) % 20000)), "w").close()
+	fileList = FileListMultiSelect([], directory)
+
+	def run():
+		fileList.refresh()
+		fileList.setAllSelections()
+		fileList.clearAllSelections()
+	return run, (lambda: shutil.rmtree(directory))
+
+
+def runScenario(name, function, repeat):
+	cleanup = None
+	try:
+		run, cleanup = function()
+		run()  # Warm up caches and imports.
+		timings = []
+		for index in range(repeat):
+			start = time.perf_counter()
+			run()
+			timings.append((time.perf_counter() - start) * 1000.0)
+		timings.sort()
+		return {
+			"min_ms": round(timings[0], 3),
+			"median_ms": round(timings[len(timings) // 2], 3),
+			"max_ms": round(timings[-1], 3),
+			"repeat": repeat
+		}
+	except Exception as err:
+		return {"error": "%s: %s" % (type(err).__name__, err), "traceback": traceback.format_exc()}
+	finally:
+		if cleanup:
+			try:
+				cleanup()
+			except Exception:
+				pass
+
+
+def compare(results, baseline, tolerance, minimum=0.0):  # Differences below minimum milliseconds are not regressions.
+	regressions = []
+	for name, result in sorted(results.items()):
+		reference = baseline.get(name)
+		if "error" in result:
+			status = "ERROR    %s" % result["error"]
+			regressions.append(name)
+		elif reference is None or "median_ms" not in reference:
+			status = "new"
+		else:
+			ratio = result["median_ms"] / reference["median_ms"] if reference["median_ms"] else 1.0
+			if ratio > 1.0 + tolerance and result["median_ms"] - reference["median_ms"] > minimum:
+				status = "REGRESSED %.2fx (baseline %.3f ms)" % (ratio, reference["median_ms"])
+				regressions.append(name)
+			else:
+				status = "ok %.2fx" % ratio
+		print("%-24s %12s  %s" % (name, "%.3f ms" % result["median_ms"] if "median_ms" in result else "-", status))
+	return regressions
+
+
+def main(argv):
+	options = {"repeat": "5", "output": "benchmark_results.json", "baseline": "benchmark_baseline.json", "tolerance": "0.25"}
+	selected = []
+	for argument in argv:
+		if argument.startswith("--"):
+			key, sep, value = argument[2:].partition("=")
+			options[key] = value if sep else True
+		else:
+			selected.append(argument)
+	results = {}
+	for name, function in SCENARIOS:
+		if selected and name not in selected:
+			continue
+		print("[Benchmark] Running '%s'." % name)
+		results[name] = runScenario(name, function, int(options["repeat"]))
+	document = {
+		"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"machine": platform.machine(),
+		"results": results
+	}
+	with open(options["output"], "w") as fd:
+		json.dump(document, fd, indent="\t", sort_keys=True)
+	baseline = {}
+	if os.path.exists(options["baseline"]):
+		with open(options["baseline"]) as fd:
+			baseline = json.load(fd).get("results", {})
+	regressions = compare(results, baseline, float(options["tolerance"]))
+	if options.get("save-baseline"):
+		with open(options["baseline"], "w") as fd:
+			json.dump(document, fd, indent="\t", sort_keys=True)
+		print("[Benchmark] Baseline saved to '%s'." % options["baseline"])
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
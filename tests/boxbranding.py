@@ -0,0 +1,7 @@
+# Fake of the native boxbranding module, every getter returns an empty string.
+
+
+def __getattr__(name):
+	if name.startswith("get"):
+		return lambda: ""
+	raise AttributeError(name)
@@ -1,6 +1,180 @@
 # fake-enigma
 
 
+class fakeType(type):
+	def __getattr__(cls, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		return fakeObject()
+
+
+class fakeObject(metaclass=fakeType):
+	"""Stand-in for the C++ classes, functions and constants this file does
+	not emulate.  Every attribute, call and instance is another fakeObject
+	and it is 0 as a number, so importing and initialising components does
+	not fail."""
+
+	def __init__(self, *args, **kwargs):
+		pass
+
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		return fakeObject()
+
+	def __call__(self, *args, **kwargs):
+		return fakeObject()
+
+	def __int__(self):
+		return 0
+
+	def __index__(self):
+		return 0
+
+	def __bool__(self):
+		return False
+
+	def __eq__(self, other):
+		return isinstance(other, fakeObject) or other == 0
+
+	def __hash__(self):
+		return 0
+
+	def __lt__(self, other):
+		return 0 < other
+
+	def __gt__(self, other):
+		return 0 > other
+
+	def __add__(self, other):
+		return other
+
+	def __sub__(self, other):
+		return -other
+
+	def __rsub__(self, other):
+		return other
+
+	def __mul__(self, other):
+		return 0
+
+	def __or__(self, other):
+		return other
+
+	def __and__(self, other):
+		return 0
+
+	def __neg__(self):
+		return 0
+
+	def __invert__(self):
+		return -1
+
+	__radd__ = __add__
+	__rmul__ = __mul__
+	__ror__ = __or__
+	__rand__ = __and__
+	__lshift__ = __rshift__ = __mul__
+
+	def __iter__(self):
+		return iter(())
+
+	def __len__(self):
+		return 0
+
+	def __str__(self):
+		return ""
+
+	@classmethod
+	def getInstance(cls):
+		return cls()
+
+
+def __getattr__(name):  # Anything not emulated below is a fakeObject class.
+	if name.startswith("__"):
+		raise AttributeError(name)
+	fake = fakeType(name, (fakeObject,), {})
+	globals()[name] = fake
+	return fake
+
+
+class eEnv:
+	@staticmethod
+	def resolve(path):
+		return path.replace("${datadir}/enigma2/", "../data/").replace("${datadir}", "/usr/share").replace("${libdir}", "/usr/lib").replace("${sysconfdir}", "/etc").replace("${bindir}", "/usr/bin").replace("${prefix}", "/usr")
+
+
+def eGetEnigmaDebugLvl():
+	return 0
+
+
+class eSize:
+	def __init__(self, width=0, height=0):
+		self.w = width
+		self.h = height
+
+	def width(self):
+		return self.w
+
+	def height(self):
+		return self.h
+
+	def isEmpty(self):
+		return self.w <= 0 or self.h <= 0
+
+
+class ePoint:
+	def __init__(self, x=0, y=0):
+		self.xpos = x
+		self.ypos = y
+
+	def x(self):
+		return self.xpos
+
+	def y(self):
+		return self.ypos
+
+
+class eRect:
+	def __init__(self, *args):
+		if len(args) == 2:  # ePoint and eSize.
+			args = (args[0].x(), args[0].y(), args[1].width(), args[1].height())
+		self.x1, self.y1, self.w, self.h = args if len(args) == 4 else (0, 0, 0, 0)
+
+	def left(self):
+		return self.x1
+
+	def top(self):
+		return self.y1
+
+	def width(self):
+		return self.w
+
+	def height(self):
+		return self.h
+
+	def size(self):
+		return eSize(self.w, self.h)
+
+	def topLeft(self):
+		return ePoint(self.x1, self.y1)
+
+	def isEmpty(self):
+		return self.w <= 0 or self.h <= 0
+
+
+class eDesktop(fakeObject):
+	def size(self):
+		return eSize(1280, 720)
+
+	def bounds(self):
+		return eRect(0, 0, 1280, 720)
+
+
+def getDesktop(screen):
+	return eDesktop()
+
+
 class slot:
 	def __init__(self):
 		self.list = []
@@ -25,6 +199,7 @@ from events import eventfnc
 class eTimer:
 	def __init__(self):
 		self.timeout = slot()
+		self.callback = self.timeout.list
 		self.next_activation = None
 		print("NEW TIMER")
 
@@ -36,7 +211,7 @@ class eTimer:
 		timers.add(self)
 
 	def stop(self):
-		timers.remove(self)
+		timers.discard(self)
 
 	def __repr__(self):
 		return f"<eTimer timeout={repr(self.timeout)} next_activation={repr(self.next_activation)} singleshot={repr(self.singleshot)}>"
@@ -69,6 +244,19 @@ def runIteration():
 		running_timers = running_timers[1:]
 
 
+def runPending(limit=100):  # Run the timers that are due without waiting, returns the number of timers that ran.
+	count = 0
+	while count < limit:
+		due = sorted((timer for timer in timers if timer.next_activation <= time.time()), key=lambda timer: timer.next_activation)
+		if not due:
+			break
+		for timer in due:
+			if timer in timers:
+				timer.do()
+				count += 1
+	return count
+
+
 stopped = False
 
 
@@ -87,24 +275,8 @@ def run(duration=1000):
 
 ##################### ENIGMA GUI
 
-eSize = None
-ePoint = None
-gFont = None
-eWindow = None
-eLabel = None
-ePixmap = None
-eWindowStyleManager = None
-loadPNG = None
-addFont = None
-gRGB = None
-eWindowStyleSkinned = None
-eButton = None
-eListboxPythonStringContent = None
-eListbox = None
-eSubtitleWidget = None
-
-
-class eEPGCache:
+
+class eEPGCache(fakeObject):
 	@classmethod
 	def getInstance(self):
 		return self.instance
@@ -120,10 +292,8 @@ class eEPGCache:
 
 eEPGCache()
 
-getBestPlayableServiceReference = None
-
 
-class pNavigation:
+class pNavigation(fakeObject):
 	def __init__(self):
 		self.m_event = slot()
 		self.m_record_event = slot()
@@ -144,11 +314,10 @@ class pNavigation:
 		return "pNavigation"
 
 
-eRCInput = None
 getPrevAsciiCode = None
 
 
-class eServiceReference:
+class eServiceReference(fakeObject):
 
 	isDirectory = 1
 	mustDescent = 2
@@ -160,18 +329,32 @@ class eServiceReference:
 	isMarker = 64
 	isGroup = 128
 
-	def __init__(self, ref):
-		self.ref = ref
-		self.flags = 0
+	def __init__(self, ref="", flags=0, path=""):
+		if isinstance(ref, str):
+			self.ref = ref
+			self.flags = 0
+		else:
+			self.ref = "%d:%d:%s" % (ref, flags, path)
+			self.flags = flags
+		self.path = path
 
 	def toString(self):
 		return self.ref
 
+	def getPath(self):
+		return self.path
+
+	def setPath(self, path):
+		self.path = path
+
+	def valid(self):
+		return bool(self.ref)
+
 	def __repr__(self):
 		return self.toString()
 
 
-class iRecordableService:
+class iRecordableService(fakeObject):
 	def __init__(self, ref):
 		self.ref = ref
 
@@ -191,13 +374,7 @@ class iRecordableService:
 		return f"iRecordableService({repr(self.ref)})"
 
 
-quitMainloop = None
-
-
-eDVBVolumecontrol = None
-
-
-class eRFmod:
+class eRFmod(fakeObject):
 	@classmethod
 	def getInstance(self):
 		return self.instance
@@ -229,7 +406,7 @@ class eRFmod:
 eRFmod()
 
 
-class eDBoxLCD:
+class eDBoxLCD(fakeObject):
 	@classmethod
 	def getInstance(self):
 		return self.instance
@@ -254,10 +431,8 @@ class eDBoxLCD:
 
 eDBoxLCD()
 
-Misc_Options = None
 
-
-class eServiceCenter:
+class eServiceCenter(fakeObject):
 	@classmethod
 	def getInstance(self):
 		return self.instance
@@ -302,9 +477,30 @@ Components.config.config.unpickle(my_config)
 ##################### ENIGMA ACTIONS
 
 
-class eActionMap:
+class eActionMap(fakeObject):
+	instance = None
+
 	def __init__(self):
-		pass
+		self.bindings = []  # List of (prio, context, function), dispatched in ascending prio.
+
+	@classmethod
+	def getInstance(cls):
+		if cls.instance is None:
+			cls.instance = cls()
+		return cls.instance
+
+	def bindAction(self, context, prio, function):
+		self.bindings.append((prio, context, function))
+		self.bindings.sort(key=lambda binding: binding[0])
+
+	def unbindAction(self, context, function):
+		self.bindings = [binding for binding in self.bindings if not (binding[1] == context and binding[2] == function)]
+
+	def dispatch(self, context, action):  # Emulates a key press that keymap.xml maps to this context and action.
+		for prio, bindingContext, function in self.bindings[:]:
+			if bindingContext == context and function(context, action):
+				return 1
+		return 0
 
 
 ##################### ENIGMA STARTUP:
@@ -0,0 +1,205 @@
+# Headless replay of a recorded key sequence with key latency measurement.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python replay_keys.py [options] [KEYFILE]
+#
+# KEYFILE is either the enigma2-keylatency.json written by a box with
+# config.crash.keylatency enabled or a text file with one "context action"
+# pair per line, default replay_keys.txt.
+#
+# Options:
+#   --screen=MODULE.CLASS  the screen that is open when the replay starts,
+#                          default Screens.Setup.Setup
+#   --args=A,B             string arguments of that screen, default "userinterface"
+#   --repeat=N             replay the sequence N times, default 3
+#   --output=FILE          write the latency results as JSON to FILE,
+#                          default keylatency_results.json
+#   --baseline=FILE        compare against FILE, default keylatency_baseline.json
+#   --tolerance=F          see benchmarks.py, default 0.25
+#   --minimum=MS           slow downs of less than MS milliseconds are not
+#                          regressions, default 1.0
+#   --save-baseline        store the results as the new baseline
+#
+# The actions are dispatched through the fake eActionMap to the ActionMaps
+# bound by the open screens, so the replay follows the same ActionMap,
+# session.open(), readSkin, applySkin and execBegin code as the box does.
+
+import json
+import os
+import sys
+
+import enigma  # This must be the first import, it sets up the fake environment.
+from benchmarks import compare, initUsageConfig
+
+
+class ReplaySession:  # The parts of the StartEnigma.py Session the screens use.
+	def __init__(self):
+		self.desktop = enigma.getDesktop(0)
+		self.summaryDesktop = None
+		self.summary = None
+		self.current_dialog = None
+		self.dialog_stack = []
+		self.in_exec = False
+		self.nav = None
+		self.screen = {}
+		self.delay_timer = enigma.eTimer()
+		self.delay_timer.callback.append(self.processDelay)
+
+	def doInstantiateDialog(self, screen, arguments, kwargs, desktop):
+		from skin import readSkin
+		from Tools.KeyLatency import keyLatency
+		with keyLatency.phase("init", screen):
+			dialog = screen(self, *arguments, **kwargs)
+		with keyLatency.phase("readSkin", dialog):
+			readSkin(dialog, None, dialog.skinName, desktop)
+		with keyLatency.phase("applySkin", dialog):
+			dialog.setDesktop(desktop)
+			dialog.applySkin()
+		return dialog
+
+	def instantiateDialog(self, screen, *arguments, **kwargs):
+		return self.doInstantiateDialog(screen, arguments, kwargs, self.desktop)
+
+	def execBegin(self, first=True, do_show=True):
+		from Tools.KeyLatency import keyLatency
+		self.in_exec = True
+		currentDialog = self.current_dialog
+		with keyLatency.phase("execBegin", currentDialog):
+			currentDialog.execBegin()
+		if currentDialog == self.current_dialog and do_show:
+			with keyLatency.phase("show", currentDialog):
+				currentDialog.show()
+
+	def execEnd(self, last=True):
+		self.in_exec = False
+		self.current_dialog.execEnd()
+		self.current_dialog.hide()
+
+	def pushCurrent(self):
+		if self.current_dialog is not None:
+			self.dialog_stack.append((self.current_dialog, self.current_dialog.shown))
+			self.execEnd(last=False)
+
+	def popCurrent(self):
+		if self.dialog_stack:
+			self.current_dialog, doShow = self.dialog_stack.pop()
+			self.execBegin(first=False, do_show=doShow)
+		else:
+			self.current_dialog = None
+
+	def open(self, screen, *arguments, **kwargs):
+		self.pushCurrent()
+		dialog = self.current_dialog = self.instantiateDialog(screen, *arguments, **kwargs)
+		dialog.isTmp = True
+		dialog.callback = None
+		self.execBegin()
+		return dialog
+
+	def openWithCallback(self, callback, screen, *arguments, **kwargs):
+		dialog = self.open(screen, *arguments, **kwargs)
+		dialog.callback = callback
+		return dialog
+
+	def close(self, screen, *retVal):
+		if not self.in_exec or screen != self.current_dialog:
+			return
+		self.current_dialog.returnValue = retVal
+		self.delay_timer.start(0, 1)
+		self.execEnd()
+
+	def processDelay(self):
+		callback = self.current_dialog.callback
+		retVal = self.current_dialog.returnValue
+		self.current_dialog.doClose()
+		self.popCurrent()
+		if callback is not None:
+			callback(*retVal)
+
+
+def readKeys(filename):
+	if filename.endswith(".json"):
+		with open(filename) as fd:
+			return [tuple(key) for key in json.load(fd)["keys"]]
+	keys = []
+	with open(filename) as fd:
+		for line in fd:
+			line = line.split("#", 1)[0].split()
+			if len(line) == 2:
+				keys.append(tuple(line))
+	return keys
+
+
+def getClass(name):
+	module, sep, className = name.rpartition(".")
+	return getattr(__import__(module, fromlist=[className]), className)
+
+
+def replay(session, screen, arguments, keys):
+	"""Open the start screen and dispatch the keys, the main loop runs the
+	due timers after each key like the box does before the next key."""
+	actionMap = enigma.eActionMap.getInstance()
+	session.open(screen, *arguments)
+	enigma.runPending()
+	missed = set()
+	for context, action in keys:
+		if not actionMap.dispatch(context, action):
+			missed.add("%s:%s" % (context, action))
+		enigma.runPending()
+	while session.current_dialog is not None:  # Close what the sequence left open.
+		session.current_dialog.close()
+		enigma.runPending()
+	return missed
+
+
+def main(argv):
+	options = {"screen": "Screens.Setup.Setup", "args": "userinterface", "repeat": "3", "output": "keylatency_results.json", "baseline": "keylatency_baseline.json", "tolerance": "0.25", "minimum": "1.0"}
+	arguments = []
+	for argument in argv:
+		if argument.startswith("--"):
+			key, sep, value = argument[2:].partition("=")
+			options[key] = value if sep else True
+		else:
+			arguments.append(argument)
+	keys = readKeys(arguments[0] if arguments else os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_keys.txt"))
+	initUsageConfig()
+	import skin
+	from Tools.Directories import SCOPE_SKINS
+	from Tools.KeyLatency import keyLatency
+	skin.loadSkin("skin_default.xml", scope=SCOPE_SKINS)
+	screen = getClass(options["screen"])
+	screenArguments = [argument for argument in options["args"].split(",") if argument]
+	session = ReplaySession()
+	replay(session, screen, screenArguments, keys)  # Warm up imports and skin caches.
+	keyLatency.reset()
+	keyLatency.setEnabled(True)
+	missed = set()
+	for index in range(int(options["repeat"])):
+		missed |= replay(session, screen, screenArguments, keys)
+	keyLatency.setEnabled(False)
+	keyLatency.keys = keys[:]
+	document = keyLatency.getResults()
+	with open(options["output"], "w") as fd:
+		json.dump(document, fd, indent="\t", sort_keys=True)
+	results = {}
+	for group in ("actions", "screens"):
+		for name, result in document[group].items():
+			results["%s %s" % (group[:-1], name)] = result
+	baseline = {}
+	if os.path.exists(options["baseline"]):
+		with open(options["baseline"]) as fd:
+			document = json.load(fd)
+			for group in ("actions", "screens"):
+				for name, result in document.get(group, {}).items():
+					baseline["%s %s" % (group[:-1], name)] = result
+	regressions = compare(results, baseline, float(options["tolerance"]), float(options["minimum"]))
+	for name in sorted(missed):
+		print("[Replay] Warning: No ActionMap handled '%s'." % name)
+	if options.get("save-baseline"):
+		with open(options["baseline"], "w") as fd:
+			json.dump(keyLatency.getResults(), fd, indent="\t", sort_keys=True)
+		print("[Replay] Baseline saved to '%s'." % options["baseline"])
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
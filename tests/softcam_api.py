@@ -0,0 +1,152 @@
+# Test of the asynchronous softcam client against a stub web interface.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python softcam_api.py
+#
+# The stub serves the recorded oscamapi responses in oscamapi/, named after
+# the "part" and "label" of the request, with digest authentication and a
+# delay per request.  The label "hang" never answers.  The test checks the
+# parsing, the digest authorization, the reuse of connections and of
+# cached responses, the concurrency limit and the timeout, and exits with 1
+# if a check failed.
+
+import os
+import sys
+from hashlib import md5
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Site
+
+from Tools.SoftcamAPI import OscamAPI, SoftcamAPI, SoftcamAPIError, parseChallenge
+
+RESPONSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oscamapi")
+USERNAME = "admin"
+PASSWORD = "secret"
+REALM = "Forbidden"
+NONCE = "b0d7a1a5c9d9e4ab"
+DELAY = 0.05
+
+
+class StubOscamAPI(Resource):
+	isLeaf = True
+
+	def __init__(self):
+		Resource.__init__(self)
+		self.requests = 0
+		self.challenges = 0
+		self.running = 0
+		self.peak = 0
+		self.connections = set()
+
+	def authorized(self, request):
+		header = request.getHeader("authorization")
+		if not header:
+			return False
+		scheme, parameters = parseChallenge(header)
+		hash1 = md5(("%s:%s:%s" % (USERNAME, REALM, PASSWORD)).encode()).hexdigest()
+		hash2 = md5(("%s:%s" % (request.method.decode(), parameters.get("uri", ""))).encode()).hexdigest()
+		expected = md5(("%s:%s:%s:%s:%s:%s" % (hash1, NONCE, parameters.get("nc"), parameters.get("cnonce"), parameters.get("qop"), hash2)).encode()).hexdigest()
+		return scheme == "digest" and parameters.get("username") == USERNAME and parameters.get("response") == expected
+
+	def render_GET(self, request):
+		self.connections.add(id(request.channel))
+		if not self.authorized(request):
+			self.challenges += 1
+			request.setResponseCode(401)
+			request.setHeader("WWW-Authenticate", 'Digest realm="%s", qop="auth", nonce="%s", opaque="d41d8cd98f00b204"' % (REALM, NONCE))
+			return b"Unauthorized"
+		self.requests += 1
+		part = request.args.get(b"part", [b"status"])[0].decode()
+		label = request.args.get(b"label", [b""])[0].decode()
+		if label == "hang":
+			return NOT_DONE_YET
+		if part == "status" and b"appendlog" in request.args:
+			part = "status_log"
+		filename = os.path.join(RESPONSES, "%s%s.xml" % (part, "_%s" % label.replace(" ", "_") if label else ""))
+		self.running += 1
+		self.peak = max(self.peak, self.running)
+
+		def respond():
+			self.running -= 1
+			if os.path.exists(filename):
+				with open(filename, "rb") as fd:
+					request.write(fd.read())
+			else:
+				request.setResponseCode(404)
+			request.finish()
+
+		reactor.callLater(DELAY, respond)
+		return NOT_DONE_YET
+
+
+failures = []
+
+
+def check(name, condition, details=""):
+	print("%-4s %s%s" % ("ok" if condition else "FAIL", name, " (%s)" % details if details and not condition else ""))
+	if not condition:
+		failures.append(name)
+
+
+@inlineCallbacks
+def runTests(port, stub):
+	client = SoftcamAPI(timeout=1, concurrency=2, ttl=2)
+	api = OscamAPI("http://127.0.0.1:%d/oscamapi.html" % port, USERNAME, PASSWORD, client=client)
+	status = yield api.getStatus()
+	check("status parsed", status.attrib.get("version") == "11.718-@59cb0a1" and len(status.find("status").findall("client")) == 5)
+	check("digest challenge answered once", stub.challenges == 1, stub.challenges)
+	readers = yield api.getReaders()
+	check("status reused from the cache", stub.requests == 1, stub.requests)
+	check("readers and proxies", readers == [("internal_card", "internal"), ("remote cccam", "cccam"), ("second cccam", "cccam")], readers)
+	cccam = [name for name, protocol in (yield api.getReaders("cccam"))]
+	totals = yield api.getTotalCards(cccam)
+	check("total cards per reader", totals == {"remote cccam": "3", "second cccam": "1"}, totals)
+	stub.peak = 0
+	client.clearCache()
+	results = yield api.getAll(api.getReaderStats, ["remote cccam", "second cccam", "internal_card", "remote cccam"])
+	check("concurrency limit", stub.peak <= 2, stub.peak)
+	check("missing reader", [element is None for reader, element in results] == [False, False, True, False], results)
+	check("challenge kept for further requests", stub.challenges == 1, stub.challenges)
+	log = yield api.getLog()
+	logLines = log.find("log").text.strip().split("\n")
+	check("log wrapped in CDATA", len(logLines) == 3, logLines)
+	requests = stub.requests
+	yield api.getLog()
+	check("log not cached", stub.requests == requests + 1)
+	check("persistent connections", len(stub.connections) <= 2, len(stub.connections))
+	try:
+		yield api.getEntitlements("hang")
+		check("timeout", False, "no error")
+	except SoftcamAPIError as err:
+		check("timeout", "1 seconds" in str(err), err)
+	badClient = SoftcamAPI(timeout=1, concurrency=2, ttl=0)
+	try:
+		yield OscamAPI("http://127.0.0.1:%d/oscamapi.html" % port, USERNAME, "wrong", client=badClient).getStatus()
+		check("wrong password", False, "no error")
+	except SoftcamAPIError as err:
+		check("wrong password", "401" in str(err), err)
+	yield client.pool.closeCachedConnections()
+	yield badClient.pool.closeCachedConnections()
+
+
+def main():
+	stub = StubOscamAPI()
+	listener = reactor.listenTCP(0, Site(stub), interface="127.0.0.1")
+
+	def done(result):
+		if result is not None and hasattr(result, "printTraceback"):
+			result.printTraceback()
+			failures.append("exception")
+		listener.stopListening()
+		reactor.stop()
+
+	reactor.callWhenRunning(lambda: runTests(listener.getHost().port, stub).addBoth(done))
+	reactor.run()
+	print("%d checks failed." % len(failures) if failures else "All checks passed.")
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,105 @@
+# Test of the entries, the selection, the inhibited directories and the
+# sorting of the FileList.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python test_filelist.py
+#
+# A temporary directory with files, directories and a link to an inhibited
+# directory is listed.  The first element of an entry must be the tuple of
+# the path, directory, link, selection, name and icon flags external code
+# reads, getSelectedItems() must return the items in the order they were
+# selected, an inhibited directory and a link to it must be hidden and the
+# sorting by date or size must read the status of items without a directory
+# entry, like the ones of the service reference listing.  The process exits
+# with 1 if a check failed.
+
+import os
+import sys
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import enigma  # This must be the first import, it sets up the fake environment.
+from benchmarks import initUsageConfig
+initUsageConfig()
+from Components.FileList import FILE_IS_DIR, FILE_IS_LINK, FILE_NAME, FILE_PATH, FILE_SELECTED, FileList, FileListMultiSelect, SELECT_FILES
+
+failures = []
+
+
+def check(label, result, expected):
+	if result != expected:
+		failures.append("%s: %s instead of %s" % (label, result, expected))
+	print("%-50s %s" % (label, "ok" if result == expected else "FAILED"))
+
+
+def getNames(fileList):
+	return [entry[0][FILE_NAME] for entry in fileList.getFileList()]
+
+
+def select(fileList, name, method):
+	index = getNames(fileList).index(name)
+	fileList.getSelectionIndex = lambda: index
+	method()
+
+
+def main():
+	directory = os.path.realpath(mkdtemp())
+	try:
+		for name, size in (("b.ts", 300), ("c.ts", 100), ("a.ts", 200)):
+			with open(os.path.join(directory, name), "w") as fd:
+				fd.write("x" * size)
+			time.sleep(0.01)  # Different change times for the sorting by date.
+		for name in ("sub", "hidden"):
+			os.mkdir(os.path.join(directory, name))
+		os.symlink(os.path.join(directory, "hidden"), os.path.join(directory, "hiddenlink"))
+		os.symlink(os.path.join(directory, "sub"), os.path.join(directory, "sublink"))
+		files = [os.path.join(directory, name) for name in ("a.ts", "b.ts", "c.ts")]
+
+		fileList = FileList(directory, showMountpoints=False)
+		entries = [entry for entry in fileList.getFileList() if not entry[0][FILE_NAME].startswith("<")]
+		check("entry[0] is the tuple of the entry", [(entry[0][FILE_PATH], entry[0][FILE_IS_DIR], entry[0][FILE_IS_LINK], entry[0][FILE_SELECTED]) for entry in entries], [(os.path.join(directory, name, ""), True, name.endswith("link"), None) for name in ("hidden", "hiddenlink", "sub", "sublink")] + [(path, False, False, None) for path in files])
+		check("entry[0] is the first element of the row", all(fileList.buildEntry(*entry)[0] is entry[0] for entry in entries), True)
+
+		fileList = FileList(directory, showMountpoints=False, inhibitDirs=[os.path.join(directory, "hidden")])
+		check("inhibited directory and its link hidden", [name for name in getNames(fileList) if not name.startswith("<")], ["sub", "sublink", "a.ts", "b.ts", "c.ts"])
+
+		fileList = FileListMultiSelect([files[2], files[0]], directory, showDirectories=False, showMountpoints=False)
+		check("initial selection order kept", fileList.getSelectedItems(), [files[2], files[0]])
+		select(fileList, "a.ts", fileList.clearSelection)
+		select(fileList, "b.ts", fileList.setSelection)
+		select(fileList, "a.ts", fileList.toggleSelection)
+		check("set, clear and toggle keep the order", fileList.getSelectedItems(), [files[2], files[1], files[0]])
+		check("selection flags of the entries", [entry[0][FILE_SELECTED] for entry in fileList.getFileList()], [True, True, True])
+		fileList.clearAllSelections()
+		check("all cleared", fileList.getSelectedItems(), [])
+		select(fileList, "c.ts", fileList.setSelection)
+		fileList.setAllSelections(SELECT_FILES)
+		check("all set after one, the first one stays first", fileList.getSelectedItems(), [files[2], files[0], files[1]])
+		select(fileList, "a.ts", fileList.clearSelection)
+		fileList.toggleAllSelections()
+		check("toggle all", fileList.getSelectedItems(), [files[0]])
+		fileList.toggleAllSelections()
+		check("toggle all again", fileList.getSelectedItems(), [files[1], files[2]])
+
+		items = [(os.path.basename(path), path, False, False, None) for path in files]  # No os.DirEntry, as for the service references.
+		items.append(("sublink", os.path.join(directory, "sublink"), True, True, None))
+		bySize = [item[:4] for item in sorted(items, key=lambda item: os.lstat(item[1]).st_size)]
+		byDate = [item[:4] for item in sorted(items, key=lambda item: os.lstat(item[1]).st_ctime, reverse=True)]
+		check("sorted by size without directory entries", fileList.sortList(items, "2.0"), bySize)
+		check("sorted by date without directory entries", fileList.sortList(items, "1.1"), byDate)
+		check("sorted by name", [item[0] for item in fileList.sortList(items, "0.0")], ["a.ts", "b.ts", "c.ts", "sublink"])
+	finally:
+		rmtree(directory)
+
+	if failures:
+		print()
+		print("\n".join(failures))
+		return 1
+	print()
+	print("All file list checks passed.")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
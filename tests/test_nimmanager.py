@@ -0,0 +1,155 @@
+# Test of the satellite to tuner routing table of the NimManager.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python test_nimmanager.py
+#
+# A NimManager with four DVB-S2 slots, the last two an FBC root and an FBC
+# link, and a DVB-T2 slot is configured step by step in simple, advanced,
+# unicable and FBC modes.  After every step the memoised getSatListForNim()
+# and getNimListForSat() are compared with the configuration walk of
+# calcSatListForNim() and the former getNimListForSat(), which also checks
+# that the notifiers of config.Nims dropped the routing table.  A second
+# query without a change must not walk the configuration again.  The
+# process exits with 1 if a check failed.
+
+import sys
+
+import enigma  # This must be the first import, it sets up the fake environment.
+from benchmarks import initUsageConfig
+initUsageConfig()
+import Components.NimManager
+from Components.config import config
+
+SATELLITES = [(130, "Hotbird", 1), (192, "Astra 1", 1), (235, "Astra 3", 1), (282, "Astra 2", 1), (3560, "Amos", 1)]
+SLOTS = (("DVB-S2", [0, 0, 0]), ("DVB-S2", [0, 0, 0]), ("DVB-S2", [1, 1, 0]), ("DVB-S2", [2, 3, 0]), ("DVB-T2", [0, 0, 0]))
+
+
+class FakeSatelliteEquipmentControl(enigma.fakeObject):
+	def getMaxFixedLnbPositions(self):
+		return 64
+
+
+class TestNimManager(Components.NimManager.NimManager):
+	def __init__(self):
+		self.walks = 0
+		Components.NimManager.NimManager.__init__(self)
+
+	def enumerateNIMs(self):
+		self.nim_slots = []
+		self.invalidateRoutes()
+		self.number_of_slots = len(SLOTS)
+		for slot, (type, fbc) in enumerate(SLOTS):
+			self.nim_slots.append(Components.NimManager.NIM(slot=slot, description="Test %s" % type, nimtype=type, frontend_id=slot, is_fbc=fbc, number_of_slots=len(SLOTS)))
+
+	def readTransponders(self):
+		self.satList = list(SATELLITES)
+		self.satellites = {}
+		self.transponders = {}
+		self.invalidateRoutes()
+
+	def calcSatListForNim(self, slotid):
+		self.walks += 1
+		return Components.NimManager.NimManager.calcSatListForNim(self, slotid)
+
+
+def referenceNimListForSat(nimmgr, orb_pos):  # The getNimListForSat() before the routing table.
+	return [nim.slot for nim in nimmgr.nim_slots if nim.isCompatible("DVB-S") and not nim.isFBCLink() and orb_pos in [sat[0] for sat in nimmgr.calcSatListForNim(nim.slot)]]
+
+
+failures = []
+
+
+def check(nimmgr, label):
+	for nim in nimmgr.nim_slots:
+		expected = nimmgr.calcSatListForNim(nim.slot)
+		result = nimmgr.getSatListForNim(nim.slot)
+		if result != expected:
+			failures.append("%s: getSatListForNim(%d) returned %s instead of %s" % (label, nim.slot, result, expected))
+		if nimmgr.getSatPositionsForNim(nim.slot) != frozenset(sat[0] for sat in expected):
+			failures.append("%s: getSatPositionsForNim(%d) differs from %s" % (label, nim.slot, expected))
+	for position, name, flags in SATELLITES:
+		expected = referenceNimListForSat(nimmgr, position)
+		result = nimmgr.getNimListForSat(position)
+		if result != expected:
+			failures.append("%s: getNimListForSat(%d) returned %s instead of %s" % (label, position, result, expected))
+	walks = nimmgr.walks
+	for nim in nimmgr.nim_slots:
+		nimmgr.getSatListForNim(nim.slot)
+	for position, name, flags in SATELLITES:
+		nimmgr.getNimListForSat(position)
+	if nimmgr.walks != walks:
+		failures.append("%s: the routing table was not reused, %d configuration walks" % (label, nimmgr.walks - walks))
+	print("%-45s %s" % (label, ", ".join("%d=%s" % (position, nimmgr.getNimListForSat(position)) for position, name, flags in SATELLITES)))
+
+
+def setSatlist(element, position):
+	element.value = str(position) if isinstance(element.value, str) else position
+
+
+def main():
+	Components.NimManager.secClass = FakeSatelliteEquipmentControl
+	config.content.items.pop("Nims", None)  # Created for the slots of this environment by the import.
+	nimmgr = TestNimManager()
+	nims = [config.Nims[slot].dvbs for slot in range(4)]
+	check(nimmgr, "default configuration")
+
+	nims[0].diseqcMode.value = "single"
+	setSatlist(nims[0].diseqcA, 192)
+	check(nimmgr, "simple single")
+	nims[0].diseqcMode.value = "diseqc_a_b_c_d"
+	setSatlist(nims[0].diseqcB, 130)
+	setSatlist(nims[0].diseqcC, 282)
+	check(nimmgr, "simple DiSEqC A/B/C/D")
+	nims[1].configMode.value = "equal"
+	nims[1].connectedTo.value = "0"
+	check(nimmgr, "simple equal to")
+	setSatlist(nims[0].diseqcD, 235)
+	check(nimmgr, "simple change seen by the equal tuner")
+	nims[1].diseqcMode.value = "positioner_select"
+	nims[1].configMode.value = "simple"
+	nims[1].userSatellitesList.value = "[130, 3560]"
+	check(nimmgr, "simple positioner selecting satellites")
+	nims[1].diseqcMode.value = "positioner"
+	check(nimmgr, "simple positioner")
+
+	nims[0].configMode.value = "advanced"
+	check(nimmgr, "advanced without LNB")
+	nims[0].advanced.sat[192].lnb.value = "1"
+	nims[0].advanced.sat[130].lnb.value = "2"
+	check(nimmgr, "advanced two LNBs")
+	nims[0].advanced.lnb[1].lof.value = "unicable"
+	check(nimmgr, "advanced unicable LNB")
+	nims[0].advanced.sat[3605].lnb.value = nims[0].advanced.sat[3605].lnb.choices[1]
+	nims[0].advanced.sat[3605].userSatellitesList.value = "[282, 130]"
+	check(nimmgr, "advanced selecting satellites")
+	nims[0].advanced.sat[3601].lnb.value = nims[0].advanced.sat[3601].lnb.choices[1]
+	check(nimmgr, "advanced all satellites")
+	nims[0].advanced.sat[3601].lnb.value = "0"
+	nims[0].advanced.sat[130].lnb.value = "0"
+	check(nimmgr, "advanced LNBs removed")
+
+	nims[2].configMode.value = "advanced"
+	nims[2].advanced.sats.value = 235  # The FBC link takes the LNB of the satellite selected on the root.
+	nims[2].advanced.sat[235].lnb.value = "1"
+	nims[2].advanced.lnb[1].lof.value = "unicable"
+	check(nimmgr, "FBC root unicable")
+	nims[3].configMode.value = "advanced"
+	nims[3].advanced.sat[282].lnb.value = "1"
+	check(nimmgr, "FBC link, not a tuner of a satellite")
+	nims[2].configMode.value = "nothing"
+	check(nimmgr, "FBC root disabled")
+
+	nimmgr.readTransponders()
+	check(nimmgr, "satellites read again")
+
+	if failures:
+		print()
+		print("\n".join(failures))
+		return 1
+	print()
+	print("All routing table checks passed.")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
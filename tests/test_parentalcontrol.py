@@ -0,0 +1,163 @@
+# Test of the hidden flags and the protected bouquets of the parental control.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python test_parentalcontrol.py
+#
+# A blacklist with a service and a bouquet is loaded from a temporary
+# configuration directory.  The index of the protected bouquets must be
+# built from the bouquets of the list, only the hidden flags of the services
+# whose state changed may be set or cleared and a bouquet whose file changed
+# or that was read before the bouquets were loaded must be read again.  The
+# process exits with 1 if a check failed.
+
+import os
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import enigma  # This must be the first import, it sets up the fake environment.
+from benchmarks import initUsageConfig
+initUsageConfig()
+import Tools.Directories
+from Components.config import ConfigInteger, NoSave, config
+import Components.ParentalControl
+
+SERVICE = "1:0:19:283D:3FB:1:C00000:0:0:0:"
+BOUQUET = "1:7:1:0:0:0:0:0:0:0:FROM BOUQUET \"userbouquet.kids.tv\" ORDER BY bouquet"
+KIDS = ["1:0:1:1:1:1:C00000:0:0:0:", "1:0:1:2:1:1:C00000:0:0:0:", "1:0:1:3:1:1:C00000:0:0:0:"]
+
+
+class FakeDVBDB:  # Records the flag changes of eDVBDB.
+	instance = None
+
+	def __init__(self):
+		self.added = []
+		self.removed = []
+
+	@classmethod
+	def getInstance(cls):
+		return cls.instance
+
+	def addFlag(self, ref, flag):
+		self.added.append(ref.toString())
+
+	def removeFlag(self, ref, flag):
+		self.removed.append(ref.toString())
+
+
+class FakeServiceList:
+	def __init__(self, services):
+		self.services = services
+
+	def getContent(self, format, sort=False):
+		return [(service, "") for service in self.services]
+
+
+class FakeServiceCenter:  # Lists the services of the bouquets, None until the bouquets are loaded.
+	bouquets = None
+
+	@classmethod
+	def getInstance(cls):
+		return cls()
+
+	def list(self, root):
+		if self.bouquets is None:
+			return None
+		return FakeServiceList(self.bouquets.get(root.toString(), []))
+
+
+failures = []
+refreshes = []
+
+
+def check(label, added=(), removed=(), refreshed=False):
+	db = FakeDVBDB.instance
+	if sorted(db.added) != sorted(added) or sorted(db.removed) != sorted(removed):
+		failures.append("%s: flags added %s and removed %s instead of %s and %s" % (label, sorted(db.added), sorted(db.removed), sorted(added), sorted(removed)))
+	if bool(refreshes) != refreshed:
+		failures.append("%s: the service list was %srefreshed" % (label, "" if refreshes else "not "))
+	print("%-45s %d flags added, %d removed" % (label, len(db.added), len(db.removed)))
+	db.added = []
+	db.removed = []
+	del refreshes[:]
+
+
+def writeBouquet(directory, services, mtime):
+	path = os.path.join(directory, "userbouquet.kids.tv")
+	with open(path, "w") as fd:
+		fd.write("#NAME Kids\n")
+		fd.write("".join("#SERVICE %s\n" % service for service in services))
+	os.utime(path, (mtime, mtime))
+	FakeServiceCenter.bouquets = {BOUQUET: services}
+
+
+def main():
+	directory = mkdtemp()
+	Tools.Directories.defaultPaths[Tools.Directories.SCOPE_CONFIG] = (os.path.join(directory, ""), Tools.Directories.PATH_DONTCREATE)
+	with open(os.path.join(directory, "blacklist"), "w") as fd:
+		fd.write("%s\n%s\n" % (SERVICE, BOUQUET))
+	writeBouquet(directory, [], 1000000)
+	FakeServiceCenter.bouquets = None  # The bouquet file is there, the bouquets are loaded later.
+	FakeDVBDB.instance = FakeDVBDB()
+	Components.ParentalControl.eDVBDB = FakeDVBDB
+	Components.ParentalControl.eServiceCenter = FakeServiceCenter
+	Components.ParentalControl.refreshServiceList = lambda: refreshes.append(True)
+	if not hasattr(config.misc, "standbyCounter"):
+		config.misc.standbyCounter = NoSave(ConfigInteger(default=0))
+	config.ParentalControl.configured.value = True
+	config.ParentalControl.storeservicepin.value = "standby"
+	config.ParentalControl.hideBlacklist.value = True
+	parentalControl = Components.ParentalControl.ParentalControl()
+	try:
+		parentalControl.open()  # The bouquets are not loaded yet.
+		if BOUQUET not in parentalControl.bouquets:
+			failures.append("the protected bouquet is not indexed after the list was loaded")
+		check("list loaded before the bouquets", added=[SERVICE], refreshed=True)
+		FakeServiceCenter.bouquets = {BOUQUET: KIDS[:2]}
+		parentalControl.hideBlacklist()
+		check("bouquets loaded, file unchanged", added=KIDS[:2], refreshed=True)
+		parentalControl.hideBlacklist()
+		check("unchanged")
+
+		FakeServiceCenter.bouquets = {BOUQUET: KIDS[1:]}
+		parentalControl.hideBlacklist()
+		check("bouquet changed, file unchanged")
+		writeBouquet(directory, KIDS[1:], 2000000)
+		parentalControl.hideBlacklist()
+		check("bouquet file changed", added=[KIDS[2]], removed=[KIDS[0]], refreshed=True)
+		if KIDS[0] in parentalControl.blacklist or KIDS[2] not in parentalControl.blacklist:
+			failures.append("the blacklist does not hold the services of the changed bouquet")
+
+		parentalControl.setSessionPinCached()
+		parentalControl.hideBlacklist()
+		check("PIN entered", removed=[SERVICE] + KIDS[1:], refreshed=True)
+		parentalControl.resetSessionPin()
+		check("PIN cache expired", added=[SERVICE] + KIDS[1:], refreshed=True)
+		parentalControl.protectService(KIDS[0])
+		check("service protected", added=[KIDS[0]])
+		parentalControl.unProtectService(BOUQUET)
+		check("bouquet unprotected", removed=KIDS[1:])
+		if BOUQUET in parentalControl.bouquets:
+			failures.append("the unprotected bouquet is still indexed")
+
+		parentalControl.save()
+		parentalControl.protectService(BOUQUET)
+		FakeDVBDB.instance.added = []
+		parentalControl.open()  # The saved list without the bouquet.
+		if parentalControl.bouquets:
+			failures.append("the index holds bouquets that are not in the loaded list")
+		check("list loaded again", removed=KIDS[1:], refreshed=True)
+	finally:
+		rmtree(directory)
+
+	if failures:
+		print()
+		print("\n".join(failures))
+		return 1
+	print()
+	print("All parental control checks passed.")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
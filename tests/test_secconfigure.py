@@ -0,0 +1,147 @@
+# Test of the incremental satellite equipment control setup of SecConfigure.
+#
+# Start with
+# PYTHONPATH=.:..:../lib/python/ python test_secconfigure.py
+#
+# The tuners of test_nimmanager.py are configured step by step and after
+# every step SecConfigure.update() pushes the setup to a recording
+# satellite equipment control.  The recorded LNB table and links must be
+# the ones of a full setup computed by calcSetup() and only the expected
+# clear() and addLNB() calls may reach the satellite equipment control.
+# The process exits with 1 if a check failed.
+
+import sys
+
+from test_nimmanager import TestNimManager, setSatlist  # This sets up the fake environment.
+import enigma
+import Components.NimManager
+from Components.config import config
+
+
+class RecordingSatelliteEquipmentControl(enigma.fakeObject):  # The class constants and setParam() are fake.
+	instance = None
+
+	def __init__(self):
+		self.links = []
+		self.lnbs = []
+		self.clears = 0
+		self.added = 0
+
+	@classmethod
+	def getInstance(cls):
+		if cls.instance is None:
+			cls.instance = cls()
+		return cls.instance
+
+	def __getattr__(self, name):
+		if not name.startswith("set"):
+			raise AttributeError(name)
+		if name in ("setTunerLinked", "setTunerDepends", "setSlotNotLinked"):
+			return lambda *args: self.links.append((name, args))
+		return lambda *args: self.lnbs[-1].append((name, args))
+
+	def getMaxFixedLnbPositions(self):
+		return 64
+
+	def clear(self):
+		self.links = []
+		self.lnbs = []
+		self.clears += 1
+
+	def addLNB(self):
+		self.lnbs.append([])
+		self.added += 1
+		return 0
+
+	def addSatellite(self, orbpos):
+		self.lnbs[-1].append(("addSatellite", (orbpos,)))
+
+
+class DiseqcParameters:  # The values of eDVBSatelliteDiseqcParameters, SecConfigure compares the DiSEqC mode.
+	NONE, V1_0, V1_1, V1_2, SMATV = range(5)
+	NO, A, B = range(3)
+	AA, AB, BA, BB, SENDNO = range(5)
+
+
+class SwitchParameters:  # The values of eDVBSatelliteSwitchParameters, the fake constants would be all equal.
+	HILO, ON, OFF = range(3)
+	HV, _14V, _18V, _0V, HV_13 = range(5)
+
+
+class RotorParameters:  # The values of eDVBSatelliteRotorParameters.
+	NORTH, SOUTH, EAST, WEST = range(4)
+	FAST, SLOW = range(2)
+
+
+failures = []
+
+
+def check(nimmgr, label, clears, added):
+	sec = RecordingSatelliteEquipmentControl.getInstance()
+	sec.clears = 0
+	sec.added = 0
+	nimmgr.sec.update()
+	setup = nimmgr.sec.calcSetup()
+	if sec.lnbs != setup.lnbs:
+		failures.append("%s: the LNB table differs from the full setup" % label)
+	if sec.links != [(method, args) for method, args in setup.links if method != "setInternalLink"]:
+		failures.append("%s: the links differ from the full setup" % label)
+	if nimmgr.getConfiguredSats() != setup.satellites:
+		failures.append("%s: the configured satellites %s are not %s" % (label, sorted(nimmgr.getConfiguredSats()), sorted(setup.satellites)))
+	if (sec.clears, sec.added) != (clears, added):
+		failures.append("%s: %d clear() and %d addLNB() instead of %d and %d" % (label, sec.clears, sec.added, clears, added))
+	print("%-45s %d LNBs, %d clear(), %d addLNB()" % (label, len(sec.lnbs), sec.clears, sec.added))
+
+
+def main():
+	Components.NimManager.secClass = RecordingSatelliteEquipmentControl
+	Components.NimManager.diseqcParam = DiseqcParameters
+	Components.NimManager.switchParam = SwitchParameters
+	Components.NimManager.rotorParam = RotorParameters
+	config.content.items.pop("Nims", None)  # Created for the slots of this environment by the import.
+	nimmgr = TestNimManager()
+	nims = [config.Nims[slot].dvbs for slot in range(4)]
+	check(nimmgr, "default configuration, unchanged", 0, 0)
+
+	nims[0].diseqcMode.value = "diseqc_a_b"
+	setSatlist(nims[0].diseqcA, 192)
+	setSatlist(nims[0].diseqcB, 130)
+	check(nimmgr, "simple DiSEqC A/B", 0, 2)
+	check(nimmgr, "unchanged", 0, 0)
+	config.Nims[4].dvbt.configMode.value = "nothing"
+	check(nimmgr, "DVB-T tuner disabled", 0, 0)
+	nims[0].diseqcMode.value = "diseqc_a_b_c_d"
+	setSatlist(nims[0].diseqcC, 282)
+	setSatlist(nims[0].diseqcD, 235)
+	check(nimmgr, "simple DiSEqC A/B/C/D, LNBs C and D added", 0, 2)
+
+	nims[1].configMode.value = "advanced"
+	nims[1].advanced.sat[192].lnb.value = "1"
+	check(nimmgr, "second tuner advanced, LNB added", 0, 1)
+	nims[1].advanced.sat[130].lnb.value = "2"
+	check(nimmgr, "second LNB added", 0, 1)
+	nims[1].advanced.lnb[2].lof.value = "c_band"
+	check(nimmgr, "applied LNB changed", 1, 6)
+	nims[1].advanced.sat[130].tonemode.value = "off"
+	check(nimmgr, "satellite of an applied LNB changed", 1, 6)
+	nims[1].advanced.sat[130].lnb.value = "0"
+	check(nimmgr, "LNB removed", 1, 5)
+
+	nims[1].configMode.value = "equal"
+	nims[1].connectedTo.value = "0"
+	check(nimmgr, "second tuner equal to the first", 1, 4)
+	nims[0].diseqc13V.value = True
+	check(nimmgr, "voltage of the first tuner changed", 1, 4)
+	check(nimmgr, "unchanged", 0, 0)
+
+	if failures:
+		print()
+		print("\n".join(failures))
+		return 1
+	print()
+	print("All satellite equipment control checks passed.")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -10,37 +10,28 @@
 import os
 import sys
 
-f = open(sys.argv[1]).readlines()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "lib", "python"))
 
-f = f[f.index("services\n") + 1:-3]
+from Tools.Lamedb import Service, iterLamedb  # noqa: E402
 
-while len(f) > 2:
-	ref = [int(x, 0x10) for x in f[0][:-1].split(':')]
-	name = f[1][:-1]
-	name = name.replace('\xc2\x87', '').replace('\xc2\x86', '')
+for service in iterLamedb(sys.argv[1]):
+	if not isinstance(service, Service):
+		continue
+	name = service.name.replace('\x87', '').replace('\x86', '')
+	provider = service.provider or 'unknown'
 
-	fields = f[2].split(',')
-	if len(fields) and fields[0][0] == 'p':
-		provider = fields[0].split(':')[1]
-	else:
-		provider = 'unknown'
-
-	if ref[4] == 2:
+	if service.serviceType == 2:
 		servicetype = 'radio'
 	else:
-		ref[4] = 1
+		service.serviceType = 1
 		servicetype = 'tv'
 
-	sat = str(ref[1] / 16 / 16 / 16 / 16)
-
-#	SID:NS:TSID:ONID:STYPE:UNUSED(channelnumber in enigma1)
-#	X   X  X    X    D     D
+	sat = str(service.namespace >> 16)
 
 #	REFTYPE:FLAGS:STYPE:SID:TSID:ONID:NS:PARENT_SID:PARENT_TSID:UNUSED
 #   D       D     X     X   X    X    X  X          X           X
 
-	refstr = f"1:0:{ref[4]:X}:{ref[0]:X}:{ref[2]:X}:{ref[3]:X}:{ref[1]:X}:0:0:0"
-	refstr = refstr.replace(':', '_')
+	refstr = service.getServiceReference()[:-1].replace(':', '_')
 
 	filename = name + ".png"
 	linkname = refstr + ".png"
@@ -50,13 +41,8 @@ while len(f) > 2:
 	filename = filename.replace('\n', '')
 	provider = provider.replace('\n', '')
 
-	for i in list(range(len(filename))):
-		if ord(filename[i]) > 127:
-			filename = filename[0:i] + '_' + filename[i + 1:]
-
-	for i in list(range(len(provider))):
-		if ord(provider[i]) > 127:
-			provider = provider[0:i] + '_' + provider[i + 1:]
+	filename = ''.join(c if ord(c) <= 127 else '_' for c in filename)
+	provider = ''.join(c if ord(c) <= 127 else '_' for c in provider)
 
 	if sat == "65535":
 		sat = "cable"
@@ -81,5 +67,3 @@ while len(f) > 2:
 		os.symlink(filename, sat + '/' + servicetype + '/' + linkname)
 	except:
 		pass
-
-	f = f[3:]